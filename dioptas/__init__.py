@@ -29,25 +29,30 @@ if "QT_API" not in os.environ:
     except ImportError:
         pass
 
-from qtpy import QtWidgets
-from qt_material import apply_stylesheet
-
-try:
-    from pyshortcuts import make_shortcut
-except ImportError:
-    make_shortcut = None
-
 __version__ = "0.7.1"
 
 from .paths import resources_path, calibrants_path, icons_path, data_path, style_path
-from .excepthook import excepthook
-from .controller.MainController import MainController
-
 
 theme_path = os.path.join(style_path, "dark_orange.xml")
 qss_path = os.path.join(style_path, "qt_material.css")
 
+
+def __getattr__(name):
+    # the GUI (and with it Qt, pyFAI and all widgets) is only imported when it is used, so that scripts using parts of
+    # Dioptas do not pay for its import time
+    if name == "MainController":
+        from .controller.MainController import MainController
+
+        return MainController
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 def main():
+    from qtpy import QtWidgets
+    from qt_material import apply_stylesheet
+    from .excepthook import excepthook
+    from .controller.MainController import MainController
+
     app = QtWidgets.QApplication([])
 
     apply_stylesheet(
@@ -61,6 +66,7 @@ def main():
 
     if len(sys.argv) == 1:  # normal start
         controller = MainController()
+        controller.model.integrate_in_background = True
         controller.show_window()
         app.exec_()
     else:  # with command line arguments
@@ -69,7 +75,9 @@ def main():
             controller.show_window()
 
         elif sys.argv[1].startswith("makeshortcut"):
-            if make_shortcut is None:
+            try:
+                from pyshortcuts import make_shortcut
+            except ImportError:
                 raise ImportError("pyshortcuts not installed.  Try `pip install pyshortcuts`")
             binary_dir = "Scripts" if os.name == "nt" else "bin"
             make_shortcut(
@@ -84,6 +92,7 @@ def main():
 
         elif sys.argv[1].endswith(".json"):
             controller = MainController(config_file=sys.argv[1])
+            controller.model.integrate_in_background = True
             controller.show_window()
             app.exec_()
     del app
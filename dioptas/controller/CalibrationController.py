@@ -33,6 +33,7 @@ from ..model.DioptasModel import DioptasModel
 from ..model.CalibrationModel import (
     NotEnoughSpacingsInCalibrant,
     get_available_detectors,
+    get_available_calibrants,
     DetectorModes,
 )
 
@@ -309,14 +310,7 @@ class CalibrationController(object):
         """
         Loads all calibrants from the ExampleData/calibrants directory into the calibrants combobox. And loads number 7.
         """
-        self._calibrants_file_list = []
-        self._calibrants_file_names_list = []
-        for file in os.listdir(calibrants_path):
-            if file.endswith(".D"):
-                self._calibrants_file_list.append(file)
-                self._calibrants_file_names_list.append(file.split(".")[:-1][0])
-        self._calibrants_file_list.sort()
-        self._calibrants_file_names_list.sort()
+        self._calibrants_file_names_list, self._calibrants_file_list = get_available_calibrants(calibrants_path)
         self.widget.calibrant_cb.blockSignals(True)
         self.widget.calibrant_cb.clear()
         self.widget.calibrant_cb.addItems(self._calibrants_file_names_list)
@@ -643,15 +637,12 @@ class CalibrationController(object):
         else:
             mask = None
 
-        self.model.calibration_model.search_peaks_on_ring(
-            0, delta_tth, intensity_min_factor, intensity_max, mask
-        )
-        self.widget.peak_num_sb.setValue(2)
-        progress_dialog.setValue(1)
-        self.model.calibration_model.search_peaks_on_ring(
-            1, delta_tth, intensity_min_factor, intensity_max, mask
+        # both rings are searched with the starting geometry, the following rings depend on the previous refinement
+        self.model.calibration_model.search_peaks_on_rings(
+            [0, 1], delta_tth, intensity_min_factor, intensity_max, mask
         )
         self.widget.peak_num_sb.setValue(3)
+        progress_dialog.setValue(1)
         if len(self.model.calibration_model.points):
             self.model.calibration_model.refine()
             self.plot_points()
@@ -751,11 +742,11 @@ class CalibrationController(object):
                 "Integrating to cake.", "", 0, show_cancel_btn=False
             )
             QtWidgets.QApplication.processEvents()
-            self.model.current_configuration.integrate_image_2d()
+            self.model.current_configuration.integrate_image_2d(in_background=False)
             progress_dialog.setLabelText("Integrating to pattern.")
             QtWidgets.QApplication.processEvents()
             QtWidgets.QApplication.processEvents()
-            self.model.current_configuration.integrate_image_1d()
+            self.model.current_configuration.integrate_image_1d(in_background=False)
             progress_dialog.close()
         self.widget.cake_widget.plot_image(self.model.cake_data, False)
         self.widget.cake_widget.auto_level()
@@ -93,6 +93,9 @@ class MainController(object):
         self.update_title()
 
         if use_settings:
+            self.model.phase_model.phase_library.cache_filename = os.path.join(
+                self.settings_directory, "phase_library.pkl"
+            )
             QtCore.QTimer.singleShot(0, self.load_default_settings)
             self.setup_backup_timer()
 
@@ -237,6 +240,7 @@ class MainController(object):
         if not os.path.exists(self.settings_directory):
             os.mkdir(self.settings_directory)
         self.model.save(os.path.join(self.settings_directory, "config.dio"))
+        self.model.phase_model.phase_library.flush_cache()
 
     def load_default_settings(self):
         config_path = os.path.join(self.settings_directory, "config.dio")
@@ -288,6 +292,8 @@ class MainController(object):
         if self.use_settings:
             self.save_default_settings()
             self.save_directories()
+        self.model.integration_worker.close()
+        self.model.pattern_writer.close()
         QtWidgets.QApplication.closeAllWindows()
         ev.accept()
 
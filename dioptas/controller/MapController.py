@@ -245,8 +245,8 @@ class MapController(object):
         if not self.model.current_configuration.is_calibrated:
             return
 
-        self.widget.img_plot_widget.set_circle_line(
-            self.model.calibration_model.pattern_geometry.ttha, np.deg2rad(pos)
+        self.widget.img_plot_widget.set_circle_contours(
+            self.model.calibration_model.get_two_theta_contours(np.deg2rad(pos))
         )
 
     def file_list_row_changed(self, row):
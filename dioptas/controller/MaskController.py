@@ -367,11 +367,13 @@ class MaskController(object):
         self.plot_mask()
 
     def grow_btn_click(self):
-        self.model.mask_model.grow()
+        self.model.mask_model.grow(self.widget.grow_shrink_radius_sb.value(),
+                                   self.widget.grow_shrink_structure_cb.currentText())
         self.plot_mask()
 
     def shrink_btn_click(self):
-        self.model.mask_model.shrink()
+        self.model.mask_model.shrink(self.widget.grow_shrink_radius_sb.value(),
+                                     self.widget.grow_shrink_structure_cb.currentText())
         self.plot_mask()
 
     def invert_mask_btn_click(self):
@@ -21,7 +21,7 @@
 import os
 
 import numpy as np
-from qtpy import QtWidgets
+from qtpy import QtWidgets, QtCore
 from xypattern.auto_background import SmoothBrucknerBackground
 
 from ...widgets.UtilityWidgets import open_file_dialog, save_file_dialog
@@ -47,6 +47,14 @@ class BackgroundController(object):
         )
         self.model = dioptas_model
 
+        # edits of the background image scaling and offset are collected, so that the image is only processed and
+        # integrated again once the values settled (e.g. while typing or holding the spin box arrows)
+        self.bkg_image_update_timer = QtCore.QTimer()
+        self.bkg_image_update_timer.setSingleShot(True)
+        self.bkg_image_update_timer.setInterval(200)
+        self.bkg_image_update_timer.timeout.connect(self.apply_background_img_parameters)
+        self._bkg_image_pending_update = None  # (img_model, scaling, offset)
+
         self.model.configuration_selected.connect(self.update_bkg_image_widgets)
         self.model.configuration_selected.connect(self.update_auto_pattern_bkg_widgets)
 
@@ -171,10 +179,33 @@ class BackgroundController(object):
             self.widget.bkg_name_lbl.setText("")
 
     def background_img_scale_changed(self):
-        self.model.img_model.background_scaling = self.widget.bkg_image_scale_sb.value()
+        self._schedule_background_img_parameters()
 
     def background_img_offset_changed(self):
-        self.model.img_model.background_offset = self.widget.bkg_image_offset_sb.value()
+        self._schedule_background_img_parameters()
+
+    def _schedule_background_img_parameters(self):
+        self._bkg_image_pending_update = (
+            self.model.img_model,
+            self.widget.bkg_image_scale_sb.value(),
+            self.widget.bkg_image_offset_sb.value(),
+        )
+        self.bkg_image_update_timer.start()
+
+    def apply_background_img_parameters(self):
+        """
+        Sets the edited background scaling and offset in the image model, it is processed only once for both.
+        """
+        self.bkg_image_update_timer.stop()
+        if self._bkg_image_pending_update is None:
+            return
+        img_model, scaling, offset = self._bkg_image_pending_update
+        self._bkg_image_pending_update = None
+        with img_model.batch_update():
+            if img_model.background_scaling != scaling:
+                img_model.background_scaling = scaling
+            if img_model.background_offset != offset:
+                img_model.background_offset = offset
 
     def bkg_pattern_gb_toggled_callback(self, is_checked):
         self.widget.bkg_pattern_gb.blockSignals(True)
@@ -360,9 +391,15 @@ class BackgroundController(object):
         self.widget.pattern_widget.bkg_roi.blockSignals(False)
 
     def update_bkg_image_widgets(self):
+        # pending edits belong to the previously selected configuration
+        self.apply_background_img_parameters()
         self.update_background_image_filename()
+        self.widget.bkg_image_offset_sb.blockSignals(True)
+        self.widget.bkg_image_scale_sb.blockSignals(True)
         self.widget.bkg_image_offset_sb.setValue(self.model.img_model.background_offset)
         self.widget.bkg_image_scale_sb.setValue(self.model.img_model.background_scaling)
+        self.widget.bkg_image_offset_sb.blockSignals(False)
+        self.widget.bkg_image_scale_sb.blockSignals(False)
         self.widget.img_show_background_subtracted_btn.setVisible(
             self.model.img_model.has_background()
         )
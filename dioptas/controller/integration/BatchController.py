@@ -126,6 +126,12 @@ class BatchController(object):
         self.widget.batch_widget.control_widget.normalize_btn.clicked.connect(
             self.normalize_btn_clicked
         )
+        self.widget.batch_widget.control_widget.pressure_btn.clicked.connect(
+            self.determine_pressures
+        )
+        self.widget.batch_widget.control_widget.track_peaks_btn.clicked.connect(
+            self.track_peaks
+        )
 
         # set unit of x axis
         self.widget.batch_widget.options_widget.tth_btn.clicked.connect(
@@ -160,30 +166,13 @@ class BatchController(object):
             self.process_step
         )
 
-        # Surface widget signals
+        # Surface widget signals, the surface widget itself is created when the 3D view is used for the first time
         if open_gl:
             self.widget.batch_widget.mode_widget.view_3d_btn.clicked.connect(
                 self.change_view
             )
-            surface_navigation_widget = (
-                self.widget.batch_widget.surface_widget.control_widget
-            )
-            surface_navigation_widget.view3d_f_btn.clicked.connect(self.set_3d_view_f)
-            surface_navigation_widget.view3d_s_btn.clicked.connect(self.set_3d_view_s)
-            surface_navigation_widget.view3d_t_btn.clicked.connect(self.set_3d_view_t)
-            surface_navigation_widget.view3d_i_btn.clicked.connect(self.set_3d_view_i)
-            surface_navigation_widget.scale_x_btn.clicked.connect(self.pressed_button_x)
-            surface_navigation_widget.scale_y_btn.clicked.connect(self.pressed_button_y)
-            surface_navigation_widget.scale_z_btn.clicked.connect(self.pressed_button_z)
-            surface_navigation_widget.scale_s_btn.clicked.connect(self.pressed_button_s)
-            surface_navigation_widget.trim_h_btn.clicked.connect(self.pressed_button_h)
-            surface_navigation_widget.trim_l_btn.clicked.connect(self.pressed_button_l)
-            surface_navigation_widget.move_g_btn.clicked.connect(self.pressed_button_g)
-            surface_navigation_widget.move_m_btn.mouseReleaseEvent = (
-                self.pressed_button_m
-            )
-            surface_navigation_widget.m_color_btn.sigColorChanged.connect(
-                self.set_marker_color
+            self.widget.batch_widget.surface_widget_created.connect(
+                self.connect_surface_widget
             )
 
         self.widget.batch_widget.stack_plot_widget.img_view.img_view_box.sigRangeChanged.connect(
@@ -204,20 +193,37 @@ class BatchController(object):
 
         self.model.clicked_tth_changed.connect(self.update_vertical_line_pos)
 
-        # 3D
-        if open_gl:
-            self.widget.batch_widget.surface_widget.pg_layout.wheelEvent = (
-                self.wheel_event_3d
-            )
-            self.widget.batch_widget.surface_widget.pg_layout.keyPressEvent = (
-                self.key_pressed_3d
-            )
+    def connect_surface_widget(self):
+        """
+        Creates the signal connections and mouse behavior of the 3D view after it has been created
+        """
+        surface_widget = self.widget.batch_widget.surface_widget
+        surface_navigation_widget = surface_widget.control_widget
+        surface_navigation_widget.view3d_f_btn.clicked.connect(self.set_3d_view_f)
+        surface_navigation_widget.view3d_s_btn.clicked.connect(self.set_3d_view_s)
+        surface_navigation_widget.view3d_t_btn.clicked.connect(self.set_3d_view_t)
+        surface_navigation_widget.view3d_i_btn.clicked.connect(self.set_3d_view_i)
+        surface_navigation_widget.scale_x_btn.clicked.connect(self.pressed_button_x)
+        surface_navigation_widget.scale_y_btn.clicked.connect(self.pressed_button_y)
+        surface_navigation_widget.scale_z_btn.clicked.connect(self.pressed_button_z)
+        surface_navigation_widget.scale_s_btn.clicked.connect(self.pressed_button_s)
+        surface_navigation_widget.trim_h_btn.clicked.connect(self.pressed_button_h)
+        surface_navigation_widget.trim_l_btn.clicked.connect(self.pressed_button_l)
+        surface_navigation_widget.move_g_btn.clicked.connect(self.pressed_button_g)
+        surface_navigation_widget.move_m_btn.mouseReleaseEvent = self.pressed_button_m
+        surface_navigation_widget.m_color_btn.sigColorChanged.connect(
+            self.set_marker_color
+        )
+
+        surface_widget.pg_layout.wheelEvent = self.wheel_event_3d
+        surface_widget.pg_layout.keyPressEvent = self.key_pressed_3d
 
     def show_batch_frame(self):
         self.widget.batch_widget.raise_widget()
 
     def close_batch_frame(self, a0: typing.Optional[QCloseEvent]) -> None:
         self.widget.batch_widget.hide()
+        self.widget.batch_widget.pressure_widget.hide()
         if a0 is not None:
             a0.ignore()
 
@@ -570,6 +576,116 @@ class BatchController(object):
         self.model.batch_model.extract_background(parameters, callback_fn)
         progress_dialog.close()
 
+    def determine_pressures(self):
+        """
+        Determines the pressure of every frame from the peak positions of the phase selected in the phase tab and
+        plots the pressures against the frame index
+        """
+        if self.model.batch_model.data is None:
+            return
+        phase_ind = self.widget.phase_widget.get_selected_phase_row()
+        if phase_ind < 0:
+            self.widget.show_error_msg(
+                "Please select the calibrant phase for the pressure determination in the phase tab."
+            )
+            return
+
+        progress_dialog = get_progress_dialog(
+            "Determining pressures",
+            "Abort",
+            self.model.batch_model.n_img,
+            self.widget.batch_widget,
+        )
+
+        def callback_fn(current_index):
+            if progress_dialog.wasCanceled():
+                return False
+            progress_dialog.setValue(current_index)
+            QtWidgets.QApplication.processEvents()
+            return ~progress_dialog.wasCanceled()
+
+        self.model.batch_model.determine_pressures(
+            self.model.phase_model.phases[phase_ind], callback_fn=callback_fn
+        )
+        progress_dialog.close()
+        self.plot_pressures()
+        self.widget.batch_widget.pressure_widget.raise_widget()
+
+    def plot_pressures(self):
+        """
+        Plots the pressures of the batch against the frame index, frames without a pressure are left out
+        """
+        pressures = self.model.batch_model.pressures
+        if pressures is None:
+            self.widget.batch_widget.pressure_widget.plot_pressures([], [])
+            return
+        frames = np.arange(len(pressures))
+        valid = np.isfinite(pressures)
+        self.widget.batch_widget.pressure_widget.plot_pressures(
+            frames[valid], pressures[valid], self.model.batch_model.pressure_calibrant
+        )
+
+    def track_peaks(self):
+        """
+        Asks for the start positions (by default the clicked two theta) and the width of the peaks, fits them in
+        every frame and shows the fitted peak centers on the 2D batch image
+        """
+        binning = self.model.batch_model.binning
+        if self.model.batch_model.data is None or binning is None or len(binning) < 2:
+            return
+
+        centers_str, ok = QtWidgets.QInputDialog.getText(
+            self.widget.batch_widget,
+            "Track peaks",
+            "Peak positions (2θ in °, comma separated):",
+            text="{:.4f}".format(self.model.clicked_tth),
+        )
+        if not ok:
+            return
+        try:
+            centers = [
+                float(center)
+                for center in centers_str.replace(";", ",").split(",")
+                if center.strip()
+            ]
+        except ValueError:
+            centers = []
+        if len(centers) == 0:
+            self.widget.show_error_msg(
+                "Please enter the peak positions as comma separated numbers."
+            )
+            return
+
+        bin_step = (binning[-1] - binning[0]) / (len(binning) - 1)
+        fwhm, ok = QtWidgets.QInputDialog.getDouble(
+            self.widget.batch_widget,
+            "Track peaks",
+            "FWHM (2θ in °):",
+            value=5 * bin_step,
+            min=bin_step,
+            decimals=4,
+        )
+        if not ok:
+            return
+
+        progress_dialog = get_progress_dialog(
+            "Tracking peaks",
+            "Abort",
+            self.model.batch_model.n_img,
+            self.widget.batch_widget,
+        )
+
+        def callback_fn(current_index):
+            if progress_dialog.wasCanceled():
+                return False
+            progress_dialog.setValue(current_index)
+            QtWidgets.QApplication.processEvents()
+            return ~progress_dialog.wasCanceled()
+
+        self.model.batch_model.track_peaks(centers, fwhm, callback_fn=callback_fn)
+        progress_dialog.close()
+        self.plot_batch()
+
     def set_hard_minimum(self, ev, scale):
         if ev.button() == QtCore.Qt.RightButton:
             val, ok = QtWidgets.QInputDialog.getDouble(
@@ -731,6 +847,11 @@ class BatchController(object):
             if n_img is None:
                 self.widget.batch_widget.mode_widget.view_f_btn.setChecked(True)
                 return
+            if self.widget.batch_widget.surface_widget is None:
+                # OpenGL could not be imported, the 2D view is shown instead
+                self.widget.batch_widget.mode_widget.view_2d_btn.setChecked(True)
+                self.change_view()
+                return
             self.set_navigation_range((0, n_img - 1))
             self.widget.batch_widget.activate_surface_view()
             self.plot_batch()
@@ -850,12 +971,12 @@ class BatchController(object):
         Check if file contains processed data
         """
         if os.path.splitext(filename)[1] == ".nxs":
-            data_file = h5py.File(filename, "r")
-            if "processed" in data_file:
-                return True
-            # ToDo Check for old format. To be removed
-            if "data" in data_file:
-                return True
+            with h5py.File(filename, "r", swmr=True) as data_file:
+                if "processed" in data_file:
+                    return True
+                # ToDo Check for old format. To be removed
+                if "data" in data_file:
+                    return True
         return False
 
     def load_raw_data(self, filenames):
@@ -919,6 +1040,7 @@ class BatchController(object):
         self.widget.calibration_lbl.setText(
             self.model.calibration_model.calibration_name
         )
+        self.plot_pressures()
 
     def plot_batch(self, start=None, stop=None):
         """
@@ -957,6 +1079,7 @@ class BatchController(object):
             )
             self.update_axes_range()
             self.update_linear_region()
+            self.plot_peak_positions(start, stop, start_x)
 
         if self.widget.batch_widget.mode_widget.view_3d_btn.isChecked():
             step = int(
@@ -977,6 +1100,22 @@ class BatchController(object):
 
         self.model.enabled_phases_in_cake.emit()
 
+    def plot_peak_positions(self, start, stop, start_x):
+        """
+        Overlays the peak centers of the last peak tracking onto the 2D batch image
+        """
+        img_view = self.widget.batch_widget.stack_plot_widget.img_view
+        peak_tracking = self.model.batch_model.peak_tracking
+        binning = self.model.batch_model.binning
+        if peak_tracking is None or binning is None or len(binning) < 2:
+            img_view.clear_peak_positions()
+            return
+        centers = peak_tracking.center[start : stop + 1]
+        bin_step = (binning[-1] - binning[0]) / (len(binning) - 1)
+        x = (centers - binning[0]) / bin_step - start_x
+        y = np.broadcast_to(np.arange(len(centers))[:, np.newaxis], centers.shape)
+        img_view.plot_peak_positions(x.ravel(), y.ravel().astype(float))
+
     def _get_x_range(self):
         """
         Return bin-x range of the batch plot
@@ -1465,6 +1604,7 @@ class BatchController(object):
 
         progress_dialog.close()
         self.show_metadata_info()
+        self.plot_pressures()
 
         n_img = self.model.batch_model.n_img
         n_img_all = self.model.batch_model.n_img_all
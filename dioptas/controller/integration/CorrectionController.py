@@ -18,10 +18,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import numpy as np
 import time
 import os
-from qtpy import QtWidgets
+from qtpy import QtWidgets, QtCore
 
 from ...model.util.ImgCorrection import (
     CbnCorrection,
@@ -51,6 +50,14 @@ class CorrectionController(object):
         self.widget = widget
         self.model = dioptas_model
 
+        # parameter edits are collected, so that the corrections are only recalculated once the user stopped editing
+        self.cbn_update_timer = QtCore.QTimer()
+        self.cbn_update_timer.setSingleShot(True)
+        self.cbn_update_timer.setInterval(300)
+        self.oiadac_update_timer = QtCore.QTimer()
+        self.oiadac_update_timer.setSingleShot(True)
+        self.oiadac_update_timer.setInterval(300)
+
         self.create_signals()
 
     def create_signals(self):
@@ -58,16 +65,18 @@ class CorrectionController(object):
         self.widget.cbn_groupbox.clicked.connect(self.cbn_groupbox_changed)
         for row_ind in range(self.widget.cbn_param_tw.rowCount()):
             self.widget.cbn_param_tw.cellWidget(row_ind, 1).editingFinished.connect(
-                self.cbn_groupbox_changed
+                self.cbn_update_timer.start
             )
+        self.cbn_update_timer.timeout.connect(self.cbn_groupbox_changed)
         self.widget.cbn_plot_btn.clicked.connect(self.cbn_plot_correction_btn_clicked)
 
         # oiadac correction
         self.widget.oiadac_groupbox.clicked.connect(self.oiadac_groupbox_changed)
         for row_ind in range(self.widget.oiadac_param_tw.rowCount()):
             self.widget.oiadac_param_tw.cellWidget(row_ind, 1).editingFinished.connect(
-                self.oiadac_groupbox_changed
+                self.oiadac_update_timer.start
             )
+        self.oiadac_update_timer.timeout.connect(self.oiadac_groupbox_changed)
         self.widget.oiadac_plot_btn.clicked.connect(self.oiadac_plot_btn_clicked)
 
         # transfer correction
@@ -186,12 +195,8 @@ class CorrectionController(object):
             seat_absorption_length = self.widget.cbn_param_tw.cellWidget(8, 1).value()
             anvil_absorption_length = self.widget.cbn_param_tw.cellWidget(9, 1).value()
 
-            tth_array = (
-                180.0 / np.pi * self.model.calibration_model.pattern_geometry.ttha
-            )
-            azi_array = (
-                180.0 / np.pi * self.model.calibration_model.pattern_geometry.chia
-            )
+            tth_array = self.model.calibration_model.geometry_arrays.get("tth_deg")
+            azi_array = self.model.calibration_model.geometry_arrays.get("chi_deg")
 
             new_cbn_correction = CbnCorrection(
                 tth_array=tth_array,
@@ -283,9 +288,23 @@ class CorrectionController(object):
             detector_tilt = fit2d_parameter["tilt"]
             detector_tilt_rotation = fit2d_parameter["tiltPlanRotation"]
 
-            tth_array = self.model.calibration_model.pattern_geometry.ttha
-            azi_array = self.model.calibration_model.pattern_geometry.chia
-            import time
+            tth_array = self.model.calibration_model.geometry_arrays.get("tth")
+            azi_array = self.model.calibration_model.geometry_arrays.get("chi")
+
+            current_correction = self.model.img_model.get_img_correction("oiadac")
+            if (
+                current_correction is not None
+                and current_correction.tth_array is tth_array
+                and current_correction.azi_array is azi_array
+                and current_correction.get_params()
+                == {
+                    "detector_thickness": detector_thickness,
+                    "absorption_length": absorption_length,
+                    "tilt": detector_tilt,
+                    "rotation": detector_tilt_rotation,
+                }
+            ):
+                return
 
             t1 = time.time()
 
@@ -20,10 +20,6 @@
 
 from qtpy import QtCore, QtWidgets
 import numpy as np
-try:
-    import epics
-except ImportError:
-    epics = None
 
 from .econfig import epics_config
 
@@ -32,6 +28,8 @@ from ...model.DioptasModel import DioptasModel
 
 
 class EpicsController(object):
+    # pyepics loads the channel access library when it is imported, it is therefore only imported when the motors are
+    # actually used
 
     def __init__(self, widget, dioptas_model):
         """
@@ -72,6 +70,8 @@ class EpicsController(object):
         self.widget.move_widget.motors_setup_widget.set_motor_names_btn.clicked.connect(self.get_motors)
 
     def update_current_motor_position(self):
+        import epics
+
         hor = epics.caget(self.hor_motor_name + '.RBV', as_string=True)
         ver = epics.caget(self.ver_motor_name + '.RBV', as_string=True)
         focus = epics.caget(self.focus_motor_name + '.RBV', as_string=True)
@@ -101,6 +101,8 @@ class EpicsController(object):
             self.move_widget.img_omega_lbl.setText("")
 
     def move_stage(self):
+        import epics
+
         hor_pos = float(self.move_widget.img_hor_lbl.text())
         ver_pos = float(self.move_widget.img_ver_lbl.text())
         focus_pos = float(self.move_widget.img_focus_lbl.text())
@@ -171,6 +173,8 @@ class EpicsController(object):
 
     @staticmethod
     def check_conditions():
+        import epics
+
         if int(epics.caget('13IDD:m24.RBV')) > -105:
             return False
         elif int(epics.caget('13IDD:m23.RBV')) > -105:
@@ -180,6 +184,8 @@ class EpicsController(object):
         return True
 
     def check_sample_point_distances(self, pos_x, pos_y, pos_z):
+        import epics
+
         cur_x = float(epics.caget(self.hor_motor_name + '.RBV', as_string=True))
         cur_y = float(epics.caget(self.ver_motor_name + '.RBV', as_string=True))
         cur_z = float(epics.caget(self.focus_motor_name + '.RBV', as_string=True))
@@ -629,7 +629,7 @@ class ImageController(object):
         if not self.model.current_configuration.auto_integrate_cake:
             self.model.current_configuration.auto_integrate_cake = True
 
-        self.model.current_configuration.integrate_image_2d()
+        self.model.current_configuration.integrate_image_2d(in_background=False)
 
         self.set_cake_line_position(self.model.clicked_tth)
         self._update_cake_mouse_click_pos()
@@ -922,7 +922,8 @@ class ImageController(object):
             self.widget.img_widget.deactivate_circle_scatter()
             return
         self.widget.img_widget.activate_circle_scatter()
-        self.widget.img_widget.set_circle_line(self.model.calibration_model.get_two_theta_array(), np.deg2rad(tth))
+        self.widget.img_widget.set_circle_contours(
+            self.model.calibration_model.get_two_theta_contours(np.deg2rad(tth)))
 
     def set_iteration_mode_number(self):
         self.model.img_model.set_file_iteration_mode('number')
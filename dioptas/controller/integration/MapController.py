@@ -163,7 +163,7 @@ class MapController(object):
             # self.update_map_status_files_lbl()
 
     def _integrate_and_save_pattern(self, directory, base_filename):
-        self.model.current_configuration.integrate_image_1d()
+        self.model.current_configuration.integrate_image_1d(in_background=False)
         path = os.path.join(directory, os.path.splitext(base_filename)[0] + '.xy')
         self.model.current_configuration.save_pattern(path)
         return path
@@ -60,6 +60,8 @@ class PatternController(object):
         # Data subscriptions
         self.model.pattern_changed.connect(self.plot_pattern)
         self.model.configuration_selected.connect(self.update_gui)
+        self.model.pattern_writer.backlog_changed.connect(self.update_pattern_writer_status)
+        self.model.pattern_writer.write_failed.connect(self.pattern_write_failed)
 
         # Gui subscriptions
         # self.widget.img_widget.roi.sigRegionChangeFinished.connect(self.image_changed)
@@ -145,6 +147,9 @@ class PatternController(object):
         self.widget.pattern_header_fxye_cb.clicked.connect(
             self.update_pattern_file_endings
         )
+        self.widget.pattern_header_nxs_cb.clicked.connect(
+            self.update_pattern_file_endings
+        )
 
     def update_pattern_file_endings(self):
         res = []
@@ -156,6 +161,8 @@ class PatternController(object):
             res.append(".dat")
         if self.widget.pattern_header_fxye_cb.isChecked():
             res.append(".fxye")
+        if self.widget.pattern_header_nxs_cb.isChecked():
+            res.append(".nxs")
         self.model.current_configuration.integrated_patterns_file_formats = res
 
     def plot_pattern(self):
@@ -267,6 +274,31 @@ class PatternController(object):
         self.model.current_configuration.auto_save_integrated_pattern = (
             self.widget.pattern_autocreate_cb.isChecked()
         )
+        # toggling the auto save acknowledges previous write errors
+        del self.model.pattern_writer.errors[:]
+        self.update_pattern_writer_status(self.model.pattern_writer.backlog)
+
+    def update_pattern_writer_status(self, backlog):
+        """
+        Shows the number of auto saved pattern files, which are not written yet, and the number of write errors.
+        """
+        status = []
+        if backlog > 0:
+            status.append("writing {} files".format(backlog))
+        errors = self.model.pattern_writer.errors
+        if len(errors) > 0:
+            status.append("{} write errors".format(len(errors)))
+            self.widget.pattern_writer_status_lbl.setStyleSheet("color: red;")
+            self.widget.pattern_writer_status_lbl.setToolTip(
+                "Last error: {}\n{}".format(*errors[-1])
+            )
+        else:
+            self.widget.pattern_writer_status_lbl.setStyleSheet("")
+            self.widget.pattern_writer_status_lbl.setToolTip("")
+        self.widget.pattern_writer_status_lbl.setText(", ".join(status))
+
+    def pattern_write_failed(self, filename, message):
+        self.update_pattern_writer_status(self.model.pattern_writer.backlog)
 
     def filename_txt_changed(self):
         current_filename = os.path.basename(self.model.pattern.filename)
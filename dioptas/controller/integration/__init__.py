@@ -21,7 +21,6 @@
 from .BackgroundController import BackgroundController
 from .ImageController import ImageController
 from .IntegrationController import IntegrationController
-from .phase.JcpdsEditorController import JcpdsEditorController
 from .overlay.OverlayController import OverlayController
 from .phase.PhaseController import PhaseController
 from .phase.PhaseController import PhaseInPatternController
@@ -30,3 +29,11 @@ from .PatternController import PatternController
 from .MapController import MapController
 from .OptionsController import OptionsController
 from .BatchController import BatchController
+
+
+def __getattr__(name):
+    # the jcpds editor is rarely used and therefore only imported when requested
+    if name == "JcpdsEditorController":
+        from .phase.JcpdsEditorController import JcpdsEditorController
+        return JcpdsEditorController
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -19,13 +19,13 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+from concurrent.futures import CancelledError
 
 from qtpy import QtWidgets, QtCore, QtGui
 
 from ....model.PhaseModel import PhaseLoadError
 from ....model.util.HelperModule import get_base_name
-from ....controller.integration.phase.JcpdsEditorController import JcpdsEditorController
-from ....widgets.UtilityWidgets import save_file_dialog, open_file_dialog, open_files_dialog
+from ....widgets.UtilityWidgets import save_file_dialog, open_file_dialog, open_files_dialog, get_progress_dialog
 
 from .PhaseInPatternController import PhaseInPatternController
 from .PhaseInCakeController import PhaseInCakeController
@@ -61,9 +61,17 @@ class PhaseController(object):
         self.phase_in_pattern_controller = PhaseInPatternController(self.integration_widget.pattern_widget, dioptas_model)
         self.phase_in_cake_controller = PhaseInCakeController(self.integration_widget, dioptas_model)
         self.phase_in_batch_controller = PhaseInBatchController(self.integration_widget.batch_widget, dioptas_model)
-        self.jcpds_editor_controller = JcpdsEditorController(self.integration_widget, self.model)
+        self._jcpds_editor_controller = None  # created when the editor is used for the first time
 
         self.phase_lw_items = []
+
+        # the phase matching runs in a worker thread of the phase model, its result is polled
+        self.phase_matches = []
+        self._matching_future = None
+        self._matching_timer = QtCore.QTimer()
+        self._matching_timer.setInterval(50)
+        self._matching_timer.timeout.connect(self.check_matching_phases)
+
         self.create_signals()
         self.update_temperature_step()
         self.update_pressure_step()
@@ -75,6 +83,14 @@ class PhaseController(object):
         self.phase_widget.clear_btn.clicked.connect(self.clear_phases)
         self.phase_widget.save_list_btn.clicked.connect(self.save_btn_clicked_callback)
         self.phase_widget.load_list_btn.clicked.connect(self.load_list_btn_clicked_callback)
+        self.phase_widget.edit_btn.clicked.connect(self.edit_btn_click_callback)
+        self.phase_widget.find_phases_btn.clicked.connect(self.find_phases_btn_clicked)
+
+        # Phase matching
+        phase_match_widget = self.phase_widget.phase_match_widget
+        phase_match_widget.add_folder_btn.clicked.connect(self.add_library_folder)
+        phase_match_widget.search_btn.clicked.connect(self.search_matching_phases)
+        phase_match_widget.add_phases_btn.clicked.connect(self.add_matching_phases)
 
         # Spinbox Callbacks
         self.phase_widget.pressure_step_msb.valueChanged.connect(self.update_pressure_step)
@@ -96,6 +112,22 @@ class PhaseController(object):
         self.model.phase_model.phase_changed.connect(self.phase_changed)
         self.model.phase_model.phase_removed.connect(self.phase_removed)
 
+    @property
+    def jcpds_editor_controller(self):
+        """
+        The JcpdsEditorController is only created when it is needed, since the editor is rarely used and its widget
+        would otherwise be created on every start of Dioptas.
+        """
+        if self._jcpds_editor_controller is None:
+            from .JcpdsEditorController import JcpdsEditorController
+            self._jcpds_editor_controller = JcpdsEditorController(self.integration_widget, self.model)
+        return self._jcpds_editor_controller
+
+    def edit_btn_click_callback(self):
+        # once created, the JcpdsEditorController handles the edit button itself
+        if self._jcpds_editor_controller is None:
+            self.jcpds_editor_controller.edit_btn_callback()
+
     def connect_click_function(self, emitter, function):
         emitter.clicked.connect(function)
 
@@ -114,38 +146,132 @@ class PhaseController(object):
 
         if len(filenames):
             self.model.working_directories['phase'] = os.path.dirname(str(filenames[0]))
+            filenames = [str(filename) for filename in filenames]
+            intensity_cutoff, minimum_d_spacing = 0.5, 0.5
+            if any(filename.endswith(".cif") for filename in filenames):
+                self.cif_conversion_dialog.exec_()
+                intensity_cutoff = self.cif_conversion_dialog.int_cutoff
+                minimum_d_spacing = self.cif_conversion_dialog.min_d_spacing
+
             progress_dialog = QtWidgets.QProgressDialog("Loading multiple phases.", "Abort Loading", 0, len(filenames),
                                                         self.integration_widget)
             progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
             progress_dialog.setWindowFlags(QtCore.Qt.FramelessWindowHint)
             progress_dialog.show()
             QtWidgets.QApplication.processEvents()
-            for ind, filename in enumerate(filenames):
-                filename = str(filename)
-                progress_dialog.setValue(ind)
-                progress_dialog.setLabelText("Loading: " + os.path.basename(filename))
-                QtWidgets.QApplication.processEvents()
 
-                self._add_phase(filename)
+            def update_progress(num_parsed):
+                progress_dialog.setValue(num_parsed)
+                QtWidgets.QApplication.processEvents()
+                return not progress_dialog.wasCanceled()
 
-                if progress_dialog.wasCanceled():
-                    break
+            errors = self.model.phase_model.add_phases(filenames, intensity_cutoff, minimum_d_spacing,
+                                                       update_progress)
             progress_dialog.close()
             QtWidgets.QApplication.processEvents()
 
-    def _add_phase(self, filename):
+            if len(errors):
+                self.integration_widget.show_error_msg(
+                    'Could not load:\n\n{}.\n\nPlease check if the format of the input file is correct.'.
+                        format('\n'.join(e.filename for e in errors)))
+
+    def find_phases_btn_clicked(self):
+        self.phase_widget.phase_match_widget.set_library_size(len(self.model.phase_model.phase_library))
+        self.phase_widget.phase_match_widget.raise_widget()
+        self.search_matching_phases()
+
+    def add_library_folder(self, folder=None):
+        """
+        Adds all jcpds and cif files of a folder to the phase library and searches for matching phases again.
+        """
+        if not folder:
+            folder = str(QtWidgets.QFileDialog.getExistingDirectory(
+                self.phase_widget.phase_match_widget, "Add Folder to Phase Library",
+                self.model.working_directories['phase']))
+        if not folder:
+            return
+
+        progress_dialog = get_progress_dialog("Adding phases to the library.", "Abort", 0,
+                                              self.phase_widget.phase_match_widget)
+
+        def update_progress(num_parsed):
+            progress_dialog.setLabelText("Adding phases to the library ({} parsed).".format(num_parsed))
+            QtWidgets.QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        phase_library = self.model.phase_model.phase_library
+        failed = phase_library.add_folder(folder, intensity_cutoff=self.cif_conversion_dialog.int_cutoff,
+                                          minimum_d_spacing=self.cif_conversion_dialog.min_d_spacing,
+                                          callback_fn=update_progress)
+        progress_dialog.close()
+        self.phase_widget.phase_match_widget.set_library_size(len(phase_library))
+        if len(failed):
+            self.integration_widget.show_error_msg(
+                'Could not add:\n\n{}\n\nto the phase library.'.format('\n'.join(failed)))
+        self.search_matching_phases()
+
+    def search_matching_phases(self):
+        """
+        Starts the search for phases of the phase library matching the peaks of the current (background subtracted)
+        pattern, the result is shown by check_matching_phases.
+        """
+        phase_match_widget = self.phase_widget.phase_match_widget
+        if not self.model.calibration_model.is_calibrated:
+            phase_match_widget.status_lbl.setText("Searching phases needs a calibration.")
+            return
+        if len(self.model.phase_model.phase_library) == 0:
+            phase_match_widget.status_lbl.setText("The phase library is empty, please add a folder.")
+            return
+        x, y = self.model.pattern_model.pattern.data
+        if len(x) == 0:
+            return
+
+        self._matching_future = self.model.phase_model.find_matching_phases(
+            x, y, self.model.integration_unit, self.model.calibration_model.wavelength * 1e10,
+            pressure_range=phase_match_widget.get_pressure_range())
+        phase_match_widget.status_lbl.setText("Searching...")
+        self._matching_timer.start()
+
+    def check_matching_phases(self):
+        """
+        Shows the result of the phase matching, once the search in the worker thread is finished.
+        """
+        if self._matching_future is None or not self._matching_future.done():
+            return
+        self._matching_timer.stop()
+        future, self._matching_future = self._matching_future, None
+        phase_match_widget = self.phase_widget.phase_match_widget
         try:
-            if filename.endswith("jcpds"):
-                self.model.phase_model.add_jcpds(filename)
-            elif filename.endswith(".cif"):
-                self.cif_conversion_dialog.exec_()
-                self.model.phase_model.add_cif(filename,
-                                               self.cif_conversion_dialog.int_cutoff,
-                                               self.cif_conversion_dialog.min_d_spacing)
-        except PhaseLoadError as e:
+            matches = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            phase_match_widget.status_lbl.setText("Search failed: {}".format(e))
+            return
+
+        self.phase_matches = [match for match in matches if match.num_matched > 0]
+        phase_match_widget.set_matches([(match.name, match.score, match.pressure, match.num_matched,
+                                         match.num_reflections) for match in self.phase_matches])
+        phase_match_widget.status_lbl.setText("{} matching phases".format(len(self.phase_matches)))
+
+    def add_matching_phases(self):
+        """
+        Adds the phases selected in the list of matching phases to the phase list.
+        """
+        errors = []
+        for row in self.phase_widget.phase_match_widget.get_selected_rows():
+            entry = self.phase_matches[row].entry
+            try:
+                if entry.conversion_parameters is None:
+                    self.model.phase_model.add_jcpds(entry.filename)
+                else:
+                    self.model.phase_model.add_cif(entry.filename, *entry.conversion_parameters)
+            except PhaseLoadError as e:
+                errors.append(e)
+        if len(errors):
             self.integration_widget.show_error_msg(
-                'Could not load:\n\n{}.\n\nPlease check if the format of the input file is correct.'. \
-                    format(e.filename))
+                'Could not load:\n\n{}.\n\nPlease check if the format of the input file is correct.'.
+                    format('\n'.join(e.filename for e in errors)))
 
     def phase_added(self):
         color = self.model.phase_model.phase_colors[-1]
@@ -173,7 +299,7 @@ class PhaseController(object):
         self.phase_widget.del_phase(ind)
         # self.img_view_widget.del_cake_phase(ind)
 
-        if self.jcpds_editor_controller.active:
+        if self._jcpds_editor_controller is not None and self._jcpds_editor_controller.active:
             ind = self.phase_widget.get_selected_phase_row()
             if ind >= 0:
                 self.jcpds_editor_controller.show_phase(self.model.phase_model.phases[ind])
@@ -235,7 +361,8 @@ class PhaseController(object):
         """
         while self.phase_widget.phase_tw.rowCount() > 0:
             self.delete_btn_click_callback()
-            self.jcpds_editor_controller.close_view()
+            if self._jcpds_editor_controller is not None:
+                self._jcpds_editor_controller.close_view()
 
     def update_pressure_step(self):
         for pressure_sb in self.phase_widget.pressure_sbs:
@@ -11,6 +11,10 @@ from PIL import Image
 from xypattern.auto_background import SmoothBrucknerBackground
 from xypattern import Pattern
 
+from .util.StackOutlierDetector import StackOutlierDetector
+from .util.PressureCalibration import determine_pressures
+from .util.PeakTracker import PeakTracker, PeakTrackingResult
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +41,10 @@ class BatchModel(QtCore.QObject):
         self.used_mask = None
         self.used_mask_shape = None
         self.used_calibration = None
+        self.outlier_detector = None
+        self.pressures = None
+        self.pressure_calibrant = None
+        self.peak_tracking = None
 
     def reset_data(self):
         self.data = None
@@ -52,6 +60,10 @@ class BatchModel(QtCore.QObject):
         self.used_mask_shape = None
         self.used_calibration = None
         self.raw_available = False
+        self.outlier_detector = None
+        self.pressures = None
+        self.pressure_calibrant = None
+        self.peak_tracking = None
 
     def set_image_files(self, files):
         """
@@ -123,7 +135,8 @@ class BatchModel(QtCore.QObject):
         Load diffraction patterns and metadata from h5 file
 
         """
-        with h5py.File(filename, "r") as data_file:
+        # swmr allows reading files, which are still written (e.g. by the auto save of patterns)
+        with h5py.File(filename, "r", swmr=True) as data_file:
             # ToDo To be removed
             if "processed/result" not in data_file:
                 self.try_load_old_format(data_file)
@@ -167,6 +180,17 @@ class BatchModel(QtCore.QObject):
             if "bkg" in data_file["processed/process/"]:
                 self.bkg = data_file["processed/process/bkg"][()]
 
+            if "pressure" in data_file["processed"]:
+                self.pressures = data_file["processed/pressure/pressure"][()]
+                self.pressure_calibrant = data_file["processed/pressure"].attrs.get("calibrant", "")
+
+            if "peaks" in data_file["processed"]:
+                peaks = data_file["processed/peaks"]
+                self.peak_tracking = PeakTrackingResult(
+                    str(peaks.attrs.get("shape", "gaussian")),
+                    peaks["center"][()], peaks["fwhm"][()], peaks["area"][()], peaks["eta"][()],
+                    peaks["background"][()], peaks["chi2"][()], peaks["success"][()].astype(bool))
+
     def save_proc_data(self, filename):
         """
         Save diffraction patterns to h5 file
@@ -211,6 +235,29 @@ class BatchModel(QtCore.QObject):
             nxprocess.create_dataset("file_map", data=self.file_map)
             nxprocess.create_dataset("files", data=self.files.astype("S"))
 
+            if self.pressures is not None:
+                nxpressure = nxentry.create_group("pressure")
+                nxpressure.attrs["NX_class"] = "NXdata"
+                nxpressure.attrs["signal"] = "pressure"
+                nxpressure.attrs["axes"] = ["frame"]
+                nxpressure.attrs["calibrant"] = str(self.pressure_calibrant)
+                pressure = nxpressure.create_dataset("pressure", data=self.pressures)
+                pressure.attrs["units"] = "GPa"
+                nxpressure.create_dataset("frame", data=np.arange(len(self.pressures)))
+
+            if self.peak_tracking is not None:
+                nxpeaks = nxentry.create_group("peaks")
+                nxpeaks.attrs["NX_class"] = "NXdata"
+                nxpeaks.attrs["signal"] = "center"
+                nxpeaks.attrs["axes"] = ["frame", "peak"]
+                nxpeaks.attrs["shape"] = self.peak_tracking.shape
+                for name in ("center", "fwhm", "area", "eta", "background", "chi2", "success"):
+                    nxpeaks.create_dataset(name, data=getattr(self.peak_tracking, name))
+                nxpeaks["center"].attrs["units"] = "deg"
+                nxpeaks["fwhm"].attrs["units"] = "deg"
+                nxpeaks.create_dataset("frame", data=np.arange(len(self.peak_tracking.chi2)))
+                nxpeaks.create_dataset("peak", data=np.arange(self.peak_tracking.num_peaks))
+
     def save_as_csv(self, filename):
         """
         Save diffraction patterns to 3-columns csv file
@@ -255,33 +302,40 @@ class BatchModel(QtCore.QObject):
             self.used_mask_shape = mask.shape
 
         self.configuration.img_model.blockSignals(True)
-        for index in range(start, stop, step):
-            if use_all:
-                file_index, pos = self.pos_map_all[index]
-            else:
-                file_index, pos = self.pos_map[index]
-            if file_index != current_file:
-                current_file = file_index
-                self.configuration.calibration_model.img_model.load(
-                    self.files[file_index]
+        try:
+            for index in range(start, stop, step):
+                if use_all:
+                    file_index, pos = self.pos_map_all[index]
+                else:
+                    file_index, pos = self.pos_map[index]
+                if file_index != current_file:
+                    current_file = file_index
+                    self.configuration.calibration_model.img_model.load(
+                        self.files[file_index]
+                    )
+
+                self.configuration.img_model.load_series_img(pos + 1)
+                self.configuration.mask_model.set_dimension(
+                    self.configuration.img_model.img_data.shape
                 )
-
-            self.configuration.img_model.load_series_img(pos + 1)
-            self.configuration.mask_model.set_dimension(
-                self.configuration.img_model.img_data.shape
-            )
-
-            binning, intensity = self.configuration.integrate_image_1d()
-            image_counter += 1
-            pos_map.append((file_index, pos))
-            intensity_data.append(intensity)
-            binning_data.append(binning)
-
-            if callback_fn is not None:
-                if not callback_fn(image_counter):
-                    break
-
-        self.configuration.img_model.blockSignals(False)
+                if self.outlier_detector is not None:
+                    self.configuration.mask_model.set_frame_mask(
+                        self.outlier_detector.get_frame_mask((file_index, pos))
+                    )
+
+                binning, intensity = self.configuration.integrate_image_1d(in_background=False)
+                image_counter += 1
+                pos_map.append((file_index, pos))
+                intensity_data.append(intensity)
+                binning_data.append(binning)
+
+                if callback_fn is not None:
+                    if not callback_fn(image_counter):
+                        break
+        finally:
+            # the frame mask must not stay on the mask model, also if the integration failed
+            self.configuration.mask_model.set_frame_mask(None)
+            self.configuration.img_model.blockSignals(False)
 
         # deal with different x lengths due to trimmed zeros:
         binning_lengths = [len(binning) for binning in binning_data]
@@ -303,8 +357,122 @@ class BatchModel(QtCore.QObject):
         self.binning = np.array(binning)
         self.data = np.array(intensity_data)
         self.bkg = None
+        self.pressures = None
+        self.peak_tracking = None
         self.n_img = self.data.shape[0]
 
+    def detect_outliers(self, start, stop, step, use_all=True, callback_fn=None, **kwargs):
+        """
+        Detects bad pixels and per-frame outliers (cosmic rays, zingers) from per-pixel statistics over the images
+        in a single pass. The per-frame outlier masks are applied on the fly in integrate_raw_data (also when no mask
+        is used), the static bad pixel mask can be added to the mask with apply_static_outlier_mask.
+
+        :param start: Start image index
+        :param stop: Stop image index
+        :param step: Step along images
+        :param use_all: Use all images. If False use only images, that were already integrated.
+        :param callback_fn: callback function which is called each iteration with the current image number as parameter,
+                            if it returns False the detection will be aborted.
+        :param kwargs: parameters for the StackOutlierDetector
+        :return: the StackOutlierDetector
+        """
+        detector = StackOutlierDetector(**kwargs)
+        current_file = ""
+
+        self.configuration.img_model.blockSignals(True)
+        try:
+            for image_counter, index in enumerate(range(start, stop, step)):
+                if use_all:
+                    file_index, pos = self.pos_map_all[index]
+                else:
+                    file_index, pos = self.pos_map[index]
+                if file_index != current_file:
+                    current_file = file_index
+                    self.configuration.img_model.load(self.files[file_index])
+                self.configuration.img_model.load_series_img(pos + 1)
+                detector.add_frame(self.configuration.img_model.img_data, (file_index, pos))
+
+                if callback_fn is not None:
+                    if not callback_fn(image_counter + 1):
+                        break
+        finally:
+            self.configuration.img_model.blockSignals(False)
+
+        detector.finish()
+        self.outlier_detector = detector
+        return detector
+
+    def determine_pressures(self, phase, pressure_range=(0, 100), temperature=None, chunk_size=256,
+                            callback_fn=None, **kwargs):
+        """
+        Determines the pressure of every integrated pattern from the peak positions of a calibrant phase, see
+        util.PressureCalibration.determine_pressures. The patterns are processed in chunks, a background extracted
+        with extract_background is subtracted before.
+
+        :param phase: calibrant jcpds object
+        :param pressure_range: pressure range in GPa which is searched
+        :param temperature: temperature in K, defaults to the temperature of the phase
+        :param chunk_size: number of patterns processed at once
+        :param callback_fn: callback function which is called after every chunk with the number of processed patterns,
+                            if it returns False the determination will be aborted.
+        :param kwargs: further parameters for util.PressureCalibration.determine_pressures
+        :return: array of pressures in GPa, NaN for patterns which were not processed or where no peaks were found
+        """
+        if self.data is None:
+            return None
+        if temperature is None:
+            temperature = phase.params['temperature']
+        wavelength = self.configuration.calibration_model.wavelength * 1e10
+
+        pressures = np.full(self.data.shape[0], np.nan)
+        for start in range(0, self.data.shape[0], chunk_size):
+            data = self.data[start:start + chunk_size]
+            if self.bkg is not None:
+                data = data - self.bkg[start:start + chunk_size]
+            result = determine_pressures(self.binning, data, phase, wavelength, pressure_range, temperature,
+                                         **kwargs)
+            pressures[start:start + chunk_size] = result.pressures
+            if callback_fn is not None:
+                if not callback_fn(min(start + chunk_size, self.data.shape[0])):
+                    break
+
+        self.pressures = pressures
+        self.pressure_calibrant = phase.name
+        return pressures
+
+    def track_peaks(self, centers, fwhm, shape='gaussian', callback_fn=None, **kwargs):
+        """
+        Fits one or more peaks in every integrated pattern, warm-starting each chunk of patterns from the previous
+        one, see util.PeakTracker. A background extracted with extract_background is subtracted before.
+
+        :param centers: start values of the peak centers in degree two theta
+        :param fwhm: start value(s) of the full width at half maximum of the peaks in degree
+        :param shape: 'gaussian' or 'pseudo_voigt'
+        :param callback_fn: callback function which is called after every chunk with the number of fitted patterns,
+                            if it returns False the fitting will be aborted.
+        :param kwargs: further parameters for util.PeakTracker.PeakTracker
+        :return: PeakTrackingResult
+        """
+        if self.data is None:
+            return None
+        data = self.data
+        if self.bkg is not None:
+            data = data - self.bkg
+        tracker = PeakTracker(self.binning, centers, fwhm, shape, **kwargs)
+        self.peak_tracking = tracker.fit(data, callback_fn)
+        return self.peak_tracking
+
+    def apply_static_outlier_mask(self):
+        """
+        Adds the hot and stuck pixels found by detect_outliers to the current mask.
+        """
+        if self.outlier_detector is None:
+            return
+        static_mask = self.outlier_detector.get_static_mask()
+        mask_model = self.configuration.mask_model
+        if static_mask is not None and static_mask.shape == mask_model.get_img().shape:
+            mask_model.set_mask(np.logical_or(mask_model.get_img(), static_mask))
+
     def extract_background(self, parameters, callback_fn=None):
         """
         Subtract background calculated with respect of given parameters
@@ -18,10 +18,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
 import logging
 import os
-import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from copy import deepcopy
 
@@ -39,6 +41,7 @@ from skimage.measure import find_contours
 from .. import calibrants_path
 from .ImgModel import ImgModel
 from .util import Signal
+from .util.GeometryArrays import GeometryArrays
 from .util.HelperModule import (
     get_base_name,
     rotate_matrix_p90,
@@ -51,6 +54,20 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def changes_geometry(method):
+    """
+    Decorator for methods of the CalibrationModel changing the geometries or the detector, they are run while holding
+    the geometry_lock, so that they do not interfere with an integration running in a background thread.
+    """
+
+    @functools.wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with self.geometry_lock:
+            return method(self, *args, **kwargs)
+
+    return locked_method
+
+
 class CalibrationModel(object):
 
     def __init__(self, img_model=None):
@@ -76,11 +93,16 @@ class CalibrationModel(object):
         self.cake_geometry = None
         self.cake_geometry_img_shape = None
         self.calibrant = Calibrant()
+        # guards the geometries and the detector, integrations might run in a background thread (see
+        # Configuration.integrate_in_background), all methods changing them hold the lock
+        self.geometry_lock = threading.RLock()
 
         self.orig_pixel1 = (
             self.detector.pixel1
         )  # needs to be extra stored for applying supersampling
         self.orig_pixel2 = self.detector.pixel2
+        # per-pixel two theta, azimuth, etc. of the calibrated geometry shared by all consumers
+        self.geometry_arrays = GeometryArrays(self)
 
         self.start_values = {
             "dist": 200e-3,
@@ -182,12 +204,20 @@ class CalibrationModel(object):
             self.points_index.pop(-1)
             return num_points
 
+    @changes_geometry
     def create_cake_geometry(self):
+        # the parameters are given to the constructor, since set_config resets the integrator including a slow garbage
+        # collection, which is noticeable during the automatic refinement
         self.cake_geometry = AzimuthalIntegrator(
-            splineFile=self.distortion_spline_filename
+            dist=self.pattern_geometry.dist,
+            poni1=self.pattern_geometry.poni1,
+            poni2=self.pattern_geometry.poni2,
+            rot1=self.pattern_geometry.rot1,
+            rot2=self.pattern_geometry.rot2,
+            rot3=self.pattern_geometry.rot3,
+            wavelength=self.pattern_geometry.wavelength,
+            detector=self.detector,
         )
-        self.cake_geometry.set_config(self.pattern_geometry.get_config())
-        self.cake_geometry.detector = self.detector
 
     def setup_peak_search_algorithm(self, algorithm, mask=None):
         """
@@ -232,62 +262,95 @@ class CalibrationModel(object):
                      The mask should be given as an 2d array with the same dimensions as the image, where 1 denotes a
                      masked pixel and all others should be 0.
         """
-        self.reset_supersampling()
-        if not self.is_calibrated:
-            return
+        self.search_peaks_on_rings([ring_index], delta_tth, min_mean_factor, upper_limit, mask)
 
-        # transform delta from degree into radians
-        delta_tth = delta_tth / 180.0 * np.pi
+    @changes_geometry
+    def search_peaks_on_rings(
+        self, ring_indices, delta_tth=0.1, min_mean_factor=1, upper_limit=55000, mask=None, max_workers=None
+    ):
+        """
+        Searches for peaks on several expected rings at once, see search_peaks_on_ring for the parameters. The pixels
+        close to any of the rings are selected in a single pass over the image and the peaks of the individual rings
+        are picked on a thread pool. The found peaks are stored in the order of ring_indices.
+
+        :param ring_indices: list of indices of the rings for the search
+        :param max_workers: number of threads for picking the peaks, defaults to the ThreadPoolExecutor default
+        :return: list with an array of the found peaks ([y, x]) for every ring, empty for rings without peaks
+        """
+        if not self.is_calibrated or len(ring_indices) == 0:
+            return []
 
-        # get appropriate two theta value for the ring number
+        # get appropriate two theta values for the ring numbers
         tth_calibrant_list = self.calibrant.get_2th()
-        if ring_index >= len(tth_calibrant_list):
+        if max(ring_indices) >= len(tth_calibrant_list):
             raise NotEnoughSpacingsInCalibrant()
-        tth_calibrant = float(tth_calibrant_list[ring_index])
+        tth_rings = np.array([tth_calibrant_list[ring_index] for ring_index in ring_indices], dtype=np.float64)
 
-        # get the calculated two theta values for the whole image
-        tth_array = self.pattern_geometry.twoThetaArray(self.img_model.img_data.shape)
-
-        # create mask based on two_theta position
-        ring_mask = abs(tth_array - tth_calibrant) <= delta_tth
-
-        if mask is not None:
-            mask = np.logical_and(ring_mask, np.logical_not(mask))
-        else:
-            mask = ring_mask
+        # transform delta from degree into radians
+        delta_tth = delta_tth / 180.0 * np.pi
 
-        # calculate the mean and standard deviation of this area
-        sub_data = np.array(
-            self.img_model.img_data.ravel()[np.where(mask.ravel())], dtype=np.float64
+        self.reset_supersampling()
+        img_data = self.img_model.img_data
+        tth_array = self.geometry_arrays.get("tth").ravel()
+
+        # select all pixels within delta_tth of any of the rings by their distance to the closest ring
+        sorted_tth_rings = np.sort(tth_rings)
+        upper_ind = np.searchsorted(sorted_tth_rings, tth_array)
+        distance = np.minimum(
+            abs(tth_array - sorted_tth_rings[np.maximum(upper_ind - 1, 0)]),
+            abs(tth_array - sorted_tth_rings[np.minimum(upper_ind, len(sorted_tth_rings) - 1)]),
         )
-        sub_data[np.where(sub_data > upper_limit)] = np.NaN
-        mean = np.nanmean(sub_data)
-        std = np.nanstd(sub_data)
-
-        # set the threshold into the mask (don't detect very low intensity peaks)
-        threshold = min_mean_factor * mean + std
-        mask2 = np.logical_and(self.img_model.img_data > threshold, mask)
-        mask2[np.where(self.img_model.img_data > upper_limit)] = False
-        size2 = mask2.sum(dtype=int)
-
-        keep = int(np.ceil(np.sqrt(size2)))
+        pixels = np.flatnonzero(distance <= delta_tth)
+        del upper_ind, distance
+        if mask is not None:
+            pixels = pixels[np.logical_not(mask.ravel()[pixels])]
+        pixel_tth = tth_array[pixels]
+        pixel_intensities = np.array(img_data.ravel()[pixels], dtype=np.float64)
+        pixel_intensities[pixel_intensities > upper_limit] = np.nan
+
+        def search_ring(tth_ring):
+            ring_pixels = abs(pixel_tth - tth_ring) <= delta_tth
+            intensities = pixel_intensities[ring_pixels]
+
+            # calculate the mean and standard deviation of this area
+            mean = np.nanmean(intensities)
+            std = np.nanstd(intensities)
+
+            # set the threshold into the mask (don't detect very low intensity peaks), pixels above the upper limit are
+            # NaN and therefore never above the threshold
+            peak_pixels = pixels[ring_pixels][intensities > min_mean_factor * mean + std]
+            peak_mask = np.zeros(img_data.shape, dtype=bool)
+            peak_mask.flat[peak_pixels] = True
+
+            keep = int(np.ceil(np.sqrt(len(peak_pixels))))
+            try:
+                return self.peak_search_algorithm.peaks_from_area(peak_mask, Imin=mean - std, keep=keep)
+            except IndexError:
+                return []
+
+        # Massif logs every searched point which does not lead to a peak, only its errors are kept during the search.
+        # Redirecting sys.stdout instead would silence all threads of the process.
+        massif_logger = logging.getLogger(Massif.__module__)
+        massif_log_level = massif_logger.level
+        massif_logger.setLevel(logging.ERROR)
         try:
-            old_stdout = sys.stdout
-            sys.stdout = DummyStdOut
-            res = self.peak_search_algorithm.peaks_from_area(
-                mask2, Imin=mean - std, keep=keep
-            )
-            sys.stdout = old_stdout
-        except IndexError:
-            res = []
+            if max_workers == 1 or len(tth_rings) == 1:
+                results = [search_ring(tth_ring) for tth_ring in tth_rings]
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(search_ring, tth_rings))
+        finally:
+            massif_logger.setLevel(massif_log_level)
 
         # Store the result
-        if len(res):
-            self.points.append(np.array(res))
-            self.points_index.append(ring_index)
+        for ring_index, res in zip(ring_indices, results):
+            if len(res):
+                self.points.append(np.array(res))
+                self.points_index.append(ring_index)
 
         self.set_supersampling()
-        self.pattern_geometry.reset()
+        self.pattern_geometry.reset(collect_garbage=False)
+        return [np.array(res) for res in results]
 
     def set_calibrant(self, filename):
         self.calibrant = Calibrant()
@@ -298,6 +361,7 @@ class CalibrationModel(object):
         self.start_values = start_values
         self.polarization_factor = start_values["polarization_factor"]
 
+    @changes_geometry
     def set_pixel_size(self, pixel_size):
         """
         :param pixel_size: tuple with pixel_width and pixel height as element
@@ -309,6 +373,7 @@ class CalibrationModel(object):
         self.detector.pixel2 = self.orig_pixel2
         self.set_supersampling()
 
+    @changes_geometry
     def update_detector_shape(self):
         self.detector.shape = self.img_model.img_data.shape
         self.detector.max_shape = self.img_model.img_data.shape
@@ -322,6 +387,7 @@ class CalibrationModel(object):
         """
         self.fixed_values = fixed_values
 
+    @changes_geometry
     def calibrate(self):
         if len(self.points) == 0:
             raise NoPointsError("No starting points for calibration found.")
@@ -345,6 +411,7 @@ class CalibrationModel(object):
         # reset the integrator (not the geometric parameters)
         self.pattern_geometry.reset()
 
+    @changes_geometry
     def refine(self):
         if len(self.points) == 0:
             raise NoPointsError("No points for refinement found.")
@@ -368,12 +435,16 @@ class CalibrationModel(object):
 
         self.create_cake_geometry()
         self.set_supersampling()
-        # reset the integrator (not the geometric parameters)
-        self.pattern_geometry.reset()
-
-    def _check_detector_and_image_shape(self):
+        # reset the integrator (not the geometric parameters), without pyFAI's garbage collection which would take
+        # most of the time of every refinement step
+        self.pattern_geometry.reset(collect_garbage=False)
+
+    @changes_geometry
+    def _check_detector_and_image_shape(self, img_shape=None):
+        if img_shape is None:
+            img_shape = self.img_model.img_data.shape
         if self.detector.shape is not None:
-            if self.detector.shape != self.img_model.img_data.shape:
+            if self.detector.shape != img_shape:
                 self.reset_detector()
                 self.detector_reset.emit()
         else:
@@ -389,15 +460,17 @@ class CalibrationModel(object):
                 if mask.shape == self.detector.mask.shape:
                     return np.logical_or(self.detector.mask, mask)
 
-    def _prepare_integration_super_sampling(self, mask):
+    def _prepare_integration_super_sampling(self, mask, img_data=None):
+        if img_data is None:
+            img_data = self.img_model.img_data
         if self.supersampling_factor > 1:
-            img_data = supersample_image(
-                self.img_model.img_data, self.supersampling_factor
-            )
+            img_data = supersample_image(img_data, self.supersampling_factor)
             if mask is not None:
                 mask = supersample_image(mask, self.supersampling_factor)
-        else:
-            img_data = self.img_model.img_data
+        if not img_data.flags.writeable:
+            # the cython integrators of pyFAI only accept writable buffers. pyFAI converts the image to float32 (a
+            # copy) anyway if it has a different dtype, so this only adds a copy for read-only float32 images
+            img_data = img_data.astype(np.float32)
         return img_data, mask
 
     def integrate_1d(
@@ -410,6 +483,7 @@ class CalibrationModel(object):
         method="csr",
         azi_range=None,
         trim_zeros=True,
+        img_data=None,
     ):
         """
         :param num_points: number of points for the integration
@@ -422,101 +496,132 @@ class CalibrationModel(object):
                             'csr_ocl_lut', 'csr_ocl_lut_memsave', 'csr_numpy', 'csr_numpy_memsave'
         :param azi_range: azimuthal range for the integration
         :param trim_zeros: if True, the trailing zeros in the integration will be trimmed
+        :param img_data: image to integrate, defaults to the img_data of the img_model
         :return: tth, intensity
         """
-        if (
-            np.sum(mask)
-            == self.img_model.img_data.shape[0] * self.img_model.img_data.shape[1]
-        ):
-            # do not perform integration if the image is completely masked...
-            return self.tth, self.int
-
-        if self.pattern_geometry_img_shape != self.img_model.img_data.shape:
-            # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
-            self.pattern_geometry.reset()
-            self.pattern_geometry_img_shape = self.img_model.img_data.shape
-
-        if polarization_factor is None:
-            polarization_factor = self.polarization_factor
-
-        self._check_detector_and_image_shape()
-        mask = self._prepare_integration_mask(mask)
-        img_data, mask = self._prepare_integration_super_sampling(mask)
-
-        if num_points is None:
-            num_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
-
-        self.num_points = num_points
+        result = self.calculate_integration_1d(
+            num_points, mask, polarization_factor, filename, unit, method, azi_range, trim_zeros, img_data
+        )
+        return self.store_integration_1d(result)
 
-        t1 = time.time()
+    def calculate_integration_1d(
+        self,
+        num_points=None,
+        mask=None,
+        polarization_factor=None,
+        filename=None,
+        unit="2th_deg",
+        method="csr",
+        azi_range=None,
+        trim_zeros=True,
+        img_data=None,
+    ):
+        """
+        Integrates the image like integrate_1d, but returns the result instead of storing it in tth and int. Only the
+        geometries are used (guarded by the geometry_lock), so it can be called from a background thread, the result is
+        then stored with store_integration_1d on the main thread.
+        :return: tth, intensity, num_points or None if the image is completely masked
+        """
+        if img_data is None:
+            img_data = self.img_model.img_data
 
-        if unit == "d_A":
-            try:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
-                    img_data,
-                    num_points,
-                    method=method,
-                    unit="2th_deg",
-                    azimuth_range=azi_range,
-                    mask=mask,
-                    polarization_factor=polarization_factor,
-                    correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
-                )
-            except NameError:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
-                    img_data,
-                    num_points,
-                    method="csr",
-                    unit="2th_deg",
-                    azimuth_range=azi_range,
-                    mask=mask,
-                    polarization_factor=polarization_factor,
-                    correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
+        with self.geometry_lock:
+            if np.sum(mask) == img_data.shape[0] * img_data.shape[1]:
+                # do not perform integration if the image is completely masked...
+                return None
+
+            if self.pattern_geometry_img_shape != img_data.shape:
+                # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
+                self.pattern_geometry.reset()
+                self.pattern_geometry_img_shape = img_data.shape
+
+            if polarization_factor is None:
+                polarization_factor = self.polarization_factor
+
+            self._check_detector_and_image_shape(img_data.shape)
+            mask = self._prepare_integration_mask(mask)
+            img_data, mask = self._prepare_integration_super_sampling(mask, img_data)
+
+            if num_points is None:
+                num_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
+
+            t1 = time.time()
+
+            if unit == "d_A":
+                try:
+                    tth, intensity = self.pattern_geometry.integrate1d(
+                        img_data,
+                        num_points,
+                        method=method,
+                        unit="2th_deg",
+                        azimuth_range=azi_range,
+                        mask=mask,
+                        polarization_factor=polarization_factor,
+                        correctSolidAngle=self.correct_solid_angle,
+                        filename=filename,
+                    )
+                except NameError:
+                    tth, intensity = self.pattern_geometry.integrate1d(
+                        img_data,
+                        num_points,
+                        method="csr",
+                        unit="2th_deg",
+                        azimuth_range=azi_range,
+                        mask=mask,
+                        polarization_factor=polarization_factor,
+                        correctSolidAngle=self.correct_solid_angle,
+                        filename=filename,
+                    )
+                tth = (
+                    self.pattern_geometry.wavelength
+                    / (2 * np.sin(tth / 360 * np.pi))
+                    * 1e10
                 )
-            self.tth = (
-                self.pattern_geometry.wavelength
-                / (2 * np.sin(self.tth / 360 * np.pi))
-                * 1e10
-            )
-            self.int = self.int
-        else:
-            try:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
-                    img_data,
-                    num_points,
-                    method=method,
-                    unit=unit,
-                    azimuth_range=azi_range,
-                    mask=mask,
-                    polarization_factor=polarization_factor,
-                    correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
-                )
-            except NameError:
-                self.tth, self.int = self.pattern_geometry.integrate1d(
-                    img_data,
-                    num_points,
-                    method="csr",
-                    unit=unit,
-                    azimuth_range=azi_range,
-                    mask=mask,
-                    polarization_factor=polarization_factor,
-                    correctSolidAngle=self.correct_solid_angle,
-                    filename=filename,
+            else:
+                try:
+                    tth, intensity = self.pattern_geometry.integrate1d(
+                        img_data,
+                        num_points,
+                        method=method,
+                        unit=unit,
+                        azimuth_range=azi_range,
+                        mask=mask,
+                        polarization_factor=polarization_factor,
+                        correctSolidAngle=self.correct_solid_angle,
+                        filename=filename,
+                    )
+                except NameError:
+                    tth, intensity = self.pattern_geometry.integrate1d(
+                        img_data,
+                        num_points,
+                        method="csr",
+                        unit=unit,
+                        azimuth_range=azi_range,
+                        mask=mask,
+                        polarization_factor=polarization_factor,
+                        correctSolidAngle=self.correct_solid_angle,
+                        filename=filename,
+                    )
+            logger.info(
+                "1d integration of {0}: {1}s.".format(
+                    os.path.basename(self.img_model.filename), time.time() - t1
                 )
-        logger.info(
-            "1d integration of {0}: {1}s.".format(
-                os.path.basename(self.img_model.filename), time.time() - t1
             )
-        )
 
-        if (
-            np.sum(self.int) != 0 and trim_zeros
-        ):  # only trim zeros if not everything is 0 (e.g. bkg-subtraction of the same image)
-            self.tth, self.int = trim_trailing_zeros(self.tth, self.int)
+            if (
+                np.sum(intensity) != 0 and trim_zeros
+            ):  # only trim zeros if not everything is 0 (e.g. bkg-subtraction of the same image)
+                tth, intensity = trim_trailing_zeros(tth, intensity)
 
+            return tth, intensity, num_points
+
+    def store_integration_1d(self, result):
+        """
+        Stores the result of calculate_integration_1d in tth, int and num_points.
+        :return: tth, intensity, the previous ones if the result is None (completely masked image)
+        """
+        if result is not None:
+            self.tth, self.int, self.num_points = result
         return self.tth, self.int
 
     def integrate_2d(
@@ -528,44 +633,79 @@ class CalibrationModel(object):
         rad_points=None,
         azimuth_points=360,
         azimuth_range=None,
+        img_data=None,
     ):
-        if polarization_factor is None:
-            polarization_factor = self.polarization_factor
-
-        if self.cake_geometry_img_shape != self.img_model.img_data.shape:
-            # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
-            self.cake_geometry.reset()
-            self.cake_geometry_img_shape = self.img_model.img_data.shape
-
-        self._check_detector_and_image_shape()
-        mask = self._prepare_integration_mask(mask)
-        img_data, mask = self._prepare_integration_super_sampling(mask)
-
-        if rad_points is None:
-            rad_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
-        self.num_points = rad_points
-
-        t1 = time.time()
-
-        res = self.cake_geometry.integrate2d(
-            img_data,
-            rad_points,
-            azimuth_points,
-            azimuth_range=azimuth_range,
-            method=method,
-            mask=mask,
-            unit=unit,
-            polarization_factor=polarization_factor,
-            correctSolidAngle=self.correct_solid_angle,
+        """
+        Integrates the image into a cake, stored in cake_img, cake_tth and cake_azi.
+        :param img_data: image to integrate, defaults to the img_data of the img_model
+        :return: cake_img
+        """
+        result = self.calculate_integration_2d(
+            mask, polarization_factor, unit, method, rad_points, azimuth_points, azimuth_range, img_data
         )
-        logger.info(
-            "2d integration of {0}: {1}s.".format(
-                os.path.basename(self.img_model.filename), time.time() - t1
+        return self.store_integration_2d(result)
+
+    def calculate_integration_2d(
+        self,
+        mask=None,
+        polarization_factor=None,
+        unit="2th_deg",
+        method="csr",
+        rad_points=None,
+        azimuth_points=360,
+        azimuth_range=None,
+        img_data=None,
+    ):
+        """
+        Integrates the image into a cake like integrate_2d, but returns the result instead of storing it. Like
+        calculate_integration_1d it can be called from a background thread.
+        :return: cake_img, cake_tth, cake_azi, rad_points
+        """
+        if img_data is None:
+            img_data = self.img_model.img_data
+
+        with self.geometry_lock:
+            if polarization_factor is None:
+                polarization_factor = self.polarization_factor
+
+            if self.cake_geometry_img_shape != img_data.shape:
+                # if cake geometry was used on differently shaped image before the azimuthal integrator needs to be reset
+                self.cake_geometry.reset()
+                self.cake_geometry_img_shape = img_data.shape
+
+            self._check_detector_and_image_shape(img_data.shape)
+            mask = self._prepare_integration_mask(mask)
+            img_data, mask = self._prepare_integration_super_sampling(mask, img_data)
+
+            if rad_points is None:
+                rad_points = self.calculate_number_of_pattern_points(img_data.shape, 2)
+
+            t1 = time.time()
+
+            res = self.cake_geometry.integrate2d(
+                img_data,
+                rad_points,
+                azimuth_points,
+                azimuth_range=azimuth_range,
+                method=method,
+                mask=mask,
+                unit=unit,
+                polarization_factor=polarization_factor,
+                correctSolidAngle=self.correct_solid_angle,
             )
-        )
-        self.cake_img = res[0]
-        self.cake_tth = res[1]
-        self.cake_azi = res[2]
+            logger.info(
+                "2d integration of {0}: {1}s.".format(
+                    os.path.basename(self.img_model.filename), time.time() - t1
+                )
+            )
+            return res[0], res[1], res[2], rad_points
+
+    def store_integration_2d(self, result):
+        """
+        Stores the result of calculate_integration_2d in cake_img, cake_tth, cake_azi and num_points.
+        :return: cake_img
+        """
+        self.cake_img, self.cake_tth, self.cake_azi, self.num_points = result
         return self.cake_img
 
     def cake_integral(self, tth, bins=1):
@@ -639,6 +779,7 @@ class CalibrationModel(object):
         max_dist = np.sqrt(side1**2 + side2**2)
         return int(max_dist * max_dist_factor)
 
+    @changes_geometry
     def load(self, poni_filename):
         """
         Loads a calibration file andsets all the calibration parameter.
@@ -703,6 +844,7 @@ class CalibrationModel(object):
         self.detector_mode = DetectorModes.NEXUS
         self._load_detector(NexusDetector(filename))
 
+    @changes_geometry
     def _load_detector(self, detector):
         """Loads a pyFAI detector
         :param detector: an instance of pyFAI Detector
@@ -719,7 +861,9 @@ class CalibrationModel(object):
 
         self.set_supersampling()
         self._original_detector = None
+        self.geometry_arrays.invalidate()
 
+    @changes_geometry
     def reset_detector(self):
         self.detector_mode = DetectorModes.CUSTOM
         self.detector = Detector(
@@ -743,6 +887,7 @@ class CalibrationModel(object):
 
             return DefaultAiWriter(None, self.pattern_geometry).make_headers()
 
+    @changes_geometry
     def set_fit2d(self, fit2d_parameter):
         """
         Reads in a dictionary with fit2d parameters where the fields of the dictionary are:
@@ -770,6 +915,7 @@ class CalibrationModel(object):
         self.is_calibrated = True
         self.set_supersampling()
 
+    @changes_geometry
     def set_pyFAI(self, pyFAI_parameter):
         """
         Reads in a dictionary with pyFAI parameters where the fields of dictionary are:
@@ -802,6 +948,7 @@ class CalibrationModel(object):
         """
         return self.pattern_geometry.get_config()
 
+    @changes_geometry
     def set_pyFAI_config(self, pyFAI_config):
         """
         Updates the pyFAI configuration of the geometry refinement object. The pyFAI_config is the dicionary extracted
@@ -816,19 +963,24 @@ class CalibrationModel(object):
         self.is_calibrated = True
         self.set_supersampling()
 
+    @changes_geometry
     def load_distortion(self, spline_filename):
         self.distortion_spline_filename = spline_filename
         self.pattern_geometry.set_splineFile(spline_filename)
         if self.cake_geometry:
             self.cake_geometry.set_splineFile(spline_filename)
+        self.geometry_arrays.invalidate()
 
+    @changes_geometry
     def reset_distortion_correction(self):
         self.distortion_spline_filename = None
         self.detector.set_splineFile(None)
         self.pattern_geometry.set_splineFile(None)
         if self.cake_geometry:
             self.cake_geometry.set_splineFile(None)
+        self.geometry_arrays.invalidate()
 
+    @changes_geometry
     def set_supersampling(self, factor=None):
         """
         Sets the supersampling to a specific factor. Whereby the factor determines in how many artificial pixel the
@@ -852,6 +1004,7 @@ class CalibrationModel(object):
             self.pattern_geometry.reset()
             self.supersampling_factor = factor
 
+    @changes_geometry
     def reset_supersampling(self):
         self.pattern_geometry.pixel1 = self.orig_pixel1
         self.pattern_geometry.pixel2 = self.orig_pixel2
@@ -900,9 +1053,38 @@ class CalibrationModel(object):
         return self.pattern_geometry.chi(x - 0.5, y - 0.5)[0]
 
     def get_two_theta_array(self):
-        return self.pattern_geometry.twoThetaArray(self.img_model.img_data.shape)[
-            :: self.supersampling_factor, :: self.supersampling_factor
-        ]
+        return self.geometry_arrays.get("tth")
+
+    def get_two_theta_contours(self, tth):
+        """
+        Calculates the line of constant two theta on the image. For flat detectors the ring is the intersection of the
+        diffraction cone with the detector plane and is calculated analytically along the azimuth, only detectors with
+        distortion corrections fall back to a contour search in the full two theta array.
+        :param tth:
+            two theta in radians
+        :return:
+            list of (n, 2) arrays with the fractional image indices (row, column) of each continuous part of the ring,
+            in the same format as skimage.measure.find_contours
+        """
+        shape = self.img_model.img_data.shape
+        plane = self._get_detector_plane(shape, self.supersampling_factor)
+        if plane is None:
+            return find_contours(self.get_two_theta_array(), tth)
+
+        # estimate the sampling along the azimuth, which gives a point at least every half pixel on the image
+        chi = np.linspace(-np.pi, np.pi, 360, endpoint=False)
+        indices = self._get_cone_indices(plane, tth, chi)
+        inside = _is_inside(indices, shape)
+        if not np.any(inside):
+            return []
+        step_lengths = np.linalg.norm(indices - np.roll(indices, -1, axis=0), axis=1)
+        step_lengths = step_lengths[inside | np.roll(inside, -1)]
+        max_step = np.max(step_lengths[np.isfinite(step_lengths)], initial=1)
+        num_points = int(np.clip(360 * 2 * max_step, 360, 2**16))
+
+        chi = np.linspace(-np.pi, np.pi, num_points, endpoint=False)
+        indices = self._get_cone_indices(plane, tth, chi)
+        return _split_contour(indices, shape)
 
     def get_pixel_ind(self, tth, azi):
         """
@@ -914,13 +1096,59 @@ class CalibrationModel(object):
         :return:
             tuple of index 1 and 2
         """
-        tth_ind = find_contours(self.pattern_geometry.ttha, tth)
-        if len(tth_ind) == 0:
+        shape = self.img_model.img_data.shape
+        plane = self._get_detector_plane(shape, self.supersampling_factor)
+        if plane is None:
+            tth_ind = find_contours(self.geometry_arrays.get("tth"), tth)
+            if len(tth_ind) == 0:
+                return []
+            tth_ind = np.vstack(tth_ind)
+            azi_values = self.pattern_geometry.chi(tth_ind[:, 0], tth_ind[:, 1])
+            min_index = np.argmin(np.abs(azi_values - azi))
+            return tth_ind[min_index, 0], tth_ind[min_index, 1]
+
+        indices = self._get_cone_indices(plane, tth, np.array([azi], dtype=float))
+        if not _is_inside(indices, shape)[0]:
             return []
-        tth_ind = np.vstack(tth_ind)
-        azi_values = self.pattern_geometry.chi(tth_ind[:, 0], tth_ind[:, 1])
-        min_index = np.argmin(np.abs(azi_values - azi))
-        return tth_ind[min_index, 0], tth_ind[min_index, 1]
+        return indices[0, 0], indices[0, 1]
+
+    def _get_detector_plane(self, shape, step=1):
+        """
+        Position of the first pixel and the vectors between neighbouring pixels (row and column direction) in the lab
+        frame of the calibrated geometry, every image index corresponds to step pixels of the geometry (supersampling).
+        Returns None, when the pixel positions are not on a regular flat grid (e.g. with a distortion correction).
+        """
+        rows = step * np.array([0, 1, 0, shape[0] - 1, (shape[0] - 1) // 2], dtype=float)
+        cols = step * np.array([0, 0, 1, shape[1] - 1, (shape[1] - 1) // 2], dtype=float)
+        positions = np.array(self.pattern_geometry.calc_pos_zyx(None, rows, cols)).reshape(3, -1).T
+
+        origin = positions[0]
+        row_vector = positions[1] - origin
+        col_vector = positions[2] - origin
+        grid_indices = np.stack([rows, cols], axis=1) / step
+        expected = origin + grid_indices[:, :1] * row_vector + grid_indices[:, 1:] * col_vector
+        tolerance = 1e-3 * min(np.linalg.norm(row_vector), np.linalg.norm(col_vector))
+        if not np.all(np.isfinite(positions)) or not np.allclose(positions, expected, rtol=0, atol=tolerance):
+            return None
+        return origin, row_vector, col_vector
+
+    @staticmethod
+    def _get_cone_indices(plane, tth, chi):
+        """
+        Intersects the rays with a scattering angle tth and the azimuths chi with the detector plane.
+        :return: (n, 2) array of fractional image indices, NaN for rays not hitting the detector plane
+        """
+        origin, row_vector, col_vector = plane
+        # same lab frame as calc_pos_zyx (z along the beam) and same definition of chi as pyFAI (arctan2(y, x))
+        directions = np.stack([np.full_like(chi, np.cos(tth)),
+                               np.sin(tth) * np.sin(chi),
+                               np.sin(tth) * np.cos(chi)], axis=1)
+        normal = np.cross(row_vector, col_vector)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distance = np.dot(origin, normal) / np.dot(directions, normal)
+            distance[~(distance > 0)] = np.nan
+            positions = distance[:, np.newaxis] * directions - origin
+        return positions @ np.linalg.pinv(np.stack([row_vector, col_vector], axis=1)).T
 
     @property
     def wavelength(self):
@@ -928,11 +1156,13 @@ class CalibrationModel(object):
 
     ##########################
     ## Detector rotation stuff
+    @changes_geometry
     def swap_detector_shape(self):
         self._swap_detector_shape()
         self._swap_pixel_size()
         self._swap_detector_module_size()
 
+    @changes_geometry
     def rotate_detector_m90(self):
         """
         Rotates the detector stuff by m90 degree. This includes swapping of shape, pixel size and module sizes, as well
@@ -944,6 +1174,7 @@ class CalibrationModel(object):
         self._reset_detector_mask()
         self._transform_pixel_corners(rotate_matrix_m90)
 
+    @changes_geometry
     def rotate_detector_p90(self):
         """ """
         self._save_original_detector_definition()
@@ -952,14 +1183,17 @@ class CalibrationModel(object):
         self._reset_detector_mask()
         self._transform_pixel_corners(rotate_matrix_p90)
 
+    @changes_geometry
     def flip_detector_horizontally(self):
         self._save_original_detector_definition()
         self._transform_pixel_corners(np.fliplr)
 
+    @changes_geometry
     def flip_detector_vertically(self):
         self._save_original_detector_definition()
         self._transform_pixel_corners(np.flipud)
 
+    @changes_geometry
     def reset_transformations(self):
         """Restores the detector to it's original state"""
         if self._original_detector is None:  # no transformations done so far
@@ -972,6 +1206,7 @@ class CalibrationModel(object):
             self.cake_geometry.detector = self.detector
         self.set_supersampling()
         self._original_detector = None
+        self.geometry_arrays.invalidate()
 
     def load_transformations_string_list(self, transformations):
         """Transforms the detector parameters (shape, pixel size and distortion correction) based on a
@@ -1008,6 +1243,7 @@ class CalibrationModel(object):
             self.detector._pixel_corners = np.ascontiguousarray(
                 transform_function(self.detector.get_pixel_corners())
             )
+        self.geometry_arrays.invalidate()
 
     def _swap_pixel_size(self):
         """swaps the pixel sizes"""
@@ -1042,6 +1278,56 @@ class CalibrationModel(object):
         self.detector._mask = False
 
 
+def _is_inside(indices, shape):
+    """Checks which fractional (row, column) indices are within the image, NaN indices are outside"""
+    with np.errstate(invalid="ignore"):
+        return (indices[:, 0] >= 0) & (indices[:, 0] <= shape[0] - 1) & \
+            (indices[:, 1] >= 0) & (indices[:, 1] <= shape[1] - 1)
+
+
+def _split_contour(indices, shape):
+    """
+    Splits a closed line of points into the parts within the image, the parts are extended to the image border.
+    :param indices: (n, 2) array of fractional (row, column) indices on a closed line, NaN for invalid points
+    :param shape: shape of the image
+    :return: list of (m, 2) arrays, a line completely within the image is returned closed (first point repeated)
+    """
+    inside = _is_inside(indices, shape)
+    if np.all(inside):
+        return [np.vstack((indices, indices[:1]))]
+    # start at a point outside, so that no part within the image wraps around the end of the arrays
+    start = np.argmin(inside)
+    indices = np.roll(indices, -start, axis=0)
+    inside = np.roll(inside, -start)
+    changes = np.diff(inside.astype(np.int8))
+    starts = np.where(changes == 1)[0] + 1
+    stops = np.where(changes == -1)[0] + 1
+    if len(stops) < len(starts):
+        stops = np.append(stops, len(inside))
+
+    contours = []
+    for start, stop in zip(starts, stops):
+        first = _get_border_point(indices[start], indices[start - 1], shape)
+        last = _get_border_point(indices[stop - 1], indices[stop % len(indices)], shape)
+        contour = np.vstack([point for point in (first, *indices[start:stop], last) if point is not None])
+        if len(contour) > 1:
+            contours.append(contour)
+    return contours
+
+
+def _get_border_point(inside_point, outside_point, shape):
+    """Point where the line between a point inside and a point outside of the image crosses the image border"""
+    if not np.all(np.isfinite(outside_point)):
+        return None
+    t = 1.0
+    for dim in range(2):
+        if outside_point[dim] < 0:
+            t = min(t, inside_point[dim] / (inside_point[dim] - outside_point[dim]))
+        elif outside_point[dim] > shape[dim] - 1:
+            t = min(t, (shape[dim] - 1 - inside_point[dim]) / (outside_point[dim] - inside_point[dim]))
+    return inside_point + t * (outside_point - inside_point)
+
+
 def poni_flipud(poni_dict: dict) -> dict:
     """
     Flips the detector up-down orientation in a poni configuration dictionary. Changes the dictionary object in place.
@@ -1087,27 +1373,43 @@ class DummyStdOut(object):
     def write(cls, *args, **kwargs):
         pass
 
+    @classmethod
+    def flush(cls):
+        pass
 
-def get_available_detectors():
-    detector_classes = set()
-    detector_names = []
 
-    for key, item in ALL_DETECTORS.items():
-        detector_classes.add(item)
+_detector_catalogue = None
+_calibrant_catalogues = {}
 
-    for detector in detector_classes:
-        if len(detector.aliases) > 0:
-            detector_names.append(detector.aliases[0])
-        else:
-            detector_names.append(detector().__class__.__name__)
 
-    sorted_indices = sorted(range(len(detector_names)), key=detector_names.__getitem__)
+def get_available_detectors():
+    """
+    Returns the names and classes of all predefined pyFAI detectors sorted by name. The catalogue is only built on the
+    first call, every call returns new lists.
+    """
+    global _detector_catalogue
+    if _detector_catalogue is None:
+        detectors = []
+        for detector in set(ALL_DETECTORS.values()):
+            name = detector.aliases[0] if len(detector.aliases) > 0 else detector.__name__
+            if name != "Detector":
+                detectors.append((name, detector))
+        detectors.sort(key=lambda item: item[0])
+        _detector_catalogue = [name for name, _ in detectors], [detector for _, detector in detectors]
 
-    detector_names_sorted = [detector_names[i] for i in sorted_indices]
-    detector_classes_sorted = [list(detector_classes)[i] for i in sorted_indices]
+    detector_names, detector_classes = _detector_catalogue
+    return list(detector_names), list(detector_classes)
 
-    base_class_index = detector_names_sorted.index("Detector")
-    del detector_names_sorted[base_class_index]
-    del detector_classes_sorted[base_class_index]
 
-    return detector_names_sorted, detector_classes_sorted
+def get_available_calibrants(directory=calibrants_path):
+    """
+    Returns the names and filenames of all calibrants (*.D files) in a directory sorted by name. The directory is only
+    listed again when its modification time changes.
+    """
+    mtime = os.path.getmtime(directory)
+    if directory not in _calibrant_catalogues or _calibrant_catalogues[directory][0] != mtime:
+        calibrants = sorted((file.split(".")[0], file) for file in os.listdir(directory) if file.endswith(".D"))
+        _calibrant_catalogues[directory] = mtime, calibrants
+
+    calibrants = _calibrant_catalogues[directory][1]
+    return [name for name, _ in calibrants], [file for _, file in calibrants]
@@ -23,12 +23,15 @@ import numpy as np
 import json
 
 from copy import deepcopy
+from functools import partial
 
 from xypattern import Pattern
 from xypattern.auto_background import SmoothBrucknerBackground
 
 from .util import Signal
 from .util.ImgCorrection import CbnCorrection, ObliqueAngleDetectorAbsorptionCorrection
+from .util.PatternWriter import PatternWriter
+from .util.IntegrationWorker import IntegrationWorker
 
 from .util.calc import convert_units
 from . import ImgModel, CalibrationModel, MaskModel, PatternModel, BatchModel
@@ -43,7 +46,13 @@ class Configuration(object):
     The management of multiple Configurations is done by the DioptasModel.
     """
 
-    def __init__(self, working_directories=None):
+    def __init__(self, working_directories=None, pattern_writer=None, integration_worker=None):
+        """
+        :param working_directories: dictionary of working directories
+        :param pattern_writer: PatternWriter used for the auto saved patterns, can be shared between configurations
+        :param integration_worker: IntegrationWorker used when integrate_in_background is True, can be shared between
+                                   configurations
+        """
         super(Configuration, self).__init__()
 
         self.img_model = ImgModel()
@@ -84,6 +93,16 @@ class Configuration(object):
 
         self.auto_save_integrated_pattern = False
         self.integrated_patterns_file_formats = [".xy"]
+        if pattern_writer is None:
+            pattern_writer = PatternWriter()
+        self.pattern_writer = pattern_writer
+
+        # integrations triggered by image or parameter changes run in the integration_worker thread, the results are
+        # set on the main thread and superseded integrations are discarded
+        self.integrate_in_background = False
+        if integration_worker is None:
+            integration_worker = IntegrationWorker()
+        self.integration_worker = integration_worker
 
         self.cake_changed = Signal()
         self._connect_signals()
@@ -95,56 +114,109 @@ class Configuration(object):
         self.img_model.img_changed.connect(self.update_mask_dimension)
         self.img_model.img_changed.connect(self.integrate_image_1d)
 
-    def integrate_image_1d(self):
+    def integrate_image_1d(self, in_background=None):
         """
         Integrates the image in the ImageModel to a Pattern. Will also automatically save the integrated pattern, if
         auto_save_integrated is True.
+        :param in_background: whether to integrate in the integration_worker thread, the pattern_model is then updated
+                              when the integration is finished. Defaults to integrate_in_background, images are always
+                              integrated immediately when the patterns are auto saved, so that no image is skipped.
+        :return: x, y of the integrated pattern, None if integrated in the background
         """
         if self.calibration_model.is_calibrated:
-            if self.use_mask:
-                mask = self.mask_model.get_mask()
-            elif self.mask_model.roi is not None:
-                mask = self.mask_model.roi_mask
-            else:
-                mask = None
+            if in_background is None:
+                in_background = self.integrate_in_background and not self.auto_save_integrated_pattern
 
-            x, y = self.calibration_model.integrate_1d(
+            kwargs = dict(
                 azi_range=self.oned_azimuth_range,
-                mask=mask,
+                mask=self._get_integration_mask(),
                 unit=self.integration_unit,
                 num_points=self.integration_rad_points,
                 trim_zeros=self.trim_trailing_zeros,
             )
+            set_pattern = partial(
+                self._set_integrated_pattern, filename=self.img_model.filename, unit=self.integration_unit
+            )
 
-            self.pattern_model.set_pattern(
-                x, y, self.img_model.filename, unit=self.integration_unit
-            )  #
-
-            if self.auto_save_integrated_pattern:
-                self._auto_save_patterns()
+            if in_background:
+                self._submit_integration(
+                    "1d",
+                    self.calibration_model.calculate_integration_1d,
+                    kwargs,
+                    lambda result: set_pattern(self.calibration_model.store_integration_1d(result)),
+                )
+                return
 
+            # an older integration running in the background must not overwrite the result
+            self.integration_worker.cancel((id(self), "1d"))
+            x, y = self.calibration_model.integrate_1d(**kwargs)
+            set_pattern((x, y))
             return x, y
 
-    def integrate_image_2d(self):
+    def _set_integrated_pattern(self, pattern, filename, unit):
+        x, y = pattern
+        self.pattern_model.set_pattern(x, y, filename, unit=unit)
+
+        if self.auto_save_integrated_pattern:
+            self._auto_save_patterns()
+
+    def integrate_image_2d(self, in_background=None):
         """
         Integrates the image in the ImageModel to a Cake.
+        :param in_background: whether to integrate in the integration_worker thread, cake_changed is then emitted when
+                              the integration is finished. Defaults to integrate_in_background.
         """
-        if self.use_mask:
-            mask = self.mask_model.get_mask()
-        elif self.mask_model.roi is not None:
-            mask = self.mask_model.roi_mask
-        else:
-            mask = None
+        if in_background is None:
+            in_background = self.integrate_in_background
 
-        self.calibration_model.integrate_2d(
-            mask=mask,
+        kwargs = dict(
+            mask=self._get_integration_mask(),
             rad_points=self._integration_rad_points,
             azimuth_points=self._cake_azimuth_points,
             azimuth_range=self._cake_azimuth_range,
         )
 
+        if in_background:
+            self._submit_integration(
+                "2d", self.calibration_model.calculate_integration_2d, kwargs, self._cake_integrated
+            )
+            return
+
+        self.integration_worker.cancel((id(self), "2d"))
+        self.calibration_model.integrate_2d(**kwargs)
         self.cake_changed.emit()
 
+    def _cake_integrated(self, result):
+        self.calibration_model.store_integration_2d(result)
+        self.cake_changed.emit()
+
+    def _submit_integration(self, integration_type, integrate_function, kwargs, callback):
+        """
+        Submits an integration of a snapshot of the current image to the integration_worker, superseding the previous
+        integration of the same type of this configuration. The integrate_function must not change the calibration
+        model, its result is stored by the callback on the main thread.
+        """
+        img_data = self.img_model.img_data
+        if kwargs["mask"] is not None:
+            kwargs["mask"] = np.copy(kwargs["mask"])
+        # a reset of the detector has to be signalled on the main thread
+        self.calibration_model._check_detector_and_image_shape(img_data.shape)
+        self.integration_worker.submit(
+            (id(self), integration_type),
+            partial(integrate_function, img_data=img_data, **kwargs),
+            callback,
+        )
+
+    def _get_integration_mask(self):
+        if self.use_mask:
+            return self.mask_model.get_mask()
+        mask = self.mask_model.roi_mask if self.mask_model.roi is not None else None
+        # outliers of the current frame (see BatchModel.detect_outliers) are masked even without a mask
+        frame_mask = self.mask_model.frame_mask
+        if frame_mask is not None and frame_mask.shape == self.mask_model.get_img().shape:
+            mask = frame_mask if mask is None else np.logical_or(mask, frame_mask)
+        return mask
+
     def save_pattern(self, filename=None, subtract_background=False):
         """
         Saves the current integrated pattern. The format depends on the file ending. Possible file formats:
@@ -155,22 +227,11 @@ class Configuration(object):
         if filename is None:
             filename = self.img_model.filename
 
-        if filename.endswith(".xy"):
-            self.pattern_model.save_pattern(
-                filename,
-                header=self._create_xy_header(),
-                subtract_background=subtract_background,
-            )
-        elif filename.endswith(".fxye"):
-            self.pattern_model.save_pattern(
-                filename,
-                header=self._create_fxye_header(filename),
-                subtract_background=subtract_background,
-            )
-        else:
-            self.pattern_model.save_pattern(
-                filename, subtract_background=subtract_background
-            )
+        self.pattern_model.save_pattern(
+            filename,
+            header=self._create_pattern_header(filename),
+            subtract_background=subtract_background,
+        )
 
     def save_background_pattern(self, filename=None):
         """
@@ -230,30 +291,66 @@ class Configuration(object):
         Saves the current pattern in the pattern working directory (specified in self.working_directories['pattern'].
         When background subtraction is enabled in the pattern model the pattern will be saved with background
         subtraction and without in another sub-folder. ('bkg_subtracted')
+        The files are written in the background by the pattern_writer, all formats from the same snapshot of the
+        pattern. For the '.nxs' format the patterns of all images of a folder are appended to a single NeXus file
+        named after the image folder, which includes the background subtracted data.
         """
+        pattern = self.pattern_model.pattern
+        has_background = pattern.background_pattern is not None or pattern.auto_bkg is not None
+
+        files = []
         for file_ending in self.integrated_patterns_file_formats:
+            if file_ending == ".nxs":
+                files.append((self._get_pattern_sink_filename(), "", has_background))
+                continue
             filename = os.path.join(
                 self.working_directories["pattern"],
                 os.path.basename(str(self.img_model.filename)).split(".")[:-1][0]
                 + file_ending,
             )
             filename = filename.replace("\\", "/")
-            self.save_pattern(filename, subtract_background=False)
-
-        pattern = self.pattern_model.pattern
+            files.append((filename, self._create_pattern_header(filename), False))
 
-        if pattern.background_pattern is not None or pattern.auto_bkg is not None:
+        if has_background:
             for file_ending in self.integrated_patterns_file_formats:
+                if file_ending == ".nxs":
+                    continue
                 directory = os.path.join(
                     self.working_directories["pattern"], "bkg_subtracted"
                 )
-                if not os.path.exists(directory):
-                    os.mkdir(directory)
                 filename = os.path.join(
                     directory, self.pattern_model.pattern.name + file_ending
                 )
                 filename = filename.replace("\\", "/")
-                self.save_pattern(filename, subtract_background=True)
+                files.append((filename, self._create_pattern_header(filename), True))
+
+        self.pattern_writer.submit(
+            pattern,
+            files,
+            self.pattern_model.unit,
+            image_filename=str(self.img_model.filename),
+            frame=self.img_model.series_pos - 1,
+            calibration_file=self.calibration_model.filename,
+        )
+
+    def _get_pattern_sink_filename(self) -> str:
+        """
+        Returns the filename of the NeXus file collecting the patterns of all images in the folder of the current image.
+        """
+        image_directory = os.path.dirname(os.path.abspath(str(self.img_model.filename)))
+        folder_name = os.path.basename(image_directory) or "patterns"
+        filename = os.path.join(self.working_directories["pattern"], folder_name + ".nxs")
+        return filename.replace("\\", "/")
+
+    def _create_pattern_header(self, filename) -> str:
+        """
+        Creates the header for a pattern file depending on the file ending (see save_pattern).
+        """
+        if filename.endswith(".xy"):
+            return self._create_xy_header()
+        elif filename.endswith(".fxye"):
+            return self._create_fxye_header(filename)
+        return ""
 
     def update_mask_dimension(self):
         """
@@ -384,7 +481,8 @@ class Configuration(object):
         :return: copied configuration
         :rtype: Configuration
         """
-        new_configuration = Configuration(self.working_directories)
+        new_configuration = Configuration(self.working_directories, self.pattern_writer, self.integration_worker)
+        new_configuration.integrate_in_background = self.integrate_in_background
         new_configuration.img_model._img_data = self.img_model._img_data
         new_configuration.img_model.img_transformations = deepcopy(
             self.img_model.img_transformations
@@ -831,12 +929,8 @@ class Configuration(object):
                 for param, val in correction_group.attrs.items():
                     params[param] = val
                 if name == "cbn":
-                    tth_array = (
-                        180.0 / np.pi * self.calibration_model.pattern_geometry.ttha
-                    )
-                    azi_array = (
-                        180.0 / np.pi * self.calibration_model.pattern_geometry.chia
-                    )
+                    tth_array = self.calibration_model.geometry_arrays.get("tth_deg")
+                    azi_array = self.calibration_model.geometry_arrays.get("chi_deg")
                     cbn_correction = CbnCorrection(
                         tth_array=tth_array, azi_array=azi_array
                     )
@@ -845,12 +939,8 @@ class Configuration(object):
                     cbn_correction.update()
                     self.img_model.add_img_correction(cbn_correction, name)
                 elif name == "oiadac":
-                    tth_array = (
-                        180.0 / np.pi * self.calibration_model.pattern_geometry.ttha
-                    )
-                    azi_array = (
-                        180.0 / np.pi * self.calibration_model.pattern_geometry.chia
-                    )
+                    tth_array = self.calibration_model.geometry_arrays.get("tth")
+                    azi_array = self.calibration_model.geometry_arrays.get("chi")
                     oiadac = ObliqueAngleDetectorAbsorptionCorrection(
                         tth_array=tth_array, azi_array=azi_array
                     )
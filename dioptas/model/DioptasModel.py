@@ -28,6 +28,8 @@ from xypattern.combine import stitch_patterns
 
 from .util import Signal
 from .util import jcpds
+from .util.PatternWriter import PatternWriter
+from .util.IntegrationWorker import IntegrationWorker
 from .Configuration import Configuration
 from . import (
     ImgModel,
@@ -51,9 +53,12 @@ class DioptasModel(object):
 
     def __init__(self):
         super(DioptasModel, self).__init__()
+        self.pattern_writer = PatternWriter()  # shared by all configurations for auto saving patterns
+        self.integration_worker = IntegrationWorker()  # shared by all configurations for background integrations
+        self._integrate_in_background = False
         self.configurations = []
         self.configuration_ind = 0
-        self.configurations.append(Configuration())
+        self.configurations.append(self._create_configuration())
 
         self._overlay_model = OverlayModel()
         self._phase_model = PhaseModel()
@@ -81,12 +86,36 @@ class DioptasModel(object):
 
         self.connect_models()
 
+    def _create_configuration(self, working_directories=None):
+        """
+        Creates a new configuration sharing the pattern writer and the integration worker with all others.
+        """
+        configuration = Configuration(working_directories, self.pattern_writer, self.integration_worker)
+        configuration.integrate_in_background = self._integrate_in_background
+        return configuration
+
+    @property
+    def integrate_in_background(self) -> bool:
+        """
+        Whether integrations triggered by image or parameter changes run in a background thread, see
+        Configuration.integrate_image_1d.
+        """
+        return self._integrate_in_background
+
+    @integrate_in_background.setter
+    def integrate_in_background(self, new_val):
+        self._integrate_in_background = new_val
+        for configuration in self.configurations:
+            configuration.integrate_in_background = new_val
+        if not new_val:
+            self.integration_worker.wait()
+
     def add_configuration(self):
         """
         Adds a new configuration to the list of configurations. The new configuration will have the same working
         directories as the currently selected.
         """
-        self.configurations.append(Configuration(self.working_directories))
+        self.configurations.append(self._create_configuration(self.working_directories))
 
         if self.current_configuration.calibration_model.is_calibrated:
             dioptas_config_folder = os.path.join(os.path.expanduser("~"), ".Dioptas")
@@ -99,7 +128,7 @@ class DioptasModel(object):
                 os.path.join(dioptas_config_folder, "transfer.poni")
             )
 
-        self.configurations[-1].img_model._img_data = (
+        self.configurations[-1].img_model._img_data = np.copy(
             self.current_configuration.img_model.img_data
         )
 
@@ -197,7 +226,7 @@ class DioptasModel(object):
         # load_configurations
         self.configurations = []
         for ind, configuration_group in f.get("configurations").items():
-            configuration = Configuration()
+            configuration = self._create_configuration()
             configuration.load_from_hdf5(configuration_group)
             self.configurations.append(configuration)
         self.configuration_ind = f.get("configurations").attrs["selected_configuration"]
@@ -215,14 +244,20 @@ class DioptasModel(object):
                 new_jcpds.params[p_key] = p_value
             for c_key, comment in phase_group.get("comments").attrs.items():
                 new_jcpds.params["comments"].append(comment)
-            for r_key, reflection in phase_group.get("reflections").items():
-                new_jcpds.add_reflection(
-                    reflection.attrs["h"],
-                    reflection.attrs["k"],
-                    reflection.attrs["l"],
-                    reflection.attrs["intensity"],
-                    reflection.attrs["d"],
+            # the reflection groups are named by their index and hdf5 iterates them alphabetically
+            reflection_attrs = [
+                reflection.attrs
+                for r_key, reflection in sorted(
+                    phase_group.get("reflections").items(),
+                    key=lambda item: int(item[0]),
                 )
+            ]
+            new_jcpds.add_reflections(
+                *[
+                    [attrs[field] for attrs in reflection_attrs]
+                    for field in ("h", "k", "l", "intensity", "d")
+                ]
+            )
             new_jcpds.params["modified"] = bool(
                 phase_group.get("params").attrs["modified"]
             )
@@ -504,7 +539,7 @@ class DioptasModel(object):
         working_directories = self.working_directories
         self.disconnect_models()
         self.delete_configurations()
-        self.configurations = [Configuration()]
+        self.configurations = [self._create_configuration()]
         self.configuration_ind = 0
         self.overlay_model.reset()
         self.phase_model.reset()
@@ -21,6 +21,7 @@
 import logging
 import os
 import copy
+from contextlib import contextmanager
 
 import numpy as np
 from PIL import Image
@@ -32,6 +33,7 @@ from .util import Signal
 from dioptas.model.loader.spe import SpeFile
 from .util.NewFileWatcher import NewFileInDirectoryWatcher
 from .util.HelperModule import rotate_matrix_p90, rotate_matrix_m90, FileNameIterator
+from .util.calc import correct_img_data
 from .util.ImgCorrection import (
     ImgCorrectionManager,
     ImgCorrectionInterface,
@@ -71,9 +73,7 @@ class ImgModel(object):
         self.selected_source = None
 
         self._img_data = None
-        self._img_data_background_subtracted = None
-        self._img_data_absorption_corrected = None
-        self._img_data_background_subtracted_absorption_corrected = None
+        self._img_data_corrected = None
 
         self.background_filename = ""
         self._background_data = None
@@ -82,6 +82,10 @@ class ImgModel(object):
 
         self._factor = 1
 
+        # nesting depth of batch_update and whether img_data needs to be recalculated at its end
+        self._batch_update_depth = 0
+        self._img_data_outdated = False
+
         self.transfer_correction = TransferFunctionCorrection()
 
         # anything that gets loaded from an image file and needs to be reset if a file without these attributes is
@@ -372,12 +376,10 @@ class ImgModel(object):
 
         if self._background_data.shape != self._img_data.shape:
             self._background_data = None
-            self._calculate_img_data()
-            self.img_changed.emit()
+            self._update_img_data()
             raise BackgroundDimensionWrongException()
 
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def add(self, filename):
         """
@@ -406,8 +408,7 @@ class ImgModel(object):
 
         self._img_data += img_data
 
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def _image_and_background_shape_equal(self):
         """
@@ -450,8 +451,7 @@ class ImgModel(object):
     @background_data.setter
     def background_data(self, new_data):
         self._background_data = new_data
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     @property
     def background_scaling(self):
@@ -460,8 +460,7 @@ class ImgModel(object):
     @background_scaling.setter
     def background_scaling(self, new_value):
         self._background_scaling = new_value
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     @property
     def background_offset(self):
@@ -470,8 +469,7 @@ class ImgModel(object):
     @background_offset.setter
     def background_offset(self, new_value):
         self._background_offset = new_value
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def load_series_img(self, pos):
         """
@@ -555,6 +553,39 @@ class ImgModel(object):
             self.file_name_iterator.create_timed_file_list = True
             self.file_name_iterator.update_filename(self.filename)
 
+    @contextmanager
+    def batch_update(self):
+        """
+        Context manager collecting several changes (e.g. background scaling and offset, factor, transformations).
+        The img_data is only recalculated once at the end of the context and img_changed is emitted at most once,
+        instead of after every single change.
+
+        Usage::
+            with img_model.batch_update():
+                img_model.background_scaling = 1.2
+                img_model.background_offset = 10
+        """
+        with self.img_changed.coalesce():
+            self._batch_update_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_update_depth -= 1
+                if self._batch_update_depth == 0 and self._img_data_outdated:
+                    self._img_data_outdated = False
+                    self._calculate_img_data()
+                    self.img_changed.emit()
+
+    def _update_img_data(self):
+        """
+        Recalculates img_data and emits img_changed, within batch_update this is deferred to the end of the batch.
+        """
+        if self._batch_update_depth > 0:
+            self._img_data_outdated = True
+            return
+        self._calculate_img_data()
+        self.img_changed.emit()
+
     def _calculate_img_data(self):
         """
         Calculates compound img_data based on the state of the object. This function is used internally to not compute
@@ -571,25 +602,21 @@ class ImgModel(object):
                 self.transfer_correction.reset()
                 self.corrections_removed.emit()
 
-        # calculate the current _img_data
-        if self._background_data is not None and not self._img_corrections.has_items():
-            self._img_data_background_subtracted = self._img_data - (
-                self._background_scaling * self._background_data
-                + self._background_offset
-            )
-        elif self._background_data is None and self._img_corrections.has_items():
-            self._img_data_absorption_corrected = (
-                self._img_data / self._img_corrections.get_data()
-            )
-
-        elif self._background_data is not None and self._img_corrections.has_items():
-            self._img_data_background_subtracted_absorption_corrected = (
-                self._img_data
-                - (
-                    self._background_scaling * self._background_data
-                    + self._background_offset
-                )
-            ) / self._img_corrections.get_data()
+        # calculate the current _img_data, background subtraction, corrections and factor are applied in a
+        # single blocked pass (see correct_img_data)
+        if self._background_data is None and not self._img_corrections.has_items() and self.factor == 1:
+            self._img_data_corrected = None
+            return
+
+        self._img_data_corrected = correct_img_data(
+            self._img_data,
+            self._background_data,
+            self._background_scaling,
+            self._background_offset,
+            self._img_corrections.get_data() if self._img_corrections.has_items() else None,
+            self.factor,
+        )
+        self._img_data_corrected.flags.writeable = False
 
     @property
     def img_data(self):
@@ -598,25 +625,15 @@ class ImgModel(object):
             The image based on the current state of the ImgData object. It will apply all image correction as well as
             background subtraction. in case you want the raw data without corrections, please use the
             raw_img_data property.
+            The returned array is read-only and shared between calls, please copy it before modifying it.
         """
-        # if self._img_data is None:
-        #     return None
-
-        if self._background_data is None and not self._img_corrections.has_items():
-            return self._img_data * self.factor
-
-        elif (
-            self._background_data is not None and not self._img_corrections.has_items()
-        ):
-            return self._img_data_background_subtracted * self.factor
-
-        elif self._background_data is None and self._img_corrections.has_items():
-            return self._img_data_absorption_corrected * self.factor
-
-        elif self._background_data is not None and self._img_corrections.has_items():
-            return (
-                self._img_data_background_subtracted_absorption_corrected * self.factor
-            )
+        if self._img_data_corrected is None:
+            if self._img_data is None:
+                return None
+            img_data = self._img_data.view()
+            img_data.flags.writeable = False
+            return img_data
+        return self._img_data_corrected
 
     @property
     def raw_img_data(self):
@@ -643,8 +660,7 @@ class ImgModel(object):
         self.img_transformations.append(rotate_matrix_p90)
 
         self.transformations_changed.emit()
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def rotate_img_m90(self):
         """
@@ -658,8 +674,7 @@ class ImgModel(object):
         self.img_transformations.append(rotate_matrix_m90)
         self.transformations_changed.emit()
 
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def flip_img_horizontally(self):
         """
@@ -673,8 +688,7 @@ class ImgModel(object):
         self.img_transformations.append(np.fliplr)
         self.transformations_changed.emit()
 
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def flip_img_vertically(self):
         """
@@ -688,8 +702,7 @@ class ImgModel(object):
         self.img_transformations.append(np.flipud)
         self.transformations_changed.emit()
 
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def reset_transformations(self, img_changed=True):
         """
@@ -775,8 +788,7 @@ class ImgModel(object):
         :type name: str
         """
         self._img_corrections.add(correction, name)
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def get_img_correction(self, name):
         """
@@ -791,8 +803,7 @@ class ImgModel(object):
          the last added correction is deleted.
         """
         self._img_corrections.delete(name)
-        self._calculate_img_data()
-        self.img_changed.emit()
+        self._update_img_data()
 
     def enable_transfer_function(self):
         if (
@@ -801,8 +812,7 @@ class ImgModel(object):
         ):
             self.add_img_correction(self.transfer_correction, "transfer")
         if self.get_img_correction("transfer") is not None:
-            self._calculate_img_data()
-            self.img_changed.emit()
+            self._update_img_data()
 
     def disable_transfer_function(self):
         if self.get_img_correction("transfer") is not None:
@@ -882,7 +892,7 @@ class ImgModel(object):
     @factor.setter
     def factor(self, new_value):
         self._factor = new_value
-        self.img_changed.emit()
+        self._update_img_data()
 
     def blockSignals(self, block=True):
         for member in vars(self):
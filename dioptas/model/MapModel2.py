@@ -23,6 +23,7 @@ import os.path
 
 import numpy as np
 from dioptas.model.util.signal import Signal
+from dioptas.model.util.PeakTracker import PeakTracker
 
 from typing import TYPE_CHECKING
 
@@ -64,6 +65,7 @@ class MapModel2:
         self.dimension = None
         self.possible_dimensions = None
         self.map = None
+        self.peak_tracking = None
 
     def load(self, filepaths: list[str]):
         """Loads a list of files, integrates them and creates a map"""
@@ -100,6 +102,7 @@ class MapModel2:
         self.pattern_x = []
         self.pattern_intensities = []
         self.point_infos = []
+        self.peak_tracking = None
 
         # disable trimming trailing zeros for integration, otherwise the
         # integration will result in patterns with different length, which
@@ -125,7 +128,7 @@ class MapModel2:
 
             for frame_ind in range(self.configuration.img_model.series_max):
                 self.configuration.img_model.load_series_img(frame_ind + 1)
-                x, y = self.configuration.integrate_image_1d()
+                x, y = self.configuration.integrate_image_1d(in_background=False)
 
                 if file_ind == 0:
                     self.pattern_x = x
@@ -151,8 +154,25 @@ class MapModel2:
         self.dimension = None
         self.possible_dimensions = None
         self.map = None
+        self.peak_tracking = None
         self.map_changed.emit()
 
+    def track_peaks(self, centers, fwhm, shape="gaussian", callback_fn=None, **kwargs):
+        """Fits one or more peaks in the integrated patterns of all map points,
+        see util.PeakTracker.
+        :param centers: start values of the peak centers in the unit of pattern_x
+        :param fwhm: start value(s) of the full width at half maximum of the peaks
+        :param shape: 'gaussian' or 'pseudo_voigt'
+        :param callback_fn: called after every chunk with the number of fitted
+            patterns, returning False aborts the fitting
+        :return: PeakTrackingResult
+        """
+        if self.pattern_intensities is None or len(self.pattern_intensities) == 0:
+            return None
+        tracker = PeakTracker(self.pattern_x, centers, fwhm, shape, **kwargs)
+        self.peak_tracking = tracker.fit(self.pattern_intensities, callback_fn)
+        return self.peak_tracking
+
     def set_window(self, window: tuple[float, float]):
         """Sets the window in the pattern for generating the map
         :param window: tuple/list of lower value and upper value of the window
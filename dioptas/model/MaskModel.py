@@ -18,16 +18,35 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from collections import deque
-
 import fabio
 import numpy as np
 import skimage.draw
+from scipy import ndimage
 from PIL import Image
 from qtpy import QtCore
 from math import sqrt, atan2, cos, sin
 
-from .util.cosmics import cosmicsimage
+from .util.cosmics import lacosmic_mask
+from .util.MaskHistory import MaskHistory, FULL_REGION
+
+
+def structuring_element(radius=1, structure='square'):
+    """
+    Creates a boolean structuring element for growing and shrinking masks.
+
+    :param radius: radius of the element in pixel, the resulting array has a shape of (2*radius+1, 2*radius+1)
+    :param structure: 'square', 'cross' (all pixels within the given manhattan distance) or 'disk'
+    :return: 2D boolean array
+    """
+    radius = int(radius)
+    y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    if structure == 'square':
+        return np.ones((2 * radius + 1, 2 * radius + 1), dtype=bool)
+    elif structure == 'cross':
+        return (np.abs(x) + np.abs(y)) <= radius
+    elif structure == 'disk':
+        return (x ** 2 + y ** 2) <= radius ** 2
+    raise ValueError("Unknown structuring element: {}".format(structure))
 
 
 class MaskModel(object):
@@ -37,10 +56,10 @@ class MaskModel(object):
         self.filename = ''
         self.mode = True
         self.roi = None
+        self.frame_mask = None
 
         self._mask_data = np.zeros(self.mask_dimension, dtype=bool)
-        self._undo_deque = deque(maxlen=50)
-        self._redo_deque = deque(maxlen=50)
+        self._history = MaskHistory()
 
     def set_dimension(self, mask_dimension):
         if not np.array_equal(mask_dimension, self.mask_dimension):
@@ -50,8 +69,7 @@ class MaskModel(object):
     def reset_dimension(self):
         if self.mask_dimension is not None:
             self._mask_data = np.zeros(self.mask_dimension, dtype=bool)
-            self._undo_deque = deque(maxlen=50)
-            self._redo_deque = deque(maxlen=50)
+            self._history = MaskHistory()
 
     @property
     def roi_mask(self):
@@ -70,38 +88,48 @@ class MaskModel(object):
             return None
 
     def get_mask(self):
+        mask = self._mask_data
+        if self.frame_mask is not None and self.frame_mask.shape == mask.shape:
+            mask = np.logical_or(mask, self.frame_mask)
         if self.roi is None:
-            return self._mask_data
+            return mask
         elif self.roi is not None:
-            return np.logical_or(self._mask_data, self.roi_mask)
+            return np.logical_or(mask, self.roi_mask)
+
+    def set_frame_mask(self, frame_mask):
+        """
+        Sets an additional mask for the current frame only (e.g. outliers of a series), which is combined with the
+        mask in get_mask() but not part of the editable mask. None removes the frame mask.
+        """
+        self.frame_mask = frame_mask
 
     def get_img(self):
         return self._mask_data
 
-    def update_deque(self):
+    def update_deque(self, region=FULL_REGION):
         """
-        Saves the current mask data into a deque, which can be popped later
-        to provide an undo/redo feature.
-        When performing a new action the old redo steps will be cleared..._
+        Saves the part of the current mask data, which is going to be changed,
+        into the undo history, which can be popped later to provide an
+        undo/redo feature.
+        When performing a new action the old redo steps will be cleared.
+
+        :param region: tuple of slices covering the area which will be
+                       modified by the following operation, defaults to the
+                       full mask
         """
-        self._undo_deque.append(np.copy(self._mask_data))
-        self._redo_deque.clear()
+        self._history.store(self._mask_data, region)
+
+    def set_history_size(self, max_bytes):
+        """
+        Sets the memory budget in bytes for the undo/redo history.
+        """
+        self._history.set_max_bytes(max_bytes)
 
     def undo(self):
-        try:
-            old_data = self._undo_deque.pop()
-            self._redo_deque.append(np.copy(self._mask_data))
-            self._mask_data = old_data
-        except IndexError:
-            pass
+        self._history.undo(self._mask_data)
 
     def redo(self):
-        try:
-            new_data = self._redo_deque.pop()
-            self._undo_deque.append(np.copy(self._mask_data))
-            self._mask_data = new_data
-        except IndexError:
-            pass
+        self._history.redo(self._mask_data)
 
     def mask_below_threshold(self, img_data, threshold):
         self.update_deque()
@@ -148,7 +176,6 @@ class MaskModel(object):
         Masks a rectangle. x and y parameters are the upper left corner
         of the rectangle.
         """
-        self.update_deque()
         if width > 0:
             x_ind1 = np.round(x)
             x_ind2 = np.round(x + width)
@@ -168,6 +195,7 @@ class MaskModel(object):
             y_ind1 = 0
 
         x_ind1, x_ind2, y_ind1, y_ind2 = int(x_ind1), int(x_ind2), int(y_ind1), int(y_ind2)
+        self.update_deque((slice(x_ind1, x_ind2), slice(y_ind1, y_ind2)))
         self._mask_data[x_ind1:x_ind2, y_ind1:y_ind2] = self.mode
 
     def mask_polygon(self, x, y):
@@ -176,8 +204,8 @@ class MaskModel(object):
         the polygon vertices. Uses the draw.polygon implementation of
         the skimage library.
         """
-        self.update_deque()
         rr, cc = skimage.draw.polygon(y, x, self._mask_data.shape)
+        self.update_deque(MaskHistory.bounding_box(rr, cc))
         self._mask_data[rr, cc] = self.mode
 
     def mask_ellipse(self, cx, cy, x_radius, y_radius):
@@ -186,24 +214,32 @@ class MaskModel(object):
         given. Uses the draw.ellipse implementation of
         the skimage library.
         """
-        self.update_deque()
         rr, cc = skimage.draw.ellipse(
             cy, cx, y_radius, x_radius, shape=self._mask_data.shape)
+        self.update_deque(MaskHistory.bounding_box(rr, cc))
         self._mask_data[rr, cc] = self.mode
 
-    def grow(self):
+    def grow(self, radius=1, structure='square'):
+        """
+        Grows the mask by the given radius (in pixel) in a single binary dilation.
+
+        :param radius: number of pixels the masked areas are extended by
+        :param structure: shape of the structuring element - 'square', 'cross' or 'disk'
+        """
         self.update_deque()
-        self._mask_data[1:, :] = np.logical_or(self._mask_data[1:, :], self._mask_data[:-1, :])
-        self._mask_data[:-1, :] = np.logical_or(self._mask_data[:-1, :], self._mask_data[1:, :])
-        self._mask_data[:, 1:] = np.logical_or(self._mask_data[:, 1:], self._mask_data[:, :-1])
-        self._mask_data[:, :-1] = np.logical_or(self._mask_data[:, :-1], self._mask_data[:, 1:])
+        self._mask_data = ndimage.binary_dilation(self._mask_data, structuring_element(radius, structure))
 
-    def shrink(self):
+    def shrink(self, radius=1, structure='square'):
+        """
+        Shrinks the mask by the given radius (in pixel) in a single binary erosion. Pixels outside of the image are
+        considered to be masked, so that masked areas at the image borders are not eroded from the outside.
+
+        :param radius: number of pixels the masked areas are reduced by
+        :param structure: shape of the structuring element - 'square', 'cross' or 'disk'
+        """
         self.update_deque()
-        self._mask_data[1:, :] = np.logical_and(self._mask_data[1:, :], self._mask_data[:-1, :])
-        self._mask_data[:-1, :] = np.logical_and(self._mask_data[:-1, :], self._mask_data[1:, :])
-        self._mask_data[:, 1:] = np.logical_and(self._mask_data[:, 1:], self._mask_data[:, :-1])
-        self._mask_data[:, :-1] = np.logical_and(self._mask_data[:, :-1], self._mask_data[:, 1:])
+        self._mask_data = ndimage.binary_erosion(self._mask_data, structuring_element(radius, structure),
+                                                 border_value=1)
 
     def invert_mask(self):
         self.update_deque()
@@ -214,13 +250,13 @@ class MaskModel(object):
         self._mask_data[:, :] = False
 
     def remove_cosmic(self, img):
+        """
+        Masks cosmic rays in the image, using two iterations of the L.A.Cosmic algorithm, which are processed in
+        parallel on overlapping tiles of the image when several CPUs are available.
+        """
         self.update_deque()
-        test = cosmicsimage(img, sigclip=3.0, objlim=3.0)
-        num = 2
-        for i in range(num):
-            test.lacosmiciteration(True)
-            test.clean()
-            self._mask_data = np.logical_or(self._mask_data, np.array(test.mask, dtype='bool'))
+        cosmics = lacosmic_mask(img, num_iterations=2, sigclip=3.0, objlim=3.0)
+        self._mask_data = np.logical_or(self._mask_data, cosmics)
 
     def set_mode(self, mode):
         """
@@ -238,16 +274,17 @@ class MaskModel(object):
         :param filename: Path of the file to write
         :param flipud: True to apply a vertical flip before saving the mask
         """
-        im_array = np.int8(self.get_img())
+        im_array = np.asarray(self.get_img(), dtype=bool)
         if flipud:
             im_array = np.flipud(im_array)
 
         if filename.endswith('.npy'):
-            np.save(filename, im_array)
+            np.save(filename, np.int8(im_array))
         elif filename.endswith('.edf'):
-            fabio.edfimage.EdfImage(im_array).write(filename)
+            fabio.edfimage.EdfImage(np.int8(im_array)).write(filename)
         else:
-            im = Image.fromarray(im_array)
+            # boolean arrays are written as compressed 1-bit (bilevel) tiff
+            im = Image.fromarray(np.ascontiguousarray(im_array))
             try:
                 im.save(filename, "tiff", compression="tiff_deflate")
             except OSError:
@@ -291,7 +328,7 @@ class MaskModel(object):
             self.filename = filename
             self.mask_dimension = data.shape
             self.reset_dimension()
-            self.set_mask(data)
+            self.set_mask(np.asarray(data, dtype=bool))
             return True
         return False
 
@@ -18,11 +18,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 from .util import Signal
 from .util.jcpds import jcpds, jcpds_reflection
-from .util.cif import CifConverter
+from .util.PhaseLibrary import PhaseLibrary
+from .util.PhaseMatcher import PhaseMatcher, find_pattern_peaks, convert_x_to_d
 from .util.HelperModule import calculate_color
 
 
@@ -48,6 +51,11 @@ class PhaseModel(object):
         self.phase_visible = []
 
         self.same_conditions = True
+        self.phase_library = PhaseLibrary()
+        self._phase_matcher = None
+        self._phase_matcher_key = None
+        self._matching_executor = ThreadPoolExecutor(max_workers=1)
+        self._matching_future = None
 
         self.phase_added = Signal()
         self.phase_removed = Signal(int)  # phase ind
@@ -63,8 +71,7 @@ class PhaseModel(object):
         :param filename: filename of the jcpds file
         """
         try:
-            jcpds_object = jcpds()
-            jcpds_object.load_file(filename)
+            jcpds_object = self.phase_library.get_phase(filename)
             self.phase_files.append(filename)
             self.add_jcpds_object(jcpds_object)
         except (ZeroDivisionError, UnboundLocalError, ValueError):
@@ -79,14 +86,81 @@ class PhaseModel(object):
         :param minimum_d_spacing: all reflections added to the jcpds will have larger d spacing than specified here
         """
         try:
-            cif_converter = CifConverter(0.31, minimum_d_spacing, intensity_cutoff)
-            jcpds_object = cif_converter.convert_cif_to_jcpds(filename)
+            jcpds_object = self.phase_library.get_phase(filename, intensity_cutoff, minimum_d_spacing)
             self.phase_files.append(filename)
             self.add_jcpds_object(jcpds_object)
         except (ZeroDivisionError, UnboundLocalError, ValueError) as e:
             print(e)
             raise PhaseLoadError(filename)
 
+    def add_phases(self, filenames, intensity_cutoff=0.5, minimum_d_spacing=0.5, callback_fn=None):
+        """
+        Adds several jcpds and cif files. All files not yet in the phase library are parsed in parallel first, adding
+        the phases afterwards only copies them from the library.
+        :param filenames: list of jcpds or cif filenames
+        :param intensity_cutoff: intensity cutoff for cif files in % (0-100)
+        :param minimum_d_spacing: minimum d spacing for cif files
+        :param callback_fn: function called with the number of parsed files, returning False aborts the loading
+                            without adding any phase
+        :return: list of PhaseLoadError for all files which could not be loaded
+        """
+        filenames = [f for f in filenames if f.endswith('jcpds') or f.endswith('.cif')]
+        aborted = []
+
+        def library_callback(num_parsed):
+            if callback_fn is not None and callback_fn(num_parsed) is False:
+                aborted.append(True)
+                return False
+
+        self.phase_library.update(filenames, intensity_cutoff, minimum_d_spacing, library_callback)
+        errors = []
+        if aborted:
+            return errors
+        for filename in filenames:
+            try:
+                if filename.endswith('jcpds'):
+                    self.add_jcpds(filename)
+                else:
+                    self.add_cif(filename, intensity_cutoff, minimum_d_spacing)
+            except PhaseLoadError as e:
+                errors.append(e)
+        return errors
+
+    def find_matching_phases(self, x, y, unit, wavelength, tolerance=2e-3, pressure_range=(0, 0), temperature=298,
+                             strain=0.0, min_prominence=0.02):
+        """
+        Ranks all phases of the phase library by how well they match the peaks of a pattern. The search runs in a
+        worker thread, a still pending previous search is cancelled.
+        :param x: x values of the (background subtracted) pattern
+        :param y: intensities of the pattern
+        :param unit: unit of x, possible values: '2th_deg', 'q_A^-1', 'd_A'
+        :param wavelength: wavelength in Angstrom
+        :param tolerance: maximum relative difference between reflection and peak d-spacings
+        :param pressure_range: (minimum, maximum) pressure in GPa, the reflections are scaled with the EOS of each phase
+        :param temperature: temperature in K
+        :param strain: additional relative d-spacing window, e.g. for phases without EOS
+        :param min_prominence: minimum peak prominence relative to the intensity range of the pattern
+        :return: concurrent.futures.Future with a list of PhaseMatch sorted by descending score
+        """
+        entries = self.phase_library.entries
+        matcher_key = (self.phase_library.revision, tolerance, tuple(pressure_range), temperature, strain)
+        x = np.array(x, dtype=float)
+        y = np.array(y, dtype=float)
+
+        def match():
+            if self._phase_matcher_key != matcher_key:
+                self._phase_matcher = PhaseMatcher(entries, tolerance, pressure_range, temperature, strain)
+                self._phase_matcher_key = matcher_key
+            peak_d, _ = find_pattern_peaks(x, y, unit, wavelength, min_prominence)
+            with np.errstate(divide='ignore'):  # a pattern starting at 0 has an infinite d-spacing limit
+                d_limits = convert_x_to_d(np.array([np.min(x), np.max(x)]), unit, wavelength)
+            return self._phase_matcher.match(peak_d, (np.min(d_limits), np.max(d_limits)))
+
+        if self._matching_future is not None:
+            self._matching_future.cancel()
+        self._matching_future = self._matching_executor.submit(match)
+        return self._matching_future
+
     def add_jcpds_object(self, jcpds_object):
         """
         Adds a jcpds object to the phase list.
@@ -209,13 +283,8 @@ class PhaseModel(object):
         Gets the reflections from the phase with index ind and saves them in a two-dimensional array.
         """
         reflections = self.phases[ind].get_reflections()
-        res = np.zeros((len(reflections), 5))
-        for i, reflection in enumerate(reflections):
-            res[i, 0] = reflection.d
-            res[i, 1] = reflection.intensity
-            res[i, 2] = reflection.h
-            res[i, 3] = reflection.k
-            res[i, 4] = reflection.l
+        res = np.column_stack((reflections.d, reflections.intensity,
+                               reflections.h, reflections.k, reflections.l)).astype(float)
         self.reflections[ind] = res
         return res
 
@@ -329,11 +398,10 @@ class PhaseModel(object):
         Updates the reflection of a phase with a new jcpds_reflection
         :param phase_ind: index of the phase
         :param reflection_ind: index of the refection
-        :param reflection: updated reflection
+        :param reflection: updated reflection, a jcpds_reflection or an element of the jcpds reflections
         :type reflection: jcpds_reflection
         """
-        self.phases[phase_ind].reflections[reflection_ind] = reflection
-        self.phases[phase_ind].params['modified'] = True
+        self.phases[phase_ind].set_reflection(reflection_ind, reflection)
         self.phases[phase_ind].compute_d0()
         self.phases[phase_ind].compute_d()
         self.get_lines_d(phase_ind)
@@ -18,12 +18,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-try:
-    from extra_data import H5File
-    from extra_data.exceptions import FileStructureError
-    extra_data_installed = True
-except ImportError:
-    extra_data_installed = False
+from importlib.util import find_spec
+
+# extra_data is only imported when a karabo file is opened
+extra_data_installed = find_spec("extra_data") is not None
 
 __all__ = ['KaraboFile', 'extra_data_installed']
 
@@ -32,6 +30,9 @@ class KaraboFile:
     def __init__(self, filename, source_ind=0):
         if not extra_data_installed:
             raise IOError('extra_data is required to load karabo h5 files')
+        from extra_data import H5File
+        from extra_data.exceptions import FileStructureError
+
         try:
             self.f = H5File(filename)
         except FileStructureError:
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+class GeometryArrays(object):
+    """
+    Per-pixel geometry arrays of the calibrated geometry of a CalibrationModel, shared by all parts of Dioptas.
+
+    The arrays have the shape of the (not supersampled) image, are stored in float32 and are calculated lazily when
+    first requested. They are recalculated automatically when the geometry parameters, the detector or the image shape
+    change and can be invalidated explicitly after changes which are not visible in the geometry parameters (e.g.
+    detector transformations). The returned arrays are read-only, since they are shared.
+
+    Available arrays:
+        tth             two theta in radians
+        chi             azimuth in radians (same definition as pyFAI, -pi to pi)
+        tth_deg         two theta in degrees
+        chi_deg         azimuth in degrees
+    """
+
+    NAMES = ("tth", "chi", "tth_deg", "chi_deg")
+    BLOCK_ROWS = 256  # rows of the image calculated at once, limits the memory of the float64 intermediates
+
+    def __init__(self, calibration_model):
+        """
+        :param calibration_model: model providing the geometry (pattern_geometry), its geometry_lock and the image shape
+        :type calibration_model: CalibrationModel
+        """
+        self.calibration_model = calibration_model
+        self._arrays = {}
+        self._key = None
+        self._version = 0
+        # the arrays are calculated from the geometries, which might be used by an integration in another thread
+        self._lock = calibration_model.geometry_lock
+
+    def get(self, name):
+        """
+        Returns a geometry array, calculating it if necessary.
+        :param name: one of GeometryArrays.NAMES
+        :return: read-only float32 array with the shape of the image
+        """
+        if name not in self.NAMES:
+            raise KeyError("Unknown geometry array: {}".format(name))
+        with self._lock:
+            key = self._get_key()
+            if key != self._key:
+                self._arrays = {}
+                self._key = key
+
+            if name not in self._arrays:
+                self._calculate(name)
+            return self._arrays[name]
+
+    def invalidate(self):
+        """Discards all arrays, they are recalculated when requested the next time."""
+        with self._lock:
+            self._version += 1
+            self._arrays = {}
+            self._key = None
+
+    @property
+    def shape(self):
+        return self.calibration_model.img_model.img_data.shape
+
+    def _get_key(self):
+        geometry = self.calibration_model.pattern_geometry
+        detector = geometry.detector
+        return (self._version, self.shape, id(detector), detector.orientation, detector.get_splineFile(),
+                geometry.dist, geometry.poni1, geometry.poni2, geometry.rot1, geometry.rot2, geometry.rot3,
+                geometry.wavelength, self.calibration_model.orig_pixel1, self.calibration_model.orig_pixel2)
+
+    def _calculate(self, name):
+        if name in ("tth", "chi"):
+            self._calculate_angles()
+        elif name == "tth_deg":
+            self._store(name, np.rad2deg(self.get("tth")))
+        elif name == "chi_deg":
+            self._store(name, np.rad2deg(self.get("chi")))
+
+    def _calculate_angles(self):
+        geometry = self.calibration_model.pattern_geometry
+        tth = np.empty(self.shape, dtype=np.float32)
+        chi = np.empty(self.shape, dtype=np.float32)
+        for rows, d1, d2 in self._iterate_pixel_positions():
+            z, y, x = geometry.calc_pos_zyx(None, d1, d2)
+            tth[rows] = np.arctan2(np.sqrt(x * x + y * y), z)
+            chi[rows] = np.arctan2(y, x)
+        self._store("tth", tth)
+        self._store("chi", chi)
+
+    def _iterate_pixel_positions(self):
+        """
+        Yields blocks of rows of the image with the pixel indices of the pixel centers in the geometry, which are
+        scaled when the geometry is supersampled.
+        """
+        geometry = self.calibration_model.pattern_geometry
+        scale1 = self.calibration_model.orig_pixel1 / geometry.pixel1
+        scale2 = self.calibration_model.orig_pixel2 / geometry.pixel2
+        cols = (np.arange(self.shape[1]) + 0.5) * scale2 - 0.5
+        for start in range(0, self.shape[0], self.BLOCK_ROWS):
+            rows = np.arange(start, min(start + self.BLOCK_ROWS, self.shape[0]))
+            d1, d2 = np.meshgrid((rows + 0.5) * scale1 - 0.5, cols, indexing="ij")
+            yield slice(rows[0], rows[-1] + 1), d1, d2
+
+    def _store(self, name, array):
+        array = np.asarray(array, dtype=np.float32)
+        array.flags.writeable = False
+        self._arrays[name] = array
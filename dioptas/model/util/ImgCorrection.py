@@ -19,6 +19,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import numpy as np
+import numexpr as ne
 import fabio
 from PIL import Image
 
@@ -29,6 +30,9 @@ class ImgCorrectionManager(object):
         self._ind = 0
         self.shape = img_shape
 
+        self._combined_data = None
+        self._combined_sources = ()
+
     def add(self, img_correction, name=None):
         if self.shape is None:
             self.shape = img_correction.shape()
@@ -58,15 +62,26 @@ class ImgCorrectionManager(object):
         self._corrections = {}
         self.shape = None
         self._ind = 0
+        self._combined_data = None
+        self._combined_sources = ()
 
     def get_data(self):
+        """
+        Returns the product of all corrections. The product is cached and only recalculated if the data array of any
+        of the corrections has been replaced (corrections calculate new arrays when their parameters change).
+        """
         if len(self._corrections) == 0:
             return None
 
-        res = np.ones(self.shape)
-        for key, correction in self._corrections.items():
-            res *= correction.get_data()
-        return res
+        sources = tuple(correction.get_data() for correction in self._corrections.values())
+        if len(sources) != len(self._combined_sources) or \
+                any(source is not cached for source, cached in zip(sources, self._combined_sources)):
+            res = np.array(sources[0], dtype=np.result_type(np.float32, *sources))
+            for data in sources[1:]:
+                res *= data
+            self._combined_data = res
+            self._combined_sources = sources
+        return self._combined_data
 
     def get_correction(self, name):
         try:
@@ -108,6 +123,7 @@ class CbnCorrection(ImgCorrectionInterface):
         self._center_offset_angle = center_offset_angle
 
         self._data = None
+        self._calculated_params = None
 
     def get_data(self):
         return self._data
@@ -140,6 +156,12 @@ class CbnCorrection(ImgCorrectionInterface):
         self._center_offset_angle = params['center_offset_angle']
 
     def update(self):
+        """
+        Calculates the correction (in float32). Nothing is recalculated if the parameters did not change since the
+        last calculation.
+        """
+        if self._data is not None and self._calculated_params == self.get_params():
+            return
 
         # diam - diamond thickness
         # ds - seat thickness
@@ -147,76 +169,58 @@ class CbnCorrection(ImgCorrectionInterface):
         # r2 - large radius
         # tilt - tilting angle of DAC
         dtor = np.pi / 180.0
+        f32 = np.float32
 
-        diam = self._diamond_thickness
-        ds = self._seat_thickness
-        r1 = self._small_cbn_seat_radius
-        r2 = self._large_cbn_seat_radius
+        diam = f32(self._diamond_thickness)
+        ds = f32(self._seat_thickness)
+        r1 = f32(self._small_cbn_seat_radius)
+        r2 = f32(self._large_cbn_seat_radius)
         tilt = -self._tilt * dtor
         tilt_rotation = self._tilt_rotation * dtor + np.pi / 2
-        center_offset_angle = self._center_offset_angle * dtor
+        center_offset = f32(self._center_offset)
+        center_offset_angle = f32(self._center_offset_angle * dtor)
+        pi = f32(np.pi)
 
-        two_theta = self._tth_array * dtor
-        azi = self._azi_array * dtor
+        two_theta = ne.evaluate("tth * dtor", local_dict={'tth': np.asarray(self._tth_array, dtype=f32),
+                                                          'dtor': f32(dtor)})
+        azi = ne.evaluate("azi * dtor", local_dict={'azi': np.asarray(self._azi_array, dtype=f32),
+                                                    'dtor': f32(dtor)})
 
         # calculate radius of the cone for each pixel specific to a center_offset and rotation angle
         if self._center_offset != 0:
-            beta = azi - np.arcsin(
-                self._center_offset * np.sin((np.pi - (azi + center_offset_angle))) / r1) + center_offset_angle
-            r1 = np.sqrt(r1 ** 2 + self._center_offset ** 2 - 2 * r1 * self._center_offset * np.cos(beta))
-            r2 = np.sqrt(r2 ** 2 + self._center_offset ** 2 - 2 * r2 * self._center_offset * np.cos(beta))
-
-        # defining rotation matrices for the diamond anvil cell
-        Rx = np.matrix([[1, 0, 0],
-                        [0, np.cos(tilt_rotation), -np.sin(tilt_rotation)],
-                        [0, np.sin(tilt_rotation), np.cos(tilt_rotation)]])
-
-        Ry = np.matrix([[np.cos(tilt), 0, np.sin(tilt)],
-                        [0, 1, 0],
-                        [-np.sin(tilt), 0, np.cos(tilt)]])
-
-        dac_vector = np.array(Rx * Ry * np.matrix([1, 0, 0]).T)
-
-        # calculating a diffraction vector for each pixel
-        diffraction_vec = np.array([np.cos(two_theta),
-                                    np.cos(azi) * np.sin(two_theta),
-                                    np.sin(azi) * np.sin(two_theta)])
-
-        # angle between diffraction vector and diamond anvil cell vector based on dot product:
-        tt = np.arccos(dot_product(dac_vector, diffraction_vec) /
-                       (vector_len(dac_vector) * vector_len(diffraction_vec)))
-
-        # calculate path through diamond its absorption
-        path_diamond = diam / np.cos(tt)
-        abs_diamond = np.exp(-path_diamond / self._diamond_abs_length)
+            beta = ne.evaluate("azi - arcsin(center_offset * sin(pi - (azi + center_offset_angle)) / r1) + "
+                               "center_offset_angle")
+            r1 = ne.evaluate("sqrt(r1 ** 2 + center_offset ** 2 - 2 * r1 * center_offset * cos(beta))")
+            r2 = ne.evaluate("sqrt(r2 ** 2 + center_offset ** 2 - 2 * r2 * center_offset * cos(beta))")
+
+        # unit vector of the diamond anvil cell, rotation of (1, 0, 0) by the tilt around y and the tilt rotation
+        # around x
+        dac_x = f32(np.cos(tilt))
+        dac_y = f32(np.sin(tilt_rotation) * np.sin(tilt))
+        dac_z = f32(-np.cos(tilt_rotation) * np.sin(tilt))
+
+        # angle between the (unit) diffraction vector of each pixel and the diamond anvil cell vector based on the
+        # dot product:
+        tt = ne.evaluate("arccos(dac_x * cos(two_theta) + "
+                         "       (dac_y * cos(azi) + dac_z * sin(azi)) * sin(two_theta))")
 
         # define the different regions for the absorption in the seat
         # region 2 is partial absorption (in the cone) and region 3 is complete absorbtion
-        ts1 = np.arctan(r1 / diam)
-        ts2 = np.arctan(r2 / (diam + ds))
-        tseat = np.arctan((r2 - r1) / ds)
-
-        region2 = np.logical_and(tt > ts1, tt < ts2)
-        region3 = tt >= ts2
-
-        # calculate the paths through each region
-        path_seat = np.zeros(tt.shape)
-        if self._center_offset != 0:
-            deltar = diam * np.tan(tt[region2]) - r1[region2]
-            alpha = np.pi / 2. - tseat[region2]
-            gamma = np.pi - (alpha + tt[region2] + np.pi / 2)
-        else:
-            deltar = diam * np.tan(tt[region2]) - r1
-            alpha = np.pi / 2. - tseat
-            gamma = np.pi - (alpha + tt[region2] + np.pi / 2)
-
-        path_seat[region2] = deltar * np.sin(alpha) / np.sin(gamma)
-        path_seat[region3] = ds / np.cos(tt[region3])
-
-        abs_seat = np.exp(-path_seat / self._seat_abs_length)
-
-        # combine both, diamond and seat absorption correction
-        self._data = abs_diamond * abs_seat
+        ts1 = ne.evaluate("arctan(r1 / diam)")
+        ts2 = ne.evaluate("arctan(r2 / (diam + ds))")
+        tseat = ne.evaluate("arctan((r2 - r1) / ds)")
+        alpha = ne.evaluate("pi / 2 - tseat")
+
+        diamond_abs_length = f32(self._diamond_abs_length)
+        seat_abs_length = f32(self._seat_abs_length)
+
+        # combine the absorption in the diamond and the paths through each region of the seat
+        self._data = ne.evaluate(
+            "exp(-(diam / cos(tt)) / diamond_abs_length) * "
+            "exp(-where(tt >= ts2, ds / cos(tt),"
+            "           where(tt > ts1, (diam * tan(tt) - r1) * sin(alpha) / sin(pi - (alpha + tt + pi / 2)), 0))"
+            "    / seat_abs_length)")
+        self._calculated_params = self.get_params()
 
     def __eq__(self, other):
         if not isinstance(other, CbnCorrection):
@@ -241,9 +245,10 @@ class CbnCorrection(ImgCorrectionInterface):
             return False
         if self._center_offset_angle != other._center_offset_angle:
             return False
-        if not np.array_equal(self._tth_array, other._tth_array):
+        # the arrays are usually the shared geometry arrays of the calibration model, comparing them is then not needed
+        if self._tth_array is not other._tth_array and not np.array_equal(self._tth_array, other._tth_array):
             return False
-        if not np.array_equal(self._azi_array, other._azi_array):
+        if self._azi_array is not other._azi_array and not np.array_equal(self._azi_array, other._azi_array):
             return False
         return True
 
@@ -280,18 +285,22 @@ class ObliqueAngleDetectorAbsorptionCorrection(ImgCorrectionInterface):
         return self._data.shape
 
     def update(self):
-        tilt_rad = self.tilt / 180.0 * np.pi
-        rotation_rad = self.rotation / 180.0 * np.pi
-
-        path_length = self.detector_thickness / np.cos(
-            np.sqrt(self.tth_array ** 2 + tilt_rad ** 2 - 2 * tilt_rad * self.tth_array * \
-                    np.cos(np.pi - self.azi_array + rotation_rad)))
-
-        attenuation_constant = 1.0 / self.absorption_length
-        absorption_correction = (1 - np.exp(-attenuation_constant * path_length)) / \
-                                (1 - np.exp(-attenuation_constant * self.detector_thickness))
-
-        self._data = absorption_correction
+        f32 = np.float32
+        tilt_rad = f32(self.tilt / 180.0 * np.pi)
+        rotation_rad = f32(self.rotation / 180.0 * np.pi)
+        detector_thickness = f32(self.detector_thickness)
+        attenuation_constant = f32(1.0 / self.absorption_length)
+        pi = f32(np.pi)
+
+        self._data = ne.evaluate(
+            "(1 - exp(-attenuation_constant * detector_thickness / "
+            "         cos(sqrt(tth ** 2 + tilt_rad ** 2 - 2 * tilt_rad * tth * cos(pi - azi + rotation_rad))))) / "
+            "(1 - exp(-attenuation_constant * detector_thickness))",
+            local_dict={'tth': np.asarray(self.tth_array, dtype=f32),
+                        'azi': np.asarray(self.azi_array, dtype=f32),
+                        'tilt_rad': tilt_rad, 'rotation_rad': rotation_rad,
+                        'detector_thickness': detector_thickness,
+                        'attenuation_constant': attenuation_constant, 'pi': pi})
 
 
 class TransferFunctionCorrection(ImgCorrectionInterface):
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from collections import deque
+
+from qtpy import QtCore
+
+from . import Signal
+
+logger = logging.getLogger(__name__)
+
+
+class IntegrationRequest(object):
+    """
+    A function to be run in the worker thread and the callback receiving its result on the main thread.
+    """
+
+    __slots__ = ("key", "function", "callback", "generation")
+
+    def __init__(self, key, function, callback, generation):
+        self.key = key
+        self.function = function
+        self.callback = callback
+        self.generation = generation
+
+
+class IntegrationWorker(QtCore.QObject):
+    """
+    Runs integrations in a background thread, so that the GUI stays responsive while large cakes or supersampled
+    images are integrated. It is also used for other expensive calculations of the GUI, e.g. image histograms.
+
+    Requests are submitted with a key (e.g. the configuration and the type of integration) and only the most recent
+    request of every key is served: a pending request is replaced by a newer request with the same key and the result
+    of a running request is discarded if a newer request with the same key was submitted in the meantime (the
+    integration itself can not be interrupted). Results are delivered to the callback of the request on the main
+    thread. Without a running QCoreApplication requests are run immediately.
+
+    Typical usage::
+        worker = IntegrationWorker()
+        worker.submit("1d", lambda: integrate(img_data), set_pattern)
+    """
+
+    # used internally for inside of a qt application to deliver the results on the main thread
+    _result_ready_qt = QtCore.Signal()
+
+    def __init__(self):
+        super(IntegrationWorker, self).__init__()
+        self.integration_failed = Signal(str)  # error message
+        self._result_ready_qt.connect(self._deliver_results)
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closing = False
+        self._pending = {}  # key -> IntegrationRequest, insertion ordered
+        self._running = None
+        self._results = deque()
+        self._generations = {}  # key -> generation of the most recent request
+
+    @property
+    def busy(self):
+        """True if there are requests which are pending, running or whose results are not delivered yet."""
+        with self._condition:
+            return bool(self._pending) or self._running is not None or bool(self._results)
+
+    def submit(self, key, function, callback=None):
+        """
+        Requests to run function in the worker thread, superseding all earlier requests with the same key.
+        :param key: hashable key of the request
+        :param function: function without arguments, e.g. a functools.partial of the integration
+        :param callback: called with the result of function on the main thread, not called if the request was
+                         superseded or failed
+        """
+        with self._condition:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            request = IntegrationRequest(key, function, callback, generation)
+            if QtCore.QCoreApplication.instance() is None:
+                self._results.append((request, *self._run(request)))
+            else:
+                self._pending[key] = request
+                self._start()
+                self._condition.notify_all()
+        self._deliver_results()
+
+    def cancel(self, key=None):
+        """
+        Cancels the pending request with the given key and discards the result of a running one.
+        :param key: key of the request, if None all requests are cancelled
+        """
+        with self._condition:
+            keys = list(self._generations.keys()) if key is None else [key]
+            for k in keys:
+                self._pending.pop(k, None)
+                if k in self._generations:
+                    self._generations[k] += 1
+
+    def wait(self):
+        """Blocks until all pending and running requests are finished and delivers their results."""
+        with self._condition:
+            while self._pending or self._running is not None:
+                self._condition.wait()
+        self._deliver_results()
+
+    def close(self):
+        """Cancels all pending requests and stops the worker thread after the running request is finished."""
+        with self._condition:
+            if self._thread is None:
+                return
+            self._pending.clear()
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+        self._closing = False
+        self._results.clear()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._process_requests, daemon=True)
+            self._thread.start()
+
+    def _process_requests(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closing:
+                    self._condition.wait()
+                if self._closing:
+                    return
+                key = next(iter(self._pending))
+                self._running = self._pending.pop(key)
+
+            result, error = self._run(self._running)
+
+            with self._condition:
+                self._results.append((self._running, result, error))
+                self._running = None
+                self._condition.notify_all()
+            self._result_ready_qt.emit()
+
+    @staticmethod
+    def _run(request):
+        try:
+            return request.function(), None
+        except Exception as e:
+            logger.exception("Integration failed")
+            return None, str(e)
+
+    def _deliver_results(self):
+        while True:
+            with self._condition:
+                if not self._results:
+                    return
+                request, result, error = self._results.popleft()
+                if request.generation != self._generations.get(request.key):
+                    continue  # superseded by a newer request
+            if error is not None:
+                self.integration_failed.emit(error)
+            elif request.callback is not None:
+                request.callback(result)
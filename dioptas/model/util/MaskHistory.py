@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+
+import numpy as np
+
+FULL_REGION = (slice(None), slice(None))
+
+
+class MaskHistory(object):
+    """
+    Undo/redo store for a 2D boolean mask.
+
+    Instead of a full copy of the mask, every step only keeps the bit-packed content of the region (bounding box)
+    which is going to be changed by an operation. Undoing a step swaps the stored region back into the mask and
+    keeps the replaced content as redo step, therefore time and memory stay proportional to the edited area.
+
+    The history is limited by a byte budget (max_bytes) and not by a number of steps. The oldest undo steps are
+    dropped when the budget is exceeded, the most recent step is always kept.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._undo_deque = deque()
+        self._redo_deque = deque()
+        self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        """Number of bytes used by all stored undo and redo steps."""
+        return self._nbytes
+
+    @property
+    def undo_steps(self):
+        return len(self._undo_deque)
+
+    @property
+    def redo_steps(self):
+        return len(self._redo_deque)
+
+    def clear(self):
+        self._undo_deque.clear()
+        self._redo_deque.clear()
+        self._nbytes = 0
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._trim()
+
+    def store(self, mask, region=FULL_REGION):
+        """
+        Saves the given region of the mask before it is going to be modified. Any redo steps are cleared.
+
+        :param mask: current mask data
+        :param region: tuple of two slices describing the part of the mask which will be changed, default is the
+                       full mask
+        """
+        for step in self._redo_deque:
+            self._nbytes -= step[2].nbytes
+        self._redo_deque.clear()
+        self._push(self._undo_deque, self._create_step(mask, region))
+
+    def undo(self, mask):
+        """
+        Restores the last stored step into mask (in place).
+
+        :return: True if a step was undone, False if there was nothing to undo
+        """
+        return self._swap(mask, self._undo_deque, self._redo_deque)
+
+    def redo(self, mask):
+        """
+        Reapplies the last undone step onto mask (in place).
+
+        :return: True if a step was redone, False if there was nothing to redo
+        """
+        return self._swap(mask, self._redo_deque, self._undo_deque)
+
+    @staticmethod
+    def bounding_box(rr, cc):
+        """
+        Calculates the region covered by the given row and column indices, e.g. as returned by skimage.draw
+        """
+        if len(rr) == 0:
+            return slice(0, 0), slice(0, 0)
+        return slice(int(np.min(rr)), int(np.max(rr)) + 1), slice(int(np.min(cc)), int(np.max(cc)) + 1)
+
+    def _swap(self, mask, source, target):
+        try:
+            step = source.pop()
+        except IndexError:
+            return False
+        region, shape, packed = step
+        self._nbytes -= packed.nbytes
+        self._push(target, self._create_step(mask, region))
+        mask[region] = self._unpack(packed, shape)
+        return True
+
+    @staticmethod
+    def _create_step(mask, region):
+        region_data = mask[region]
+        return region, region_data.shape, np.packbits(region_data.astype(bool, copy=False), axis=None)
+
+    @staticmethod
+    def _unpack(packed, shape):
+        return np.unpackbits(packed, count=int(np.prod(shape))).reshape(shape).astype(bool)
+
+    def _push(self, target, step):
+        target.append(step)
+        self._nbytes += step[2].nbytes
+        self._trim()
+
+    def _trim(self):
+        while self._nbytes > self.max_bytes and len(self._undo_deque) > 1:
+            self._nbytes -= self._undo_deque.popleft()[2].nbytes
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import h5py
+import numpy as np
+
+SINK_ATTRIBUTE = "dioptas_pattern_sink"
+
+
+class NexusPatternSink(object):
+    """
+    Appends integrated patterns to a single NeXus (HDF5) file in the layout of the processed files of the BatchModel,
+    so that the file can be opened directly in the batch view:
+
+        processed/result/data          (patterns x bins) intensities
+        processed/result/binning       x values of the first pattern
+        processed/process/bkg          (patterns x bins) background, i.e. data - bkg is the background subtracted data
+        processed/process/files        image filenames
+        processed/process/file_map     index of the first pattern of every image file (and the number of patterns)
+        processed/process/pos_map      (patterns x 2) image file index and frame of every pattern
+        processed/process/timestamp    time of the integration (seconds since epoch)
+
+    All datasets are created (chunked and resizable) when the file is created and the file is switched into SWMR mode,
+    so that it can be read while patterns are still appended. Every append is flushed. An existing sink file is
+    continued, patterns with different x values are interpolated onto the binning of the file. Patterns are only
+    appended to files with the same x unit, otherwise a ValueError is raised.
+    """
+
+    def __init__(self, filename, calibration_file="", unit="2th_deg", chunk_size=16):
+        """
+        :param filename: filename of the NeXus file
+        :param calibration_file: calibration file stored as cal_file in the process group
+        :param unit: x unit of the patterns
+        :param chunk_size: number of patterns per HDF5 chunk
+        """
+        self.filename = filename
+        self.calibration_file = str(calibration_file)
+        self.unit = unit
+        self.chunk_size = chunk_size
+        self._file = None
+        self._binning = None
+        self._last_filename = None
+
+        if os.path.exists(filename):
+            self._file = h5py.File(filename, "a", libver="latest")
+            if not self._file.attrs.get(SINK_ATTRIBUTE, False):
+                self._file.close()
+                self._file = None
+                raise ValueError("{} exists and was not created by Dioptas for appending patterns".format(filename))
+            stored_unit = self._file["processed/process/int_unit"].asstr()[()]
+            if stored_unit != unit:
+                self._file.close()
+                self._file = None
+                raise ValueError(self._unit_error_message(stored_unit, unit))
+            self._file.swmr_mode = True
+            self._binning = self._file["processed/result/binning"][()]
+            files = self._file["processed/process/files"]
+            if files.shape[0] > 0:
+                self._last_filename = files.asstr()[-1]
+
+    @property
+    def num_patterns(self):
+        if self._file is None:
+            return 0
+        return self._file["processed/result/data"].shape[0]
+
+    @property
+    def binning(self):
+        return self._binning
+
+    def append(self, x, y, y_bkg_subtracted=None, image_filename="", frame=0, timestamp=0.0, unit=None):
+        """
+        Appends a pattern.
+        :param x: x values
+        :param y: intensities
+        :param y_bkg_subtracted: background subtracted intensities, if None no background is stored
+        :param image_filename: filename of the integrated image
+        :param frame: frame of the image within the image file (0 based)
+        :param timestamp: time of the integration in seconds since epoch
+        :param unit: x unit of the pattern, has to be the unit of the sink, defaults to it
+        """
+        if unit is not None and unit != self.unit:
+            # x values in another unit can not be interpolated onto the binning
+            raise ValueError(self._unit_error_message(self.unit, unit))
+        if self._file is None:
+            self._create_file(x)
+        y_mapped = self._map_to_binning(x, y, self._binning)
+        if y_bkg_subtracted is None:
+            bkg = np.zeros_like(y_mapped)
+        else:
+            bkg = y_mapped - self._map_to_binning(x, y_bkg_subtracted, self._binning)
+
+        process = self._file["processed/process"]
+        files = process["files"]
+        file_map = process["file_map"]
+        image_filename = str(image_filename)
+
+        num_files = files.shape[0]
+        if self._last_filename != image_filename:
+            files.resize((num_files + 1,))
+            files[num_files] = image_filename
+            self._last_filename = image_filename
+            num_files += 1
+            file_map.resize((num_files + 1,))
+            file_map[num_files - 1] = self.num_patterns
+
+        ind = self.num_patterns
+        for dataset, value in ((self._file["processed/result/data"], y_mapped), (process["bkg"], bkg),
+                               (process["pos_map"], (num_files - 1, frame)), (process["timestamp"], timestamp)):
+            dataset.resize(ind + 1, axis=0)
+            dataset[ind] = value
+        file_map[num_files] = ind + 1
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _create_file(self, x):
+        if os.path.dirname(self.filename) != "":
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        f = h5py.File(self.filename, "w", libver="latest")
+        f.attrs[SINK_ATTRIBUTE] = True
+        f.attrs["default"] = "processed"
+        num_bins = len(x)
+
+        nxentry = f.create_group("processed")
+        nxentry.attrs["NX_class"] = "NXentry"
+        nxentry.attrs["default"] = "result"
+
+        nxdata = nxentry.create_group("result")
+        nxdata.attrs["NX_class"] = "NXdata"
+        nxdata.attrs["signal"] = "data"
+        nxdata.attrs["axes"] = [".", "binning"]
+        nxdata.create_dataset("data", shape=(0, num_bins), maxshape=(None, num_bins), dtype=np.float64,
+                              chunks=(self.chunk_size, num_bins))
+        binning = nxdata.create_dataset("binning", data=np.asarray(x, dtype=np.float64))
+        binning.attrs["unit"] = self.unit
+
+        nxprocess = nxentry.create_group("process")
+        nxprocess.attrs["NX_class"] = "NXprocess"
+        nxprocess["cal_file"] = self.calibration_file
+        nxprocess["int_method"] = "csr"
+        nxprocess["int_unit"] = self.unit
+        nxprocess["num_points"] = num_bins
+        nxprocess.create_dataset("bkg", shape=(0, num_bins), maxshape=(None, num_bins), dtype=np.float64,
+                                 chunks=(self.chunk_size, num_bins))
+        nxprocess.create_dataset("files", shape=(0,), maxshape=(None,), dtype=h5py.string_dtype(),
+                                 chunks=(self.chunk_size,))
+        nxprocess.create_dataset("file_map", data=np.zeros(1, dtype=np.int64), maxshape=(None,),
+                                 chunks=(self.chunk_size,))
+        nxprocess.create_dataset("pos_map", shape=(0, 2), maxshape=(None, 2), dtype=np.int64,
+                                 chunks=(self.chunk_size, 2))
+        timestamp = nxprocess.create_dataset("timestamp", shape=(0,), maxshape=(None,), dtype=np.float64,
+                                             chunks=(self.chunk_size,))
+        timestamp.attrs["units"] = "s"
+
+        f.swmr_mode = True
+        self._file = f
+        self._binning = binning[()]
+
+    def _unit_error_message(self, stored_unit, unit):
+        return "{} contains patterns in {}, patterns in {} can not be appended".format(self.filename, stored_unit, unit)
+
+    @staticmethod
+    def _map_to_binning(x, y, binning):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == len(binning) and np.allclose(x, binning):
+            return y
+        if len(x) < len(binning) and np.allclose(x, binning[:len(x)]):
+            # trimmed trailing zeros
+            return np.concatenate((y, np.zeros(len(binning) - len(x))))
+        return np.interp(binning, x, y, left=0, right=0)
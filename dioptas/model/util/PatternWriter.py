@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import queue
+
+import numpy as np
+from qtpy import QtCore
+from xypattern import Pattern
+
+from . import Signal
+from .PatternSink import NexusPatternSink
+
+logger = logging.getLogger(__name__)
+
+
+class PatternWriteJob(object):
+    """
+    Snapshot of a pattern together with all files which should be written from it.
+    """
+
+    def __init__(self, pattern, files, unit="2th_deg", image_filename="", frame=0, calibration_file=""):
+        """
+        :param pattern: xypattern Pattern, the original and the background subtracted data are copied
+        :param files: list of (filename, header, subtract_background) tuples, patterns for *.nxs files are appended to
+                      a NexusPatternSink, subtract_background then stores the background subtracted data in addition
+        :param unit: x unit of the pattern, written into the header of chi files
+        :param image_filename: filename of the integrated image (stored in *.nxs files)
+        :param frame: frame of the integrated image (stored in *.nxs files)
+        :param calibration_file: calibration file used for the integration (stored in *.nxs files)
+        """
+        self.unit = unit
+        self.image_filename = image_filename
+        self.frame = frame
+        self.calibration_file = calibration_file
+        self.timestamp = time.time()
+        self.files = list(files)
+        self.original = Pattern(*[np.copy(values) for values in pattern.original_data], name=pattern.name)
+        if any(subtract_background for _, _, subtract_background in self.files):
+            self.subtracted = Pattern(*[np.copy(values) for values in pattern.data], name=pattern.name)
+        else:
+            self.subtracted = None
+
+    @property
+    def directories(self):
+        return set(os.path.dirname(filename) for filename, _, _ in self.files)
+
+
+class PatternWriter(QtCore.QObject):
+    """
+    Writes patterns in a background thread, so that saving files (e.g. on slow network shares) does not block the
+    integration of the next image.
+
+    Jobs are put into a bounded queue; when the queue is full, submit blocks until the writer caught up. Write errors
+    are collected in errors and reported with the write_failed signal, the number of files not written yet is reported
+    with the backlog_changed signal. Patterns for *.nxs files are appended to a NexusPatternSink, which stays open
+    until the writer is closed.
+
+    Typical usage::
+        writer = PatternWriter()
+        writer.write_failed.connect(show_error)
+        writer.submit(pattern, [("a.xy", header, False), ("a.chi", "", False)])
+        writer.flush()
+    """
+
+    # used internally for inside of a qt application to avoid thread problems
+    _write_failed_qt = QtCore.Signal(str, str)
+    _backlog_changed_qt = QtCore.Signal(int)
+
+    def __init__(self, max_queue_size=64, max_open_sinks=4):
+        """
+        :param max_queue_size: maximum number of pending jobs
+        :param max_open_sinks: maximum number of *.nxs files kept open, the least recently used one is closed first
+        """
+        super(PatternWriter, self).__init__()
+        self.write_failed = Signal(str, str)  # filename, error message
+        self.backlog_changed = Signal(int)  # number of files waiting to be written
+        self._write_failed_qt.connect(self.write_failed.emit)
+        self._backlog_changed_qt.connect(self.backlog_changed.emit)
+
+        self.errors = []
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._backlog = 0
+        self._created_directories = set()
+        self._sinks = OrderedDict()
+        self.max_open_sinks = max_open_sinks
+
+    @property
+    def backlog(self):
+        """Number of files which are submitted but not written yet."""
+        return self._backlog
+
+    def submit(self, pattern, files, unit="2th_deg", **kwargs):
+        """
+        Queues files to be written from a snapshot of the pattern.
+        :param pattern: xypattern Pattern
+        :param files: list of (filename, header, subtract_background) tuples
+        :param unit: x unit of the pattern
+        :param kwargs: image_filename, frame and calibration_file stored in *.nxs files, see PatternWriteJob
+        """
+        job = PatternWriteJob(pattern, files, unit, **kwargs)
+        if len(job.files) == 0:
+            return
+        self._start()
+        self._change_backlog(len(job.files))
+        self._queue.put(job)
+
+    def flush(self):
+        """Blocks until all submitted files are written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Writes all pending files, stops the writer thread and closes all *.nxs files."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for sink in self._sinks.values():
+            sink.close()
+        self._sinks.clear()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._process_jobs, daemon=True)
+            self._thread.start()
+
+    def _process_jobs(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _write_job(self, job):
+        for directory in job.directories - self._created_directories:
+            try:
+                if directory != "":
+                    os.makedirs(directory, exist_ok=True)
+                self._created_directories.add(directory)
+            except OSError as e:
+                logger.error("Could not create directory {}: {}".format(directory, e))
+
+        for filename, header, subtract_background in job.files:
+            pattern = job.subtracted if subtract_background else job.original
+            try:
+                if filename.endswith(".nxs"):
+                    self._append_to_sink(filename, job, subtract_background)
+                else:
+                    pattern.save(filename, header, unit=job.unit)
+            except Exception as e:
+                logger.error("Could not write pattern {}: {}".format(filename, e))
+                # the directory might have been removed in the meantime, it will be created again for the next job
+                self._created_directories.discard(os.path.dirname(filename))
+                self.errors.append((filename, str(e)))
+                self._emit(self._write_failed_qt, self.write_failed, filename, str(e))
+            self._change_backlog(-1)
+
+    def _append_to_sink(self, filename, job, subtract_background):
+        sink = self._sinks.pop(filename, None)
+        if sink is None:
+            sink = NexusPatternSink(filename, job.calibration_file, job.unit)
+            while len(self._sinks) >= self.max_open_sinks:
+                self._sinks.popitem(last=False)[1].close()
+        self._sinks[filename] = sink  # most recently used sink is the last one
+
+        x, y = job.original.data
+        y_bkg_subtracted = job.subtracted.y if subtract_background else None
+        sink.append(x, y, y_bkg_subtracted, job.image_filename, job.frame, job.timestamp, job.unit)
+
+    def _change_backlog(self, change):
+        with self._lock:
+            self._backlog += change
+            backlog = self._backlog
+        self._emit(self._backlog_changed_qt, self.backlog_changed, backlog)
+
+    @staticmethod
+    def _emit(qt_signal, signal, *args):
+        if QtCore.QCoreApplication.instance() is not None:
+            qt_signal.emit(*args)
+        else:
+            signal.emit(*args)
@@ -21,9 +21,27 @@
 import numpy as np
 
 s2pi = np.sqrt(2 * np.pi)
+SIGMA_TO_FWHM = 2 * np.sqrt(2 * np.log(2))
+
+
 def gaussian(x, amplitude=1.0, center=0.0, sigma=1.0):
     """1 dimensional gaussian:
     gaussian(x, amplitude, center, sigma)
     """
     return (amplitude / (s2pi * sigma)) * np.exp(-(1.0 * x - center) ** 2 / (2 * sigma ** 2))
 
+
+def lorentzian(x, amplitude=1.0, center=0.0, gamma=1.0):
+    """1 dimensional lorentzian:
+    lorentzian(x, amplitude, center, gamma), gamma is the half width at half maximum
+    """
+    return (amplitude / np.pi) * gamma / ((1.0 * x - center) ** 2 + gamma ** 2)
+
+
+def pseudo_voigt(x, amplitude=1.0, center=0.0, fwhm=1.0, eta=0.5):
+    """1 dimensional pseudo-Voigt, a linear combination of a lorentzian and a gaussian with the same full width at
+    half maximum:
+    pseudo_voigt(x, amplitude, center, fwhm, eta), eta is the lorentzian fraction
+    """
+    return eta * lorentzian(x, amplitude, center, fwhm / 2) + \
+           (1 - eta) * gaussian(x, amplitude, center, fwhm / SIGMA_TO_FWHM)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .PeakShapes import gaussian, lorentzian, SIGMA_TO_FWHM
+
+PEAK_SHAPES = ('gaussian', 'pseudo_voigt')
+
+
+class PeakTrackingResult(object):
+    """
+    Fitted peak parameters of a series of patterns, all peak arrays have the shape (patterns x peaks).
+    """
+
+    def __init__(self, shape, center, fwhm, area, eta, background, chi2, success):
+        self.shape = shape
+        self.center = center
+        self.fwhm = fwhm
+        self.area = area
+        self.eta = eta  # lorentzian fraction, zero for gaussian peaks
+        self.background = background  # (patterns x 2), offset and slope of the linear background
+        self.chi2 = chi2  # mean squared residual of every pattern
+        self.success = success  # False for patterns, which could not be fitted
+
+    @property
+    def num_peaks(self):
+        return self.center.shape[1]
+
+
+class PeakTracker(object):
+    """
+    Fits one or more peaks on a linear background to every pattern of a series.
+
+    All patterns of a chunk are fitted at once with a batched Levenberg-Marquardt least squares, i.e. the
+    Jacobians and normal equations of all patterns are evaluated as stacked arrays. The chunks are processed in
+    order and every chunk is warm-started from the solution of the last pattern of the previous chunk, with the peak
+    centers moved to the local intensity maximum of each pattern. The patterns of a chunk are split between the
+    threads of a thread pool.
+    """
+
+    def __init__(self, x, centers, fwhm, shape='gaussian', x_range=None, eta=0.5, max_iterations=50,
+                 chunk_size=256, max_workers=None):
+        """
+        :param x: x values of the patterns
+        :param centers: start values of the peak centers
+        :param fwhm: start value(s) of the full width at half maximum of the peaks
+        :param shape: 'gaussian' or 'pseudo_voigt'
+        :param x_range: (minimum, maximum) x range used for the fit, defaults to 5 fwhm around the peaks
+        :param eta: start value of the lorentzian fraction of pseudo-Voigt peaks
+        :param max_iterations: maximum number of Levenberg-Marquardt iterations
+        :param chunk_size: number of patterns fitted at once
+        :param max_workers: number of threads, defaults to the number of CPUs
+        """
+        if shape not in PEAK_SHAPES:
+            raise ValueError("Unknown peak shape {}, possible shapes are {}".format(shape, PEAK_SHAPES))
+        self.x = np.asarray(x, dtype=float)
+        self.centers = np.atleast_1d(np.asarray(centers, dtype=float))
+        self.fwhm = np.broadcast_to(np.asarray(fwhm, dtype=float), self.centers.shape).copy()
+        self.shape = shape
+        self.eta = eta
+        self.max_iterations = max_iterations
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+        if x_range is None:
+            x_range = (np.min(self.centers - 5 * self.fwhm), np.max(self.centers + 5 * self.fwhm))
+        self.x_range = x_range
+        self._fit_indices = np.flatnonzero((self.x >= x_range[0]) & (self.x <= x_range[1]))
+        self._fit_x = self.x[self._fit_indices]
+        self._x_mid = np.mean(self._fit_x)
+        self._min_fwhm = np.min(np.diff(self._fit_x)) if len(self._fit_x) > 1 else 1e-6
+        self._params_per_peak = 4 if shape == 'pseudo_voigt' else 3
+
+    @property
+    def num_params(self):
+        return 2 + self._params_per_peak * len(self.centers)
+
+    def fit(self, data, callback_fn=None):
+        """
+        Fits all patterns.
+        :param data: (patterns x len(x)) array of intensities
+        :param callback_fn: called after every chunk with the number of fitted patterns, returning False aborts the
+                            fitting, the remaining patterns are marked as not successful
+        :return: PeakTrackingResult
+        :rtype: PeakTrackingResult
+        """
+        data = np.atleast_2d(np.asarray(data, dtype=float))[:, self._fit_indices]
+        num_patterns = data.shape[0]
+        params = np.full((num_patterns, self.num_params), np.nan)
+        chi2 = np.full(num_patterns, np.nan)
+
+        start_params = self._get_start_params(data[:1])[0]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in range(0, num_patterns, self.chunk_size):
+                chunk = data[start:start + self.chunk_size]
+                initial = self._recenter(np.tile(start_params, (len(chunk), 1)), chunk)
+
+                splits = np.array_split(np.arange(len(chunk)), min(self.max_workers, len(chunk)))
+                futures = [executor.submit(self._fit_rows, chunk[rows], initial[rows]) for rows in splits]
+                for rows, future in zip(splits, futures):
+                    params[start + rows], chi2[start + rows] = future.result()
+
+                last_params = params[min(start + self.chunk_size, num_patterns) - 1]
+                if np.all(np.isfinite(last_params)):
+                    start_params = last_params
+                if callback_fn is not None:
+                    if not callback_fn(min(start + self.chunk_size, num_patterns)):
+                        break
+        return self._create_result(params, chi2)
+
+    def _get_start_params(self, data):
+        params = np.zeros((len(data), self.num_params))
+        params[:, 0] = np.min(data, axis=1)
+        for ind, (center, fwhm) in enumerate(zip(self.centers, self.fwhm)):
+            offset = 2 + ind * self._params_per_peak
+            nearest = np.argmin(np.abs(self._fit_x - center))
+            height = np.maximum(data[:, nearest] - params[:, 0], 0)
+            # area of a gaussian with the given height and fwhm
+            params[:, offset] = height * fwhm * np.sqrt(2 * np.pi) / SIGMA_TO_FWHM
+            params[:, offset + 1] = center
+            params[:, offset + 2] = fwhm
+            if self.shape == 'pseudo_voigt':
+                params[:, offset + 3] = self.eta
+        return params
+
+    def _recenter(self, params, data):
+        """
+        Moves the start centers of every pattern to the intensity maximum within two fwhm.
+        """
+        params = params.copy()
+        for ind in range(len(self.centers)):
+            offset = 2 + ind * self._params_per_peak
+            center = params[0, offset + 1]
+            fwhm = params[0, offset + 2]
+            in_window = np.flatnonzero(np.abs(self._fit_x - center) <= 2 * fwhm)
+            if len(in_window) < 3:
+                continue
+            maximum = in_window[np.argmax(data[:, in_window], axis=1)]
+            params[:, offset + 1] = self._fit_x[maximum]
+        return params
+
+    def _fit_rows(self, data, params):
+        """
+        Batched Levenberg-Marquardt fit of all rows of data.
+        """
+        params = params.copy()
+        damping = np.full(len(data), 1e-3)
+        model, jacobian = self._evaluate(params)
+        cost = np.sum((data - model) ** 2, axis=1)
+        active = np.flatnonzero(np.isfinite(cost))
+
+        for _ in range(self.max_iterations):
+            if len(active) == 0:
+                break
+            residual = data[active] - model[active]
+            jac = jacobian[active]
+            jac_t = jac.transpose(0, 2, 1)
+            jtj = jac_t @ jac
+            gradient = (jac_t @ residual[..., np.newaxis])[..., 0]
+            diagonal = np.einsum('rpp->rp', jtj)
+            damped = jtj + (damping[active, np.newaxis] * np.maximum(diagonal, 1e-12))[:, :, np.newaxis] * \
+                     np.eye(self.num_params)
+            try:
+                step = np.linalg.solve(damped, gradient[..., np.newaxis])[..., 0]
+            except np.linalg.LinAlgError:
+                step = np.stack([np.linalg.lstsq(a, b, rcond=None)[0] for a, b in zip(damped, gradient)])
+
+            new_params = self._constrain(params[active] + step)
+            new_model, new_jacobian = self._evaluate(new_params)
+            new_cost = np.sum((data[active] - new_model) ** 2, axis=1)
+
+            improved = np.isfinite(new_cost) & (new_cost < cost[active])
+            improved_rows = active[improved]
+            converged = np.zeros(len(active), dtype=bool)
+            converged[improved] = (cost[improved_rows] - new_cost[improved]) <= 1e-10 * cost[improved_rows]
+
+            params[improved_rows] = new_params[improved]
+            model[improved_rows] = new_model[improved]
+            jacobian[improved_rows] = new_jacobian[improved]
+            cost[improved_rows] = new_cost[improved]
+            damping[improved_rows] *= 0.3
+            damping[active[~improved]] *= 10
+            converged |= damping[active] > 1e10
+
+            active = active[~converged]
+
+        params[~np.isfinite(cost)] = np.nan
+        return params, cost / data.shape[1]
+
+    def _constrain(self, params):
+        for ind in range(len(self.centers)):
+            offset = 2 + ind * self._params_per_peak
+            params[:, offset + 2] = np.maximum(params[:, offset + 2], self._min_fwhm)
+            if self.shape == 'pseudo_voigt':
+                params[:, offset + 3] = np.clip(params[:, offset + 3], 0, 1)
+        return params
+
+    def _evaluate(self, params):
+        """
+        Calculates the model and its Jacobian for all rows of params.
+        :return: model (rows x points), jacobian (rows x points x params)
+        """
+        x = self._fit_x[np.newaxis, :]
+        jacobian = np.empty((len(params), len(self._fit_x), self.num_params))
+        jacobian[:, :, 0] = 1
+        jacobian[:, :, 1] = x - self._x_mid
+        model = params[:, :1] + params[:, 1:2] * (x - self._x_mid)
+
+        for ind in range(len(self.centers)):
+            offset = 2 + ind * self._params_per_peak
+            area = params[:, offset:offset + 1]
+            center = params[:, offset + 1:offset + 2]
+            fwhm = params[:, offset + 2:offset + 3]
+            u = x - center
+
+            sigma = fwhm / SIGMA_TO_FWHM
+            g = gaussian(x, 1.0, center, sigma)
+            dg_dcenter = g * u / sigma ** 2
+            dg_dfwhm = g * (u ** 2 / sigma ** 2 - 1) / sigma / SIGMA_TO_FWHM
+
+            if self.shape == 'pseudo_voigt':
+                eta = params[:, offset + 3:offset + 4]
+                gamma = fwhm / 2
+                denominator = u ** 2 + gamma ** 2
+                lor = lorentzian(x, 1.0, center, gamma)
+                dl_dcenter = lor * 2 * u / denominator
+                dl_dfwhm = lor * (1 / gamma - 2 * gamma / denominator) / 2
+
+                shape = eta * lor + (1 - eta) * g
+                jacobian[:, :, offset + 1] = area * (eta * dl_dcenter + (1 - eta) * dg_dcenter)
+                jacobian[:, :, offset + 2] = area * (eta * dl_dfwhm + (1 - eta) * dg_dfwhm)
+                jacobian[:, :, offset + 3] = area * (lor - g)
+            else:
+                shape = g
+                jacobian[:, :, offset + 1] = area * dg_dcenter
+                jacobian[:, :, offset + 2] = area * dg_dfwhm
+            jacobian[:, :, offset] = shape
+            model = model + area * shape
+        return model, jacobian
+
+    def _create_result(self, params, chi2):
+        peak_params = params[:, 2:].reshape(len(params), len(self.centers), self._params_per_peak)
+        if self.shape == 'pseudo_voigt':
+            eta = peak_params[:, :, 3]
+        else:
+            eta = np.zeros(peak_params.shape[:2])
+        success = np.all(np.isfinite(params), axis=1)
+        return PeakTrackingResult(self.shape, peak_params[:, :, 1], peak_params[:, :, 2], peak_params[:, :, 0],
+                                  eta, params[:, :2], chi2, success)
+
+
+def track_peaks(x, data, centers, fwhm, shape='gaussian', callback_fn=None, **kwargs):
+    """
+    Convenience function fitting peaks in all patterns of data, see PeakTracker.
+    :return: PeakTrackingResult
+    """
+    return PeakTracker(x, centers, fwhm, shape, **kwargs).fit(data, callback_fn)
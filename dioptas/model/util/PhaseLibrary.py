@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import copy
+import pickle
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .jcpds import jcpds
+
+logger = logging.getLogger(__name__)
+
+PHASE_FILE_EXTENSIONS = ('.jcpds', '.cif')
+
+FORMULA_PATTERN = re.compile(r'(?:[A-Z][a-z]?(?:[1-9]\d*(?:\.\d+)?|0\.\d+)?)+')
+ELEMENT_PATTERN = re.compile(r'[A-Z][a-z]?')
+
+
+class PhaseLibraryEntry(object):
+    """
+    Parsed phase file of the library together with the information used for searching.
+    """
+
+    def __init__(self, filename, mtime, phase, elements, conversion_parameters=None):
+        self.filename = filename
+        self.mtime = mtime
+        self.phase = phase  # type: jcpds
+        self.elements = elements
+        self.conversion_parameters = conversion_parameters
+
+    @property
+    def name(self):
+        return self.phase.name
+
+    @property
+    def symmetry(self):
+        return self.phase.params['symmetry']
+
+    @property
+    def comments(self):
+        return ' '.join(self.phase.params['comments'])
+
+
+class PhaseLibrary(object):
+    """
+    Index of jcpds and cif phase files. Many cif files are parsed in parallel processes and the parsed phases
+    (including the calculated cif intensities and the d-spacings) are kept in memory and optionally in a cache file.
+    Entries are reused as long as the modification time of the file (and for cif files the conversion parameters) did
+    not change, entries of files which do not exist anymore are removed. The cache file is written after an update of
+    several files, single parsed phases are only written by save_cache or flush_cache.
+    """
+    CACHE_VERSION = 1
+
+    # starting a worker process imports the model package (including pyFAI), which takes about as long as parsing 15
+    # cif files, fewer files are parsed in the current process
+    cif_files_per_worker = 16
+
+    def __init__(self, cache_filename=None, max_workers=None):
+        """
+        :param cache_filename: file in which the parsed phases are stored between sessions, None keeps them only in
+                               memory
+        :param max_workers: maximum number of processes used for parsing cif files, defaults to the number of CPUs,
+                            with 1 all files are parsed in the current process
+        """
+        self.cache_filename = cache_filename
+        self.max_workers = max_workers
+        self._entries = {}
+        self._cache_loaded = False
+        self._cache_modified = False  # entries changed since the cache file was written
+        self.revision = 0  # incremented whenever entries are added or removed
+
+    def __len__(self):
+        self._load_cache()
+        return len(self._entries)
+
+    @property
+    def entries(self):
+        self._load_cache()
+        return list(self._entries.values())
+
+    def add_folder(self, folder, recursive=True, intensity_cutoff=0.5, minimum_d_spacing=0.5, callback_fn=None):
+        """
+        Adds all jcpds and cif files within a folder to the library.
+        :return: list of the files which could not be parsed
+        """
+        filenames = []
+        for root, dirs, files in os.walk(folder):
+            filenames.extend(os.path.join(root, f) for f in sorted(files)
+                             if f.lower().endswith(PHASE_FILE_EXTENSIONS))
+            if not recursive:
+                break
+        return self.update(filenames, intensity_cutoff, minimum_d_spacing, callback_fn)
+
+    def update(self, filenames, intensity_cutoff=0.5, minimum_d_spacing=0.5, callback_fn=None):
+        """
+        Parses all files which are not in the library or were modified since they have been parsed. Many cif files are
+        parsed in parallel processes (the parsing is pure python and would hold the GIL in threads), the cache file is
+        updated afterwards.
+        :param filenames: list of jcpds or cif files
+        :param intensity_cutoff: minimum intensity of calculated cif reflections in % (0-100)
+        :param minimum_d_spacing: minimum d spacing of calculated cif reflections
+        :param callback_fn: function called with the number of parsed files after every parsed file, returning False
+                            stops the parsing
+        :return: list of the files which could not be parsed
+        """
+        self._load_cache()
+        conversion_parameters = (intensity_cutoff, minimum_d_spacing)
+        outdated = [os.path.abspath(f) for f in filenames
+                    if self._get_valid_entry(os.path.abspath(f), conversion_parameters) is None]
+        outdated = list(dict.fromkeys(outdated))
+
+        failed = []
+        cif_files = [f for f in outdated if f.lower().endswith('.cif')]
+        max_workers = min(self.max_workers or os.cpu_count() or 1, len(cif_files) // self.cif_files_per_worker)
+        if max_workers <= 1:
+            results = (_parse_phase_file_or_error(f, intensity_cutoff, minimum_d_spacing) for f in outdated)
+            self._add_parsed_entries(outdated, results, failed, callback_fn)
+        else:
+            # spawned processes do not inherit the threads (and Qt state) of the main process
+            with ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = {f: executor.submit(_parse_phase_file_or_error, f, intensity_cutoff, minimum_d_spacing)
+                           for f in cif_files}
+
+                def get_results():
+                    for filename in outdated:
+                        if filename not in futures:  # jcpds files are parsed faster than they are sent to a worker
+                            yield _parse_phase_file_or_error(filename, intensity_cutoff, minimum_d_spacing)
+                            continue
+                        try:
+                            yield futures[filename].result()
+                        except Exception as e:  # e.g. a crashed worker process
+                            yield str(e) or type(e).__name__
+
+                self._add_parsed_entries(outdated, get_results(), failed, callback_fn)
+                for future in futures.values():
+                    future.cancel()
+
+        self.flush_cache()
+        return failed
+
+    def _add_parsed_entries(self, filenames, results, failed, callback_fn):
+        for ind, (filename, result) in enumerate(zip(filenames, results)):
+            if isinstance(result, PhaseLibraryEntry):
+                self._entries[filename] = result
+                self.revision += 1
+                self._cache_modified = True
+            else:
+                logger.warning("Could not parse phase file {}: {}".format(filename, result))
+                failed.append(filename)
+            if callback_fn is not None and callback_fn(ind + 1) is False:
+                break
+
+    def get_phase(self, filename, intensity_cutoff=0.5, minimum_d_spacing=0.5):
+        """
+        Returns a copy of the parsed phase, the file is parsed if it is not in the library or outdated. A newly parsed
+        phase is not written to the cache file immediately, see flush_cache.
+        :raises: the parsing exception if the file could not be parsed
+        """
+        abs_filename = os.path.abspath(filename)
+        self._load_cache()
+        entry = self._get_valid_entry(abs_filename, (intensity_cutoff, minimum_d_spacing))
+        if entry is None:
+            entry = parse_phase_file(abs_filename, intensity_cutoff, minimum_d_spacing)
+            self._entries[abs_filename] = entry
+            self.revision += 1
+            self._cache_modified = True
+        phase = copy.deepcopy(entry.phase)
+        phase.filename = filename
+        return phase
+
+    def search(self, name=None, elements=None, symmetry=None):
+        """
+        Filters the library entries.
+        :param name: case-insensitive part of the phase name, filename or comments
+        :param elements: list of elements, which all have to be in the phase
+        :param symmetry: symmetry of the phase, e.g. 'CUBIC'
+        :return: list of matching PhaseLibraryEntry
+        """
+        self._load_cache()
+        result = []
+        name = name.lower() if name else None
+        elements = set(elements) if elements else None
+        symmetry = symmetry.upper() if symmetry else None
+        for entry in self._entries.values():
+            if name is not None and name not in entry.name.lower() and \
+                    name not in os.path.basename(entry.filename).lower() and \
+                    name not in entry.comments.lower():
+                continue
+            if elements is not None and not elements.issubset(entry.elements):
+                continue
+            if symmetry is not None and entry.symmetry != symmetry:
+                continue
+            result.append(entry)
+        return result
+
+    def remove(self, filename):
+        self._load_cache()
+        if self._entries.pop(os.path.abspath(filename), None) is not None:
+            self.revision += 1
+            self._cache_modified = True
+
+    def clear(self):
+        self._entries = {}
+        self._cache_loaded = True
+        self.revision += 1
+        self._cache_modified = True
+
+    def flush_cache(self):
+        """
+        Writes the cache file if the entries changed since it was last written.
+        """
+        if self._cache_modified:
+            self.save_cache()
+
+    def save_cache(self):
+        if self.cache_filename is None:
+            return
+        try:
+            cache_folder = os.path.dirname(self.cache_filename)
+            if cache_folder and not os.path.isdir(cache_folder):
+                os.makedirs(cache_folder)
+            with open(self.cache_filename, 'wb') as f:
+                pickle.dump({'version': self.CACHE_VERSION, 'entries': self._entries}, f)
+            self._cache_modified = False
+        except OSError as e:
+            logger.warning("Could not write phase library cache {}: {}".format(self.cache_filename, e))
+
+    def _load_cache(self):
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        if self.cache_filename is None or not os.path.isfile(self.cache_filename):
+            return
+        try:
+            with open(self.cache_filename, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('version') == self.CACHE_VERSION:
+                for filename, entry in cache['entries'].items():
+                    if os.path.isfile(filename):
+                        self._entries[filename] = entry
+                    else:
+                        self._cache_modified = True
+                self.revision += 1
+        except Exception as e:
+            logger.warning("Could not read phase library cache {}: {}".format(self.cache_filename, e))
+
+    def _get_valid_entry(self, filename, conversion_parameters):
+        entry = self._entries.get(filename)
+        if entry is None:
+            return None
+        try:
+            mtime = os.path.getmtime(filename)
+        except OSError:
+            del self._entries[filename]
+            self.revision += 1
+            self._cache_modified = True
+            return None
+        if entry.mtime != mtime:
+            return None
+        if entry.conversion_parameters is not None and entry.conversion_parameters != conversion_parameters:
+            return None
+        return entry
+
+
+def parse_phase_file(filename, intensity_cutoff=0.5, minimum_d_spacing=0.5):
+    """
+    Parses a jcpds or cif file into a PhaseLibraryEntry, the d-spacings are calculated at ambient conditions.
+    """
+    mtime = os.path.getmtime(filename)
+    if filename.lower().endswith('.cif'):
+        from .cif import CifConverter, read_cif_phase  # PyCifRW is only imported when phases are loaded
+
+        cif_converter = CifConverter(0.31, minimum_d_spacing, intensity_cutoff)
+        cif_phase = read_cif_phase(filename)
+        phase = cif_converter.convert_cif_phase_to_jcpds(cif_phase)
+        phase.filename = filename
+        phase.name = os.path.splitext(os.path.basename(filename))[0]
+        phase.params['modified'] = False
+        elements = set(atom[0] for atom in cif_phase.atoms)
+        conversion_parameters = (intensity_cutoff, minimum_d_spacing)
+    else:
+        phase = jcpds()
+        phase.load_file(filename)
+        elements = get_elements_from_text(phase.name, ' '.join(phase.params['comments']))
+        conversion_parameters = None
+    phase.compute_d()
+    return PhaseLibraryEntry(filename, mtime, phase, elements, conversion_parameters)
+
+
+def _parse_phase_file_or_error(filename, intensity_cutoff, minimum_d_spacing):
+    """
+    Parses a phase file in a worker process. The error message is returned instead of raising the exception, since
+    exceptions of the parsers can not always be pickled back from the worker process.
+    """
+    try:
+        return parse_phase_file(filename, intensity_cutoff, minimum_d_spacing)
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+def get_elements_from_text(name, comments=''):
+    """
+    Guesses the elements of a jcpds phase from its name (e.g. 'au_Anderson' or 'FeGeO3_cpx') and the chemical
+    formulas in its comments.
+    """
+    from .cif import PERIODIC_TABLE
+
+    elements = set()
+    for token in re.split(r'[\s_\-,;:()\[\]]+', name):
+        if token.capitalize() in PERIODIC_TABLE:
+            elements.add(token.capitalize())
+    for token in re.split(r'[\s_\-,;:()\[\]]+', name + ' ' + comments):
+        if token.isupper() and token.isalpha() and len(token) > 1:
+            continue  # abbreviations such as FCC or EOS
+        if FORMULA_PATTERN.fullmatch(token):
+            symbols = ELEMENT_PATTERN.findall(token)
+            if all(symbol in PERIODIC_TABLE for symbol in symbols):
+                elements.update(symbols)
+    return elements
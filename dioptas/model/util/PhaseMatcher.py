@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+import numpy as np
+from scipy.signal import find_peaks
+
+from .calc import convert_units
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseMatch(object):
+    """
+    Result of matching a phase against the peaks of a pattern.
+    """
+
+    def __init__(self, entry, score, pressure, ratio, num_matched, num_reflections, deviation):
+        self.entry = entry
+        self.score = score  # fraction of the reflection intensity (0-1) within the pattern range matching a peak
+        self.pressure = pressure
+        self.ratio = ratio  # d / d0 of the best match
+        self.num_matched = num_matched
+        self.num_reflections = num_reflections  # number of reflections within the pattern range
+        self.deviation = deviation  # mean relative d-spacing difference of the matched reflections
+
+    @property
+    def name(self):
+        return self.entry.name
+
+    def __repr__(self):
+        return "PhaseMatch({}, score={:.3f}, pressure={:.2f}, matched={}/{})".format(
+            self.name, self.score, self.pressure, self.num_matched, self.num_reflections)
+
+
+def find_pattern_peaks(x, y, unit='2th_deg', wavelength=None, min_prominence=0.02, min_width=1):
+    """
+    Finds the peaks of a (background subtracted) pattern and returns their d-spacings.
+    :param x: x values of the pattern
+    :param y: intensities of the pattern
+    :param unit: unit of x, possible values: '2th_deg', 'q_A^-1', 'd_A'
+    :param wavelength: wavelength in Angstrom, not needed for patterns in 'd_A'
+    :param min_prominence: minimum prominence of a peak relative to the intensity range of the pattern
+    :param min_width: minimum width of a peak in data points
+    :return: tuple of (sorted d-spacings, intensities) of the peaks
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    intensity_range = np.nanmax(y) - np.nanmin(y)
+    if len(y) < 3 or intensity_range <= 0:
+        return np.empty(0), np.empty(0)
+    peak_indices, _ = find_peaks(np.nan_to_num(y), prominence=min_prominence * intensity_range, width=min_width)
+    d = convert_x_to_d(x[peak_indices], unit, wavelength)
+    order = np.argsort(d)
+    return d[order], y[peak_indices][order]
+
+
+def convert_x_to_d(x, unit='2th_deg', wavelength=None):
+    """
+    Converts pattern x values into d-spacings in Angstrom, the wavelength is in Angstrom.
+    """
+    if unit == 'd_A':
+        return np.asarray(x, dtype=float)
+    return convert_units(np.asarray(x, dtype=float), wavelength * 1e-10, unit, 'd_A')
+
+
+class PhaseMatcher(object):
+    """
+    Ranks phases (PhaseLibraryEntry) by how well their reflections match a list of observed peak d-spacings.
+
+    For every phase, the reflections are scaled by a set of ratios d/d0, which are sampled such that consecutive
+    ratios differ by less than the matching tolerance. The ratios cover the compression of the phase within the
+    pressure window (calculated with the EOS of the phase) widened by an additional strain window. The scaled
+    d-spacings of all phases and ratios are stored in one flat array, matching a pattern then only needs a single
+    binary search of all of them in the sorted peak positions.
+    """
+
+    def __init__(self, entries, tolerance=2e-3, pressure_range=(0, 0), temperature=298, strain=0.0):
+        """
+        :param entries: list of PhaseLibraryEntry
+        :param tolerance: maximum relative difference (delta d / d) between a reflection and a peak
+        :param pressure_range: (minimum, maximum) pressure in GPa
+        :param temperature: temperature in K used for the EOS
+        :param strain: additional relative scaling window (e.g. 0.01 allows d/d0 to vary by +-1%), for phases
+                       without EOS or with uncertain EOS parameters
+        """
+        self.entries = list(entries)
+        self.tolerance = tolerance
+        self.pressure_range = pressure_range
+        self.temperature = temperature
+        self.strain = strain
+        self._build_index()
+
+    def _build_index(self):
+        d_spacings = []
+        intensities = []
+        group_ratios = []
+        group_pressures = []
+        group_phases = []
+        group_sizes = []
+
+        for phase_ind, entry in enumerate(self.entries):
+            phase = entry.phase
+            d0 = phase.reflections.d0
+            if len(d0) == 0:
+                continue
+            intensity = phase.reflections.intensity.astype(float)
+            ratios, pressures = self._get_ratios(phase)
+
+            d_spacings.append(np.outer(ratios, d0).ravel())
+            intensities.append(np.tile(intensity, len(ratios)))
+            group_ratios.append(ratios)
+            group_pressures.append(pressures)
+            group_phases.append(np.full(len(ratios), phase_ind))
+            group_sizes.append(np.full(len(ratios), len(d0)))
+
+        if len(d_spacings) == 0:
+            self._d = np.empty(0)
+            self._intensities = np.empty(0)
+            self._groups = np.empty(0, dtype=int)
+            self._group_ratios = np.empty(0)
+            self._group_pressures = np.empty(0)
+            self._group_phases = np.empty(0, dtype=int)
+            return
+
+        self._d = np.concatenate(d_spacings)
+        self._intensities = np.concatenate(intensities)
+        self._group_ratios = np.concatenate(group_ratios)
+        self._group_pressures = np.concatenate(group_pressures)
+        self._group_phases = np.concatenate(group_phases)
+        # every (phase, ratio) combination is a group of consecutive reflections
+        self._groups = np.repeat(np.arange(len(self._group_ratios)), np.concatenate(group_sizes))
+
+    def _get_ratios(self, phase):
+        """
+        Returns the sampled ratios d/d0 and the corresponding pressures for a phase.
+        """
+        p_min, p_max = self.pressure_range
+        if p_max > p_min and phase.params['k0'] > 0:
+            eos_pressures = np.linspace(p_min, p_max, 51)
+            try:
+                eos_ratios = (phase.calculate_volumes(eos_pressures, self.temperature) / phase.params['v0']) ** (1 / 3)
+            except ArithmeticError:
+                logger.info("Could not solve the EOS of {} for the pressure window".format(phase.name))
+                eos_pressures = np.array([0.])
+                eos_ratios = np.array([1.])
+        else:
+            eos_pressures = np.array([float(p_min) if phase.params['k0'] > 0 else 0.])
+            eos_ratios = (phase.calculate_volumes(eos_pressures, self.temperature) / phase.params['v0']) ** (1 / 3)
+
+        log_min = np.log(eos_ratios.min() * (1 - self.strain))
+        log_max = np.log(eos_ratios.max() * (1 + self.strain))
+        num_ratios = int(np.ceil((log_max - log_min) / self.tolerance)) + 1
+        ratios = np.exp(np.linspace(log_min, log_max, num_ratios))
+        # ratios decrease with pressure, np.interp needs increasing x values
+        pressures = np.interp(ratios, eos_ratios[::-1], eos_pressures[::-1])
+        return ratios, pressures
+
+    def match(self, peak_d, d_range=None, min_reflections=1):
+        """
+        Scores all phases against the observed peaks.
+        :param peak_d: d-spacings of the observed peaks
+        :param d_range: (minimum, maximum) d-spacing covered by the pattern, only reflections within this range are
+                        scored, defaults to the range of the peaks
+        :param min_reflections: minimum number of reflections of a phase within the pattern range
+        :return: list of PhaseMatch sorted by descending score, only the best ratio of every phase is reported
+        """
+        peak_d = np.sort(np.asarray(peak_d, dtype=float))
+        if len(peak_d) == 0 or len(self._d) == 0:
+            return []
+        if d_range is None:
+            d_range = (peak_d[0], peak_d[-1])
+        d_min = d_range[0] * (1 - self.tolerance)
+        d_max = d_range[1] * (1 + self.tolerance)
+
+        in_range = (self._d >= d_min) & (self._d <= d_max)
+        d = self._d[in_range]
+
+        # nearest peak of every reflection by binary search
+        right = np.clip(np.searchsorted(peak_d, d), 0, len(peak_d) - 1)
+        left = np.clip(right - 1, 0, len(peak_d) - 1)
+        deviation = np.minimum(np.abs(peak_d[right] - d), np.abs(peak_d[left] - d)) / d
+        matched = deviation <= self.tolerance
+
+        num_groups = len(self._group_ratios)
+        groups = self._groups[in_range]
+        intensities = self._intensities[in_range]
+        total_intensity = np.bincount(groups, intensities, minlength=num_groups)
+        matched_intensity = np.bincount(groups[matched], intensities[matched], minlength=num_groups)
+        num_reflections = np.bincount(groups, minlength=num_groups)
+        num_matched = np.bincount(groups[matched], minlength=num_groups)
+        mean_deviation = np.bincount(groups[matched], deviation[matched], minlength=num_groups) / \
+                         np.maximum(num_matched, 1)
+
+        valid = (num_reflections >= max(min_reflections, 1)) & (total_intensity > 0)
+        scores = np.zeros(num_groups)
+        scores[valid] = matched_intensity[valid] / total_intensity[valid]
+
+        # best group of every phase, ties are resolved by the number of matched reflections and their deviation
+        order = np.lexsort((mean_deviation, -num_matched, -scores, self._group_phases))
+        phase_starts = np.flatnonzero(np.diff(self._group_phases[order], prepend=-1))
+        best = order[phase_starts]
+        best = best[valid[best]]
+
+        results = [PhaseMatch(self.entries[self._group_phases[ind]], float(scores[ind]),
+                              float(self._group_pressures[ind]), float(self._group_ratios[ind]),
+                              int(num_matched[ind]), int(num_reflections[ind]), float(mean_deviation[ind]))
+                   for ind in best]
+        results.sort(key=lambda result: (-result.score, -result.num_matched, result.deviation))
+        return results
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .HelperModule import convert_d_to_two_theta
+
+
+class PressureCalibrationResult(object):
+    """
+    Pressures determined from the peaks of a calibrant for a series of patterns.
+    """
+
+    def __init__(self, pressures, volumes, two_theta, reflection_indices):
+        self.pressures = pressures  # one pressure per pattern in GPa, NaN if no peak was found
+        self.volumes = volumes  # unit cell volumes of the calibrant
+        self.two_theta = two_theta  # (patterns x reflections) fitted peak positions, NaN for missing peaks
+        self.reflection_indices = reflection_indices  # indices of the used reflections in the jcpds
+
+
+def determine_pressures(two_theta, data, phase, wavelength, pressure_range=(0, 100), temperature=298,
+                        window=None, min_intensity=10):
+    """
+    Determines the pressure of a calibrant for every pattern of a series at once.
+
+    First, the intensities of all patterns at the calculated reflection positions are evaluated on a pressure grid,
+    which is fine enough to move the peaks by at most one bin per step, and the pressure with the highest weighted
+    intensity is chosen for each pattern. The peak positions are then refined by the centroid of the baseline
+    corrected intensity within a window around the predicted positions (a second time with windows centered on the
+    first estimate). The cell volume is obtained from a least squares fit of the observed to the calculated
+    d-spacings and converted into pressure with the EOS of the calibrant.
+
+    :param two_theta: equidistant two theta values of the patterns in degree
+    :param data: (patterns x two theta) array of (background subtracted) intensities
+    :param phase: calibrant jcpds object with an EOS
+    :param wavelength: wavelength in Angstrom
+    :param pressure_range: pressure range in GPa which is searched for the pressures
+    :param temperature: temperature in K
+    :param window: half width of the peak windows in degree, defaults to three times the standard deviation of the
+                   peaks estimated from the data
+    :param min_intensity: minimum relative intensity (0-100) of the reflections which are used
+    :return: PressureCalibrationResult
+    :rtype: PressureCalibrationResult
+    """
+    two_theta = np.asarray(two_theta, dtype=float)
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    step = (two_theta[-1] - two_theta[0]) / (len(two_theta) - 1)
+
+    d_ambient = phase.compute_d(np.zeros(1), 298.)[0]
+    coarse_pressures = np.linspace(pressure_range[0], pressure_range[1], 2)
+    two_theta_limits = convert_d_to_two_theta(phase.compute_d(coarse_pressures, temperature), wavelength)
+
+    # only use reflections, which stay within the pattern over the whole pressure range
+    intensity = phase.reflections.intensity.astype(float)
+    margin = 10 * step if window is None else window
+    usable = (np.min(two_theta_limits, axis=0) > two_theta[0] + margin) & \
+             (np.max(two_theta_limits, axis=0) < two_theta[-1] - margin) & \
+             (intensity >= min_intensity * np.max(intensity) / 100.)
+    reflection_indices = np.flatnonzero(usable)
+    num_patterns = data.shape[0]
+    if len(reflection_indices) == 0:
+        nan = np.full(num_patterns, np.nan)
+        return PressureCalibrationResult(nan, nan.copy(), np.full((num_patterns, 0), np.nan), reflection_indices)
+
+    d_ambient = d_ambient[reflection_indices]
+    weights = intensity[reflection_indices]
+
+    # the peaks move by at most one bin between two pressures of the grid
+    max_shift = np.max(np.abs(np.diff(two_theta_limits[:, reflection_indices], axis=0)))
+    num_pressures = int(min(max(np.ceil(max_shift / step), 1), 5000)) + 1
+    pressures = np.linspace(pressure_range[0], pressure_range[1], num_pressures)
+    grid_two_theta = convert_d_to_two_theta(phase.compute_d(pressures, temperature)[:, reflection_indices],
+                                            wavelength)
+    grid_indices = np.rint((grid_two_theta - two_theta[0]) / step).astype(int)
+
+    # (patterns x pressures) scores
+    scores = data[:, grid_indices.ravel()].reshape(num_patterns, num_pressures, -1) @ weights
+    predicted_indices = grid_indices[np.argmax(scores, axis=1)]
+
+    if window is None:
+        # the second moment within a too small window underestimates the width, the window is therefore adapted
+        # to the estimate a few times
+        width_window = 10
+        for _ in range(3):
+            sigma = estimate_peak_width(two_theta, data, predicted_indices, width_window)
+            width_window = max(2, int(round(4 * sigma / step)))
+        window = 3 * sigma
+    half_width = max(2, int(round(window / step)))
+
+    peak_two_theta = fit_peak_centroids(two_theta, data, predicted_indices, half_width)
+    # a second centroid with windows centered on the first estimate removes most of the bias of off-center windows
+    centered_indices = np.rint((np.nan_to_num(peak_two_theta, nan=0) - two_theta[0]) / step).astype(int)
+    centered_indices = np.where(np.isfinite(peak_two_theta), centered_indices, predicted_indices)
+    peak_two_theta = fit_peak_centroids(two_theta, data, centered_indices, half_width)
+    d_observed = wavelength / (2 * np.sin(np.radians(peak_two_theta / 2)))
+
+    # least squares ratio between observed and ambient d-spacings, missing peaks have no weight
+    valid = np.isfinite(d_observed)
+    d_observed_valid = np.where(valid, d_observed, 0)
+    weights_valid = np.where(valid, weights, 0)
+    denominator = (weights_valid * d_ambient ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = (weights_valid * d_observed_valid * d_ambient).sum(axis=1) / denominator
+    volumes = phase.params['v0'] * ratios ** 3
+    with np.errstate(invalid='ignore'):
+        result_pressures = phase.calculate_pressures(volumes, temperature)
+    return PressureCalibrationResult(result_pressures, volumes, peak_two_theta, reflection_indices)
+
+
+def fit_peak_centroids(x, data, peak_indices, half_width):
+    """
+    Refines peak positions of many patterns at once by the centroid of the intensity within windows around the
+    given indices, after subtracting the linear baseline through the window edges.
+
+    :param x: equidistant x values
+    :param data: (patterns x len(x)) array of intensities
+    :param peak_indices: (patterns x peaks) array of starting indices
+    :param half_width: half width of the windows in bins
+    :return: (patterns x peaks) array of peak positions, NaN where the window contains no intensity above the
+             baseline
+    """
+    return _calculate_window_moments(x, data, peak_indices, half_width)[0]
+
+
+def estimate_peak_width(x, data, peak_indices, half_width):
+    """
+    Estimates the common standard deviation of the peaks from the second moment of the baseline corrected
+    intensity within windows around the given indices (median over all patterns and peaks).
+    """
+    sigma = _calculate_window_moments(x, data, peak_indices, half_width)[1]
+    if not np.any(np.isfinite(sigma)):
+        return half_width * (x[1] - x[0]) / 3.
+    return np.nanmedian(sigma)
+
+
+def _calculate_window_moments(x, data, peak_indices, half_width):
+    offsets = np.arange(-half_width, half_width + 1)
+    indices = np.clip(peak_indices[..., np.newaxis] + offsets, 0, len(x) - 1)
+    window = np.take_along_axis(data[:, np.newaxis, :], indices, axis=2)
+
+    baseline = window[..., :1] + (window[..., -1:] - window[..., :1]) * (offsets + half_width) / (2 * half_width)
+    window = np.clip(window - baseline, 0, None)
+    total = window.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positions = (window * x[indices]).sum(axis=2) / total
+        sigma = np.sqrt((window * (x[indices] - positions[..., np.newaxis]) ** 2).sum(axis=2) / total)
+    positions[total <= 0] = np.nan
+    sigma[total <= 0] = np.nan
+    return positions, sigma
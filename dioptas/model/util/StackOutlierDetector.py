@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from scipy import ndimage
+
+MAD_TO_SIGMA = 1.4826
+
+
+class StackOutlierDetector(object):
+    """
+    Detects bad pixels and per-frame outliers (cosmic rays, zingers) from per-pixel statistics over a series of
+    images in a single pass.
+
+    The frames are collected in blocks of block_size frames. For every completed block, the per-pixel median and
+    median absolute deviation (MAD) are calculated and every frame of the block is compared to them, pixels which
+    are more than outlier_sigma robust standard deviations above the median are stored as outliers of that frame.
+    The block medians and MADs are then combined into series estimates with the remedian algorithm, so the memory
+    needed is bounded by a few blocks independent of the length of the series.
+
+    The static bad pixel mask contains hot pixels (series median far above the median of the neighborhood) and
+    stuck pixels (identical value in all frames).
+    """
+
+    def __init__(self, block_size=7, outlier_sigma=8.0, hot_sigma=10.0, min_sigma=1.0, row_chunk=256):
+        """
+        :param block_size: number of frames used for the per-pixel statistics of one block
+        :param outlier_sigma: threshold for per-frame outliers in robust standard deviations above the block median
+        :param hot_sigma: threshold for hot pixels in robust standard deviations above the median of the neighbors
+        :param min_sigma: lower limit of the robust standard deviation, prevents pixels with a MAD of 0 to be flagged
+                          for any deviation
+        :param row_chunk: number of image rows for which the block median is calculated at once, limits the size
+                          of temporary arrays
+        """
+        self.block_size = block_size
+        self.outlier_sigma = outlier_sigma
+        self.hot_sigma = hot_sigma
+        self.min_sigma = min_sigma
+        self.row_chunk = row_chunk
+        self.reset()
+
+    def reset(self):
+        self.num_frames = 0
+        self.shape = None
+        self._block = None
+        self._block_keys = []
+        self._last_block_stats = None
+        self._median_levels = [[]]
+        self._mad_levels = [[]]
+        self._min = None
+        self._max = None
+        self._frame_outliers = {}
+
+    def add_frame(self, frame, key=None):
+        """
+        Adds a frame of the series. The outliers of the frame are available after the block of the frame is
+        completed or finish() is called.
+
+        :param frame: 2D image array
+        :param key: key for retrieving the outlier mask of this frame, defaults to the running frame index
+        """
+        frame = np.asarray(frame)
+        if self.shape is None:
+            self.shape = frame.shape
+            self._block = np.empty((self.block_size,) + self.shape, dtype=np.float32)
+            self._min = frame.copy()
+            self._max = frame.copy()
+        elif frame.shape != self.shape:
+            raise ValueError("Frame shape {} does not match the series shape {}".format(frame.shape, self.shape))
+        else:
+            np.minimum(self._min, frame, out=self._min)
+            np.maximum(self._max, frame, out=self._max)
+
+        if key is None:
+            key = self.num_frames
+        self._block[len(self._block_keys)] = frame
+        self._block_keys.append(key)
+        self.num_frames += 1
+
+        if len(self._block_keys) == self.block_size:
+            self._process_block()
+
+    def finish(self):
+        """
+        Processes the remaining frames of an incomplete block. Blocks with less than 3 frames are compared to the
+        statistics of the previous block, since their own median is not robust.
+        """
+        num_block_frames = len(self._block_keys)
+        if num_block_frames == 0:
+            return
+        if num_block_frames >= 3 or self._last_block_stats is None:
+            self._process_block()
+        else:
+            median, mad = self._last_block_stats
+            for frame, key in zip(self._block, self._block_keys):
+                self._store_outliers(frame, key, median, mad)
+            self._block_keys = []
+
+    @property
+    def median(self):
+        """Estimated per-pixel median of the series."""
+        return self._remedian_estimate(self._median_levels)
+
+    @property
+    def mad(self):
+        """Estimated per-pixel median absolute deviation of the series."""
+        return self._remedian_estimate(self._mad_levels)
+
+    def get_static_mask(self):
+        """
+        Returns the mask of hot and stuck pixels of the series.
+        """
+        median = self.median
+        mad = self.mad
+        if median is None:
+            return None
+        sigma = np.maximum(MAD_TO_SIGMA * ndimage.median_filter(mad, size=5), self.min_sigma)
+        hot = (median - ndimage.median_filter(median, size=5)) > self.hot_sigma * sigma
+        if self.num_frames > 1:
+            stuck = self._min == self._max
+            return np.logical_or(hot, stuck)
+        return hot
+
+    def get_frame_mask(self, key):
+        """
+        Returns the outlier mask of a frame or None if the frame is unknown (or its block was not processed yet).
+        """
+        indices = self._frame_outliers.get(key)
+        if indices is None:
+            return None
+        mask = np.zeros(self.shape, dtype=bool)
+        mask.flat[indices] = True
+        return mask
+
+    def get_num_outliers(self, key):
+        indices = self._frame_outliers.get(key)
+        return 0 if indices is None else len(indices)
+
+    def _process_block(self):
+        block = self._block[:len(self._block_keys)]
+        median = np.empty(self.shape, dtype=np.float32)
+        mad = np.empty(self.shape, dtype=np.float32)
+        for row in range(0, self.shape[0], self.row_chunk):
+            chunk = block[:, row:row + self.row_chunk]
+            median[row:row + self.row_chunk] = np.median(chunk, axis=0)
+            mad[row:row + self.row_chunk] = np.median(np.abs(chunk - median[row:row + self.row_chunk]), axis=0)
+
+        # the MAD of only a few frames is noisy, the noise level is therefore taken as the larger of the pixel's own
+        # MAD and the median MAD of its 5x5 neighborhood
+        noise_mad = np.maximum(mad, ndimage.median_filter(mad, size=5))
+        for frame, key in zip(block, self._block_keys):
+            self._store_outliers(frame, key, median, noise_mad)
+
+        self._last_block_stats = (median, noise_mad)
+        self._push_remedian(self._median_levels, median)
+        self._push_remedian(self._mad_levels, mad)
+        self._block_keys = []
+
+    def _store_outliers(self, frame, key, median, mad):
+        threshold = np.maximum(MAD_TO_SIGMA * mad, self.min_sigma)
+        threshold *= self.outlier_sigma
+        self._frame_outliers[key] = np.flatnonzero((frame - median) > threshold)
+
+    def _push_remedian(self, levels, estimate):
+        level = 0
+        while True:
+            levels[level].append(estimate)
+            if len(levels[level]) < self.block_size:
+                return
+            estimate = np.median(np.array(levels[level]), axis=0)
+            levels[level] = []
+            level += 1
+            if level == len(levels):
+                levels.append([])
+
+    @staticmethod
+    def _remedian_estimate(levels):
+        estimates = [estimate for level in levels for estimate in level]
+        if len(estimates) == 0:
+            return None
+        if len(estimates) == 1:
+            return estimates[0]
+        return np.median(np.array(estimates), axis=0)
@@ -18,6 +18,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 
@@ -84,3 +87,83 @@ def trim_trailing_zeros(x, y):
     x_trim = x[:len(y_trim)]
 
     return x_trim, y_trim
+
+
+def get_corrected_img_dtype(img_data, background_data=None, corrections=None, factor=1):
+    """
+    Determines the dtype of the corrected image data. Background subtraction and corrections are calculated in
+    floating point with at least float32 precision, integer images are therefore converted to float32 (16 bit and
+    smaller) or float64. Without background and corrections the dtype of img_data * factor is kept.
+    """
+    if background_data is None and corrections is None:
+        return np.result_type(img_data, factor)
+    dtypes = [np.float32, img_data.dtype]
+    if background_data is not None:
+        dtypes.append(background_data.dtype)
+    if corrections is not None:
+        dtypes.append(corrections.dtype)
+    return np.result_type(*dtypes)
+
+
+_correction_executors = {}
+
+
+def _get_correction_executor(max_workers):
+    # the thread pools are kept alive, since starting the threads for every frame is slower than the correction
+    if max_workers not in _correction_executors:
+        _correction_executors[max_workers] = ThreadPoolExecutor(max_workers=max_workers)
+    return _correction_executors[max_workers]
+
+
+def correct_img_data(img_data, background_data=None, background_scaling=1, background_offset=0,
+                     corrections=None, factor=1, out=None, block_rows=64, max_workers=None):
+    """
+    Calculates (img_data - (background_scaling * background_data + background_offset)) / corrections * factor
+    in a single pass over blocks of image rows. Every block is processed in place in the output array, therefore
+    no full size temporary arrays are created and the blocks stay in the CPU cache between the operations. The
+    blocks are distributed over a thread pool, numpy releases the GIL for the arithmetic.
+
+    :param img_data: 2D raw image array
+    :param background_data: background image with the same shape or None
+    :param background_scaling: scaling of the background image
+    :param background_offset: offset added to the scaled background
+    :param corrections: array the image gets divided by (e.g. the product of all image corrections) or None
+    :param factor: scaling factor applied to the final result
+    :param out: preallocated output array, which is used if it has the right shape and dtype
+                (see get_corrected_img_dtype)
+    :param block_rows: number of image rows processed at once
+    :param max_workers: number of threads, defaults to the number of CPUs, 1 processes all blocks in the
+                        calling thread
+    :return: the corrected image
+    """
+    dtype = get_corrected_img_dtype(img_data, background_data, corrections, factor)
+    if out is None or out.shape != img_data.shape or out.dtype != dtype:
+        out = np.empty(img_data.shape, dtype=dtype)
+
+    def process_block(start):
+        rows = slice(start, start + block_rows)
+        block = out[rows]
+        if background_data is not None:
+            block[...] = background_data[rows]
+            if background_scaling != 1:
+                np.multiply(block, background_scaling, out=block)
+            if background_offset != 0:
+                np.add(block, background_offset, out=block)
+            np.subtract(img_data[rows], block, out=block)
+        else:
+            block[...] = img_data[rows]
+        if corrections is not None:
+            np.divide(block, corrections[rows], out=block)
+        if factor != 1:
+            np.multiply(block, factor, out=block)
+
+    starts = range(0, img_data.shape[0], block_rows)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers == 1 or len(starts) == 1:
+        for start in starts:
+            process_block(start)
+    else:
+        # list() waits for all blocks and raises exceptions of the workers
+        list(_get_correction_executor(max_workers).map(process_block, starts))
+    return out
@@ -19,8 +19,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import itertools
-from math import degrees
+import re
 from urllib.request import pathname2url
 
 from CifFile import ReadCif
@@ -28,6 +27,7 @@ from .jcpds import jcpds
 from ... import data_path
 
 import numpy as np
+from scipy.spatial import cKDTree
 import json
 
 with open(os.path.join(data_path, "atomic_scattering_params.json")) as f:
@@ -60,9 +60,7 @@ class CifConverter(object):
         :return: converted jcpds object
         :rtype: jcpds
         """
-        file_url = 'file:' + pathname2url(filename)
-        cif_file = ReadCif(file_url)
-        cif_phase = CifPhase(cif_file[cif_file.keys()[0]])
+        cif_phase = read_cif_phase(filename)
         jcpds_phase = self.convert_cif_phase_to_jcpds(cif_phase)
         jcpds_phase.filename = filename
         jcpds_phase.name = os.path.splitext(os.path.basename(filename))[0]
@@ -78,16 +76,15 @@ class CifConverter(object):
         :return: converted jcpds object
         :rtype: jcpds
         """
-        reflections = self._calculate_hkl_within_sphere_and_min_d_spacing(cif_phase)
-        xrd_reflections = self._calculate_reflection_intensities(cif_phase, reflections)
+        hkl, d_hkl = self._calculate_hkl_within_sphere_and_min_d_spacing(cif_phase)
+        xrd_reflections = self._calculate_reflection_intensities(cif_phase, hkl, d_hkl)
         jcpds_phase = self._create_jcpds_from_cif_parameters(cif_phase)
 
-        for reflection in xrd_reflections:
-            jcpds_phase.add_reflection(reflection.h,
-                                       reflection.k,
-                                       reflection.l,
-                                       reflection.intensity,
-                                       reflection.d_spacing)
+        jcpds_phase.add_reflections([reflection.h for reflection in xrd_reflections],
+                                    [reflection.k for reflection in xrd_reflections],
+                                    [reflection.l for reflection in xrd_reflections],
+                                    [reflection.intensity for reflection in xrd_reflections],
+                                    [reflection.d_spacing for reflection in xrd_reflections])
         return jcpds_phase
 
     def _create_jcpds_from_cif_parameters(self, cif_phase):
@@ -114,41 +111,37 @@ class CifConverter(object):
 
     def _calculate_hkl_within_sphere_and_min_d_spacing(self, cif_phase):
         """
-        Generates a list of hkl reflections which can satisfy the diffraction condition using the given wavelength and
+        Generates all hkl reflections which can satisfy the diffraction condition using the given wavelength and
         also the minimum d spacing
-        :return: list of reflections
-        :rtype: list[Reflection]
+        :return: (n x 3) integer array of hkl and array of the corresponding d-spacings
         """
-        max_h = np.floor(2 * cif_phase.a / self.wavelength)
-        max_k = np.floor(2 * cif_phase.b / self.wavelength)
-        max_l = np.floor(2 * cif_phase.c / self.wavelength)
-
-        h = reversed(np.arange(-max_h + 1, max_h, 1))
-        k = reversed(np.arange(-max_k + 1, max_k, 1))
-        l = reversed(np.arange(-max_l + 1, max_l, 1))
-        s = [h, k, l]
-
-        reciprocal_hkl = np.array(list(itertools.product(*s)))
-        h = reciprocal_hkl[:, 0]
-        k = reciprocal_hkl[:, 1]
-        l = reciprocal_hkl[:, 2]
+        max_h = int(np.floor(2 * cif_phase.a / self.wavelength))
+        max_k = int(np.floor(2 * cif_phase.b / self.wavelength))
+        max_l = int(np.floor(2 * cif_phase.c / self.wavelength))
 
-        d_hkl = compute_d_hkl(h, k, l, cif_phase)
-        good_indices = np.argwhere(d_hkl > self.min_d_spacing)
+        # same order as itertools.product of descending h, k and l
+        h, k, l = np.meshgrid(np.arange(max_h - 1, -max_h, -1),
+                              np.arange(max_k - 1, -max_k, -1),
+                              np.arange(max_l - 1, -max_l, -1), indexing='ij')
+        hkl = np.stack((h.ravel(), k.ravel(), l.ravel()), axis=1)
 
-        reflections = []
-        for i in good_indices:
-            reflections.append(Reflection(int(h[i][0]), int(k[i][0]), int(l[i][0]), d_hkl[i][0]))
+        with np.errstate(divide='ignore'):  # (0, 0, 0) has an infinite d-spacing
+            d_hkl = compute_d_hkl(hkl[:, 0], hkl[:, 1], hkl[:, 2], cif_phase)
+        good_indices = d_hkl > self.min_d_spacing
 
-        return reflections
+        return hkl[good_indices], d_hkl[good_indices]
 
-    def _calculate_reflection_intensities(self, cif_phase, base_reflections):
+    def _calculate_reflection_intensities(self, cif_phase, hkl, d_hkl):
         """
+        Calculates the intensities of all reflections at once and merges reflections with the same two theta into
+        one peak.
         :param cif_phase:
-        :param base_reflections:
-        :return:
+        :param hkl: (n x 3) array of hkl
+        :param d_hkl: d-spacings of the reflections
+        :return: list of reflections with intensity above min_intensity, sorted by two theta
+        :rtype: list[Reflection]
         """
-        # provide atom parameters as lists
+        # provide atom parameters as arrays
         atom_numbers = []
         form_coefficients = []
         fractional_coordinates = []
@@ -170,53 +163,65 @@ class CifConverter(object):
         fractional_coordinates = np.array(fractional_coordinates)
         occupancies = np.array(occupancies)
 
-        two_thetas = []
-        peaks = {}
-
-        for reflection in base_reflections:
-            d_hkl = reflection.d_spacing
-            g_hkl = 1. / d_hkl
-            if g_hkl != 0:
-                hkl = np.array([reflection.h, reflection.k, reflection.l])
-
-                s = g_hkl * 0.5
-                s2 = s ** 2
-
-                theta = np.arcsin(self.wavelength * g_hkl * 0.5)
-                two_theta = degrees(2 * theta)
-
-                g_dot_r = np.dot(fractional_coordinates, np.transpose([hkl])).T[0]
-
-                fs = atom_numbers - 41.78214 * s2 * np.sum(
-                    form_coefficients[:, :, 0] * np.exp(-form_coefficients[:, :, 1] * s2), axis=1)
-                f_hkl = np.sum(fs * occupancies * np.exp(2j * np.pi * g_dot_r))
-                i_hkl = (f_hkl * f_hkl.conjugate()).real
-
-                ind = np.where(np.abs(np.subtract(two_thetas, two_theta)) < CifConverter.TWO_THETA_TOL)
-
-                lorentz_factor = (1 + np.cos(2 * theta) ** 2) / (np.sin(theta) ** 2 * np.cos(theta))
-
-                if len(ind[0]) > 0:
-                    peak_ind = two_thetas[ind[0][0]]
-                    peaks[peak_ind][0] += i_hkl * lorentz_factor
-                    peaks[peak_ind][1].append(tuple(hkl))
-                else:
-                    peaks[two_theta] = [i_hkl * lorentz_factor, [tuple(hkl)], d_hkl]
-                    two_thetas.append(two_theta)
-
-        max_intensity = max([v[0] for v in peaks.values()])
+        g_hkl = 1. / d_hkl
+        valid = g_hkl != 0
+        hkl = hkl[valid]
+        d_hkl = d_hkl[valid]
+        g_hkl = g_hkl[valid]
+
+        s2 = (g_hkl * 0.5) ** 2
+        theta = np.arcsin(self.wavelength * g_hkl * 0.5)
+        two_theta = np.degrees(2 * theta)
+        lorentz_factor = (1 + np.cos(2 * theta) ** 2) / (np.sin(theta) ** 2 * np.cos(theta))
+
+        intensities = np.empty(len(hkl))
+        # the reflections are processed in chunks, to limit the size of the (reflections x atoms) arrays
+        chunk_size = max(1, 2 ** 20 // max(1, len(atom_numbers)))
+        for start in range(0, len(hkl), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            s2_chunk = s2[chunk, np.newaxis, np.newaxis]
+            fs = atom_numbers - 41.78214 * s2_chunk[:, :, 0] * np.sum(
+                form_coefficients[:, :, 0] * np.exp(-form_coefficients[:, :, 1] * s2_chunk), axis=2)
+            phases = np.exp(2j * np.pi * (hkl[chunk] @ fractional_coordinates.T))
+            f_hkl = np.sum(fs * occupancies * phases, axis=1)
+            intensities[chunk] = (f_hkl * f_hkl.conjugate()).real * lorentz_factor[chunk]
+
+        # merge reflections with the same two theta: sort by two theta and start a new peak, where the two theta is
+        # TWO_THETA_TOL above the first reflection of the current peak
+        order = np.argsort(two_theta, kind='stable')
+        sorted_two_theta = two_theta[order]
+        peak_index = np.empty(len(order), dtype=int)
+        peak_start = 0
+        num_peaks = 0
+        while peak_start < len(order):
+            peak_end = np.searchsorted(sorted_two_theta, sorted_two_theta[peak_start] + CifConverter.TWO_THETA_TOL)
+            peak_index[peak_start:peak_end] = num_peaks
+            num_peaks += 1
+            peak_start = peak_end
+
+        # within a peak the reflections keep their original order, the first one gives the d spacing
+        order = order[np.lexsort((order, peak_index))]
+        peak_starts = np.flatnonzero(np.diff(peak_index, prepend=-1))
+        peak_intensities = np.add.reduceat(intensities[order], peak_starts)
+        first_reflections = order[peak_starts]
+
+        peak_order = np.argsort(two_theta[first_reflections], kind='stable')
+        peak_ends = np.append(peak_starts[1:], len(order))
+
+        max_intensity = np.max(peak_intensities)
         calculated_reflections = []
-        for k in sorted(peaks.keys()):
-            v = peaks[k]
-            scaled_intensity = v[0] / max_intensity * 100
-            fam = get_unique_families(v[1])
+        for i in peak_order:
+            scaled_intensity = peak_intensities[i] / max_intensity * 100
             if scaled_intensity > self.min_intensity:
+                hkls = [tuple(int(v) for v in hkl[ind]) for ind in order[peak_starts[i]:peak_ends[i]]]
+                fam = get_unique_families(hkls)
+                family = list(fam.keys())[0]
                 calculated_reflections.append(
                     Reflection(
-                        *list(fam.keys())[0],
-                        d_spacing=v[2],
+                        *family,
+                        d_spacing=d_hkl[first_reflections[i]],
                         intensity=scaled_intensity,
-                        multiplicity=fam[list(fam.keys())[0]]
+                        multiplicity=fam[family]
                     )
                 )
 
@@ -297,22 +302,15 @@ def get_unique_families(hkls):
         {hkl: multiplicity}: A dict with unique hkl and multiplicity.
     """
 
-    # TODO: Definitely can be sped up.
-    def is_perm(hkl1, hkl2):
-        h1 = map(abs, hkl1)
-        h2 = map(abs, hkl2)
-        return all([i == j for i, j in zip(sorted(h1), sorted(h2))])
-
     unique = {}
-    for hkl1 in hkls:
-        found = False
-        for hkl2 in unique.keys():
-            if is_perm(hkl1, hkl2):
-                found = True
-                unique[hkl2] += 1
-                break
-        if not found:
-            unique[hkl1] = 1
+    family_keys = {}
+    for hkl in hkls:
+        key = tuple(sorted(abs(i) for i in hkl))
+        if key in family_keys:
+            unique[family_keys[key]] += 1
+        else:
+            family_keys[key] = hkl
+            unique[hkl] = 1
 
     return unique
 
@@ -373,9 +371,6 @@ class CifPhase(object):
         elif '_space_group_symop_operation_xyz' in cif_dictionary.keys():
             self.symmetry_operations = cif_dictionary['_space_group_symop_operation_xyz']
 
-        for i in range(len(self.symmetry_operations)):
-            self.symmetry_operations[i] = self.symmetry_operations[i].replace("/", "./")
-
         self._atom_labels = cif_dictionary['_atom_site_label']
         self._atom_x = [float(convert_cif_number_to_float(s)) for s in cif_dictionary['_atom_site_fract_x']]
         self._atom_y = [float(convert_cif_number_to_float(s)) for s in cif_dictionary['_atom_site_fract_y']]
@@ -406,45 +401,45 @@ class CifPhase(object):
             self.atoms[i] = (name, xn, yn, zn, occu)
 
     def generate_symmetry_equivalents(self):
-        # The CIF file consists of a few atom positions plus several "symmetry
-        # operations" that indicate the other atom positions within the unit cell.  So
-        # using these operations, create copies of the atoms until no new copies can be
-        # made.
-
-        # Two atoms are on top of each other if they are less than "eps" away.
-        eps = 0.0001  # in Angstrom
-
-        # For each atom, apply each symmetry operation to create a new atom.
-        i = 0
-        while (i < len(self.atoms)):
-
-            label, x, y, z, occu = self.atoms[i]
-
-            for op in self.symmetry_operations:
-
-                # Python is awesome: calling e.g. eval('x,y,1./2+z') will convert the
-                # string into a 3-tuple using the current values for x,y,z!
-                xn, yn, zn = eval(op)
-
-                # Make sure that the new atom lies within the unit cell.
-                xn = (xn + 10.0) % 1.0
-                yn = (yn + 10.0) % 1.0
-                zn = (zn + 10.0) % 1.0
-
-                # Check if the new position is actually new, or the same as a previous
-                # atom.
-                new_atom = True
-                for at in self.atoms:
-                    if (abs(at[1] - xn) < eps and abs(at[2] - yn) < eps and abs(at[3] - zn) < eps) \
-                            and at[0] == label:
-                        new_atom = False
-
-                # If the atom is new, add it to the list!
-                if (new_atom):
-                    self.atoms.append((label, xn, yn, zn, occu))  # add a 4-tuple
-
-            # Update the loop iterator.
-            i += 1
+        """
+        The CIF file consists of a few atom positions plus several "symmetry operations" that indicate the other atom
+        positions within the unit cell. The operations are applied to all atoms at once, new atoms are added and
+        the operations are applied again to those, until no new atoms are created.
+        """
+        # Two atoms are on top of each other if all fractional coordinates are less than "eps" apart.
+        eps = 0.0001
+
+        rotations, translations = parse_symmetry_operations(self.symmetry_operations)
+
+        labels = [atom[0] for atom in self.atoms]
+        label_indices = {label: ind for ind, label in enumerate(dict.fromkeys(labels))}
+        atom_labels = np.array([label_indices[label] for label in labels], dtype=int)
+        positions = np.array([atom[1:4] for atom in self.atoms], dtype=float).reshape(-1, 3)
+        occupancies = np.array([atom[4] for atom in self.atoms], dtype=float)
+
+        new_atoms = np.arange(len(positions))
+        while len(new_atoms) > 0:
+            # apply all operations to the atoms added in the last iteration, ordered by atom and then operation
+            candidates = np.einsum('oij,nj->noi', rotations, positions[new_atoms]) + translations
+            candidates = ((candidates + 10.0) % 1.0).reshape(-1, 3)
+            candidate_atoms = np.repeat(new_atoms, len(rotations))
+
+            # the label is added as 4th coordinate, so that only atoms of the same type can be on top of each other
+            points = np.column_stack((np.concatenate((positions, candidates)),
+                                      2 * np.concatenate((atom_labels, atom_labels[candidate_atoms]))))
+            pairs = cKDTree(points).query_pairs(eps, p=np.inf, output_type='ndarray')
+            duplicate = np.zeros(len(points), dtype=bool)
+            duplicate[pairs.max(axis=1)] = True  # the first of the overlapping atoms is kept
+            keep = ~duplicate[len(positions):]
+
+            new_atoms = np.arange(len(positions), len(positions) + np.count_nonzero(keep))
+            positions = np.concatenate((positions, candidates[keep]))
+            atom_labels = np.concatenate((atom_labels, atom_labels[candidate_atoms[keep]]))
+            occupancies = np.concatenate((occupancies, occupancies[candidate_atoms[keep]]))
+
+        label_names = list(label_indices.keys())
+        self.atoms = [(label_names[label], x, y, z, occu) for label, (x, y, z), occu in
+                      zip(atom_labels.tolist(), positions.tolist(), occupancies.tolist())]
 
         # Sort the atoms according to type alphabetically.
         self.atoms = sorted(self.atoms, key=lambda at: at[0])
@@ -553,6 +548,64 @@ class CifPhase(object):
             self.comments += self.cif_dictionary['_database_code_amcsd']
 
 
+SYMMETRY_OPERATION_TERM = re.compile(r'([+-]?)(?:(\d+\.?\d*|\.\d+)(?:/(\d+\.?\d*|\.\d+))?)?\*?([xyz]?)')
+
+
+def read_cif_phase(filename):
+    """
+    Reads the first phase of a cif file.
+    :param filename: cif filename
+    :rtype: CifPhase
+    """
+    file_url = 'file:' + pathname2url(filename)
+    cif_file = ReadCif(file_url)
+    return CifPhase(cif_file[cif_file.keys()[0]])
+
+
+def parse_symmetry_operation(operation):
+    """
+    Converts a symmetry operation given as string, e.g. '-y, x-y, z+1/3', into an affine transformation.
+    :param operation: symmetry operation string
+    :return: rotation matrix (3x3) and translation vector (3)
+    """
+    rotation = np.zeros((3, 3))
+    translation = np.zeros(3)
+    components = operation.lower().replace(' ', '').strip("'\"").split(',')
+    if len(components) != 3:
+        raise ValueError("Unable to parse symmetry operation '{}'".format(operation))
+
+    for row, component in enumerate(components):
+        pos = 0
+        while pos < len(component):
+            match = SYMMETRY_OPERATION_TERM.match(component, pos)
+            sign, numerator, denominator, axis = match.groups()
+            if match.end() == pos or (pos > 0 and sign == '') or (numerator is None and axis == ''):
+                raise ValueError("Unable to parse symmetry operation '{}'".format(operation))
+            value = -1. if sign == '-' else 1.
+            if numerator is not None:
+                value *= float(numerator)
+                if denominator is not None:
+                    value /= float(denominator)
+            if axis:
+                rotation[row, 'xyz'.index(axis)] += value
+            else:
+                translation[row] += value
+            pos = match.end()
+    return rotation, translation
+
+
+def parse_symmetry_operations(operations):
+    """
+    Converts a list of symmetry operation strings into stacked affine transformations.
+    :return: rotation matrices (n x 3 x 3) and translation vectors (n x 3)
+    """
+    rotations = np.empty((len(operations), 3, 3))
+    translations = np.empty((len(operations), 3))
+    for ind, operation in enumerate(operations):
+        rotations[ind], translations[ind] = parse_symmetry_operation(operation)
+    return rotations, translations
+
+
 def number_between(number, low, high):
     """
     Tests if a number is in between low and high, whereby low and high are included  [low, high]
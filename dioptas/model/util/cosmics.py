@@ -58,10 +58,12 @@ Malte Tewes, January 2010
 __version__ = '0.4'
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import math
 import scipy.signal as signal
 import scipy.ndimage as ndimage
+from numpy.lib.stride_tricks import sliding_window_view
 
 # We define the laplacian kernel to be used
 laplkernel = np.array([[0.0, -1.0, 0.0], [-1.0, 4.0, -1.0], [0.0, -1.0, 0.0]])
@@ -116,7 +118,7 @@ class cosmicsimage:
         # In lacosmiciteration() we work on this guy
         self.cleanarray = self.rawarray.copy()
         # All False, no cosmics yet
-        self.mask = np.cast['bool'](np.zeros(self.rawarray.shape))
+        self.mask = np.zeros(self.rawarray.shape, dtype=bool)
 
         self.gain = gain
         self.readnoise = readnoise
@@ -133,6 +135,13 @@ class cosmicsimage:
         # a mask of the saturated stars, only calculated if required
         self.satstars = None
 
+        # median filtered images of the previous iteration (noise model and fine structure image) and the pixels of
+        # cleanarray changed since then. They are used to only update the medians around cleaned pixels.
+        self._m5 = None
+        self._m3 = None
+        self._m37 = None
+        self._changed = None
+
     def __str__(self):
         """
         Gives a summary of the current state, including the number of cosmic pixels in the mask etc.
@@ -217,7 +226,7 @@ class cosmicsimage:
         """
         Given the mask, we replace the actual problematic pixels with the masked 5x5 median value.
         This mimics what is done in L.A.Cosmic, but it's a bit harder to do in python, as there is no
-        readymade masked median. So for now we do a loop...
+        readymade masked median. So all 5x5 cutouts are collected and the median is taken without the flagged pixels.
         Saturated stars, if calculated, are also masked : they are not "cleaned", but their pixels are not
         used for the interpolation.
 
@@ -236,55 +245,57 @@ class cosmicsimage:
             "Cleaning cosmic affected pixels ..."
 
         # So... mask is a 2D array containing False and True, where True means "here is a cosmic"
-        # We want to loop through these cosmics one by one.
-        cosmicindices = np.argwhere(mask)
-        # This is a list of the indices of cosmic affected pixels.
-        # print cosmicindices
+        cosmicindices = np.nonzero(mask)
 
-        # We put cosmic ray pixels to np.Inf to flag them :
-        self.cleanarray[mask] = np.Inf
+        # We put cosmic ray pixels to np.inf to flag them :
+        self.cleanarray[mask] = np.inf
 
         # Now we want to have a 2 pixel frame of Inf padding around our image.
         w = self.cleanarray.shape[0]
         h = self.cleanarray.shape[1]
-        padarray = np.zeros((w + 4, h + 4)) + np.Inf
+        padarray = np.zeros((w + 4, h + 4)) + np.inf
         # that copy is important, we need 2 independent arrays
         padarray[2:w + 2, 2:h + 2] = self.cleanarray.copy()
 
-        # The medians will be evaluated in this padarray, skipping the np.Inf.
+        # The medians will be evaluated in this padarray, skipping the np.inf.
         # Now in this copy called padarray, we also put the saturated stars to
-        # np.Inf, if available :
+        # np.inf, if available :
         if self.satstars is not None:
-            padarray[2:w + 2, 2:h + 2][self.satstars] = np.Inf
-            # Viva python, I tested this one, it works...
-
-        # A loop through every cosmic pixel :
-        for cosmicpos in cosmicindices:
-            x = cosmicpos[0]
-            y = cosmicpos[1]
-            # remember the shift due to the padding !
-            cutout = padarray[x:x + 5, y:y + 5].ravel()
-            # print cutout
-            # Now we have our 25 pixels, some of them are np.Inf, and we want
-            # to take the median
-            goodcutout = cutout[cutout != np.Inf]
-            # print len(goodcutout)
-
-            if len(goodcutout) >= 25:
-                # This never happened, but you never know ...
-                raise RuntimeError("Mega error in clean !")
-            elif len(goodcutout) > 0:
-                replacementvalue = np.median(goodcutout)
-            else:
-                # i.e. no good pixels : Shit, a huge cosmic, we will have to
-                # improvise ...
-                print("OH NO, I HAVE A HUUUUUUUGE COSMIC !!!!!")
-                replacementvalue = self.guessbackgroundlevel()
-
-            # We update the cleanarray,
-            # but measure the medians in the padarray, so to not mix things
-            # up...
-            self.cleanarray[x, y] = replacementvalue
+            padarray[2:w + 2, 2:h + 2][self.satstars] = np.inf
+
+        # The 5x5 cutouts around every cosmic pixel (remember the shift due to the padding, the window at (x, y) in
+        # the padarray is centered on (x, y) in the image). Instead of looping through the cosmics, the medians of
+        # the non-flagged pixels of all cutouts are calculated at once:
+        cutouts = sliding_window_view(padarray, (5, 5))[cosmicindices].reshape(-1, 25)
+        good = cutouts != np.inf
+        nbgood = np.sum(good, axis=1)
+        if np.any(nbgood >= 25):
+            # This never happened, but you never know ...
+            raise RuntimeError("Mega error in clean !")
+
+        replacementvalues = np.empty(len(cutouts))
+        has_good = nbgood > 0
+        if np.any(has_good):
+            goodcutouts = np.where(good[has_good], cutouts[has_good], np.nan)
+            replacementvalues[has_good] = np.nanmedian(goodcutouts, axis=1)
+            # pixels which are NaN in the image itself propagate into the median (as np.median does)
+            contains_nan = np.any(np.isnan(cutouts[has_good]), axis=1)
+            replacementvalues[np.flatnonzero(has_good)[contains_nan]] = np.nan
+        if not np.all(has_good):
+            # i.e. no good pixels : Shit, a huge cosmic, we will have to
+            # improvise ...
+            print("OH NO, I HAVE A HUUUUUUUGE COSMIC !!!!!")
+            replacementvalues[~has_good] = self.guessbackgroundlevel()
+
+        # We update the cleanarray,
+        # but measured the medians in the padarray, so to not mix things
+        # up...
+        self.cleanarray[cosmicindices] = replacementvalues
+
+        if self._changed is None:
+            self._changed = np.array(mask, dtype=bool)
+        else:
+            self._changed |= mask
 
         # That's it.
         if verbose:
@@ -456,9 +467,21 @@ class cosmicsimage:
             print()
             "Creating noise model ..."
 
+        # The median filtered images only change around pixels which were cleaned after the last iteration, so
+        # the ones of the previous iteration are reused and updated around those pixels.
+        if self._changed is None:
+            m5 = ndimage.median_filter(self.cleanarray, size=5, mode='mirror')
+            m3 = ndimage.median_filter(self.cleanarray, size=3, mode='mirror')
+            m37 = ndimage.median_filter(m3, size=7, mode='mirror')
+        else:
+            m5, m3, m37 = self._m5, self._m3, self._m37
+            update_median_filter(m5, self.cleanarray, self._changed, 5)
+            m3_changed = update_median_filter(m3, self.cleanarray, self._changed, 3)
+            update_median_filter(m37, m3, m3_changed, 7)
+        self._m5, self._m3, self._m37 = m5, m3, m37
+        self._changed = None
+
         # We build a custom noise map, so to compare the laplacian to
-        m5 = ndimage.median_filter(
-            self.cleanarray, size=5, mode='mirror')
         # We keep this m5, as I will use it later for the interpolation.
         m5clipped = m5.clip(min=0.00001)  # As we will take the sqrt
         noise = (1.0 / self.gain) * np.sqrt(
@@ -506,9 +529,6 @@ class cosmicsimage:
             "Building fine structure image ..."
 
         # We build the fine structure image :
-        m3 = ndimage.median_filter(
-            self.cleanarray, size=3, mode='mirror')
-        m37 = ndimage.median_filter(m3, size=7, mode='mirror')
         f = m3 - m37
         # In the article that's it, but in lacosmic.cl f is divided by the noise...
         # Ok I understand why, it depends on if you use sp/f or L+/f as criterion.
@@ -541,8 +561,8 @@ class cosmicsimage:
 
         # We grow these cosmics a first time to determine the immediate
         # neighborhod  :
-        growcosmics = np.cast['bool'](
-            signal.convolve2d(np.cast['float32'](cosmics), growkernel, mode="same", boundary="symm"))
+        growcosmics = signal.convolve2d(cosmics.astype('float32'), growkernel, mode="same",
+                                        boundary="symm").astype(bool)
 
         # From this grown set, we keep those that have sp > sigmalim
         # so obviously not requiring sp/f > objlim, otherwise it would be
@@ -552,8 +572,8 @@ class cosmicsimage:
         # Now we repeat this procedure, but lower the detection limit to
         # sigmalimlow :
 
-        finalsel = np.cast['bool'](
-            signal.convolve2d(np.cast['float32'](growcosmics), growkernel, mode="same", boundary="symm"))
+        finalsel = signal.convolve2d(growcosmics.astype('float32'), growkernel, mode="same",
+                                     boundary="symm").astype(bool)
         finalsel = np.logical_and(sp > self.sigcliplow, finalsel)
 
         # Again, we have to kick out pixels on saturated stars :
@@ -678,6 +698,65 @@ class cosmicsimage:
 
 # Top-level functions
 
+def lacosmic_mask(rawarray, num_iterations=2, tile_size=512, overlap=None, max_workers=None, **kwargs):
+    """
+    Runs num_iterations L.A.Cosmic iterations (each followed by a clean()) on rawarray and returns the resulting
+    cosmic mask.
+
+    The image is split into tiles of tile_size x tile_size pixels, which are extended by overlap pixels into the
+    neighboring tiles, and the tiles are processed in a thread pool. One iteration including the cleaning only
+    influences pixels within a distance of 8 pixels, therefore with the default overlap (8 * num_iterations) the
+    resulting mask is identical to running the iterations on the full image. Tiles without any detected cosmics
+    skip the remaining iterations, since they would not find anything new. With a single worker the full image is
+    processed at once, since the overlaps and the overhead of every tile only pay off when the tiles run in parallel.
+
+    :param rawarray: 2D image array
+    :param num_iterations: number of L.A.Cosmic iterations
+    :param tile_size: size of the tiles in pixels
+    :param overlap: number of pixels each tile is extended by, defaults to 8 * num_iterations
+    :param max_workers: number of threads, defaults to the number of CPUs
+    :param kwargs: further parameters for the cosmicsimage (e.g. sigclip, objlim, gain, readnoise)
+    :return: 2D boolean mask
+    """
+    if overlap is None:
+        overlap = 8 * num_iterations
+    kwargs.setdefault('verbose', False)
+
+    # the background level is only used for huge cosmics and needs to be the one of the full image
+    backgroundlevel = np.median((rawarray + kwargs.get('pssl', 0.0)).ravel())
+
+    rows, cols = rawarray.shape
+    tiles = []
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            core = (slice(row, min(row + tile_size, rows)), slice(col, min(col + tile_size, cols)))
+            tile = (slice(max(row - overlap, 0), min(row + tile_size + overlap, rows)),
+                    slice(max(col - overlap, 0), min(col + tile_size + overlap, cols)))
+            tiles.append((core, tile))
+
+    def process_tile(core, tile):
+        image = cosmicsimage(rawarray[tile], **kwargs)
+        image.backgroundlevel = backgroundlevel
+        for _ in range(num_iterations):
+            if image.lacosmiciteration()["niter"] == 0:
+                break
+            image.clean()
+        return image.mask[core[0].start - tile[0].start:core[0].stop - tile[0].start,
+                          core[1].start - tile[1].start:core[1].stop - tile[1].start]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers == 1:
+        full_image = (slice(0, rows), slice(0, cols))
+        return process_tile(full_image, full_image)
+
+    mask = np.zeros(rawarray.shape, dtype=bool)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda t: process_tile(*t), tiles)
+        for (core, _), tile_mask in zip(tiles, results):
+            mask[core] = tile_mask
+    return mask
+
 
 # def fullarray(verbose = False):
 #   """
@@ -694,6 +773,28 @@ class cosmicsimage:
 
 # Array manipulation
 
+def update_median_filter(filtered, source, changed, size):
+    """
+    Updates filtered, the result of ndimage.median_filter(source, size=size, mode='mirror'), in place after the pixels
+    in the boolean array changed have been modified in source. Only the medians of pixels within the filter size of
+    a changed pixel are recalculated.
+
+    Returns a boolean array of the pixels which have been recalculated.
+    """
+    affected = ndimage.binary_dilation(changed, structure=np.ones((size, size), dtype=bool))
+    indices = np.nonzero(affected)
+    if len(indices[0]) == 0:
+        return affected
+    radius = size // 2
+    if len(indices[0]) > 0.1 * source.size or min(source.shape) <= radius:
+        filtered[...] = ndimage.median_filter(source, size=size, mode='mirror')
+        return affected
+    # np.pad with reflect is the same boundary condition as the mirror mode of ndimage
+    windows = sliding_window_view(np.pad(source, radius, mode='reflect'), (size, size))
+    filtered[indices] = np.median(windows[indices].reshape(-1, size * size), axis=1)
+    return affected
+
+
 def subsample(a):  # this is more a generic function then a method ...
     """
     Returns a 2x2-subsampled version of array a (no interpolation, just cutting pixels in 4).
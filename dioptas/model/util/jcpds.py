@@ -31,6 +31,8 @@ Modifications:
         - renamed read and write to load and save
         - the load function will now reset all parameters (previously parameters not set in the newly loaded file, were
           taken over from the previous state of the object)
+    2026 - reflections are stored in a numpy record array, compute_d can calculate d spacings for arrays of pressures
+           and temperatures at once
 
 """
 import logging
@@ -39,7 +41,6 @@ logger = logging.getLogger(__name__)
 
 import string
 import numpy as np
-from scipy.optimize import minimize
 import os
 
 
@@ -68,6 +69,26 @@ class jcpds_reflection:
         return "{:2d},{:2d},{:2d}\t{:.2f}\t{:.3f}".format(self.h, self.k, self.l, self.intensity, self.d0)
 
 
+REFLECTION_DTYPE = np.dtype([('h', int), ('k', int), ('l', int),
+                             ('intensity', float), ('d0', float), ('d', float)])
+
+
+def create_reflections(h=(), k=(), l=(), intensity=(), d=()):
+    """
+    Creates a record array of reflections (see REFLECTION_DTYPE), d0 and d are both set to d.
+    The single reflections can be accessed like jcpds_reflection objects, e.g. reflections[0].h, and changing
+    attributes of them changes the array.
+    """
+    reflections = np.rec.array(np.zeros(len(h), dtype=REFLECTION_DTYPE))
+    reflections.h = h
+    reflections.k = k
+    reflections.l = l
+    reflections.intensity = intensity
+    reflections.d0 = d
+    reflections.d = d
+    return reflections
+
+
 class MyDict(dict):
     def __init__(self):
         super(MyDict, self).__init__()
@@ -80,6 +101,16 @@ class MyDict(dict):
             self.__setitem__('modified', True)
         super(MyDict, self).__setitem__(key, value)
 
+    def __reduce__(self):
+        # copies and pickles are restored without going through __setitem__, which would set the modified flag
+        return _restore_my_dict, (dict(self),)
+
+
+def _restore_my_dict(items):
+    my_dict = MyDict()
+    dict.update(my_dict, items)
+    return my_dict
+
 
 class jcpds(object):
     def __init__(self):
@@ -113,7 +144,7 @@ class jcpds(object):
         self.params['v'] = 0.
         self.params['pressure'] = 0.
         self.params['temperature'] = 298.
-        self.reflections = []
+        self._reflections = create_reflections()
         self.params['modified'] = False
 
     def load_file(self, filename):
@@ -196,7 +227,7 @@ class jcpds(object):
         if (pos >= 0): name = name[0:pos]
         self._name = name
         self.params['comments'] = []
-        self.reflections = []
+        reflection_lines = []
 
         # Determine what version JCPDS file this is
         # In current files have the first line starts with the string VERSION:
@@ -245,15 +276,7 @@ class jcpds(object):
                 elif tag == 'DALPHADT:':
                     self.params['d_alpha_dt'] = float(value)
                 elif tag == 'DIHKL:':
-                    dtemp = value.split()
-                    dtemp = list(map(float, dtemp))
-                    reflection = jcpds_reflection()
-                    reflection.d0 = dtemp[0]
-                    reflection.intensity = dtemp[1]
-                    reflection.h = int(dtemp[2])
-                    reflection.k = int(dtemp[3])
-                    reflection.l = int(dtemp[4])
-                    self.reflections.append(reflection)
+                    reflection_lines.append(list(map(float, value.split()))[:5])
         else:
             # This is an old format JCPDS file
             self.version = 1.
@@ -280,17 +303,12 @@ class jcpds(object):
             while 1:
                 line = fp.readline()
                 if line == '': break
-                dtemp = line.split()
-                dtemp = list(map(float, dtemp))
-                reflection = jcpds_reflection()
-                reflection.d0 = dtemp[0]
-                reflection.intensity = dtemp[1]
-                reflection.h = int(dtemp[2])
-                reflection.k = int(dtemp[3])
-                reflection.l = int(dtemp[4])
-                self.reflections.append(reflection)
+                reflection_lines.append(list(map(float, line.split()))[:5])
 
         fp.close()
+        reflection_lines = np.array(reflection_lines, dtype=float).reshape(-1, 5)
+        self._reflections = create_reflections(reflection_lines[:, 2], reflection_lines[:, 3], reflection_lines[:, 4],
+                                               reflection_lines[:, 1], reflection_lines[:, 0])
         self.compute_v0()
         self.params['a'] = self.params['a0']
         self.params['b'] = self.params['b0']
@@ -302,8 +320,7 @@ class jcpds(object):
         # Compute D spacings, make sure they are consistent with the input values
 
         self.compute_d()
-        for reflection in self.reflections:
-            reflection.d0 = reflection.d
+        self._reflections.d0 = self._reflections.d
 
         self.params['modified'] = False
 
@@ -487,8 +504,8 @@ class jcpds(object):
               2) Computes volume at zero-pressure and the specified temperature
                  if ALPHAT0 is non-zero.
               3) Computes the volume at the specified pressure if K0 is non-zero.
-                 The routine uses the IDL function FX_ROOT to solve the third
-                 order Birch-Murnaghan equation of state.
+                 The third order Birch-Murnaghan equation of state is solved
+                 with Newton's method (see bm3_solve).
 
         Example:
            Compute the unit cell volume of alumina at 100 GPa and 2500 K.
@@ -514,30 +531,94 @@ class jcpds(object):
         self.params['alpha_t'] = self.params['alpha_t0'] + self.params['d_alpha_dt'] * (temperature - 298.)
         self.params['k0p'] = self.params['k0p0'] + self.params['dk0pdt'] * (temperature - 298.)
 
-        k0 = self.params['k0'] + self.params['dk0dt'] * (temperature - 298.)
-        k0p = self.params['k0p']
-
-        if pressure == 0.:
-            self.params['v'] = self.params['v0'] * (1 + self.params['alpha_t'] * (temperature - 298.))
-        elif pressure < 0:
-            if self.params['k0'] <= 0.:
-                logger.info('K0 is zero, computing zero pressure volume')
-                self.params['v'] = self.params['v0']
-            else:
-                self.params['v'] = self.params['v0'] * (1 - pressure / self.params['k0'])
-        else:
-            if self.params['k0'] <= 0.:
-                logger.info('K0 is zero, computing zero pressure volume')
-                self.params['v'] = self.params['v0']
-            else:
-                self.mod_pressure = pressure - \
-                                    self.params['alpha_t'] * k0 * (temperature - 298.)
-                res = minimize(self.bm3_inverse, 1.,
-                               args=(k0, k0p, self.mod_pressure),
-                               method='Nelder-Mead')
-                if not res.success:
-                    raise ArithmeticError("minimize didn't find a minimum!\n" + str(res))
-                self.params['v'] = self.params['v0'] / float(res.x[0])
+        if self.params['k0'] <= 0. and pressure != 0.:
+            logger.info('K0 is zero, computing zero pressure volume')
+        if pressure > 0 and self.params['k0'] > 0.:
+            k0 = self.params['k0'] + self.params['dk0dt'] * (temperature - 298.)
+            self.mod_pressure = pressure - self.params['alpha_t'] * k0 * (temperature - 298.)
+
+        self.params['v'] = float(self.calculate_volumes(pressure, temperature))
+
+    def calculate_volumes(self, pressures, temperatures):
+        """
+        Calculates the unit cell volumes for arrays of pressures and temperatures (see compute_volume) without
+        changing the state of the object. The third order Birch-Murnaghan equation is solved for all pressures at once.
+
+        :param pressures: pressures in GPa
+        :param temperatures: temperatures in K, 0 K is treated as room temperature (298 K)
+        :return: array of volumes with the broadcast shape of pressures and temperatures
+        """
+        pressures, temperatures = np.broadcast_arrays(np.asarray(pressures, dtype=float),
+                                                      np.asarray(temperatures, dtype=float))
+        temperatures = np.where(temperatures == 0, 298., temperatures)
+        delta_t = temperatures - 298.
+
+        alpha_t = self.params['alpha_t0'] + self.params['d_alpha_dt'] * delta_t
+        k0p = self.params['k0p0'] + self.params['dk0pdt'] * delta_t
+        k0 = self.params['k0'] + self.params['dk0dt'] * delta_t
+
+        v0 = self.params['v0']
+        volumes = np.full(pressures.shape, float(v0))
+
+        zero = pressures == 0.
+        volumes[zero] = v0 * (1 + alpha_t[zero] * delta_t[zero])
+        if self.params['k0'] > 0.:
+            negative = pressures < 0
+            volumes[negative] = v0 * (1 - pressures[negative] / self.params['k0'])
+
+            positive = pressures > 0
+            mod_pressures = pressures[positive] - alpha_t[positive] * k0[positive] * delta_t[positive]
+            volumes[positive] = v0 / self.bm3_solve(k0[positive], k0p[positive], mod_pressures)
+        return volumes
+
+    def calculate_pressures(self, volumes, temperatures=298.):
+        """
+        Calculates the pressures for arrays of unit cell volumes and temperatures, the inverse of calculate_volumes.
+        The third order Birch-Murnaghan equation is explicit in V0/V, therefore no solver is needed.
+
+        :param volumes: unit cell volumes
+        :param temperatures: temperatures in K, 0 K is treated as room temperature (298 K)
+        :return: array of pressures in GPa with the broadcast shape of volumes and temperatures
+        """
+        if self.params['k0'] <= 0.:
+            raise ValueError("Unable to calculate pressures, K0 of {} is zero".format(self.name))
+        volumes, temperatures = np.broadcast_arrays(np.asarray(volumes, dtype=float),
+                                                    np.asarray(temperatures, dtype=float))
+        temperatures = np.where(temperatures == 0, 298., temperatures)
+        delta_t = temperatures - 298.
+
+        alpha_t = self.params['alpha_t0'] + self.params['d_alpha_dt'] * delta_t
+        k0p = self.params['k0p0'] + self.params['dk0pdt'] * delta_t
+        k0 = self.params['k0'] + self.params['dk0dt'] * delta_t
+
+        v0_v = self.params['v0'] / volumes
+        pressures = 1.5 * k0 * (v0_v ** (7. / 3.) - v0_v ** (5. / 3.)) * \
+                    (1 + 0.75 * (k0p - 4.) * (v0_v ** (2. / 3.) - 1.0)) + alpha_t * k0 * delta_t
+        negative = pressures < 0
+        pressures[negative] = self.params['k0'] * (1 - volumes[negative] / self.params['v0'])
+        return pressures
+
+    @staticmethod
+    def bm3_solve(k0, k0p, pressures, tolerance=1e-12, max_iterations=100):
+        """
+        Solves the third order Birch-Murnaghan equation for V0/V with Newton's method, element-wise for arrays
+        of K0, K0' and pressures.
+        """
+        k0, k0p, pressures = np.broadcast_arrays(k0, k0p, pressures)
+        v0_v = np.ones(pressures.shape)
+        c = 0.75 * (k0p - 4.)
+        for _ in range(max_iterations):
+            f = v0_v ** (7. / 3.) - v0_v ** (5. / 3.)
+            df = 7. / 3. * v0_v ** (4. / 3.) - 5. / 3. * v0_v ** (2. / 3.)
+            g = 1 + c * (v0_v ** (2. / 3.) - 1.0)
+            dg = c * 2. / 3. * v0_v ** (-1. / 3.)
+            step = (1.5 * k0 * f * g - pressures) / (1.5 * k0 * (df * g + f * dg))
+            v0_v = v0_v - step
+            if np.all(np.abs(step) < tolerance * v0_v):
+                break
+        if not np.all(np.isfinite(v0_v) & (v0_v > 0)):
+            raise ArithmeticError("Unable to solve the Birch-Murnaghan equation for the given pressures")
+        return v0_v
 
     def bm3_inverse(self, v0_v, k0, k0p, pressure):
         """
@@ -576,63 +657,7 @@ class jcpds(object):
         """
         computes d0 values for the based on the the current lattice parameters
         """
-        a = self.params['a0']
-        b = self.params['b0']
-        c = self.params['c0']
-        degree_to_radians = np.pi / 180.
-        alpha = self.params['alpha0'] * degree_to_radians
-        beta = self.params['beta0'] * degree_to_radians
-        gamma = self.params['gamma0'] * degree_to_radians
-
-        h = np.zeros(len(self.reflections))
-        k = np.zeros(len(self.reflections))
-        l = np.zeros(len(self.reflections))
-
-        for ind, reflection in enumerate(self.reflections):
-            h[ind] = reflection.h
-            k[ind] = reflection.k
-            l[ind] = reflection.l
-
-        if self.params['symmetry'] == 'CUBIC':
-            d2inv = (h ** 2 + k ** 2 + l ** 2) / a ** 2
-        elif self.params['symmetry'] == 'TETRAGONAL':
-            d2inv = (h ** 2 + k ** 2) / a ** 2 + l ** 2 / c ** 2
-        elif self.params['symmetry'] == 'ORTHORHOMBIC':
-            d2inv = h ** 2 / a ** 2 + k ** 2 / b ** 2 + l ** 2 / c ** 2
-        elif self.params['symmetry'] == 'HEXAGONAL' or self.params['symmetry'] == 'TRIGONAL':
-            d2inv = (h ** 2 + h * k + k ** 2) * 4. / 3. / a ** 2 + l ** 2 / c ** 2
-        elif self.params['symmetry'] == 'RHOMBOHEDRAL':
-            d2inv = (((1. + np.cos(alpha)) * ((h ** 2 + k ** 2 + l ** 2) -
-                                              (1 - np.tan(0.5 * alpha) ** 2) * (h * k + k * l + l * h))) /
-                     (a ** 2 * (1 + np.cos(alpha) - 2 * np.cos(alpha) ** 2)))
-        elif self.params['symmetry'] == 'MONOCLINIC':
-            d2inv = (h ** 2 / np.sin(beta) ** 2 / a ** 2 +
-                     k ** 2 / b ** 2 +
-                     l ** 2 / np.sin(beta) ** 2 / c ** 2 +
-                     2 * h * l * np.cos(beta) / (a * c * np.sin(beta) ** 2))
-        elif self.params['symmetry'] == 'TRICLINIC':
-            V = (a * b * c *
-                 np.sqrt(1. - np.cos(alpha) ** 2 - np.cos(beta) ** 2 -
-                         np.cos(gamma) ** 2 +
-                         2 * np.cos(alpha) * np.cos(beta) * np.cos(gamma)))
-            s11 = b ** 2 * c ** 2 * np.sin(alpha) ** 2
-            s22 = a ** 2 * c ** 2 * np.sin(beta) ** 2
-            s33 = a ** 2 * b ** 2 * np.sin(gamma) ** 2
-            s12 = a * b * c ** 2 * (np.cos(alpha) * np.cos(beta) -
-                                    np.cos(gamma))
-            s23 = a ** 2 * b * c * (np.cos(beta) * np.cos(gamma) -
-                                    np.cos(alpha))
-            s31 = a * b ** 2 * c * (np.cos(gamma) * np.cos(alpha) -
-                                    np.cos(beta))
-            d2inv = (s11 * h ** 2 + s22 * k ** 2 + s33 * l ** 2 +
-                     2. * s12 * h * k + 2. * s23 * k * l + 2. * s31 * l * h) / V ** 2
-        else:
-            logger.error(('Unknown crystal symmetry = ' + self.params['symmetry']))
-            d2inv = 1
-        d_spacings = np.sqrt(1. / d2inv)
-
-        for ind in range(len(self.reflections)):
-            self.reflections[ind].d0 = d_spacings[ind]
+        self._reflections.d0 = self._calculate_d_spacings(self.params['a0'], self.params['b0'], self.params['c0'])
 
     def compute_d(self, pressure=None, temperature=None):
         """
@@ -642,14 +667,18 @@ class jcpds(object):
         Keywords:
            pressure:
               The pressure in GPa.  If not present then the pressure is
-              assumed to be 0.
+              assumed to be 0. Can also be an array of pressures.
 
            temperature:
               The temperature in K.  If not present or zero, then the
               temperature is assumed to be 298K, i.e. room temperature.
+              Can also be an array of temperatures.
 
         Outputs:
-           None.  The D spacing information in the JCPDS object is calculated.
+           The D spacings of all reflections. For scalar pressure and temperature the D spacing information in the
+           JCPDS object is updated as well.
+           If pressure or temperature are arrays, they are broadcast against each other and an array with the shape
+           (number of P-T points, number of reflections) is returned, the state of the JCPDS object is not changed.
 
         Procedure:
             This procedure first calls jcpds.compute_volume().
@@ -669,7 +698,21 @@ class jcpds(object):
               print, r.d0
               # Print out the D spacings at high pressure and temperature
               print, r.d
+
+           Compute the D spacings of alumina for pressures from 0 to 100 GPa at 2500 K.
+           d_grid = j.compute_d(np.linspace(0, 100, 101), 2500)
         """
+        if np.ndim(pressure) > 0 or np.ndim(temperature) > 0:
+            if pressure is None:
+                pressure = self.params['pressure']
+            if temperature is None:
+                temperature = self.params['temperature']
+            volumes = self.calculate_volumes(pressure, temperature).ravel()
+            # all cell dimensions change by the same ratio, therefore all d spacings do as well
+            ratios = (volumes / self.params['v0']) ** (1.0 / 3.0)
+            d_spacings = self._calculate_d_spacings(self.params['a0'], self.params['b0'], self.params['c0'])
+            return ratios[:, np.newaxis] * d_spacings[np.newaxis, :]
+
         self.compute_volume(pressure, temperature)
 
         # Assume each cell dimension changes by the same fractional amount = cube
@@ -679,22 +722,22 @@ class jcpds(object):
         self.params['b'] = self.params['b0'] * ratio
         self.params['c'] = self.params['c0'] * ratio
 
-        a = self.params['a']
-        b = self.params['b']
-        c = self.params['c']
+        self._reflections.d = self._calculate_d_spacings(self.params['a'], self.params['b'], self.params['c'])
+        return self._reflections.d
+
+    def _calculate_d_spacings(self, a, b, c):
+        """
+        Calculates the d spacings of all reflections for the given cell lengths and the angles alpha0, beta0 and
+        gamma0.
+        """
         dtor = np.pi / 180.
         alpha = self.params['alpha0'] * dtor
         beta = self.params['beta0'] * dtor
         gamma = self.params['gamma0'] * dtor
 
-        h = np.zeros(len(self.reflections))
-        k = np.zeros(len(self.reflections))
-        l = np.zeros(len(self.reflections))
-
-        for ind, reflection in enumerate(self.reflections):
-            h[ind] = reflection.h
-            k[ind] = reflection.k
-            l[ind] = reflection.l
+        h = self._reflections.h.astype(float)
+        k = self._reflections.k.astype(float)
+        l = self._reflections.l.astype(float)
 
         if self.params['symmetry'] == 'CUBIC':
             d2inv = (h ** 2 + k ** 2 + l ** 2) / a ** 2
@@ -731,72 +774,82 @@ class jcpds(object):
                      2. * s12 * h * k + 2. * s23 * k * l + 2. * s31 * l * h) / V ** 2
         else:
             logger.error(('Unknown crystal symmetry = ' + self.params['symmetry']))
-            d2inv = 1
-        d_spacings = np.sqrt(1. / d2inv)
-        for ind in range(len(self.reflections)):
-            self.reflections[ind].d = d_spacings[ind]
+            d2inv = np.ones(len(h))
+        return np.sqrt(1. / d2inv)
+
+    @property
+    def reflections(self):
+        """
+        Record array with the fields h, k, l, intensity, d0 and d (see REFLECTION_DTYPE). Single reflections
+        (e.g. reflections[0]) behave like jcpds_reflection objects and are views into the array.
+        """
+        return self._reflections
+
+    @reflections.setter
+    def reflections(self, reflections):
+        """
+        Sets the reflections, either as array with the REFLECTION_DTYPE or a list of jcpds_reflection objects.
+        """
+        self._reflections = create_reflections(
+            [r.h for r in reflections], [r.k for r in reflections], [r.l for r in reflections],
+            [r.intensity for r in reflections], [r.d for r in reflections])
+        self._reflections.d0 = [r.d0 for r in reflections]
 
     def add_reflection(self, h=0., k=0., l=0., intensity=0., d=0.):
-        new_reflection = jcpds_reflection(h, k, l, intensity, d)
-        self.reflections.append(new_reflection)
+        self._reflections = np.append(self._reflections, create_reflections([h], [k], [l], [intensity], [d])
+                                      ).view(np.recarray)
+        self.params['modified'] = True
+
+    def add_reflections(self, h, k, l, intensity, d):
+        """
+        Adds several reflections at once, all parameters are arrays with the same length.
+        """
+        self._reflections = np.append(self._reflections, create_reflections(h, k, l, intensity, d)
+                                      ).view(np.recarray)
+        self.params['modified'] = True
+
+    def set_reflection(self, ind, reflection):
+        """
+        Replaces the reflection at index ind with the values of reflection (a jcpds_reflection or a single reflection
+        of a reflections array)
+        """
+        for field in REFLECTION_DTYPE.names:
+            self._reflections[field][ind] = getattr(reflection, field)
         self.params['modified'] = True
 
     def delete_reflection(self, ind):
-        del self.reflections[ind]
+        self._reflections = np.delete(self._reflections, ind).view(np.recarray)
         self.params['modified'] = True
 
     def get_reflections(self):
         """
         Returns the information for each reflection for the material.
-        This information is an array of elements of class jcpds_reflection
+        This information is a record array, whose elements have the same attributes as jcpds_reflection
         """
-        return self.reflections
+        return self._reflections
 
     def reorder_reflections_by_index(self, ind_list, reversed_toggle=False):
         if reversed_toggle:
             ind_list = ind_list[::-1]
-        new_reflections = []
-        for ind in ind_list:
-            new_reflections.append(self.reflections[ind])
 
         modified_flag = self.params['modified']
-        self.reflections = new_reflections
+        self._reflections = self._reflections[np.asarray(ind_list, dtype=int)]
         self.params['modified'] = modified_flag
 
     def sort_reflections_by_h(self, reversed_toggle=False):
-        h_list = []
-        for reflection in self.reflections:
-            h_list.append(reflection.h)
-        sorted_ind = np.argsort(h_list)
-        self.reorder_reflections_by_index(sorted_ind, reversed_toggle)
+        self.reorder_reflections_by_index(np.argsort(self._reflections.h), reversed_toggle)
 
     def sort_reflections_by_k(self, reversed_toggle=False):
-        k_list = []
-        for reflection in self.reflections:
-            k_list.append(reflection.k)
-        sorted_ind = np.argsort(k_list)
-        self.reorder_reflections_by_index(sorted_ind, reversed_toggle)
+        self.reorder_reflections_by_index(np.argsort(self._reflections.k), reversed_toggle)
 
     def sort_reflections_by_l(self, reversed_toggle=False):
-        l_list = []
-        for reflection in self.reflections:
-            l_list.append(reflection.l)
-        sorted_ind = np.argsort(l_list)
-        self.reorder_reflections_by_index(sorted_ind, reversed_toggle)
+        self.reorder_reflections_by_index(np.argsort(self._reflections.l), reversed_toggle)
 
     def sort_reflections_by_intensity(self, reversed_toggle=False):
-        intensity_list = []
-        for reflection in self.reflections:
-            intensity_list.append(reflection.intensity)
-        sorted_ind = np.argsort(intensity_list)
-        self.reorder_reflections_by_index(sorted_ind, reversed_toggle)
+        self.reorder_reflections_by_index(np.argsort(self._reflections.intensity), reversed_toggle)
 
     def sort_reflections_by_d(self, reversed_toggle=False):
-        d_list = []
-        for reflection in self.reflections:
-            d_list.append(reflection.d0)
-        sorted_ind = np.argsort(d_list)
-        self.reorder_reflections_by_index(sorted_ind, reversed_toggle)
+        self.reorder_reflections_by_index(np.argsort(self._reflections.d0), reversed_toggle)
 
     def has_thermal_expansion(self):
         return (self.params['alpha_t0'] != 0) or (self.params['d_alpha_dt'] != 0)
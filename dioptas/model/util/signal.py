@@ -19,16 +19,45 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import inspect
+import time
 import weakref
+from contextlib import contextmanager
 
 __export__ = ["Signal"]
 
+# the ways listeners are called, determined once when they are connected
+CALL_WITHOUT_ARGS = 0
+CALL_WITH_ARGS = 1
+CALL_SIGNAL = 2
+
+
+class SignalStatistics:
+    """
+    Number of emits and the time spent in the listeners of a Signal, see Signal.enable_statistics.
+    """
+
+    def __init__(self):
+        self.emit_count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.emit_count if self.emit_count else 0.0
+
+    def __repr__(self):
+        return "SignalStatistics(emits={}, total={:.3g} s, mean={:.3g} s, max={:.3g} s)".format(
+            self.emit_count, self.total_time, self.mean_time, self.max_time)
+
 
 class Signal:
     def __init__(self, *_):
         self.listeners = WeakRefList()
         self.priority_listeners = WeakRefList()
         self.blocked = False
+        self.statistics = None
+        self._coalesce_depth = 0
+        self._coalesced_args = None  # arguments of the last emit within coalesce, None if there was none
 
     def connect(self, handle, priority=False):
         """
@@ -61,20 +90,62 @@ class Signal:
     def emit(self, *args):
         if self.blocked:
             return
-        self._serve_listeners(self.priority_listeners, *args)
-        self._serve_listeners(self.listeners, *args)
+        if self._coalesce_depth:
+            self._coalesced_args = args
+            return
+        if self.statistics is not None:
+            self._emit_with_statistics(args)
+            return
+        if self.priority_listeners:
+            self._serve_listeners(self.priority_listeners, args)
+        if self.listeners:
+            self._serve_listeners(self.listeners, args)
+
+    def _emit_with_statistics(self, args):
+        start = time.perf_counter()
+        self._serve_listeners(self.priority_listeners, args)
+        self._serve_listeners(self.listeners, args)
+        duration = time.perf_counter() - start
+        self.statistics.emit_count += 1
+        self.statistics.total_time += duration
+        self.statistics.max_time = max(self.statistics.max_time, duration)
 
     @staticmethod
-    def _serve_listeners(listeners, *args):
+    def _serve_listeners(listeners, args):
         for ref in listeners:
             handle = ref()
-            if type(handle) == Signal:
-                handle.emit(*args)
+            if handle is None:
+                continue
+            call_mode = ref.call_mode
+            if call_mode == CALL_WITH_ARGS:
+                handle(*args)
+            elif call_mode == CALL_WITHOUT_ARGS:
+                handle()
             else:
-                if len(inspect.signature(handle).parameters) == 0:
-                    handle()
-                else:
-                    handle(*args)
+                handle.emit(*args)
+
+    @contextmanager
+    def coalesce(self):
+        """
+        Context manager deferring all emits of the Signal within the context. At the end, the Signal is emitted once
+        with the arguments of the last emit (if there was any). Contexts can be nested, only the outermost emits.
+        """
+        self._coalesce_depth += 1
+        try:
+            yield
+        finally:
+            self._coalesce_depth -= 1
+            if self._coalesce_depth == 0 and self._coalesced_args is not None:
+                args = self._coalesced_args
+                self._coalesced_args = None
+                self.emit(*args)
+
+    def enable_statistics(self, enable=True):
+        """
+        Enables counting the emits of the Signal and measuring the time spent in its listeners (for diagnostics),
+        the results are available in the statistics attribute. Disabling removes the statistics.
+        """
+        self.statistics = SignalStatistics() if enable else None
 
     def clear(self):
         """
@@ -109,7 +180,8 @@ class WeakRefList(list):
     garbage collector from deleting the listeners.
     It is not a full reimplementation, only the methods which are used in the Signal class are implemented - append,
     remove, insert. This list will work for object methods as well as objects. To retrieve the orginal item, the
-    value of the weak reference has to be called. E.g.:
+    value of the weak reference has to be called. The references additionally store how the item is called by a
+    Signal (call_mode), so that the signature of a listener is only inspected once. E.g.:
     >>> class A:
     >>>     def method(self):
     >>>         return "lala"
@@ -124,7 +196,10 @@ class WeakRefList(list):
         super(WeakRefList, self).append(self._ref(item))
 
     def remove(self, item):
-        super(WeakRefList, self).remove(self._ref(item))
+        if inspect.ismethod(item):
+            super(WeakRefList, self).remove(weakref.WeakMethod(item))
+        else:
+            super(WeakRefList, self).remove(weakref.ref(item))
 
     def insert(self, index, item):
         super(WeakRefList, self).insert(index, self._ref(item))
@@ -134,12 +209,37 @@ class WeakRefList(list):
 
     def _ref(self, item):
         if inspect.ismethod(item):
-            return weakref.WeakMethod(item, self._remove_ref)
+            ref = _ListenerMethodRef(item, self._remove_ref)
         else:
-            return weakref.ref(item, self._remove_ref)
+            ref = _ListenerRef(item, self._remove_ref)
+        ref.call_mode = get_call_mode(item)
+        return ref
 
     def __contains__(self, item):
         for ref in self:
             if ref() == item:
                 return True
         return False
+
+
+class _ListenerRef(weakref.ref):
+    __slots__ = ("call_mode",)
+
+
+class _ListenerMethodRef(weakref.WeakMethod):
+    __slots__ = ("call_mode",)
+
+
+def get_call_mode(handle):
+    """
+    Determines how a listener is called by a Signal: Signals are emitted, functions without parameters are called
+    without the arguments of the emit and all other callables with them.
+    """
+    if isinstance(handle, Signal):
+        return CALL_SIGNAL
+    try:
+        if len(inspect.signature(handle).parameters) == 0:
+            return CALL_WITHOUT_ARGS
+    except (TypeError, ValueError):  # e.g. builtins without signature
+        pass
+    return CALL_WITH_ARGS
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import os
+
+import numpy as np
+
+from dioptas.model.util.cosmics import cosmicsimage, lacosmic_mask
+
+# synthetic diffraction image with rings, poisson noise and cosmic rays
+image_shape = (2048, 2048)
+rng = np.random.default_rng(0)
+y, x = np.indices(image_shape)
+r = np.hypot(x - image_shape[1] / 2, y - image_shape[0] / 2)
+dummy_img = rng.poisson(100 + 1000 * np.exp(-((r % 150) - 75) ** 2 / 400.)).astype(float)
+num_cosmics = 500
+ind = rng.integers(0, image_shape[0] - 1, num_cosmics), rng.integers(0, image_shape[1] - 1, num_cosmics)
+dummy_img[ind] += rng.uniform(500, 5000, num_cosmics)
+
+t1 = time.time()
+cosmics = cosmicsimage(dummy_img, sigclip=3.0, objlim=3.0, verbose=False)
+for _ in range(2):
+    cosmics.lacosmiciteration()
+    cosmics.clean()
+t_full = time.time() - t1
+print("Full image: {0:.2f}s".format(t_full))
+
+# a single worker processes the full image at once, more workers process the tiles in parallel
+num_cpus = os.cpu_count() or 1
+worker_counts = sorted({1, 2, 4, num_cpus})
+identical = True
+for max_workers in worker_counts:
+    t1 = time.time()
+    mask = lacosmic_mask(dummy_img, num_iterations=2, sigclip=3.0, objlim=3.0, max_workers=max_workers)
+    t_mask = time.time() - t1
+    identical = identical and np.array_equal(cosmics.mask, mask)
+    print("lacosmic_mask, {0} worker(s) ({1} cpus): {2:.2f}s (speedup {3:.1f}x)".format(
+        max_workers, num_cpus, t_mask, t_full / t_mask))
+
+print("Identical masks: {0}".format(identical))
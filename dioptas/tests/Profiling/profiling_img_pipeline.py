@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from dioptas.model.util.calc import correct_img_data
+
+# raw detector frame with background, corrections and a scaling factor
+image_shape = (2048, 2048)
+rng = np.random.default_rng(0)
+img = rng.poisson(1000, image_shape).astype(np.uint16)
+background = rng.poisson(100, image_shape).astype(np.uint16)
+corrections = rng.uniform(0.8, 1.0, image_shape).astype(np.float32)
+scaling, offset, factor = 1.2, 10.0, 1.5
+num_frames = 20
+
+
+def previous_pipeline():
+    # as previously done in ImgModel._calculate_img_data and ImgModel.img_data
+    corrected = (img - (scaling * background + offset)) / corrections
+    return corrected * factor
+
+
+def fused_pipeline(max_workers=None, out=None):
+    return correct_img_data(img, background, scaling, offset, corrections, factor, out=out, max_workers=max_workers)
+
+
+def profile(name, fcn):
+    fcn()
+    t1 = time.time()
+    for _ in range(num_frames):
+        result = fcn()
+    time_per_frame = (time.time() - t1) / num_frames
+
+    # numpy reports its data allocations to tracemalloc, the peak of newly allocated memory per frame is given in
+    # units of the result array size (i.e. the number of full size arrays alive at the same time)
+    del result
+    tracemalloc.start()
+    result = fcn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{0:<30s} {1:6.1f} ms/frame, peak allocation {2:5.1f} MB = {3:.1f} result arrays ({4})".format(
+        name, time_per_frame * 1000, peak / 1024 ** 2, peak / result.nbytes, result.dtype))
+    return result
+
+
+previous = profile("previous", previous_pipeline)
+fused_single = profile("fused, 1 thread", lambda: fused_pipeline(max_workers=1))
+fused = profile("fused, {0} threads".format(os.cpu_count()), fused_pipeline)
+out = np.empty(image_shape, dtype=np.float32)
+profile("fused, preallocated output", lambda: fused_pipeline(out=out))
+
+print("Maximum relative difference: {0:.1e}".format(np.max(np.abs(fused - previous) / np.abs(previous))))
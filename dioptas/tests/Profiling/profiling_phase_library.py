@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# Measures the parsing time of the phase library for different numbers of worker processes. The cif files of the test
+# data are copied several times into a temporary folder, so that every worker has several files to parse.
+
+import os
+import shutil
+import tempfile
+import time
+
+from dioptas.model.util.PhaseLibrary import PhaseLibrary
+
+cif_path = os.path.join(os.path.dirname(__file__), '../data/cif')
+num_copies = 8
+
+if __name__ == '__main__':  # the workers are spawned processes, which import this module
+    with tempfile.TemporaryDirectory() as folder:
+        for copy_ind in range(num_copies):
+            for filename in os.listdir(cif_path):
+                name, ext = os.path.splitext(filename)
+                shutil.copy(os.path.join(cif_path, filename), os.path.join(folder, '{}_{}{}'.format(name, copy_ind, ext)))
+        num_files = len(os.listdir(folder))
+
+        num_cpus = os.cpu_count() or 1
+        t_serial = None
+        for max_workers in sorted({1, 2, 4, num_cpus}):
+            t1 = time.time()
+            phase_library = PhaseLibrary(max_workers=max_workers)
+            phase_library.cif_files_per_worker = 1  # always use max_workers processes
+            failed = phase_library.add_folder(folder)
+            t_parse = time.time() - t1
+            t_serial = t_serial or t_parse
+            print("{0} cif files, {1} worker(s) ({2} cpus): {3:.2f}s (speedup {4:.1f}x), {5} failed".format(
+                num_files, max_workers, num_cpus, t_parse, t_serial / t_parse, len(failed)))
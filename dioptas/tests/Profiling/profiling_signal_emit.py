@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import inspect
+import timeit
+
+from dioptas.model.util.signal import Signal
+
+num_emits = 100000
+
+
+class Listener:
+    def __init__(self):
+        self.count = 0
+
+    def without_args(self):
+        self.count += 1
+
+    def with_args(self, value):
+        self.count += value
+
+
+def previous_emit(signal, *args):
+    # as previously done in Signal.emit, the signature of every listener was inspected on every emit
+    if signal.blocked:
+        return
+    for listeners in (signal.priority_listeners, signal.listeners):
+        for ref in listeners:
+            handle = ref()
+            if type(handle) == Signal:
+                handle.emit(*args)
+            elif len(inspect.signature(handle).parameters) == 0:
+                handle()
+            else:
+                handle(*args)
+
+
+def create_signal(num_listeners):
+    signal = Signal(int)
+    listeners = [Listener() for _ in range(num_listeners)]
+    for ind, listener in enumerate(listeners):
+        signal.connect(listener.with_args if ind % 2 else listener.without_args)
+    return signal, listeners
+
+
+def profile(name, fcn):
+    time_per_emit = min(timeit.repeat(fcn, number=num_emits, repeat=3)) / num_emits
+    print("{0:<40s} {1:8.3f} us/emit".format(name, time_per_emit * 1e6))
+
+
+for num_listeners in (0, 1, 5, 20):
+    signal, listeners = create_signal(num_listeners)
+    profile("previous, {} listeners".format(num_listeners), lambda: previous_emit(signal, 1))
+    profile("cached call mode, {} listeners".format(num_listeners), lambda: signal.emit(1))
+
+signal, listeners = create_signal(5)
+signal.blocked = True
+profile("blocked, 5 listeners", lambda: signal.emit(1))
+signal.blocked = False
+
+signal.enable_statistics()
+profile("with statistics, 5 listeners", lambda: signal.emit(1))
+print(signal.statistics)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the startup time of Dioptas. Every statement is run in a fresh interpreter with "python -X importtime", the
+# modules with the largest cumulative import time are listed for each of them.
+
+import os
+import subprocess
+import sys
+
+num_modules = 15
+
+statements = [
+    "import dioptas",
+    "import dioptas.model.DioptasModel",
+    "import dioptas.controller.MainController",
+    "from qtpy import QtWidgets; app = QtWidgets.QApplication([]); "
+    "from dioptas.controller.MainController import MainController; MainController(use_settings=False)",
+]
+
+
+def get_import_times(statement):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], env=env, capture_output=True, text=True, check=True
+    ).stderr
+    import_times = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative_time, module = line[len("import time:"):].split("|")
+        # the nesting of the imports is shown by the indentation of the module name
+        import_times.append((module.rstrip(), int(self_time), int(cumulative_time)))
+    return import_times
+
+
+def get_total_time(statement):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    statement = "import time; t = time.perf_counter(); {}; print(time.perf_counter() - t)".format(statement)
+    output = subprocess.run([sys.executable, "-c", statement], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.splitlines()[-1])
+
+
+for statement in statements:
+    print("{}\n  total: {:.3f} s".format(statement, get_total_time(statement)))
+    top_level = [entry for entry in get_import_times(statement) if "." not in entry[0].strip()]
+    for module, self_time, cumulative_time in sorted(top_level, key=lambda entry: -entry[2])[:num_modules]:
+        print("  {0:<30s} {1:8.1f} ms".format(module.strip(), cumulative_time * 1e-3))
+    print()
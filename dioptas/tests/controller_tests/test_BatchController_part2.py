@@ -19,6 +19,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import importlib
+import numpy as np
 import pytest
 from mock import MagicMock
 
@@ -202,3 +204,73 @@ def test_plot_waterfall(batch_controller, dioptas_model, load_proc_data):
 
 def test_normalize(batch_widget, batch_controller, load_proc_data):
     click_button(batch_widget.control_widget.normalize_btn)
+
+
+def test_determine_pressures(batch_widget, batch_controller, dioptas_model, load_proc_data):
+    batch_controller.widget.show_error_msg = MagicMock()
+    batch_controller.widget.phase_widget.get_selected_phase_row = MagicMock(return_value=-1)
+    click_button(batch_widget.control_widget.pressure_btn)
+    batch_controller.widget.show_error_msg.assert_called_once()
+    assert dioptas_model.batch_model.pressures is None
+
+    dioptas_model.phase_model.add_jcpds(os.path.join(jcpds_path, "pt.jcpds"))
+    batch_controller.widget.phase_widget.get_selected_phase_row = MagicMock(return_value=0)
+    click_button(batch_widget.control_widget.pressure_btn)
+
+    pressures = dioptas_model.batch_model.pressures
+    assert pressures.shape == (50,)
+    assert dioptas_model.batch_model.pressure_calibrant == "pt"
+    x, y = batch_widget.pressure_widget.pressure_plot.getData()
+    assert len(x) == np.sum(np.isfinite(pressures))
+
+
+def test_plot_pressures(batch_widget, batch_controller, dioptas_model, load_proc_data):
+    dioptas_model.batch_model.pressures = np.array([1.0, np.nan, 3.0])
+    dioptas_model.batch_model.pressure_calibrant = "pt"
+    batch_controller.plot_pressures()
+
+    x, y = batch_widget.pressure_widget.pressure_plot.getData()
+    assert np.array_equal(x, [0, 2])
+    assert np.array_equal(y, [1.0, 3.0])
+    assert "pt" in batch_widget.pressure_widget.windowTitle()
+
+
+def test_track_peaks(batch_widget, batch_controller, dioptas_model, load_proc_data):
+    binning = dioptas_model.batch_model.binning
+    center = binning[np.argmax(dioptas_model.batch_model.data[0])]
+    QtWidgets.QInputDialog.getText = MagicMock(return_value=("{:.4f}".format(center), True))
+    QtWidgets.QInputDialog.getDouble = MagicMock(return_value=(5 * (binning[1] - binning[0]), True))
+    batch_controller.widget.batch_widget.mode_widget.view_2d_btn.setChecked(True)
+    click_button(batch_widget.control_widget.track_peaks_btn)
+
+    peak_tracking = dioptas_model.batch_model.peak_tracking
+    assert peak_tracking.center.shape == (50, 1)
+    assert np.nanmedian(np.abs(peak_tracking.center[:, 0] - center)) < 5 * (binning[1] - binning[0])
+    x, y = batch_widget.stack_plot_widget.img_view.peak_positions_item.getData()
+    assert len(x) > 0
+
+
+def test_track_peaks_with_invalid_positions(batch_widget, batch_controller, dioptas_model, load_proc_data):
+    batch_controller.widget.show_error_msg = MagicMock()
+    QtWidgets.QInputDialog.getText = MagicMock(return_value=("abc", True))
+    click_button(batch_widget.control_widget.track_peaks_btn)
+    batch_controller.widget.show_error_msg.assert_called_once()
+    assert dioptas_model.batch_model.peak_tracking is None
+
+
+def test_3d_view_is_disabled_if_opengl_can_not_be_imported(
+    batch_widget, batch_controller, load_proc_data, monkeypatch
+):
+    def raise_import_error():
+        raise ImportError("OpenGL is broken")
+
+    # the integration package exports the BatchWidget class under the name of its module
+    batch_widget_module = importlib.import_module("dioptas.widgets.integration.BatchWidget")
+    monkeypatch.setattr(batch_widget_module, "BatchSurfaceWidget", raise_import_error)
+    batch_widget.mode_widget.view_3d_btn.setChecked(True)
+    batch_controller.change_view()
+
+    assert batch_widget.surface_widget is None
+    assert not batch_widget.mode_widget.view_3d_btn.isEnabled()
+    assert batch_widget.mode_widget.view_2d_btn.isChecked()
+    assert not batch_widget.stack_plot_widget.isHidden()
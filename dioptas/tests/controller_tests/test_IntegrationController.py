@@ -80,6 +80,7 @@ class IntegrationControllerTest(QtTest):
 
         QtWidgets.QFileDialog.getOpenFileNames = MagicMock(return_value=input_filenames)
         click_button(self.widget.load_img_btn)
+        self.model.pattern_writer.flush()
 
         for filename in filenames:
             filename = filename.split('.')[0] + '.xy'
@@ -95,6 +96,7 @@ class IntegrationControllerTest(QtTest):
 
         QtWidgets.QFileDialog.getOpenFileNames = MagicMock(return_value=input_filenames)
         click_button(self.widget.load_img_btn)
+        self.model.pattern_writer.flush()
 
         self.assertTrue(os.path.exists(os.path.join(working_dir, 'bkg_subtracted')))
 
@@ -64,6 +64,27 @@ class PhaseControllerTest(QtTest):
         del self.model
         gc.collect()
 
+    def test_find_matching_phases(self):
+        phase_match_widget = self.phase_widget.phase_match_widget
+        click_button(self.phase_widget.find_phases_btn)
+        self.assertIn("library is empty", phase_match_widget.status_lbl.text())
+
+        self.controller.add_library_folder(jcpds_path)
+        self.assertEqual(phase_match_widget.library_lbl.text(), "11 phases in library")
+        self.controller._matching_future.result()
+        self.controller.check_matching_phases()
+
+        matches = self.controller.phase_matches
+        self.assertGreater(len(matches), 0)
+        self.assertEqual(phase_match_widget.match_tw.rowCount(), len(matches))
+        self.assertEqual(phase_match_widget.match_tw.item(0, 0).text(), matches[0].name)
+
+        phase_match_widget.match_tw.selectRow(0)
+        click_button(phase_match_widget.add_phases_btn)
+        self.assertEqual(len(self.model.phase_model.phases), 1)
+        self.assertEqual(self.model.phase_model.phases[0].name, matches[0].name)
+        self.assertEqual(self.phase_tw.rowCount(), 1)
+
     def test_manual_deleting_phases(self):
         self.load_phases()
 
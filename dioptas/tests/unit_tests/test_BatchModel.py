@@ -6,6 +6,9 @@ from xypattern import Pattern
 
 from ...model.Configuration import Configuration
 from ...model.BatchModel import BatchModel, iterate_folder
+from ...model.util.jcpds import jcpds
+from ...model.util.HelperModule import convert_d_to_two_theta
+from ...model.util.PeakShapes import gaussian
 
 from mock import MagicMock
 
@@ -110,6 +113,122 @@ def test_normalize(batch_model):
     assert pytest.approx(0) == np.sum(np.diff(batch_model.data[:, 1]))
 
 
+def test_detect_outliers(batch_model, configuration):
+    detector = batch_model.detect_outliers(0, 20, 1, block_size=5)
+    assert detector.num_frames == 20
+    assert batch_model.outlier_detector is detector
+    assert detector.get_frame_mask((0, 3)).shape == (1833, 1556)
+    assert detector.get_frame_mask((1, 9)) is not None
+
+    configuration.use_mask = True
+    frame_masks = []
+    original_integrate = configuration.integrate_image_1d
+
+    def integrate_image_1d(**kwargs):
+        frame_masks.append(configuration.mask_model.frame_mask)
+        return original_integrate(**kwargs)
+
+    configuration.integrate_image_1d = integrate_image_1d
+    batch_model.integrate_raw_data(0, 4, 1, use_all=True)
+    assert len(frame_masks) == 4
+    assert all(mask is not None for mask in frame_masks)
+    assert configuration.mask_model.frame_mask is None
+
+    batch_model.apply_static_outlier_mask()
+    assert np.array_equal(configuration.mask_model.get_img(), detector.get_static_mask())
+
+
+def test_outlier_frame_masks_are_applied_without_mask(batch_model, configuration):
+    detector = batch_model.detect_outliers(0, 20, 1, block_size=5)
+    configuration.use_mask = False
+    batch_model.integrate_raw_data(0, 2, 1, use_all=True)
+    for call, key in zip(configuration.calibration_model.integrate_1d.call_args_list, [(0, 0), (0, 1)]):
+        assert np.array_equal(call.kwargs["mask"], detector.get_frame_mask(key))
+    assert configuration.mask_model.frame_mask is None
+
+
+def test_frame_mask_is_removed_if_integration_fails(batch_model, configuration):
+    batch_model.detect_outliers(0, 20, 1, block_size=5)
+    configuration.calibration_model.integrate_1d.side_effect = ValueError("integration failed")
+    with pytest.raises(ValueError):
+        batch_model.integrate_raw_data(0, 2, 1, use_all=True)
+    assert configuration.mask_model.frame_mask is None
+    assert not configuration.img_model.img_changed.blocked
+
+
+def create_calibrant_data(batch_model, pressures):
+    phase = jcpds()
+    phase.load_file(os.path.join(data_path, "jcpds", "pt.jcpds"))
+    wavelength = batch_model.configuration.calibration_model.wavelength * 1e10
+    two_theta = np.linspace(3, 30, 3000)
+    data = np.zeros((len(pressures), len(two_theta)))
+    for i, d_spacings in enumerate(phase.compute_d(pressures)):
+        for d, intensity in zip(d_spacings, phase.reflections.intensity):
+            data[i] += intensity * np.exp(-0.5 * ((two_theta - convert_d_to_two_theta(d, wavelength)) / 0.02) ** 2)
+    batch_model.binning = two_theta
+    batch_model.data = data + 10
+    return phase
+
+
+def test_determine_pressures(batch_model):
+    batch_model.integrate_raw_data(0, 20, 1, use_all=True)
+    true_pressures = np.linspace(0, 60, 20)
+    phase = create_calibrant_data(batch_model, true_pressures)
+
+    processed = []
+    pressures = batch_model.determine_pressures(phase, pressure_range=(0, 100), chunk_size=8,
+                                                callback_fn=lambda num: processed.append(num) or True)
+    assert processed == [8, 16, 20]
+    assert pressures == pytest.approx(true_pressures, abs=0.2)
+    assert batch_model.pressure_calibrant == "pt"
+
+
+def test_pressures_are_saved_in_processed_file(batch_model, tmp_path):
+    batch_model.integrate_raw_data(0, 4, 1, use_all=True)
+    phase = create_calibrant_data(batch_model, np.array([0, 5, 10, 15]))
+    batch_model.determine_pressures(phase)
+    pressures = batch_model.pressures.copy()
+
+    batch_model.save_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+    batch_model.reset_data()
+    assert batch_model.pressures is None
+    batch_model.load_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+    assert np.array_equal(batch_model.pressures, pressures)
+    assert batch_model.pressure_calibrant == "pt"
+
+
+def create_peak_data(batch_model, centers):
+    binning = np.linspace(5, 15, 1000)
+    batch_model.binning = binning
+    batch_model.data = np.array([gaussian(binning, 100, center, 0.05) + 10 for center in centers])
+    batch_model.bkg = np.full_like(batch_model.data, 10)
+
+
+def test_track_peaks(batch_model):
+    batch_model.integrate_raw_data(0, 20, 1, use_all=True)
+    true_centers = np.linspace(9.8, 10.2, 20)
+    create_peak_data(batch_model, true_centers)
+
+    result = batch_model.track_peaks([9.8], 0.1, x_range=(9, 11), chunk_size=8)
+    assert np.all(result.success)
+    assert result.center[:, 0] == pytest.approx(true_centers, abs=1e-3)
+    assert batch_model.peak_tracking is result
+
+
+def test_tracked_peaks_are_saved_in_processed_file(batch_model, tmp_path):
+    batch_model.integrate_raw_data(0, 4, 1, use_all=True)
+    create_peak_data(batch_model, [9.8, 9.9, 10.0, 10.1])
+    result = batch_model.track_peaks([9.8], 0.1, shape="pseudo_voigt")
+
+    batch_model.save_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+    batch_model.reset_data()
+    assert batch_model.peak_tracking is None
+    batch_model.load_proc_data(os.path.join(tmp_path, "test_save_proc.nxs"))
+    assert batch_model.peak_tracking.shape == "pseudo_voigt"
+    assert np.array_equal(batch_model.peak_tracking.center, result.center)
+    assert np.array_equal(batch_model.peak_tracking.success, result.success)
+
+
 def test_iterate_folder():
     assert iterate_folder("r001", 1) == "r002"
     assert iterate_folder("r009", 1) == "r010"
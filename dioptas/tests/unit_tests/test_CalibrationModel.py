@@ -18,6 +18,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
 import os
 import sys
 import pytest
@@ -28,10 +29,14 @@ from mock import MagicMock
 from pyFAI import detectors
 from pyFAI.detectors import Detector
 from pyFAI.detectors.orientation import Orientation
+from pyFAI.massif import Massif
+from skimage.measure import find_contours
 
 from ...model.CalibrationModel import (
     NoPointsError,
+    NotEnoughSpacingsInCalibrant,
     get_available_detectors,
+    get_available_calibrants,
     DetectorModes,
 )
 from ... import calibrants_path
@@ -129,6 +134,17 @@ def test_integration_with_supersampling(calibration_model):
     assert np.mean((y2 - y1_2_interp)) == pytest.approx(0, abs=1e-2)
 
 
+def test_integration_of_read_only_float32_image(calibration_model):
+    load_small_image_with_calibration(calibration_model)
+    calibration_model.img_model._img_data = np.ones((10, 10), dtype=np.float32)
+    assert not calibration_model.img_model.img_data.flags.writeable
+
+    x, y = calibration_model.integrate_1d()
+    assert len(y) > 0
+    cake = calibration_model.integrate_2d(rad_points=10)
+    assert cake.shape == (360, 10)
+
+
 def test_get_pixel_ind(calibration_model):
     load_small_image_with_calibration(calibration_model, shape=(30, 30))
     calibration_model.integrate_1d(60)
@@ -150,6 +166,38 @@ def test_get_pixel_ind(calibration_model):
         assert ind2 == pytest.approx(result_ind2, abs=1e-3)
 
 
+def test_get_two_theta_contours(calibration_model):
+    load_small_image_with_calibration(calibration_model, shape=(300, 400))
+    tth_array = calibration_model.get_two_theta_array()
+
+    for tth in np.deg2rad([15, 28]):
+        contours = calibration_model.get_two_theta_contours(tth)
+        expected_contours = find_contours(tth_array, tth)
+        assert len(contours) == len(expected_contours)
+
+        for contour, expected_contour in zip(contours, expected_contours):
+            # all points are on the ring and the line ends at the same image borders as the contour search
+            tth_values = calibration_model.pattern_geometry.tth(contour[:, 0], contour[:, 1])
+            assert tth_values[1:-1] == pytest.approx(tth, abs=1e-8)
+            ends = np.array(sorted(map(tuple, contour[[0, -1]])))
+            expected_ends = np.array(sorted(map(tuple, expected_contour[[0, -1]])))
+            assert ends == pytest.approx(expected_ends, abs=1e-2)
+
+    assert calibration_model.get_two_theta_contours(np.deg2rad(5)) == []
+
+
+def test_get_two_theta_contours_with_distortion_correction(calibration_model):
+    load_small_image_with_calibration(calibration_model, shape=(300, 400))
+    calibration_model.load_distortion(os.path.join(data_path, "distortion", "f4mnew.spline"))
+
+    tth = np.deg2rad(28)
+    contours = calibration_model.get_two_theta_contours(tth)
+    expected_contours = find_contours(calibration_model.get_two_theta_array(), tth)
+    assert len(contours) == len(expected_contours) > 0
+    for contour, expected_contour in zip(contours, expected_contours):
+        assert np.array_equal(contour, expected_contour)
+
+
 def test_use_different_image_sizes_for_1d_integration(calibration_model, img_model):
     load_small_image_with_calibration(calibration_model, shape=(10, 10))
     calibration_model.integrate_1d()
@@ -337,6 +385,70 @@ def test_find_peaks_automatic(calibration_model, img_model):
         assert len(points) > 0
 
 
+def setup_ring_search(calibration_model):
+    load_pilatus_1M_with_calibration(calibration_model)
+    calibration_model.set_calibrant(os.path.join(calibrants_path, "CeO2.D"))
+    calibration_model.calibrant.setWavelength_change2th(calibration_model.wavelength)
+    calibration_model.setup_peak_search_algorithm("Massif")
+
+
+def test_search_peaks_on_rings(calibration_model):
+    setup_ring_search(calibration_model)
+    np.random.seed(0)
+    for ring_index in range(5):
+        calibration_model.search_peaks_on_ring(ring_index, 0.1, 3, 50000)
+    single_ring_points = calibration_model.points
+    assert len(single_ring_points) == 5
+
+    calibration_model.clear_peaks()
+    np.random.seed(0)
+    ring_points = calibration_model.search_peaks_on_rings([0, 1, 2, 3, 4], 0.1, 3, 50000, max_workers=1)
+    assert calibration_model.points_index == [0, 1, 2, 3, 4]
+    for points, expected_points, stored_points in zip(ring_points, single_ring_points, calibration_model.points):
+        assert np.array_equal(points, expected_points)
+        assert np.array_equal(points, stored_points)
+
+    # peaks are picked in parallel and stored in ring order
+    calibration_model.clear_peaks()
+    ring_points = calibration_model.search_peaks_on_rings([4, 0, 2], 0.1, 3, 50000)
+    assert calibration_model.points_index == [4, 0, 2]
+    tth_calibrant = calibration_model.calibrant.get_2th()
+    for ring_index, points in zip([4, 0, 2], ring_points):
+        tth = calibration_model.get_two_theta_array()[points[:, 0].astype(int), points[:, 1].astype(int)]
+        assert tth == pytest.approx(tth_calibrant[ring_index], abs=np.deg2rad(0.1) + 1e-3)
+
+
+def test_search_peaks_on_rings_with_mask(calibration_model):
+    setup_ring_search(calibration_model)
+    mask = np.zeros(calibration_model.img_model.img_data.shape, dtype=bool)
+    mask[:, : mask.shape[1] // 2] = True
+    ring_points = calibration_model.search_peaks_on_rings([0, 1], 0.1, 3, 50000, mask=mask)
+    for points in ring_points:
+        assert len(points) > 0
+        assert np.all(points[:, 1] >= mask.shape[1] // 2 - 1)
+
+    with pytest.raises(NotEnoughSpacingsInCalibrant):
+        calibration_model.search_peaks_on_rings([0, 1000])
+
+
+def test_search_peaks_on_rings_keeps_stdout(calibration_model):
+    setup_ring_search(calibration_model)
+    massif_logger = logging.getLogger(Massif.__module__)
+    stdout = sys.stdout
+    search_states = []
+    peaks_from_area = calibration_model.peak_search_algorithm.peaks_from_area
+
+    def record_state(*args, **kwargs):
+        search_states.append((sys.stdout, massif_logger.level))
+        return peaks_from_area(*args, **kwargs)
+
+    calibration_model.peak_search_algorithm.peaks_from_area = record_state
+    calibration_model.search_peaks_on_rings([0, 1], 0.1, 3, 50000)
+    assert search_states == [(stdout, logging.ERROR)] * 2
+    assert sys.stdout is stdout
+    assert massif_logger.level != logging.ERROR
+
+
 def test_find_peak(calibration_model, img_model):
     """
     Tests the find_peak function for several maxima and pick points
@@ -558,6 +670,30 @@ def test_load_detector_list():
     assert "Detector" not in names
 
 
+def test_available_detectors_are_new_lists():
+    names, classes = get_available_detectors()
+    names.insert(0, "Custom")
+    classes.pop()
+    assert get_available_detectors()[0] == names[1:]
+    assert len(get_available_detectors()[1]) == len(names) - 1
+
+
+def test_get_available_calibrants(tmp_path):
+    names, files = get_available_calibrants()
+    assert names == sorted(names)
+    assert names[files.index("LaB6.D")] == "LaB6"
+    assert sorted(files) == sorted(f for f in os.listdir(calibrants_path) if f.endswith(".D"))
+
+    open(os.path.join(tmp_path, "Si.D"), "w").close()
+    open(os.path.join(tmp_path, "readme.txt"), "w").close()
+    os.utime(tmp_path, (1, 1))
+    assert get_available_calibrants(str(tmp_path)) == (["Si"], ["Si.D"])
+
+    open(os.path.join(tmp_path, "Au.D"), "w").close()
+    os.utime(tmp_path, (2, 2))
+    assert get_available_calibrants(str(tmp_path)) == (["Au", "Si"], ["Au.D", "Si.D"])
+
+
 def test_load_predefined_detector(calibration_model):
     calibration_model.load_detector("MAR 345")
 
@@ -26,6 +26,8 @@ from mock import MagicMock
 from xypattern import Pattern
 from xypattern.auto_background import SmoothBrucknerBackground
 
+from ...model.util.ImgCorrection import ObliqueAngleDetectorAbsorptionCorrection
+
 unittest_path = os.path.dirname(__file__)
 data_path = os.path.join(unittest_path, "../data")
 
@@ -294,3 +296,39 @@ def test_clear_model(dioptas_model):
     dioptas_model.add_configuration()
 
     dioptas_model.reset()
+
+
+def test_save_and_load_oiadac_correction(dioptas_model, tmp_path):
+    dioptas_model.calibration_model.load(os.path.join(data_path, "CeO2_Pilatus1M.poni"))
+    dioptas_model.img_model.load(os.path.join(data_path, "CeO2_Pilatus1M.tif"))
+    oiadac = ObliqueAngleDetectorAbsorptionCorrection(
+        tth_array=dioptas_model.calibration_model.geometry_arrays.get("tth"),
+        azi_array=dioptas_model.calibration_model.geometry_arrays.get("chi"),
+        detector_thickness=30,
+        absorption_length=450,
+    )
+    oiadac.update()
+    dioptas_model.img_model.add_img_correction(oiadac, "oiadac")
+    dioptas_model.save(os.path.join(tmp_path, "oiadac.dio"))
+
+    dioptas_model.reset()
+    dioptas_model.load(os.path.join(tmp_path, "oiadac.dio"))
+    loaded_oiadac = dioptas_model.img_model.get_img_correction("oiadac")
+    assert loaded_oiadac.detector_thickness == 30
+    assert loaded_oiadac.absorption_length == 450
+    # the correction expects two theta and azimuth in radians
+    assert np.nanmax(loaded_oiadac.tth_array) < np.pi
+    assert np.allclose(loaded_oiadac.get_data(), oiadac.get_data())
+
+
+def test_save_and_load_phases(dioptas_model, tmp_path):
+    dioptas_model.phase_model.add_jcpds(os.path.join(data_path, "jcpds", "au_Anderson.jcpds"))
+    reflections = dioptas_model.phase_model.phases[0].reflections
+    assert len(reflections) > 10
+    dioptas_model.save(os.path.join(tmp_path, "phases.dio"))
+
+    dioptas_model.reset()
+    dioptas_model.load(os.path.join(tmp_path, "phases.dio"))
+    loaded_reflections = dioptas_model.phase_model.phases[0].reflections
+    for field in ("h", "k", "l", "intensity", "d0"):
+        assert np.array_equal(loaded_reflections[field], reflections[field])
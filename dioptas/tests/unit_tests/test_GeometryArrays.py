@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+import pytest
+
+from ...model.CalibrationModel import CalibrationModel
+from ...model.ImgModel import ImgModel
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, "../data")
+
+
+@pytest.fixture
+def calibration_model():
+    img_model = ImgModel()
+    img_model._img_data = np.ones((100, 120))
+    calibration_model = CalibrationModel(img_model)
+    calibration_model.load(os.path.join(data_path, "CeO2_Pilatus1M.poni"))
+    return calibration_model
+
+
+def test_arrays_are_the_same_as_pyfai_arrays(calibration_model):
+    geometry_arrays = calibration_model.geometry_arrays
+    geometry = calibration_model.pattern_geometry
+    shape = (100, 120)
+
+    tth = geometry_arrays.get("tth")
+    assert tth.dtype == np.float32
+    assert tth.shape == shape
+    assert tth == pytest.approx(geometry.twoThetaArray(shape), abs=1e-6)
+    assert geometry_arrays.get("chi") == pytest.approx(geometry.chiArray(shape), abs=1e-4)
+    assert geometry_arrays.get("tth_deg") == pytest.approx(np.rad2deg(tth))
+    assert geometry_arrays.get("chi_deg") == pytest.approx(np.rad2deg(geometry_arrays.get("chi")))
+
+    with pytest.raises(KeyError):
+        geometry_arrays.get("r")
+
+
+def test_arrays_are_shared_until_the_geometry_changes(calibration_model):
+    geometry_arrays = calibration_model.geometry_arrays
+    tth = geometry_arrays.get("tth")
+    assert geometry_arrays.get("tth") is tth
+    assert calibration_model.get_two_theta_array() is tth
+    assert not tth.flags.writeable
+
+    # supersampling does not change the arrays of the original pixels
+    calibration_model.set_supersampling(2)
+    assert geometry_arrays.get("tth") is tth
+    calibration_model.set_supersampling(1)
+
+    calibration_model.pattern_geometry.dist *= 1.1
+    new_tth = geometry_arrays.get("tth")
+    assert new_tth is not tth
+    assert not np.array_equal(new_tth, tth)
+
+    calibration_model.img_model._img_data = np.ones((50, 60))
+    assert geometry_arrays.get("tth").shape == (50, 60)
+
+    tth = geometry_arrays.get("tth")
+    calibration_model.flip_detector_vertically()
+    assert geometry_arrays.get("tth") is not tth
+
@@ -105,6 +105,22 @@ def test_delete_corrections_with_names(corrections):
     assert np.mean(corrections.get_data()) == 5
 
 
+def test_combined_corrections_are_cached(corrections):
+    cor1 = DummyCorrection((100, 100), 2)
+    cor2 = DummyCorrection((100, 100), 3)
+    corrections.add(cor1)
+    corrections.add(cor2)
+
+    combined = corrections.get_data()
+    assert np.mean(combined) == 6
+    assert corrections.get_data() is combined
+
+    # new data of a correction invalidates the cached product
+    cor2._data = np.ones((100, 100)) * 4
+    assert np.mean(corrections.get_data()) == 8
+    assert corrections.get_data() is not combined
+
+
 class CbnCorrectionTest(unittest.TestCase):
     def setUp(self):
         # defining geometry
@@ -151,6 +167,22 @@ class CbnCorrectionTest(unittest.TestCase):
         cbn_correction_data = cbn_correction.get_data()
         self.assertGreater(np.sum(cbn_correction_data), 0)
         self.assertEqual(cbn_correction_data.shape, self.dummy_img.shape)
+        self.assertEqual(cbn_correction_data.dtype, np.float32)
+
+    def test_update_only_recalculates_after_parameter_change(self):
+        cbn_correction = CbnCorrection(self.tth_array, self.azi_array, tilt=2, tilt_rotation=30)
+        cbn_correction.update()
+        data = cbn_correction.get_data()
+
+        cbn_correction.update()
+        self.assertIs(cbn_correction.get_data(), data)
+
+        params = cbn_correction.get_params()
+        params['tilt'] = 3
+        cbn_correction.set_params(params)
+        cbn_correction.update()
+        self.assertIsNot(cbn_correction.get_data(), data)
+        self.assertFalse(np.array_equal(cbn_correction.get_data(), data))
 
 
 from ...model.CalibrationModel import CalibrationModel
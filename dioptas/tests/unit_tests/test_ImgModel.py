@@ -328,3 +328,56 @@ def test_loading_karabo_file_without_extra_data(img_model):
         # Verify that other file types still work
         img_model.load(os.path.join(data_path, "image_001.tif"))
         assert img_model.img_data is not None
+
+
+def test_img_data_with_background_corrections_and_factor():
+    img_model = ImgModel()
+    img_model._img_data = np.random.random((20, 30)) * 100
+    img_model.background_data = np.random.random((20, 30))
+    img_model.background_scaling = 2
+    img_model.background_offset = 3
+    img_model.add_img_correction(DummyCorrection((20, 30), 0.5))
+    img_model.factor = 1.5
+
+    expected = (img_model.raw_img_data - (2 * img_model.background_data + 3)) / 0.5 * 1.5
+    assert np.allclose(img_model.img_data, expected)
+
+    img_model.factor = 1
+    img_model.reset_background()
+    img_model.delete_img_correction()
+    assert np.array_equal(img_model.img_data, img_model.raw_img_data)
+
+
+def test_img_data_is_read_only_and_not_copied_on_access():
+    img_model = ImgModel()
+    img_model._img_data = np.ones((20, 30))
+    img_model.factor = 2
+
+    assert img_model.img_data is img_model.img_data
+    with pytest.raises(ValueError):
+        img_model.img_data[0, 0] = 5
+
+    img_model.factor = 1
+    with pytest.raises(ValueError):
+        img_model.img_data[0, 0] = 5
+    assert img_model.raw_img_data[0, 0] == 1
+
+
+def test_batch_update_emits_img_changed_once():
+    img_model = ImgModel()
+    img_model._img_data = np.ones((20, 30))
+    memory = []
+
+    def img_changed():
+        memory.append(1)
+
+    img_model.img_changed.connect(img_changed)
+    with img_model.batch_update():
+        img_model.background_data = np.ones((20, 30))
+        img_model.background_scaling = 0.5
+        img_model.background_offset = 0.1
+        img_model.factor = 2
+        assert memory == []
+
+    assert memory == [1]
+    assert np.allclose(img_model.img_data, (1 - (0.5 + 0.1)) * 2)
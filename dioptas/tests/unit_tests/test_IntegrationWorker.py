@@ -0,0 +1,112 @@
+import os
+import threading
+
+import numpy as np
+
+from ...model.util.IntegrationWorker import IntegrationWorker
+from ...model.Configuration import Configuration
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, "../data")
+
+
+def test_serves_only_the_most_recent_request(qapp):
+    worker = IntegrationWorker()
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "blocking"
+
+    def callback(result):
+        results.append(result)
+
+    worker.submit("1d", blocking, callback)
+    started.wait(5)
+    for value in range(5):
+        worker.submit("1d", lambda value=value: value, callback)
+    worker.submit("2d", lambda: "cake", callback)
+    assert worker.busy
+    release.set()
+    worker.wait()
+
+    # the running request and the pending ones are superseded by the last request
+    assert results == [4, "cake"]
+    assert not worker.busy
+    worker.close()
+
+
+def test_cancel_discards_result(qapp):
+    worker = IntegrationWorker()
+    release = threading.Event()
+    results = []
+
+    def callback(result):
+        results.append(result)
+
+    worker.submit("1d", lambda: release.wait(5), callback)
+    worker.cancel()
+    release.set()
+    worker.wait()
+    assert results == []
+    worker.close()
+
+
+def test_failed_request_emits_integration_failed(qapp):
+    worker = IntegrationWorker()
+    errors = []
+
+    def failing():
+        raise ValueError("no calibration")
+
+    def integration_failed(message):
+        errors.append(message)
+
+    worker.integration_failed.connect(integration_failed)
+    worker.submit("1d", failing)
+    worker.wait()
+    assert errors == ["no calibration"]
+    worker.close()
+
+
+def test_configuration_integrates_in_background(qapp):
+    config = Configuration()
+    config.calibration_model.is_calibrated = True
+    config.integrate_in_background = True
+    config.img_model._img_data = np.random.random((100, 100))
+    config.img_model.img_changed.emit()
+
+    x, y = config.integrate_image_1d(in_background=False)
+    config.pattern_model.set_pattern(np.array([0, 1]), np.array([0, 1]))
+    config.integration_worker.wait()
+    # the background integration was superseded by the immediate one
+    assert len(config.pattern_model.pattern.x) == 2
+
+    config.integrate_image_1d()
+    config.integration_worker.wait()
+    assert np.array_equal(config.pattern_model.pattern.x, x)
+    assert np.array_equal(config.pattern_model.pattern.y, y)
+    config.integration_worker.close()
+
+
+def test_background_integration_waits_for_geometry_changes(qapp):
+    config = Configuration()
+    config.calibration_model.load(os.path.join(data_path, "CeO2_Pilatus1M.poni"))
+    config.integrate_in_background = True
+    config.img_model._img_data = np.random.random((100, 100))
+    cake_img = config.calibration_model.cake_img
+
+    # e.g. a refinement on the main thread holds the lock until the geometry is consistent again
+    with config.calibration_model.geometry_lock:
+        config.integrate_image_2d()
+        assert config.integration_worker.busy
+        assert config.calibration_model.cake_img is cake_img
+
+    config.integration_worker.wait()
+    # the result is stored on the main thread when it is delivered
+    assert config.calibration_model.cake_img is not cake_img
+    assert config.calibration_model.cake_tth is not None
+    config.integration_worker.close()
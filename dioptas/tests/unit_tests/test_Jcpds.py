@@ -20,6 +20,7 @@
 import os
 
 import pytest
+import numpy as np
 
 from ...model.util import jcpds as jcpds_class
 
@@ -115,3 +116,53 @@ def test_using_negative_pressures_with_zero_bulk_modulus(jcpds):
 
     jcpds.compute_d(-1, 298)
     assert jcpds.params['v'] == jcpds.params['v0']
+
+
+def test_reflections_are_stored_in_array(jcpds):
+    jcpds.load_file(os.path.join(jcpds_path, 'au_Anderson.jcpds'))
+    reflections = jcpds.reflections
+    assert len(reflections) == 13
+    assert reflections[0].h == 1 and reflections[0].k == 1 and reflections[0].l == 1
+
+    reflections[0].h = 2
+    jcpds.compute_d0()
+    assert jcpds.reflections.h[0] == 2
+    assert jcpds.reflections.d0[0] == pytest.approx(jcpds.params['a0'] / np.sqrt(6))
+
+    jcpds.delete_reflection(0)
+    assert len(jcpds.reflections) == 12
+    jcpds.add_reflections([1, 2], [0, 0], [0, 0], [10, 20], [4, 2])
+    assert len(jcpds.reflections) == 14
+    assert jcpds.reflections[-1].intensity == 20
+
+
+def test_compute_d_for_pressure_temperature_grid(jcpds):
+    jcpds.load_file(os.path.join(jcpds_path, 'au_Anderson.jcpds'))
+    pressures = np.array([0, 10, 50, 100])
+    temperatures = np.array([298, 1000, 2000, 3000])
+
+    d_grid = jcpds.compute_d(pressures, temperatures)
+    assert d_grid.shape == (4, len(jcpds.reflections))
+    # the state of the jcpds is not changed by an array calculation
+    assert jcpds.params['pressure'] == 0
+
+    for ind, (pressure, temperature) in enumerate(zip(pressures, temperatures)):
+        jcpds.compute_d(pressure, temperature)
+        assert np.allclose(d_grid[ind], jcpds.reflections.d)
+
+    # pressures are broadcast against a single temperature
+    assert jcpds.compute_d(np.linspace(0, 100, 11), 298).shape == (11, len(jcpds.reflections))
+
+
+def test_bm3_solve(jcpds):
+    v0_v = jcpds.bm3_solve(167., 5.5, np.array([1., 10., 300.]))
+    residuals = [jcpds.bm3_inverse(x, 167., 5.5, p) for x, p in zip(v0_v, [1., 10., 300.])]
+    assert np.allclose(residuals, 0)
+
+
+def test_calculate_pressures_inverts_calculate_volumes(jcpds):
+    jcpds.load_file(os.path.join(jcpds_path, 'pt.jcpds'))
+    pressures = np.array([0.5, 10., 50., 200.])
+    for temperature in (298., 1500.):
+        volumes = jcpds.calculate_volumes(pressures, temperature)
+        assert np.allclose(jcpds.calculate_pressures(volumes, temperature), pressures)
@@ -25,7 +25,7 @@ from math import cos, sin
 import pytest
 from qtpy import QtCore
 
-from ...model.MaskModel import MaskModel
+from ...model.MaskModel import MaskModel, structuring_element
 
 unittest_path = os.path.dirname(__file__)
 data_path = os.path.join(unittest_path, '../data')
@@ -101,6 +101,70 @@ def test_shrink_mask(mask_model):
     assert np.sum(mask_model._mask_data) == 0
 
 
+@pytest.mark.parametrize("structure, num_pixels", [("square", 25), ("cross", 13), ("disk", 13)])
+def test_grow_with_radius_and_structure(mask_model, structure, num_pixels):
+    mask_model._mask_data[4, 4] = 1
+    mask_model.grow(2, structure)
+    assert np.sum(mask_model._mask_data) == num_pixels
+    assert np.array_equal(mask_model._mask_data[2:7, 2:7], structuring_element(2, structure))
+
+    mask_model.shrink(2, structure)
+    assert np.sum(mask_model._mask_data) == 1
+    assert mask_model._mask_data[4, 4]
+
+
+def test_structuring_element_with_unknown_structure():
+    with pytest.raises(ValueError):
+        structuring_element(1, 'triangle')
+
+
+def test_undo_and_redo(mask_model):
+    mask_model.mask_rect(2, 2, 3, 3)
+    after_rect = np.copy(mask_model.get_img())
+    mask_model.mask_ellipse(7, 7, 2, 2)
+    after_ellipse = np.copy(mask_model.get_img())
+    mask_model.invert_mask()
+
+    mask_model.undo()
+    assert np.array_equal(mask_model.get_img(), after_ellipse)
+    mask_model.undo()
+    assert np.array_equal(mask_model.get_img(), after_rect)
+    mask_model.undo()
+    assert np.sum(mask_model.get_img()) == 0
+    mask_model.undo()  # nothing left to undo
+    assert np.sum(mask_model.get_img()) == 0
+
+    mask_model.redo()
+    assert np.array_equal(mask_model.get_img(), after_rect)
+    mask_model.redo()
+    assert np.array_equal(mask_model.get_img(), after_ellipse)
+
+    # a new action clears the redo steps
+    mask_model.grow()
+    after_grow = np.copy(mask_model.get_img())
+    mask_model.redo()
+    assert np.array_equal(mask_model.get_img(), after_grow)
+
+
+def test_undo_history_only_stores_changed_region():
+    mask_model = MaskModel((1000, 1000))
+    mask_model.mask_rect(10, 10, 8, 8)
+    assert mask_model._history.nbytes == 8
+    mask_model.undo()
+    assert np.sum(mask_model.get_img()) == 0
+    assert mask_model._history.nbytes == 8
+
+
+def test_undo_history_byte_budget():
+    mask_model = MaskModel((100, 100))
+    mask_model.set_history_size(3000)
+    for _ in range(5):
+        mask_model.invert_mask()  # full mask with 100x100 bits => 1250 bytes per step
+
+    assert mask_model._history.undo_steps == 2
+    assert mask_model._history.nbytes <= 3000
+
+
 @pytest.mark.parametrize("flipud", [False, True])
 @pytest.mark.parametrize("extension", [".mask", ".npy", ".edf"])
 def test_saving_and_loading(mask_model, tmp_path, extension, flipud):
@@ -138,6 +202,16 @@ def test_save_mask(mask_model, tmp_path, extension):
     assert os.path.exists(filename)
 
 
+def test_save_mask_as_bilevel_tiff(mask_model, tmp_path):
+    from PIL import Image
+    mask_model.mask_rect(2, 3, 4, 5)
+    filename = os.path.join(tmp_path, "test_save.mask")
+    mask_model.save_mask(filename)
+
+    assert Image.open(filename).mode == '1'
+    assert np.array_equal(MaskModel.read_mask_file(filename), mask_model.get_img())
+
+
 def test_find_center_of_circle_from_three_points(mask_model):
     x0 = 2.0
     y0 = 3.5
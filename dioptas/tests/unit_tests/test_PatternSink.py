@@ -0,0 +1,88 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from ...model.Configuration import Configuration
+from ...model.util.PatternSink import NexusPatternSink
+
+x = np.linspace(1, 20, 200)
+
+
+def test_append_patterns(tmp_path):
+    filename = os.path.join(tmp_path, "run1.nxs")
+    sink = NexusPatternSink(filename, calibration_file="test.poni")
+    for ind in range(5):
+        sink.append(x, np.full_like(x, ind), np.full_like(x, ind - 1), "image_{}.h5".format(ind // 2), ind % 2,
+                    100.0 + ind)
+
+    # the file can be read while it is still open for writing
+    with h5py.File(filename, "r", swmr=True) as f:
+        assert f["processed/result/data"].shape == (5, len(x))
+        assert np.array_equal(f["processed/result/binning"][()], x)
+        assert np.array_equal(f["processed/process/bkg"][()], np.ones((5, len(x))))
+        assert list(f["processed/process/files"].asstr()[()]) == ["image_0.h5", "image_1.h5", "image_2.h5"]
+        assert list(f["processed/process/file_map"][()]) == [0, 2, 4, 5]
+        assert np.array_equal(f["processed/process/pos_map"][()], [[0, 0], [0, 1], [1, 0], [1, 1], [2, 0]])
+        assert np.array_equal(f["processed/process/timestamp"][()], 100.0 + np.arange(5))
+    sink.close()
+
+
+def test_continue_existing_sink(tmp_path):
+    filename = os.path.join(tmp_path, "run1.nxs")
+    sink = NexusPatternSink(filename)
+    sink.append(x, np.sin(x), image_filename="image_0.h5")
+    sink.close()
+
+    sink = NexusPatternSink(filename)
+    assert sink.num_patterns == 1
+    sink.append(x, np.cos(x), image_filename="image_0.h5", frame=1)
+    # trimmed patterns are padded with zeros
+    sink.append(x[:150], np.cos(x[:150]), image_filename="image_1.h5")
+    sink.close()
+
+    with h5py.File(filename, "r") as f:
+        data = f["processed/result/data"][()]
+        assert np.array_equal(data[1], np.cos(x))
+        assert np.array_equal(data[2, 150:], np.zeros(50))
+        assert list(f["processed/process/file_map"][()]) == [0, 2, 3]
+
+
+def test_do_not_append_patterns_in_other_units(tmp_path):
+    filename = os.path.join(tmp_path, "run1.nxs")
+    sink = NexusPatternSink(filename, unit="2th_deg")
+    sink.append(x, np.sin(x), image_filename="image_0.h5")
+    with pytest.raises(ValueError):
+        sink.append(x, np.sin(x), image_filename="image_1.h5", unit="q_A^-1")
+    sink.close()
+
+    with pytest.raises(ValueError):
+        NexusPatternSink(filename, unit="q_A^-1")
+
+    sink = NexusPatternSink(filename, unit="2th_deg")
+    assert sink.num_patterns == 1
+    sink.close()
+
+
+def test_do_not_append_to_other_files(tmp_path):
+    filename = os.path.join(tmp_path, "other.nxs")
+    with h5py.File(filename, "w") as f:
+        f["data"] = np.arange(3)
+    with pytest.raises(ValueError):
+        NexusPatternSink(filename)
+
+
+def test_sink_can_be_loaded_in_batch_model(tmp_path):
+    filename = os.path.join(tmp_path, "run1.nxs")
+    sink = NexusPatternSink(filename)
+    for ind in range(3):
+        sink.append(x, np.full_like(x, ind), np.zeros_like(x), "image_{}.h5".format(ind))
+
+    batch_model = Configuration().batch_model
+    batch_model.load_proc_data(filename)
+    sink.close()
+    assert batch_model.data.shape == (3, len(x))
+    assert np.array_equal(batch_model.data - batch_model.bkg, np.zeros((3, len(x))))
+    assert list(batch_model.files) == ["image_0.h5", "image_1.h5", "image_2.h5"]
+    assert batch_model.pos_map.shape == (3, 2)
@@ -0,0 +1,109 @@
+import os
+
+import h5py
+import numpy as np
+from qtpy import QtCore
+from xypattern import Pattern
+
+from ...model.util.PatternWriter import PatternWriter
+
+
+def create_pattern():
+    x = np.linspace(1, 10, 100)
+    pattern = Pattern(x, np.sin(x) + 2, name="test")
+    pattern.background_pattern = Pattern(x, np.ones_like(x))
+    return pattern
+
+
+def test_write_all_formats(tmp_path):
+    writer = PatternWriter()
+    pattern = create_pattern()
+    files = [(os.path.join(tmp_path, "test" + ending), "", False) for ending in (".xy", ".chi", ".dat")]
+    files.append((os.path.join(tmp_path, "bkg_subtracted", "test.xy"), "", True))
+    writer.submit(pattern, files)
+    writer.flush()
+
+    assert writer.backlog == 0
+    assert writer.errors == []
+    for filename, _, _ in files:
+        assert os.path.exists(filename)
+
+    saved = Pattern()
+    saved.load(os.path.join(tmp_path, "bkg_subtracted", "test.xy"))
+    assert np.allclose(saved.y, np.sin(pattern.x) + 1)
+    writer.close()
+
+
+def test_written_pattern_is_a_snapshot(tmp_path):
+    writer = PatternWriter()
+    pattern = create_pattern()
+    writer.submit(pattern, [(os.path.join(tmp_path, "test.xy"), "", False)])
+    pattern.data = (pattern.x, np.zeros_like(pattern.x))
+    writer.close()
+
+    saved = Pattern()
+    saved.load(os.path.join(tmp_path, "test.xy"))
+    assert np.allclose(saved.y, np.sin(pattern.x) + 2)
+
+
+def test_write_errors_are_reported(tmp_path):
+    writer = PatternWriter()
+    failed = []
+    backlogs = []
+
+    def write_failed(filename, message):
+        failed.append(filename)
+
+    def backlog_changed(backlog):
+        backlogs.append(backlog)
+
+    writer.write_failed.connect(write_failed)
+    writer.backlog_changed.connect(backlog_changed)
+
+    blocking_file = os.path.join(tmp_path, "file")
+    open(blocking_file, "w").close()
+    filename = os.path.join(blocking_file, "test.xy")
+    writer.submit(create_pattern(), [(filename, "", False)])
+    writer.flush()
+    # signals of the writer thread are delivered by the qt event loop, when an application exists
+    if QtCore.QCoreApplication.instance() is not None:
+        QtCore.QCoreApplication.processEvents()
+
+    assert failed == [filename]
+    assert writer.errors[0][0] == filename
+    assert backlogs == [1, 0]
+    writer.close()
+
+
+def test_append_patterns_to_nxs_file(tmp_path):
+    writer = PatternWriter()
+    filename = os.path.join(tmp_path, "images.nxs")
+    for ind in range(3):
+        writer.submit(create_pattern(), [(filename, "", True)], image_filename="image_{}.tif".format(ind))
+    writer.close()
+
+    with h5py.File(filename, "r") as f:
+        assert f["processed/result/data"].shape == (3, 100)
+        assert np.allclose(f["processed/process/bkg"][()], 1)
+        assert f["processed/process/files"].shape == (3,)
+
+
+def test_unit_change_of_nxs_file_is_reported(tmp_path):
+    writer = PatternWriter()
+    failed = []
+
+    def write_failed(filename, message):
+        failed.append(filename)
+
+    writer.write_failed.connect(write_failed)
+    filename = os.path.join(tmp_path, "images.nxs")
+    writer.submit(create_pattern(), [(filename, "", False)], unit="2th_deg", image_filename="image_0.tif")
+    writer.submit(create_pattern(), [(filename, "", False)], unit="q_A^-1", image_filename="image_1.tif")
+    writer.flush()
+    if QtCore.QCoreApplication.instance() is not None:
+        QtCore.QCoreApplication.processEvents()
+    writer.close()
+
+    assert failed == [filename]
+    with h5py.File(filename, "r") as f:
+        assert f["processed/result/data"].shape == (1, 100)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+from pytest import approx
+
+from ...model.util.PeakShapes import gaussian, pseudo_voigt, SIGMA_TO_FWHM
+from ...model.util.PeakTracker import PeakTracker, track_peaks
+
+x = np.linspace(0, 20, 2000)
+
+
+def create_gaussian_series(centers_1, centers_2, sigma=0.05):
+    return np.array([gaussian(x, 100, c1, sigma) + gaussian(x, 50, c2, sigma) + 5 + 0.1 * x
+                     for c1, c2 in zip(centers_1, centers_2)])
+
+
+def test_track_two_gaussian_peaks():
+    centers_1 = np.linspace(8, 8.5, 100)
+    centers_2 = np.linspace(12, 11.6, 100)
+    data = create_gaussian_series(centers_1, centers_2)
+
+    result = track_peaks(x, data, [8, 12], 0.1, chunk_size=16, max_workers=2)
+    assert result.num_peaks == 2
+    assert np.all(result.success)
+    assert result.center[:, 0] == approx(centers_1, abs=1e-3)
+    assert result.center[:, 1] == approx(centers_2, abs=1e-3)
+    assert result.fwhm == approx(np.full((100, 2), 0.05 * SIGMA_TO_FWHM), rel=1e-2)
+    assert result.area[:, 0] / result.area[:, 1] == approx(np.full(100, 2), rel=1e-2)
+
+
+def test_track_pseudo_voigt_peak():
+    centers = np.linspace(10, 10.3, 50)
+    data = np.array([pseudo_voigt(x, 100, center, 0.2, 0.3) + 2 for center in centers])
+
+    result = PeakTracker(x, [10], 0.15, shape='pseudo_voigt').fit(data)
+    assert np.all(result.success)
+    assert result.center[:, 0] == approx(centers, abs=1e-3)
+    assert result.fwhm[:, 0] == approx(np.full(50, 0.2), rel=1e-2)
+    assert result.eta[:, 0] == approx(np.full(50, 0.3), abs=1e-2)
+
+
+def test_abort_tracking():
+    data = create_gaussian_series(np.full(40, 8), np.full(40, 12))
+    result = track_peaks(x, data, [8, 12], 0.1, chunk_size=10, callback_fn=lambda num: num < 20)
+    assert np.all(result.success[:20])
+    assert not np.any(result.success[20:])
+
+
+def test_unknown_shape():
+    with pytest.raises(ValueError):
+        PeakTracker(x, [8], 0.1, shape='voigt')
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+
+import pytest
+import numpy as np
+
+from ...model.util.PhaseLibrary import PhaseLibrary, get_elements_from_text
+from ...model.util.jcpds import jcpds
+from ...model.PhaseModel import PhaseModel
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, '../data')
+jcpds_path = os.path.join(data_path, 'jcpds')
+cif_path = os.path.join(data_path, 'cif')
+
+
+@pytest.fixture
+def phase_library(tmp_path):
+    return PhaseLibrary(cache_filename=str(tmp_path / 'phase_library.pkl'))
+
+
+def test_add_folder(phase_library):
+    assert phase_library.add_folder(jcpds_path) == []
+    assert len(phase_library) == 11
+
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 'au_Anderson.jcpds'))
+    reference = jcpds()
+    reference.load_file(os.path.join(jcpds_path, 'au_Anderson.jcpds'))
+    reference.compute_d()
+    assert phase.name == reference.name
+    assert np.array_equal(phase.reflections.d, reference.reflections.d)
+
+
+def test_get_phase_returns_independent_copies(phase_library):
+    filename = os.path.join(jcpds_path, 'pt.jcpds')
+    phase1 = phase_library.get_phase(filename)
+    phase1.compute_d(pressure=20)
+    phase2 = phase_library.get_phase(filename)
+    assert phase2.params['pressure'] == 0
+
+
+def test_search(phase_library):
+    phase_library.add_folder(jcpds_path)
+    phase_library.update([os.path.join(cif_path, 'magnesiowustite.cif'), os.path.join(cif_path, 'hcp.cif')])
+
+    assert sorted(e.name for e in phase_library.search(elements=['Fe'])) == ['FeGeO3_cpx', 'magnesiowustite']
+    assert sorted(e.name for e in phase_library.search(elements=['Fe', 'Mg', 'O'])) == ['magnesiowustite']
+    assert sorted(e.name for e in phase_library.search(name='rhenium')) == ['re', 're_K0']
+    assert sorted(e.name for e in phase_library.search(name='au', symmetry='cubic')) == \
+           ['au_Anderson', 'au_mal_anders', 'au_mal_anders_vers2']
+    assert sorted(e.name for e in phase_library.search(symmetry='HEXAGONAL')) == ['hcp', 're', 're_K0']
+
+
+def test_cache_is_reused_and_invalidated(phase_library, tmp_path):
+    filename = str(tmp_path / 'pt.jcpds')
+    shutil.copy(os.path.join(jcpds_path, 'pt.jcpds'), filename)
+    phase_library.update([filename])
+    assert os.path.exists(phase_library.cache_filename)
+
+    new_library = PhaseLibrary(cache_filename=phase_library.cache_filename)
+    assert len(new_library) == 1
+    entry = new_library.entries[0]
+    assert new_library.get_phase(filename).name == 'pt'
+    assert new_library.entries[0] is entry
+
+    os.utime(filename, (entry.mtime + 10, entry.mtime + 10))
+    new_library.get_phase(filename)
+    assert new_library.entries[0] is not entry
+
+
+def test_cif_entries_depend_on_conversion_parameters(phase_library):
+    filename = os.path.join(cif_path, 'fcc.cif')
+    phase1 = phase_library.get_phase(filename, 0.5, 0.5)
+    phase2 = phase_library.get_phase(filename, 0.5, 1.5)
+    assert len(phase2.reflections) < len(phase1.reflections)
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    cache_filename = str(tmp_path / 'phase_library.pkl')
+    with open(cache_filename, 'wb') as f:
+        f.write(b'no pickle')
+    phase_library = PhaseLibrary(cache_filename=cache_filename)
+    assert len(phase_library) == 0
+    phase_library.update([os.path.join(jcpds_path, 'ar.jcpds')])
+    assert len(PhaseLibrary(cache_filename=cache_filename)) == 1
+
+
+def test_failed_files_are_reported(phase_library, tmp_path):
+    filename = str(tmp_path / 'broken.jcpds')
+    with open(filename, 'w') as f:
+        f.write('VERSION: 4\nNAME: broken\nSYMMETRY: CUBIC\nA: abc\n')
+    assert phase_library.update([filename, os.path.join(jcpds_path, 'ar.jcpds')]) == [filename]
+    assert len(phase_library) == 1
+
+
+def test_get_elements_from_text():
+    assert get_elements_from_text('au_Anderson', 'Gold (04-0784, Anderson et al J Appl Phys 65)') == {'Au'}
+    assert get_elements_from_text('FeGeO3_cpx', 'FeGeO3 (data from Redhammer)') == {'Fe', 'Ge', 'O'}
+    assert get_elements_from_text('test', 'Mg0.8Fe0.2O, FCC structure') == {'Mg', 'Fe', 'O'}
+
+
+def test_phase_model_add_phases():
+    phase_model = PhaseModel()
+    filenames = [os.path.join(jcpds_path, f) for f in ('ar.jcpds', 'ag.jcpds', 'pt.jcpds')]
+    filenames.append(os.path.join(cif_path, 'fcc.cif'))
+    errors = phase_model.add_phases(filenames)
+    assert errors == []
+    assert [phase.name for phase in phase_model.phases] == ['ar', 'ag', 'pt', 'fcc']
+    assert phase_model.phase_files == filenames
+
+
+def test_single_phases_are_only_written_on_flush(phase_library):
+    phase_library.get_phase(os.path.join(jcpds_path, 'pt.jcpds'))
+    assert not os.path.exists(phase_library.cache_filename)
+
+    phase_library.flush_cache()
+    assert len(PhaseLibrary(cache_filename=phase_library.cache_filename)) == 1
+
+    mtime = os.path.getmtime(phase_library.cache_filename)
+    os.utime(phase_library.cache_filename, (mtime - 10, mtime - 10))
+    phase_library.get_phase(os.path.join(jcpds_path, 'pt.jcpds'))
+    phase_library.flush_cache()
+    assert os.path.getmtime(phase_library.cache_filename) == mtime - 10
+
+
+def test_entries_of_deleted_files_are_removed(phase_library, tmp_path):
+    filenames = [str(tmp_path / 'pt.jcpds'), str(tmp_path / 'ar.jcpds')]
+    for filename in filenames:
+        shutil.copy(os.path.join(jcpds_path, os.path.basename(filename)), filename)
+    phase_library.update(filenames)
+
+    os.remove(filenames[0])
+    new_library = PhaseLibrary(cache_filename=phase_library.cache_filename)
+    assert [entry.filename for entry in new_library.entries] == [filenames[1]]
+
+    os.remove(filenames[1])
+    assert new_library.update(filenames) == filenames
+    assert len(new_library) == 0
+    assert len(PhaseLibrary(cache_filename=phase_library.cache_filename)) == 0
+
+
+def test_files_are_parsed_in_worker_processes(tmp_path):
+    broken_filename = str(tmp_path / 'broken.jcpds')
+    with open(broken_filename, 'w') as f:
+        f.write('VERSION: 4\nNAME: broken\nSYMMETRY: CUBIC\nA: abc\n')
+    filenames = [os.path.join(jcpds_path, 'ar.jcpds'), broken_filename, os.path.join(cif_path, 'fcc.cif')]
+
+    phase_library = PhaseLibrary(max_workers=2)
+    phase_library.cif_files_per_worker = 1
+    broken_cif_filename = str(tmp_path / 'broken.cif')
+    with open(broken_cif_filename, 'w') as f:
+        f.write('no cif')
+    filenames.append(broken_cif_filename)
+    assert phase_library.update(filenames) == [broken_filename, broken_cif_filename]
+    assert sorted(entry.name for entry in phase_library.entries) == ['ar', 'fcc']
+    assert len(phase_library.get_phase(filenames[2]).reflections) > 0
+
+
+def test_update_can_be_aborted(tmp_path):
+    filenames = [os.path.join(jcpds_path, f) for f in ('ar.jcpds', 'ag.jcpds', 'pt.jcpds', 're.jcpds')]
+    filenames += [os.path.join(cif_path, f) for f in ('fcc.cif', 'hcp.cif')]
+    for max_workers in (1, 2):
+        phase_library = PhaseLibrary(max_workers=max_workers)
+        phase_library.cif_files_per_worker = 1
+        phase_library.update(filenames, callback_fn=lambda num_parsed: num_parsed < 2)
+        assert len(phase_library) == 2
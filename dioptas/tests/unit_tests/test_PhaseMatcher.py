@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import pytest
+import numpy as np
+from pytest import approx
+
+from ...model.util.PhaseLibrary import PhaseLibrary
+from ...model.util.PhaseMatcher import PhaseMatcher, find_pattern_peaks
+from ...model.util.HelperModule import convert_d_to_two_theta
+from ...model.PhaseModel import PhaseModel
+
+unittest_path = os.path.dirname(__file__)
+data_path = os.path.join(unittest_path, '../data')
+jcpds_path = os.path.join(data_path, 'jcpds')
+
+WAVELENGTH = 0.31
+
+
+@pytest.fixture(scope='module')
+def phase_library():
+    phase_library = PhaseLibrary()
+    phase_library.add_folder(jcpds_path)
+    return phase_library
+
+
+def create_pattern(phase, pressure, two_theta=np.linspace(2, 25, 5000)):
+    d_spacings = phase.compute_d(np.array([pressure]))[0]
+    y = np.zeros_like(two_theta)
+    for d, intensity in zip(d_spacings, phase.reflections.intensity):
+        y += intensity * np.exp(-0.5 * ((two_theta - convert_d_to_two_theta(d, WAVELENGTH)) / 0.02) ** 2)
+    return two_theta, y
+
+
+def test_find_pattern_peaks(phase_library):
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 'pt.jcpds'))
+    x, y = create_pattern(phase, 0)
+    peak_d, peak_intensities = find_pattern_peaks(x, y, '2th_deg', WAVELENGTH)
+    d_min = WAVELENGTH / (2 * np.sin(np.radians(x[-1] / 2)))
+    expected_d = np.sort(phase.reflections.d0[phase.reflections.d0 > d_min])
+    assert peak_d == approx(expected_d, rel=5e-4)
+
+    peak_d_in_d_unit, _ = find_pattern_peaks(WAVELENGTH / (2 * np.sin(np.radians(x / 2))), y, 'd_A')
+    assert peak_d_in_d_unit == approx(peak_d, rel=1e-3)
+
+
+def test_match_at_ambient_conditions(phase_library):
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 're.jcpds'))
+    x, y = create_pattern(phase, 0)
+    peak_d, _ = find_pattern_peaks(x, y, '2th_deg', WAVELENGTH)
+
+    matches = PhaseMatcher(phase_library.entries).match(peak_d)
+    assert matches[0].name in ('re', 're_K0')
+    assert matches[0].score > 0.95  # a few reflections overlap in the pattern
+    assert matches[0].pressure == 0
+    assert sorted(m.name for m in matches[:2]) == ['re', 're_K0']
+    assert matches[2].score < 0.9
+
+
+def test_match_within_pressure_window(phase_library):
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 'pt.jcpds'))
+    x, y = create_pattern(phase, 20)
+    peak_d, _ = find_pattern_peaks(x, y, '2th_deg', WAVELENGTH)
+
+    ambient_matches = PhaseMatcher(phase_library.entries).match(peak_d)
+    assert [m.name for m in ambient_matches if m.score == approx(1)] == []
+
+    matches = PhaseMatcher(phase_library.entries, pressure_range=(0, 50)).match(peak_d)
+    assert matches[0].name == 'pt'
+    assert matches[0].score == approx(1)
+    assert matches[0].pressure == approx(20, abs=1)
+
+
+def test_match_with_strain_window(phase_library):
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 'ar.jcpds'))
+    peak_d = np.sort(phase.reflections.d0) * 0.99
+
+    assert PhaseMatcher(phase_library.entries).match(peak_d)[0].score < 1
+    matches = PhaseMatcher(phase_library.entries, strain=0.015).match(peak_d)
+    assert matches[0].score == approx(1)
+    assert matches[0].ratio == approx(0.99, abs=2e-3)
+
+
+def test_phase_model_find_matching_phases(phase_library):
+    phase_model = PhaseModel()
+    phase_model.phase_library = phase_library
+    phase = phase_library.get_phase(os.path.join(jcpds_path, 'mo.jcpds'))
+    x, y = create_pattern(phase, 10)
+
+    future = phase_model.find_matching_phases(x, y, '2th_deg', WAVELENGTH, pressure_range=(0, 30))
+    matches = future.result(timeout=10)
+    assert matches[0].name == 'mo'
+    assert matches[0].pressure == approx(10, abs=1)
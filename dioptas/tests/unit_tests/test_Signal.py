@@ -139,3 +139,61 @@ def test_signal_with_priority():
     signal.emit()
 
     assert memory == [2, 1]
+
+
+def test_signal_passes_arguments_only_to_listeners_with_parameters():
+    signal = Signal(int)
+    memory = []
+
+    def f():
+        memory.append("f")
+
+    def g(value):
+        memory.append(value)
+
+    signal.connect(f)
+    signal.connect(g)
+    signal.emit(3)
+
+    assert memory == ["f", 3]
+
+
+def test_signal_statistics():
+    signal = Signal()
+
+    def f():
+        pass
+
+    signal.connect(f)
+    signal.emit()
+    assert signal.statistics is None
+
+    signal.enable_statistics()
+    signal.emit()
+    signal.emit()
+    assert signal.statistics.emit_count == 2
+    assert signal.statistics.total_time >= signal.statistics.max_time > 0
+
+    signal.enable_statistics(False)
+    assert signal.statistics is None
+
+
+def test_signal_coalesce_emits_once_with_last_arguments():
+    signal = Signal(int)
+    memory = []
+
+    def f(value):
+        memory.append(value)
+
+    signal.connect(f)
+    with signal.coalesce():
+        signal.emit(1)
+        with signal.coalesce():
+            signal.emit(2)
+        assert memory == []
+        signal.emit(3)
+    assert memory == [3]
+
+    with signal.coalesce():
+        pass
+    assert memory == [3]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+
+from dioptas.model.util.StackOutlierDetector import StackOutlierDetector
+
+
+def create_series(num_frames, shape=(50, 60), seed=0):
+    rng = np.random.default_rng(seed)
+    frames = rng.poisson(100, (num_frames,) + shape).astype(float)
+    frames[:, 10, 10] = 5000  # hot pixel
+    frames[:, 20, 30] = 0  # dead pixel
+    frames[3, 40, 40] = 10000  # cosmic in frame 3
+    frames[12, 5, 50] = 10000  # cosmic in frame 12
+    return frames
+
+
+def test_per_frame_outliers():
+    detector = StackOutlierDetector(block_size=7)
+    for frame in create_series(15):
+        detector.add_frame(frame)
+    detector.finish()
+
+    assert detector.num_frames == 15
+    assert np.argwhere(detector.get_frame_mask(3)).tolist() == [[40, 40]]
+    assert np.argwhere(detector.get_frame_mask(12)).tolist() == [[5, 50]]
+    assert detector.get_num_outliers(0) == 0
+    # last frame is in a block with only one frame and is compared with the statistics of the previous block
+    assert detector.get_frame_mask(14) is not None
+    assert detector.get_frame_mask(15) is None
+
+
+def test_static_mask():
+    detector = StackOutlierDetector(block_size=5)
+    for frame in create_series(30):
+        detector.add_frame(frame)
+    detector.finish()
+
+    assert np.median(detector.median) == pytest.approx(100, abs=2)
+    static_mask = detector.get_static_mask()
+    assert np.argwhere(static_mask).tolist() == [[10, 10], [20, 30]]
+
+
+def test_frame_keys_and_shape_check():
+    detector = StackOutlierDetector(block_size=3)
+    frames = create_series(15)[:3]
+    for ind, frame in enumerate(frames):
+        detector.add_frame(frame, key=('file', ind))
+    assert detector.get_frame_mask(('file', 2)).shape == frames[0].shape
+
+    with pytest.raises(ValueError):
+        detector.add_frame(np.zeros((3, 3)))
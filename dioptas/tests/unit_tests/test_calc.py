@@ -1,6 +1,6 @@
 import numpy as np
 
-from ...model.util.calc import trim_trailing_zeros
+from ...model.util.calc import trim_trailing_zeros, correct_img_data
 
 
 def test_trim_trailing_zeros():
@@ -12,3 +12,33 @@ def test_trim_trailing_zeros():
 
     assert len(y_trim) == len(y) - 10
     assert len(x_trim) == len(y) - 10
+
+
+def test_correct_img_data_gives_same_result_as_separate_operations():
+    img = np.random.random((130, 70)) * 1000
+    background = np.random.random((130, 70)) * 100
+    corrections = np.random.random((130, 70)) + 0.5
+
+    expected = (img - (1.3 * background + 20)) / corrections * 2.5
+    for max_workers in [1, 4]:
+        result = correct_img_data(img, background, 1.3, 20, corrections, 2.5, block_rows=16, max_workers=max_workers)
+        assert np.array_equal(result, expected)
+
+
+def test_correct_img_data_converts_integer_images():
+    img = np.arange(20, dtype=np.uint16).reshape(4, 5)
+    background = np.full((4, 5), 10, dtype=np.uint16)
+
+    result = correct_img_data(img, background)
+    assert result.dtype == np.float32
+    assert np.array_equal(result, img.astype(np.float64) - 10)  # no unsigned integer underflow
+
+    assert correct_img_data(img).dtype == np.uint16
+    assert correct_img_data(img, factor=0.5).dtype == np.float64
+
+
+def test_correct_img_data_reuses_output_array():
+    img = np.ones((10, 10))
+    out = np.empty((10, 10))
+    assert correct_img_data(img, np.ones((10, 10)), out=out) is out
+    assert correct_img_data(img, np.ones((10, 10)), out=np.empty((5, 5))) is not out
@@ -20,7 +20,7 @@
 import os
 import numpy as np
 
-from pytest import approx
+from pytest import approx, raises
 
 try:
     from urllib import pathname2url
@@ -29,7 +29,8 @@ except ImportError:
 
 from CifFile import ReadCif
 
-from ...model.util.cif import CifPhase, CifConverter
+from ...model.util.cif import CifPhase, CifConverter, get_unique_families, \
+    parse_symmetry_operation
 
 unittest_path = os.path.dirname(__file__)
 data_path = os.path.join(unittest_path, '../data')
@@ -123,3 +124,53 @@ def test_read_cif_from_shelx():
 def test_convert_cif_with_triclinic_geometry():
     cif_converter = CifConverter(0.31, min_d_spacing=1, min_intensity=5)
     cif_converter.convert_cif_to_jcpds(os.path.join(cif_path, 'ICSD_triclinic.cif'))
+
+
+def test_calculated_reflections_are_merged_into_families():
+    fcc_cif = ReadCif(get_cif_url('fcc.cif'))
+    cif_phase = CifPhase(fcc_cif[fcc_cif.keys()[0]])
+    cif_converter = CifConverter(0.31)
+    hkl, d_hkl = cif_converter._calculate_hkl_within_sphere_and_min_d_spacing(cif_phase)
+    assert hkl.shape == (len(d_hkl), 3)
+    assert np.all(d_hkl > cif_converter.min_d_spacing)
+
+    reflections = cif_converter._calculate_reflection_intensities(cif_phase, hkl, d_hkl)
+    assert [(r.h, r.k, r.l, r.multiplicity) for r in reflections[:4]] == \
+           [(1, 1, 1, 8), (2, 0, 0, 6), (2, 2, 0, 12), (3, 1, 1, 24)]
+    assert reflections[1].intensity == approx(73.24, 1e-3)
+    assert np.all(np.diff([r.d_spacing for r in reflections]) < 0)
+
+
+def test_get_unique_families():
+    families = get_unique_families([(1, 1, 1), (-1, 1, 1), (2, 0, 0), (0, 0, -2), (1, -1, -1)])
+    assert families == {(1, 1, 1): 3, (2, 0, 0): 2}
+
+
+def test_parse_symmetry_operation():
+    rotation, translation = parse_symmetry_operation("-y, x-y, z+1/3")
+    assert np.array_equal(rotation, [[0, -1, 0], [1, -1, 0], [0, 0, 1]])
+    assert np.allclose(translation, [0, 0, 1 / 3])
+
+    rotation, translation = parse_symmetry_operation("1/2+X,-0.25-z,2*y")
+    assert np.array_equal(rotation, [[1, 0, 0], [0, 0, -1], [0, 2, 0]])
+    assert np.allclose(translation, [0.5, -0.25, 0])
+
+    with raises(ValueError):
+        parse_symmetry_operation("x, y")
+    with raises(ValueError):
+        parse_symmetry_operation("x, y, __import__('os')")
+
+
+def test_symmetry_equivalents_for_general_positions():
+    hcp_cif = ReadCif(get_cif_url('hcp.cif'))
+    cif_phase = CifPhase(hcp_cif[hcp_cif.keys()[0]])
+    positions = np.array([atom[1:4] for atom in cif_phase.atoms])
+
+    # all atoms are unique and mapped onto each other by every symmetry operation
+    assert len(cif_phase.atoms) == 6
+    for operation in cif_phase.symmetry_operations:
+        rotation, translation = parse_symmetry_operation(operation)
+        transformed = (positions @ rotation.T + translation) % 1.0
+        for position in transformed:
+            distance = np.abs(positions - position)
+            assert np.any(np.all(np.minimum(distance, 1 - distance) < 1e-4, axis=1))
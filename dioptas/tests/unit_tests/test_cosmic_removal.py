@@ -1,5 +1,7 @@
 import os
-from dioptas.model.util.cosmics import cosmicsimage
+import numpy as np
+from scipy import ndimage
+from dioptas.model.util.cosmics import cosmicsimage, lacosmic_mask, update_median_filter
 from dioptas.model.ImgModel import ImgModel
 
 from ..utility import unittest_data_path
@@ -13,3 +15,39 @@ def test_cosmics_image():
     test.clean()
     assert test is not None
     assert test.mask.shape == img_model.img_data.shape
+
+
+def create_cosmics_test_image(shape=(200, 300)):
+    rng = np.random.default_rng(1)
+    y, x = np.indices(shape)
+    img = rng.poisson(100 + 1000 * np.exp(-(((x + y) % 60) - 30) ** 2 / 50.)).astype(float)
+    ind = rng.integers(0, shape[0], 40), rng.integers(0, shape[1], 40)
+    img[ind] += rng.uniform(500, 5000, 40)
+    return img
+
+
+def test_tiled_cosmics_mask_equals_full_image_mask():
+    img = create_cosmics_test_image()
+    test = cosmicsimage(img, sigclip=3.0, objlim=3.0, verbose=False)
+    for _ in range(2):
+        test.lacosmiciteration()
+        test.clean()
+
+    mask = lacosmic_mask(img, num_iterations=2, tile_size=64, max_workers=4, sigclip=3.0, objlim=3.0)
+    assert np.sum(mask) > 0
+    assert np.array_equal(mask, test.mask)
+
+    # a single worker processes the full image at once
+    mask = lacosmic_mask(img, num_iterations=2, tile_size=64, max_workers=1, sigclip=3.0, objlim=3.0)
+    assert np.array_equal(mask, test.mask)
+
+
+def test_update_median_filter():
+    img = create_cosmics_test_image()
+    filtered = ndimage.median_filter(img, size=5, mode='mirror')
+    changed = np.zeros(img.shape, dtype=bool)
+    changed[0, 10] = changed[50, 50] = changed[199, 299] = True
+    img[changed] = 1e6
+
+    update_median_filter(filtered, img, changed, 5)
+    assert np.array_equal(filtered, ndimage.median_filter(img, size=5, mode='mirror'))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+
+# modules of rarely used parts of Dioptas which should only be imported when they are used
+lazy_modules = [
+    "OpenGL",
+    "epics",
+    "CifFile",
+    "extra_data",
+    "qt_material",
+    "pyshortcuts",
+    "dioptas.model.util.cif",
+    "dioptas.controller.integration.phase.JcpdsEditorController",
+    "dioptas.widgets.integration.JcpdsEditorWidget",
+    "dioptas.widgets.plot_widgets.SurfaceWidget",
+]
+
+
+def get_imported_modules(statement):
+    """Runs the statement in a new interpreter and returns the names of all imported modules afterward."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run(
+        [sys.executable, "-c", statement + "\nimport sys\nprint('\\n'.join(sys.modules))"],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return set(output.splitlines())
+
+
+def test_import_dioptas_does_not_import_gui_and_pyfai():
+    modules = get_imported_modules("import dioptas")
+    for module in ["pyFAI", "qtpy", "dioptas.controller", "dioptas.model"] + lazy_modules:
+        assert module not in modules
+
+
+def test_main_controller_does_not_import_rarely_used_modules():
+    modules = get_imported_modules(
+        "from qtpy import QtWidgets\n"
+        "app = QtWidgets.QApplication([])\n"
+        "from dioptas.controller.MainController import MainController\n"
+        "controller = MainController(use_settings=False)"
+    )
+    assert "dioptas.controller.MainController" in modules
+    for module in lazy_modules:
+        assert module not in modules
+
+
+def test_main_controller_is_available_from_package():
+    modules = get_imported_modules("import dioptas\nassert dioptas.MainController.__name__ == 'MainController'")
+    assert "dioptas.controller.MainController" in modules
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Test the histogram calculation of the HistogramLUTItem"""
+
+import weakref
+
+import numpy as np
+import pytest
+
+from dioptas.widgets.plot_widgets.HistogramLUTItem import (
+    HistogramLUTItem,
+    calculate_histogram,
+    get_cached_histogram_data,
+    get_histogram_cache_key,
+    get_histogram_data,
+    get_histogram_worker,
+    histogram_cache,
+)
+from dioptas.widgets.plot_widgets.NormalizedImageItem import NormalizedImageItem
+
+
+def testSubsampledHistogramApproximatesExactHistogram():
+    """Test that the histogram of a subsample is scaled to the number of pixels"""
+    img_data = np.random.default_rng(1).lognormal(5, 1, (1000, 1200))
+    edges, log_hist = calculate_histogram(img_data, bins=50, max_samples=100000)
+    exact_edges, exact_log_hist = calculate_histogram(img_data, bins=50, max_samples=100000, exact=True)
+
+    assert np.sum(np.exp(exact_log_hist)) == pytest.approx(img_data.size)
+    assert np.sum(np.exp(log_hist)) == pytest.approx(img_data.size)
+    assert edges[np.argmax(log_hist)] == pytest.approx(exact_edges[np.argmax(exact_log_hist)], abs=0.3)
+
+
+def testHistogramWithoutPositivePixels():
+    """Test that images without positive pixels give no histogram"""
+    assert calculate_histogram(np.zeros((10, 10))) == (None, None)
+
+
+def testHistogramCacheUsesDataVersion():
+    """Test that the cache distinguishes the versions of the same array"""
+    img_data = np.random.random((100, 100)) + 1
+    assert get_cached_histogram_data(img_data, version=1) is None
+    histogram = get_histogram_data(img_data, version=1)
+    assert get_cached_histogram_data(img_data, version=1) is histogram
+    assert get_cached_histogram_data(img_data, version=2) is None
+
+
+def testHistogramCacheIgnoresEntriesOfFreedArrays():
+    """Test that a new array with the id and memory of a freed array does not get its histogram"""
+    img_data = np.random.random((100, 100)) + 1
+    freed_data = np.ones((100, 100))
+    # the entry of the freed array has the same key as the new array
+    histogram_cache[get_histogram_cache_key(img_data)] = (weakref.ref(freed_data), calculate_histogram(freed_data))
+    del freed_data
+
+    assert get_cached_histogram_data(img_data) is None
+    histogram = get_histogram_data(img_data)
+    assert np.allclose(histogram[0], calculate_histogram(img_data)[0])
+    assert get_cached_histogram_data(img_data) is histogram
+
+
+def testHistogramIsCalculatedInBackground(qapp):
+    """Test that the histogram plot is updated when the background calculation is finished"""
+    image_item = NormalizedImageItem()
+    histogram_item = HistogramLUTItem(image_item)
+
+    image_item.setImage(np.random.random((200, 300)) + 1)
+    get_histogram_worker().wait()
+    x, y = histogram_item.plot.getData()
+    assert x is not None and len(x) > 0
+
+    version = image_item.getDataVersion()
+    image_item.setLevels([1, 2])
+    assert image_item.getDataVersion() == version
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Test ImagePyramid used for the display of large images"""
+
+import numpy as np
+import pytest
+
+from dioptas.widgets.plot_widgets.ImagePyramid import ImagePyramid, downsample
+
+
+def testDownsampleMax():
+    """Test that max downsampling keeps the maximum of every 2x2 block and ignores NaN values"""
+    image = np.arange(16, dtype=np.float32).reshape(4, 4)
+    image[0, 0] = np.nan
+    assert np.array_equal(downsample(image, "max"), [[5, 7], [13, 15]])
+
+
+def testDownsampleMeanWithOddShape():
+    """Test that odd dimensions are padded with the edge values"""
+    image = np.ones((5, 3), dtype=np.uint16)
+    result = downsample(image, "mean")
+    assert result.shape == (3, 2)
+    assert np.allclose(result, 1)
+
+
+def testPyramidLevelsAreComputedLazily():
+    """Test that levels are computed on request and clipped to the highest level"""
+    image = np.random.random((1000, 600))
+    pyramid = ImagePyramid(image)
+    assert pyramid.level(0) is image
+    assert pyramid.maxLevel == 9
+    assert pyramid.level(3).shape == (125, 75)
+    assert pyramid.level(3).max() == image.max()
+    assert pyramid.level(100).shape == (2, 2)
+
+    with pytest.raises(ValueError):
+        ImagePyramid(image, "median")
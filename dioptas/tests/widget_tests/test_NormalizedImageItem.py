@@ -22,11 +22,12 @@
 import numpy as np
 
 import pytest
-from pyqtgraph import GraphicsLayoutWidget
+from pyqtgraph import GraphicsLayoutWidget, ImageItem
 from qtpy import QtCore
 from qtpy.QtTest import QSignalSpy, QTest
 
-from dioptas.widgets.plot_widgets.NormalizedImageItem import NormalizedImageItem
+from dioptas.widgets.plot_widgets import NormalizedImageItem as NormalizedImageItemModule
+from dioptas.widgets.plot_widgets.NormalizedImageItem import IMAGE_ITEM_INTERNALS, NormalizedImageItem
 
 NORMALIZATIONS = tuple(NormalizedImageItem._NORMALIZATIONS.keys())
 
@@ -84,3 +85,54 @@ def testSetImage(qapp, normalizedImageItem, normalization):
     assert np.allclose(levels, min_max)
 
     assert normalizedImageItem.quickMinMax() == min_max
+
+
+def testZoomedOutImageIsRenderedDownsampled(qapp, qWidgetFactory):
+    """Test that only the pyramid level matching the screen resolution is rendered"""
+    widget = qWidgetFactory(GraphicsLayoutWidget)
+    widget.resize(300, 300)
+    viewbox = widget.addViewBox(row=1, col=1)
+    item = NormalizedImageItem()
+    viewbox.addItem(item)
+
+    item.setImage(np.random.random((2048, 2048)) + 1)
+    viewbox.autoRange(padding=0)
+    widget.grab()
+    assert item.qimage.width() < 2048
+    assert item.boundingRect().width() == 2048
+
+    viewbox.setRange(xRange=(100, 150), yRange=(100, 150), padding=0)
+    qapp.processEvents()
+    widget.grab()
+    # full resolution, but only the visible part with a margin
+    assert item.qimage.width() == NormalizedImageItem.TILE_SIZE
+
+
+def testImageItemProvidesUsedInternals(qapp):
+    """Test that the private pg.ImageItem attributes used for rendering from the image pyramid still exist"""
+    item = ImageItem()
+    for name in IMAGE_ITEM_INTERNALS:
+        assert hasattr(item, name), f"pyqtgraph.ImageItem has no attribute {name}"
+    assert NormalizedImageItem().usesImagePyramid()
+
+
+@pytest.mark.parametrize("normalization", NORMALIZATIONS)
+def testFallbackWithoutImageItemInternals(qapp, qWidgetFactory, monkeypatch, normalization):
+    """Test that the full image is normalized and rendered by pg.ImageItem if its internals are missing"""
+    monkeypatch.setattr(NormalizedImageItemModule, "IMAGE_ITEM_INTERNALS",
+                        IMAGE_ITEM_INTERNALS + ("_missingAttribute",))
+    widget = qWidgetFactory(GraphicsLayoutWidget)
+    viewbox = widget.addViewBox(row=1, col=1)
+    item = NormalizedImageItem()
+    viewbox.addItem(item)
+    assert not item.usesImagePyramid()
+
+    ref_image = np.arange(1, 10001, dtype=np.float32).reshape(100, 100)
+    item.setImage(ref_image)
+    item.setNormalization(normalization)
+    widget.grab()
+
+    assert np.array_equal(item.getData(copy=False), ref_image)
+    assert np.allclose(item.image, item._getNorm().apply(ref_image))
+    assert np.allclose(item.getLevels(), (ref_image.min(), ref_image.max()))
+    assert item.qimage.width() == 100
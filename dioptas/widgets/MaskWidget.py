@@ -114,16 +114,21 @@ class MaskWidget(QtWidgets.QWidget):
         self._action_layout = QtWidgets.QGridLayout()
         self.grow_btn = QtWidgets.QPushButton('Grow')
         self.shrink_btn = QtWidgets.QPushButton('Shrink')
+        self.grow_shrink_radius_sb = SpinBoxAlignRight()
+        self.grow_shrink_structure_cb = QtWidgets.QComboBox()
+        self.grow_shrink_structure_cb.addItems(['square', 'cross', 'disk'])
         self.invert_mask_btn = QtWidgets.QPushButton('Invert')
         self.clear_mask_btn = QtWidgets.QPushButton('Clear')
         self.undo_btn = QtWidgets.QPushButton('Undo')
         self.redo_btn = QtWidgets.QPushButton('Redo')
         self._action_layout.addWidget(self.grow_btn, 0, 0)
         self._action_layout.addWidget(self.shrink_btn, 0, 1)
-        self._action_layout.addWidget(self.invert_mask_btn, 1, 0)
-        self._action_layout.addWidget(self.clear_mask_btn, 1, 1)
-        self._action_layout.addWidget(self.undo_btn, 2, 0)
-        self._action_layout.addWidget(self.redo_btn, 2, 1)
+        self._action_layout.addWidget(self.grow_shrink_radius_sb, 1, 0)
+        self._action_layout.addWidget(self.grow_shrink_structure_cb, 1, 1)
+        self._action_layout.addWidget(self.invert_mask_btn, 2, 0)
+        self._action_layout.addWidget(self.clear_mask_btn, 2, 1)
+        self._action_layout.addWidget(self.undo_btn, 3, 0)
+        self._action_layout.addWidget(self.redo_btn, 3, 1)
         self._control_layout.addLayout(self._action_layout)
 
         self._control_layout.addWidget(HorizontalLine())
@@ -159,6 +164,10 @@ class MaskWidget(QtWidgets.QWidget):
         self.mask_rb.setChecked(True)
         self.fill_rb.setChecked(True)
         self.point_size_sb.setValue(20)
+        self.grow_shrink_radius_sb.setMinimum(1)
+        self.grow_shrink_radius_sb.setValue(1)
+        self.grow_shrink_radius_sb.setToolTip('Radius in pixels used for growing and shrinking the mask')
+        self.grow_shrink_structure_cb.setToolTip('Structuring element used for growing and shrinking the mask')
 
         self._control_widget.setMinimumWidth(200)
         self._control_widget.setMaximumWidth(200)
@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 
 from qtpy import QtWidgets, QtCore, QtGui
 from pyqtgraph import GraphicsLayoutWidget, ColorButton
@@ -17,12 +18,8 @@ from ..CustomWidgets import (
 from . import CLICKED_COLOR
 from ... import icons_path
 
-try:
-    from ..plot_widgets.SurfaceWidget import SurfaceWidget
-
-    open_gl = True
-except ModuleNotFoundError:
-    open_gl = False
+# the 3D view needs OpenGL, which is only imported when the 3D view is shown for the first time
+open_gl = find_spec("OpenGL") is not None
 
 
 class BatchWidget(QtWidgets.QWidget):
@@ -30,6 +27,8 @@ class BatchWidget(QtWidgets.QWidget):
     Class describe a widget for batch integration
     """
 
+    surface_widget_created = QtCore.Signal()
+
     def __init__(self, parent=None):
         super(BatchWidget, self).__init__(parent)
 
@@ -51,14 +50,16 @@ class BatchWidget(QtWidgets.QWidget):
         # central
         self.file_view_widget = BatchFileViewWidget()
         self.stack_plot_widget = BatchStackWidget()
-        if open_gl:
-            self.surface_widget = BatchSurfaceWidget()
+        self._surface_widget = None
         self.options_widget = BatchOptionsWidget()
 
         # bottom
         self.control_widget = BatchControlWidget()
         self.position_widget = BatchImgPositionWidget()
 
+        # separate window
+        self.pressure_widget = BatchPressureWidget()
+
         self.create_layout()
         self.style_widgets()
 
@@ -75,8 +76,6 @@ class BatchWidget(QtWidgets.QWidget):
 
         self._central_layout.addWidget(self.file_view_widget)
         self._central_layout.addWidget(self.stack_plot_widget)
-        if open_gl:
-            self._central_layout.addWidget(self.surface_widget)
         self._central_layout.addWidget(self.options_widget)
 
         self._frame_layout.addLayout(self._top_layout)
@@ -120,12 +119,32 @@ class BatchWidget(QtWidgets.QWidget):
     def sizeHint(self):
         return QtCore.QSize(800, 600)
 
+    @property
+    def surface_widget(self):
+        """
+        3D view of the batch, which is created when it is used for the first time (surface_widget_created is emitted
+        then). None if OpenGL could not be imported, the 3D view button is disabled in that case.
+        """
+        if self._surface_widget is None:
+            if not self.mode_widget.view_3d_btn.isEnabled():
+                return None
+            try:
+                self._surface_widget = BatchSurfaceWidget()
+            except ImportError as e:
+                self.mode_widget.view_3d_btn.setEnabled(False)
+                self.mode_widget.view_3d_btn.setToolTip("3D view is not available: {}".format(e))
+                return None
+            self._surface_widget.hide()
+            self._central_layout.insertWidget(self._central_layout.indexOf(self.options_widget), self._surface_widget)
+            self.surface_widget_created.emit()
+        return self._surface_widget
+
     def activate_files_view(self):
         self.mode_widget.view_f_btn.setChecked(True)
 
         self.file_view_widget.show()
-        if open_gl:
-            self.surface_widget.hide()
+        if self._surface_widget is not None:
+            self._surface_widget.hide()
         self.stack_plot_widget.hide()
         self.options_widget.hide()
 
@@ -135,6 +154,8 @@ class BatchWidget(QtWidgets.QWidget):
         self.control_widget.phases_btn.hide()
         self.control_widget.autoscale_btn.hide()
         self.control_widget.normalize_btn.hide()
+        self.control_widget.pressure_btn.hide()
+        self.control_widget.track_peaks_btn.hide()
         self.control_widget.integrate_btn.show()
 
     def activate_stack_plot(self):
@@ -145,15 +166,22 @@ class BatchWidget(QtWidgets.QWidget):
         self.file_view_widget.hide()
         self.stack_plot_widget.show()
         self.options_widget.show()
-        if open_gl:
-            self.surface_widget.hide()
+        if self._surface_widget is not None:
+            self._surface_widget.hide()
         self.control_widget.waterfall_btn.show()
         self.control_widget.phases_btn.show()
         self.control_widget.autoscale_btn.show()
         self.control_widget.normalize_btn.show()
+        self.control_widget.pressure_btn.show()
+        self.control_widget.track_peaks_btn.show()
         self.control_widget.integrate_btn.hide()
 
     def activate_surface_view(self):
+        """
+        :return: False if the 3D view is not available (see surface_widget)
+        """
+        if self.surface_widget is None:
+            return False
         self.position_widget.step_raw_widget.hide()
         self.position_widget.step_series_widget.show()
 
@@ -171,7 +199,10 @@ class BatchWidget(QtWidgets.QWidget):
         self.control_widget.phases_btn.hide()
         self.control_widget.autoscale_btn.hide()
         self.control_widget.normalize_btn.hide()
+        self.control_widget.pressure_btn.hide()
+        self.control_widget.track_peaks_btn.hide()
         self.control_widget.integrate_btn.hide()
+        return True
 
     def raise_widget(self):
         self.show()
@@ -425,6 +456,8 @@ class BatchSurfaceWidget(QtWidgets.QWidget):
     def __init__(self):
         super(BatchSurfaceWidget, self).__init__()
 
+        from ..plot_widgets.SurfaceWidget import SurfaceWidget
+
         self._layout = QtWidgets.QHBoxLayout()
         self.control_widget = BatchSurfaceViewNavigationWidget()
 
@@ -549,6 +582,8 @@ class BatchControlWidget(QtWidgets.QWidget):
         self.phases_btn = CheckableFlatButton("Show Phases")
         self.autoscale_btn = FlatButton("AutoScale")
         self.normalize_btn = FlatButton("Normalize")
+        self.pressure_btn = FlatButton("Pressure")
+        self.track_peaks_btn = FlatButton("Track peaks")
 
         self._layout = QtWidgets.QHBoxLayout()
 
@@ -563,6 +598,8 @@ class BatchControlWidget(QtWidgets.QWidget):
         self._layout.addWidget(self.phases_btn)
         self._layout.addWidget(self.autoscale_btn)
         self._layout.addWidget(self.normalize_btn)
+        self._layout.addWidget(self.pressure_btn)
+        self._layout.addWidget(self.track_peaks_btn)
 
         self._layout.addSpacerItem(HorizontalSpacerItem())
 
@@ -571,12 +608,51 @@ class BatchControlWidget(QtWidgets.QWidget):
     def set_tooltips(self):
         self.waterfall_btn.setToolTip("Create waterfall plot")
         self.calc_bkg_btn.setToolTip("Extract background")
+        self.pressure_btn.setToolTip("Determine the pressure of every frame from the peaks of the selected phase")
+        self.track_peaks_btn.setToolTip("Fit the position, width and area of peaks in every frame")
 
     def style_widgets(self):
         self._layout.setContentsMargins(6, 6, 6, 6)
         self._layout.setSpacing(4)
 
 
+class BatchPressureWidget(QtWidgets.QWidget):
+    """
+    Window showing the pressures of the frames, determined from the peak positions of a calibrant phase
+    """
+
+    def __init__(self):
+        super(BatchPressureWidget, self).__init__()
+        self._layout = QtWidgets.QVBoxLayout()
+
+        self.pg_layout = GraphicsLayoutWidget()
+        self.plot_item = self.pg_layout.addPlot(labels={"left": "P (GPa)", "bottom": "Frame"})
+        self.pressure_plot = self.plot_item.plot(pen=None, symbol="o", symbolSize=5, symbolPen=None)
+
+        self._layout.addWidget(self.pg_layout)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(self._layout)
+        self.setWindowFlags(QtCore.Qt.Tool)
+        self.setWindowTitle("Batch pressures")
+
+    def plot_pressures(self, frames, pressures, calibrant=""):
+        """
+        :param frames: frame indices
+        :param pressures: pressures in GPa
+        :param calibrant: name of the calibrant phase, shown in the window title
+        """
+        self.pressure_plot.setData(frames, pressures)
+        self.setWindowTitle("Batch pressures ({})".format(calibrant) if calibrant else "Batch pressures")
+
+    def raise_widget(self):
+        self.show()
+        self.setWindowState(
+            self.windowState() & ~QtCore.Qt.WindowMinimized | QtCore.Qt.WindowActive
+        )
+        self.activateWindow()
+        self.raise_()
+
+
 class BatchImgPositionWidget(QtWidgets.QWidget):
     def __init__(self):
         super(BatchImgPositionWidget, self).__init__()
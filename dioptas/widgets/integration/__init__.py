@@ -129,11 +129,14 @@ class IntegrationWidget(QtWidgets.QWidget):
         self.pattern_header_chi_cb = self.integration_control_widget.pattern_control_widget.chi_cb
         self.pattern_header_dat_cb = self.integration_control_widget.pattern_control_widget.dat_cb
         self.pattern_header_fxye_cb = self.integration_control_widget.pattern_control_widget.fxye_cb
+        self.pattern_header_nxs_cb = self.integration_control_widget.pattern_control_widget.nxs_cb
+        self.pattern_writer_status_lbl = self.integration_control_widget.pattern_control_widget.writer_status_lbl
         self.pattern_headers = []
         self.pattern_headers.append(self.pattern_header_xy_cb)
         self.pattern_headers.append(self.pattern_header_chi_cb)
         self.pattern_headers.append(self.pattern_header_dat_cb)
         self.pattern_headers.append(self.pattern_header_fxye_cb)
+        self.pattern_headers.append(self.pattern_header_nxs_cb)
 
         phase_control_widget = self.integration_control_widget.phase_control_widget
         self.phase_widget = phase_control_widget
@@ -41,13 +41,17 @@ class PatternWidget(QtWidgets.QWidget):
         self.chi_cb = QtWidgets.QCheckBox('.chi')
         self.dat_cb = QtWidgets.QCheckBox('.dat')
         self.fxye_cb = QtWidgets.QCheckBox('.fxye')
+        self.nxs_cb = QtWidgets.QCheckBox('.nxs')
+        self.writer_status_lbl = QtWidgets.QLabel('')
         self._pattern_types_layout = QtWidgets.QHBoxLayout()
         self._pattern_types_layout.addWidget(LabelAlignRight('Pattern types:'))
         self._pattern_types_layout.addWidget(self.xy_cb)
         self._pattern_types_layout.addWidget(self.chi_cb)
         self._pattern_types_layout.addWidget(self.dat_cb)
         self._pattern_types_layout.addWidget(self.fxye_cb)
+        self._pattern_types_layout.addWidget(self.nxs_cb)
         self._pattern_types_layout.addStretch()
+        self._pattern_types_layout.addWidget(self.writer_status_lbl)
 
         self._layout.addLayout(self._pattern_types_layout)
         self._layout.addStretch()
@@ -60,4 +64,6 @@ class PatternWidget(QtWidgets.QWidget):
         self.chi_cb.setToolTip('Create .chi files')
         self.dat_cb.setToolTip('Create .dat files')
         self.fxye_cb.setToolTip('Create .fxye files')
+        self.nxs_cb.setToolTip('Append the patterns of each image folder to a single .nxs file,\n'
+                               'which can be opened in the batch view')
         self.file_widget.file_cb.setToolTip('Autocreate patterns for each loaded image')
\ No newline at end of file
@@ -56,6 +56,7 @@ class PhaseWidget(QtWidgets.QWidget):
         self.clear_btn = FlatButton()
         self.save_list_btn = QtWidgets.QPushButton("Save List")
         self.load_list_btn = QtWidgets.QPushButton("Load List")
+        self.find_phases_btn = QtWidgets.QPushButton("Find Phases")
 
         self.button_widget = QtWidgets.QWidget(self)
         self.button_widget.setObjectName("phase_control_button_widget")
@@ -92,6 +93,7 @@ class PhaseWidget(QtWidgets.QWidget):
         self._parameter_layout.addItem(VerticalSpacerItem())
         self._parameter_layout.addWidget(self.save_list_btn)
         self._parameter_layout.addWidget(self.load_list_btn)
+        self._parameter_layout.addWidget(self.find_phases_btn)
 
         self.parameter_widget.setLayout(self._parameter_layout)
 
@@ -151,6 +153,9 @@ class PhaseWidget(QtWidgets.QWidget):
 
         self.show_parameter_in_pattern = True
 
+        # separate window
+        self.phase_match_widget = PhaseMatchWidget()
+
     def style_widgets(self):
         icon_size = QtCore.QSize(17, 17)
 
@@ -208,6 +213,7 @@ class PhaseWidget(QtWidgets.QWidget):
         self.edit_btn.setToolTip("Edit selected Phase")
         self.delete_btn.setToolTip("Removes currently selected phase")
         self.clear_btn.setToolTip("Removes all phases")
+        self.find_phases_btn.setToolTip("Searches the phase library for phases matching the peaks of the pattern")
         self.apply_to_all_cb.setToolTip(
             "Whether individual changes in P or T\nare applied to all other phases"
         )
@@ -355,3 +361,92 @@ class PhaseWidget(QtWidgets.QWidget):
         self.temperature_sb_value_changed.emit(
             self.temperature_sbs.index(temperature_sb), temperature_sb.value()
         )
+
+
+class PhaseMatchWidget(QtWidgets.QWidget):
+    """
+    Window listing the phases of the phase library ranked by how well they match the peaks of the current pattern
+    """
+
+    def __init__(self):
+        super(PhaseMatchWidget, self).__init__()
+
+        self.add_folder_btn = QtWidgets.QPushButton("Add Folder")
+        self.library_lbl = QtWidgets.QLabel()
+        self.pressure_min_sb = DoubleSpinBoxAlignRight()
+        self.pressure_max_sb = DoubleSpinBoxAlignRight()
+        self.search_btn = QtWidgets.QPushButton("Search")
+        self.status_lbl = QtWidgets.QLabel()
+
+        self.match_tw = ListTableWidget(columns=4)
+        self.match_tw.setHorizontalHeaderLabels(["Name", "Score", "P (GPa)", "Matched"])
+        self.match_tw.horizontalHeader().setVisible(True)
+        self.match_tw.horizontalHeader().setStretchLastSection(False)
+        self.match_tw.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        for column in range(1, 4):
+            self.match_tw.horizontalHeader().setSectionResizeMode(
+                column, QtWidgets.QHeaderView.ResizeToContents
+            )
+        self.match_tw.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.match_tw.setItemDelegate(NoRectDelegate())
+        self.add_phases_btn = QtWidgets.QPushButton("Add Selected")
+
+        self._layout = QtWidgets.QVBoxLayout()
+        self._library_layout = QtWidgets.QHBoxLayout()
+        self._library_layout.addWidget(self.add_folder_btn)
+        self._library_layout.addWidget(self.library_lbl)
+        self._library_layout.addStretch()
+        self._layout.addLayout(self._library_layout)
+
+        self._search_layout = QtWidgets.QHBoxLayout()
+        self._search_layout.addWidget(QtWidgets.QLabel("P (GPa):"))
+        self._search_layout.addWidget(self.pressure_min_sb)
+        self._search_layout.addWidget(QtWidgets.QLabel("-"))
+        self._search_layout.addWidget(self.pressure_max_sb)
+        self._search_layout.addWidget(self.search_btn)
+        self._search_layout.addWidget(self.status_lbl)
+        self._search_layout.addStretch()
+        self._layout.addLayout(self._search_layout)
+
+        self._layout.addWidget(self.match_tw)
+        self._layout.addWidget(self.add_phases_btn)
+        self.setLayout(self._layout)
+
+        self.pressure_min_sb.setRange(0, 1000)
+        self.pressure_max_sb.setRange(0, 1000)
+        self.add_folder_btn.setToolTip("Adds all jcpds and cif files of a folder to the phase library")
+        self.pressure_min_sb.setToolTip("Pressure range in which the reflections of phases with an EOS are shifted")
+        self.add_phases_btn.setToolTip("Adds the selected phases to the phase list")
+
+        self.setWindowFlags(QtCore.Qt.Tool)
+        self.setWindowTitle("Find Phases")
+
+    def set_library_size(self, num_phases):
+        self.library_lbl.setText("{} phases in library".format(num_phases))
+
+    def get_pressure_range(self):
+        return self.pressure_min_sb.value(), self.pressure_max_sb.value()
+
+    def set_matches(self, matches):
+        """
+        :param matches: list of (name, score, pressure, number of matched reflections, number of reflections)
+        """
+        self.match_tw.setRowCount(len(matches))
+        for row, (name, score, pressure, num_matched, num_reflections) in enumerate(matches):
+            texts = [name, "{:.2f}".format(score), "{:.1f}".format(pressure),
+                     "{}/{}".format(num_matched, num_reflections)]
+            for column, text in enumerate(texts):
+                item = QtWidgets.QTableWidgetItem(text)
+                item.setFlags(item.flags() & ~QtCore.Qt.ItemIsEditable)
+                self.match_tw.setItem(row, column, item)
+
+    def get_selected_rows(self):
+        return sorted(index.row() for index in self.match_tw.selectionModel().selectedRows())
+
+    def raise_widget(self):
+        self.show()
+        self.setWindowState(
+            self.windowState() & ~QtCore.Qt.WindowMinimized | QtCore.Qt.WindowActive
+        )
+        self.activateWindow()
+        self.raise_()
@@ -19,7 +19,10 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import pathlib
+import threading
+import weakref
 from collections import OrderedDict
+from functools import partial
 from typing import Optional
 
 from qtpy import QtCore, QtGui, QtWidgets
@@ -37,6 +40,7 @@ from .ColormapPopup import ColormapPopup
 from .NormalizedImageItem import NormalizedImageItem
 from ..CustomWidgets import FlatButton
 from ... import icons_path, style_path
+from ...model.util.IntegrationWorker import IntegrationWorker
 
 __all__ = ["HistogramLUTItem"]
 
@@ -92,6 +96,7 @@ class HistogramLUTItem(GraphicsWidget):
         self.orientation = orientation
         self.autoLevel = autoLevel
         self._img_data = None
+        self.exactHistogram = False  # if False, the histogram of large images is calculated from a subsample
 
         self.layout = QtWidgets.QGraphicsGridLayout()
         self.setLayout(self.layout)
@@ -309,14 +314,39 @@ class HistogramLUTItem(GraphicsWidget):
             if img_data is None:
                 return
 
-        left_edges_nonzero, log_hist_nonzero = get_histogram_data(img_data)
+        version = 0
+        if isinstance(self.imageItem, NormalizedImageItem):
+            version = self.imageItem.getDataVersion()
+
+        histogram = get_cached_histogram_data(img_data, version, self.exactHistogram)
+        if histogram is not None:
+            self._plotHistogram(histogram)
+            return
+
+        # the histogram is calculated in a background thread, the plot is updated when it is finished
+        get_histogram_worker().submit(
+            id(self),
+            partial(get_histogram_data, img_data, version, self.exactHistogram),
+            self._plotHistogram,
+        )
+
+    def _plotHistogram(self, histogram):
+        left_edges_nonzero, log_hist_nonzero = histogram
         if log_hist_nonzero is None:
             return
 
-        if self.orientation == "horizontal":
-            self.plot.setData(left_edges_nonzero, log_hist_nonzero)
-        elif self.orientation == "vertical":
-            self.plot.setData(log_hist_nonzero, left_edges_nonzero)
+        try:
+            if self.orientation == "horizontal":
+                self.plot.setData(left_edges_nonzero, log_hist_nonzero)
+            elif self.orientation == "vertical":
+                self.plot.setData(log_hist_nonzero, left_edges_nonzero)
+        except RuntimeError:  # the item was deleted while the histogram was calculated
+            pass
+
+    def setExactHistogram(self, exact: bool):
+        """Calculate the histogram from all pixels instead of a subsample for large images"""
+        self.exactHistogram = exact
+        self.imageChanged()
 
     def getImageData(self, copy: bool = True) -> Optional[np.ndarray]:
         """Returns currently displayed image data
@@ -452,34 +482,98 @@ class LogarithmRegionItem(LinearRegionItem):
         self.lineMoveFinished()
 
 
+HISTOGRAM_BINS = 1500
+HISTOGRAM_MAX_SAMPLES = 2 ** 20  # pixels used for the histogram of large images
+
 histogram_cache = OrderedDict()
+_histogram_cache_lock = threading.Lock()
+_histogram_worker = None
 
 
-def get_histogram_data(img_data: np.ndarray) -> tuple:
-    """calculates the histogram data necessary for the histogram LUt item"""
-    if img_data is None:
+def get_histogram_worker() -> IntegrationWorker:
+    """returns the worker calculating the histograms in a background thread (shared by all HistogramLUTItems)"""
+    global _histogram_worker
+    if _histogram_worker is None:
+        _histogram_worker = IntegrationWorker()
+    return _histogram_worker
+
+
+def calculate_histogram(
+        img_data: np.ndarray,
+        bins: int = HISTOGRAM_BINS,
+        max_samples: int = HISTOGRAM_MAX_SAMPLES,
+        exact: bool = False,
+) -> tuple:
+    """
+    Calculates the histogram of the logarithm of the image intensities. For images with more than max_samples pixels
+    only every n-th pixel is used and the counts are scaled to the number of pixels, unless exact is True.
+    :return: left edges and logarithm of the counts of the non-empty bins, (None, None) if there is no positive pixel
+    """
+    data = np.asarray(img_data).ravel(order="K")  # no copy for C and F ordered images, the order does not matter
+    scale = 1
+    if not exact and data.size > max_samples:
+        step = int(np.ceil(data.size / max_samples))
+        data = data[::step]
+        scale = img_data.size / data.size
+
+    with np.errstate(divide="ignore", invalid="ignore"):  # the error state set above only holds for the main thread
+        log_data = np.log(data)
+    log_data = log_data[np.isfinite(log_data)]
+    if log_data.size == 0:
         return None, None
 
-    ar_hash = hash(img_data[::13, ::17].tobytes())
+    hist, bin_edges = np.histogram(log_data, bins=bins)
 
-    if ar_hash in histogram_cache:
-        return histogram_cache[ar_hash]
-    else:
-        log_data = np.log(img_data)
-        log_data = log_data[np.isfinite(log_data)]
-        if log_data.size == 0:
-            return None, None
+    mask_nonzero = hist > 0
+    left_edges_nonzero = bin_edges[:-1][mask_nonzero]
+    log_hist_nonzero = np.log(hist[mask_nonzero] * scale)
+    return left_edges_nonzero, log_hist_nonzero
 
-        hist, bin_edges = np.histogram(log_data, bins=1500)
 
-        mask_nonzero = hist > 0
-        left_edges_nonzero = bin_edges[:-1][mask_nonzero]
-        hist_nonzero = hist[mask_nonzero]
+def get_histogram_cache_key(img_data: np.ndarray, version: int = 0, exact: bool = False) -> tuple:
+    """
+    The key consists of the identity of the array (object, memory and layout) and a version counter of the image
+    item, which is incremented when new data is set. Since ids are reused after an array is freed, the cache
+    additionally stores a weak reference to the array, which is checked on lookup.
+    """
+    return (
+        id(img_data),
+        img_data.__array_interface__["data"][0],
+        img_data.shape,
+        img_data.strides,
+        img_data.dtype.str,
+        version,
+        exact,
+    )
+
+
+def get_cached_histogram_data(img_data: np.ndarray, version: int = 0, exact: bool = False):
+    """returns the cached histogram data or None if it was not calculated yet"""
+    key = get_histogram_cache_key(img_data, version, exact)
+    with _histogram_cache_lock:
+        if key in histogram_cache:
+            img_data_ref, histogram = histogram_cache[key]
+            # the id and the memory of a freed array can be reused by a new array with the same key
+            if img_data_ref() is img_data:
+                histogram_cache.move_to_end(key)
+                return histogram
+            del histogram_cache[key]
+    return None
+
+
+def get_histogram_data(img_data: np.ndarray, version: int = 0, exact: bool = False) -> tuple:
+    """calculates the histogram data necessary for the histogram LUT item, can be called from any thread"""
+    if img_data is None:
+        return None, None
 
-        log_hist_nonzero = np.log(hist_nonzero)
+    histogram = get_cached_histogram_data(img_data, version, exact)
+    if histogram is not None:
+        return histogram
 
-        histogram_cache[ar_hash] = (left_edges_nonzero, log_hist_nonzero)
-        histogram_cache.move_to_end(ar_hash)
-        if len(histogram_cache) > 100:  # keep only 100 histograms in cache
+    histogram = calculate_histogram(img_data, exact=exact)
+    with _histogram_cache_lock:
+        # a weak reference identifies the array without keeping it alive
+        histogram_cache[get_histogram_cache_key(img_data, version, exact)] = (weakref.ref(img_data), histogram)
+        if len(histogram_cache) > 20:  # the keys are unique for every image, only recent ones are needed
             histogram_cache.popitem(last=False)
-        return left_edges_nonzero, log_hist_nonzero
+    return histogram
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Dioptas - GUI program for fast processing of 2D X-ray diffraction data
+# Principal author: Clemens Prescher (clemens.prescher@gmail.com)
+# Copyright (C) 2014-2019 GSECARS, University of Chicago, USA
+# Copyright (C) 2015-2018 Institute for Geology and Mineralogy, University of Cologne, Germany
+# Copyright (C) 2019-2020 DESY, Hamburg, Germany
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Multi-resolution representation of images for the display of large detectors"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+class ImagePyramid:
+    """Lazily computed downsampled versions of an image
+
+    Level 0 is the image itself, every following level halves both dimensions by reducing 2x2 blocks with their
+    maximum ("max", keeps single bright pixels visible) or mean ("mean"). Levels are computed when they are first
+    requested and kept until the pyramid is discarded.
+    """
+
+    MODES = ("max", "mean")
+
+    def __init__(self, image: np.ndarray, mode: str = "max"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported downsample mode: {mode}")
+        self.mode = mode
+        self._levels = [image]
+
+    @property
+    def shape(self) -> tuple:
+        return self._levels[0].shape
+
+    @property
+    def maxLevel(self) -> int:
+        """Highest level with at least one pixel in each dimension"""
+        return max(0, int(min(self.shape[:2])).bit_length() - 1)
+
+    def level(self, level: int) -> np.ndarray:
+        """Returns the image downsampled by 2**level (level is clipped to [0, maxLevel])"""
+        level = int(np.clip(level, 0, self.maxLevel))
+        while len(self._levels) <= level:
+            self._levels.append(downsample(self._levels[-1], self.mode))
+        return self._levels[level]
+
+
+def downsample(image: np.ndarray, mode: str = "max") -> np.ndarray:
+    """Halves both dimensions of an image by reducing 2x2 blocks, odd dimensions are padded with the edge values"""
+    if image.shape[0] % 2 or image.shape[1] % 2:
+        pad_width = [(0, image.shape[0] % 2), (0, image.shape[1] % 2)] + [(0, 0)] * (image.ndim - 2)
+        image = np.pad(image, pad_width, mode="edge")
+    top_left, top_right = image[0::2, 0::2], image[0::2, 1::2]
+    bottom_left, bottom_right = image[1::2, 0::2], image[1::2, 1::2]
+    if mode == "max":
+        # fmax ignores NaN values (e.g. masked pixels) unless the whole block is NaN
+        return np.fmax(np.fmax(top_left, top_right), np.fmax(bottom_left, bottom_right))
+    if np.issubdtype(image.dtype, np.integer):
+        top_left = top_left.astype(np.float32)
+    return (top_left + top_right + bottom_left + bottom_right) * 0.25
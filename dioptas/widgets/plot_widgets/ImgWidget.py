@@ -455,16 +455,22 @@ class IntegrationImgWidget(MaskImgWidget):
         :param tth: array of twotheta for the image
         :param cur_tth: two theta value for the line
         """
-        tth_ind = find_contours(tth, cur_tth)
+        self.set_circle_contours(find_contours(tth, cur_tth))
 
+    def set_circle_contours(self, contours):
+        """
+        sets the circle plot items to precalculated contour lines
+        :param contours: list of (n, 2) arrays with the (row, column) image indices of the line segments, e.g. from
+                         CalibrationModel.get_two_theta_contours
+        """
         # delete old graphs
         for plot_item in self.circle_plot_items:
             plot_item.setData(x=[], y=[])
 
-        for plot_ind, tth in enumerate(tth_ind):
-            x_plot = tth[:, 1] + 0.5
-            y_plot = tth[:, 0] + 0.5
-            self.circle_plot_items[plot_ind].setData(x=x_plot, y=y_plot)
+        for plot_item, contour in zip(self.circle_plot_items, contours):
+            x_plot = contour[:, 1] + 0.5
+            y_plot = contour[:, 0] + 0.5
+            plot_item.setData(x=x_plot, y=y_plot)
 
     def activate_circle_scatter(self):
         for plot_item in self.circle_plot_items:
@@ -620,6 +626,10 @@ class IntegrationBatchWidget(IntegrationCakeWidget):
         )
         self.x_bin_range = [0, None]  # Range of shown bins
         self.pg_layout.removeItem(self.pg_layout.getItem(1, 2))  # remove the right LUT
+        self.peak_positions_item = pg.ScatterPlotItem(
+            pen=pg.mkPen(color=(255, 0, 255)), brush=None, size=4, symbol="o"
+        )
+        self.img_view_box.addItem(self.peak_positions_item)
 
     def plot_image(self, img_data, auto_level=False, x_bin_range=[0, None]):
         self.x_bin_range = x_bin_range
@@ -639,6 +649,16 @@ class IntegrationBatchWidget(IntegrationCakeWidget):
     def hide_linear_region(self):
         self.img_view_box.removeItem(self.linear_region_item)
 
+    def plot_peak_positions(self, x, y):
+        """
+        Shows fitted peak positions on top of the image, x and y are given in image pixel coordinates.
+        """
+        valid = np.isfinite(x) & np.isfinite(y)
+        self.peak_positions_item.setData(x[valid] + 0.5, y[valid] + 0.5)
+
+    def clear_peak_positions(self):
+        self.peak_positions_item.clear()
+
     def move_image(self):
         pass
 
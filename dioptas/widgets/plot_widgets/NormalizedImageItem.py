@@ -20,11 +20,29 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
 from contextlib import contextmanager
 from typing import Optional
 
 import numpy as np
 import pyqtgraph as pg
+from pyqtgraph.graphicsItems.GraphicsItem import GraphicsItem
+from qtpy import QtCore
+
+from .ImagePyramid import ImagePyramid
+
+IMAGE_ITEM_INTERNALS = (
+    "_computeDownsampleFactors",
+    "_renderRequired",
+    "_unrenderable",
+    "_imageHasNans",
+    "_imageNanLocations",
+)
+"""Private pg.ImageItem attributes needed for rendering from an ImagePyramid
+
+If any of them is missing (e.g. in an untested pyqtgraph version), NormalizedImageItem falls back to normalizing and
+rendering the full image with the plain pg.ImageItem.
+"""
 
 
 class Normalization:
@@ -109,16 +127,42 @@ class SqrtNormalization(Normalization):
 
 
 class NormalizedImageItem(pg.ImageItem):
-    """pyqtgraph image item with support for data normalization"""
+    """pyqtgraph image item with support for data normalization
+
+    Images are displayed from an ImagePyramid: only the pyramid level matching the screen resolution is rendered and
+    only the visible part of it (plus a margin, aligned to TILE_SIZE). Normalized tiles are cached, so that level and
+    lookup table changes do not normalize the image again.
+
+    This relies on the IMAGE_ITEM_INTERNALS of pg.ImageItem, without them the full image is normalized and rendered.
+    """
 
     _NORMALIZATIONS = dict((cls.ID, cls()) for cls in [
         LinearNormalization, LogNormalization, SqrtNormalization])
     """Dict of normalization name: Normalization instances"""
 
+    TILE_SIZE = 256
+    """Granularity (in pixels of the rendered level) of the rendered part of the image"""
+
+    MAX_CACHED_TILES = 4
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        self.__dataVersion = 0
+        self.__pyramid = None
+        self.__downsampleMode = "max"
+        self.__normalizedTiles = OrderedDict()
+        self.__renderedTile = None
+        self.__tileRect = None
+        self.__usePyramid = False
         self.__normalization = "linear"
         self.__rawImage = None
+        super().__init__(*args, **kwargs)
+        self.__usePyramid = all(hasattr(self, name) for name in IMAGE_ITEM_INTERNALS)
+        if self.__usePyramid and self.__rawImage is not None:
+            self.setImage(self.__rawImage)
+
+    def usesImagePyramid(self) -> bool:
+        """Returns whether the image is rendered from an ImagePyramid or as a plain pg.ImageItem"""
+        return self.__usePyramid
 
     @classmethod
     def supportedNormalizations(cls) -> tuple[str]:
@@ -144,6 +188,13 @@ class NormalizedImageItem(pg.ImageItem):
             return None
         return np.array(self.__rawImage, copy=copy)
 
+    def getDataVersion(self) -> int:
+        """Returns a counter which is incremented whenever image data is set
+
+        Level changes (which call setImage without image) keep the version.
+        """
+        return self.__dataVersion
+
     def getNormalization(self) -> str:
         """Returns the currently used normalization"""
         return self.__normalization
@@ -159,7 +210,29 @@ class NormalizedImageItem(pg.ImageItem):
         # Get levels **before** changing the normalization
         levels = self.getLevels()
         self.__normalization = normalization
-        self.setImage(image=self.__rawImage, levels=levels)
+        if self.__rawImage is None:
+            return
+        if self.__pyramid is None:
+            self.setImage(self.__rawImage, levels=levels)
+            return
+        self.__normalizedTiles.clear()
+        super().setImage(None, levels=levels)
+
+    def getDownsampleMode(self) -> str:
+        """Returns how 2x2 pixel blocks are reduced for zoomed out views ("max" or "mean")"""
+        return self.__downsampleMode
+
+    def setDownsampleMode(self, mode: str):
+        """Set how 2x2 pixel blocks are reduced for zoomed out views ("max" or "mean")"""
+        if mode not in ImagePyramid.MODES:
+            raise ValueError(f"Unsupported downsample mode: {mode}")
+        if mode == self.__downsampleMode:
+            return
+        self.__downsampleMode = mode
+        if self.__pyramid is not None:
+            self.__pyramid = ImagePyramid(self.__rawImage, mode)
+            self.__normalizedTiles.clear()
+            super().setImage(None)
 
     def _getNorm(self) -> Normalization:
         return self._NORMALIZATIONS[self.getNormalization()]
@@ -168,9 +241,16 @@ class NormalizedImageItem(pg.ImageItem):
         if image is None:
             return super().setImage(None, *args, **kwargs)
 
+        self.__dataVersion += 1
         self.__rawImage = image
-        normalizedImage = self._getNorm().apply(image)
-        return super().setImage(normalizedImage, *args, **kwargs)
+        if not self.__usePyramid:
+            return super().setImage(self._getNorm().apply(image), *args, **kwargs)
+
+        self.__pyramid = ImagePyramid(image, self.__downsampleMode)
+        self.__normalizedTiles.clear()
+        # the raw image is kept as image attribute, it is normalized tile by tile in render
+        kwargs["autoDownsample"] = False
+        return super().setImage(image, *args, **kwargs)
 
     def getLevels(self):
         levels = super().getLevels()
@@ -199,6 +279,104 @@ class NormalizedImageItem(pg.ImageItem):
         finally:
             self.image = previousImage
 
+    def viewTransformChanged(self):
+        if self.__pyramid is None:
+            return super().viewTransformChanged()
+
+        GraphicsItem.viewTransformChanged(self)  # invalidates the cached view rect
+        if self.__renderedTile is not None and not self._renderRequired:
+            level, tile = self._visibleTile()
+            rendered_level, rendered_tile = self.__renderedTile
+            if level != rendered_level or not _containsTile(rendered_tile, tile):
+                self._renderRequired = True
+                self.update()
+
+    def render(self):
+        if self.__pyramid is None:
+            return super().render()
+
+        level, tile = self._visibleTile()
+        image = self._normalizedTile(level, tile)
+        # the nan state of the image item is determined from the rendered image
+        self._imageHasNans = None
+        self._imageNanLocations = None
+        with self._useAsImage(image):
+            super().render()
+        self._imageHasNans = None
+        self.__renderedTile = level, tile
+
+        scale = 2 ** level
+        x0, y0, x1, y1 = tile
+        self.__tileRect = QtCore.QRectF(
+            x0 * scale, y0 * scale,
+            min(x1 * scale, self.width()) - x0 * scale,
+            min(y1 * scale, self.height()) - y0 * scale,
+        )
+
+    def paint(self, painter, *args):
+        if self.__pyramid is None or self.image is None:
+            return super().paint(painter, *args)
+        if self._renderRequired:
+            self.render()
+            if self._unrenderable:
+                return
+        if self.paintMode is not None:
+            painter.setCompositionMode(self.paintMode)
+        painter.drawImage(self.__tileRect, self.qimage)
+        if self.border is not None:
+            painter.setPen(self.border)
+            painter.drawRect(self.boundingRect())
+
+    def _visibleTile(self) -> tuple:
+        """Returns the pyramid level matching the screen resolution and the part of it to render (x0, y0, x1, y1)"""
+        level = 0
+        xds, yds = self._computeDownsampleFactors()
+        if xds is not None:
+            level = min(int(np.log2(max(1, min(xds, yds)))), self.__pyramid.maxLevel)
+        width, height = self._levelSize(level)
+
+        view_rect = self.viewRect()
+        if view_rect is None:
+            return level, (0, 0, width, height)
+
+        # the visible part and a margin of half the view size on each side, aligned to the tile grid
+        scale = 2 ** level
+        margin_x, margin_y = view_rect.width() / 2, view_rect.height() / 2
+        tile = (
+            _alignDown((view_rect.left() - margin_x) / scale, self.TILE_SIZE, width),
+            _alignDown((view_rect.top() - margin_y) / scale, self.TILE_SIZE, height),
+            _alignUp((view_rect.right() + margin_x) / scale, self.TILE_SIZE, width),
+            _alignUp((view_rect.bottom() + margin_y) / scale, self.TILE_SIZE, height),
+        )
+        if tile[0] >= tile[2] or tile[1] >= tile[3]:  # image is outside the view
+            tile = (0, 0, min(width, self.TILE_SIZE), min(height, self.TILE_SIZE))
+        return level, tile
+
+    def _levelSize(self, level: int) -> tuple:
+        shape = self.__pyramid.level(level).shape
+        if self.axisOrder == "col-major":
+            return shape[0], shape[1]
+        return shape[1], shape[0]
+
+    def _normalizedTile(self, level: int, tile: tuple) -> np.ndarray:
+        key = (self.getNormalization(), level, tile)
+        if key in self.__normalizedTiles:
+            self.__normalizedTiles.move_to_end(key)
+            return self.__normalizedTiles[key]
+
+        x0, y0, x1, y1 = tile
+        data = self.__pyramid.level(level)
+        if self.axisOrder == "col-major":
+            data = data[x0:x1, y0:y1]
+        else:
+            data = data[y0:y1, x0:x1]
+        normalized = self._getNorm().apply(data)
+
+        self.__normalizedTiles[key] = normalized
+        if len(self.__normalizedTiles) > self.MAX_CACHED_TILES:
+            self.__normalizedTiles.popitem(last=False)
+        return normalized
+
     def quickMinMax(self, *args, **kwargs):
         with self._useAsImage(self.__rawImage):
             return super().quickMinMax(*args, **kwargs)
@@ -206,3 +384,15 @@ class NormalizedImageItem(pg.ImageItem):
     def getHistogram(self, *args, **kwargs):
         with self._useAsImage(self.__rawImage):
             return super().getHistogram(*args, **kwargs)
+
+
+def _alignDown(value: float, step: int, maximum: int) -> int:
+    return int(np.clip(np.floor(value / step) * step, 0, maximum))
+
+
+def _alignUp(value: float, step: int, maximum: int) -> int:
+    return int(np.clip(np.ceil(value / step) * step, 0, maximum))
+
+
+def _containsTile(outer: tuple, inner: tuple) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
@@ -1,3 +1,7 @@
+from multiprocessing import freeze_support
+
 from dioptas import main
 
-main()
+if __name__ == "__main__":
+    freeze_support()  # the phase library parses files in spawned processes, also in the frozen executable
+    main()